@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+
+# Copyright 2024 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Assess the latency/quality trade-off of the samplers of a trained Diffusion Policy.
+
+For each sampler and number of inference steps, the chunks of actions generated from the observations of
+held-out episodes of a dataset are compared to the actions of the dataset. The mean squared error of the
+actions and the inference time per chunk are reported in a csv file.
+
+Warm-starting is disabled, since the frames of a batch don't follow each other.
+
+Example:
+
+```bash
+python benchmarks/policies/run_diffusion_sampler_benchmark.py \
+    --policy-path lerobot/diffusion_pusht \
+    --repo-id lerobot/pusht \
+    --episodes 200 201 202 203 204 \
+    --samplers DDIM DPMSolver++ consistency \
+    --num-inference-steps 1 2 4 10 25 100
+```
+"""
+
+import argparse
+import itertools
+from pathlib import Path
+
+import pandas as pd
+import torch
+from tqdm import tqdm
+
+from lerobot.common.datasets.factory import resolve_delta_timestamps
+from lerobot.common.datasets.lerobot_dataset import LeRobotDataset, LeRobotDatasetMetadata
+from lerobot.common.policies.diffusion.modeling_diffusion import DiffusionPolicy
+from lerobot.common.utils.benchmark import TimeBenchmark
+from lerobot.common.utils.utils import get_safe_torch_device
+
+
+@torch.no_grad()
+def evaluate_sampler(
+    policy: DiffusionPolicy,
+    dataloader: torch.utils.data.DataLoader,
+    device: torch.device,
+    num_batches: int | None,
+    seed: int,
+) -> dict:
+    config = policy.config
+    start = config.n_obs_steps - 1
+    end = start + config.n_action_steps
+    benchmark = TimeBenchmark(device=device)
+    sum_squared_error = 0.0
+    num_actions = 0
+    torch.manual_seed(seed)
+    for batch in itertools.islice(dataloader, num_batches):
+        batch = {k: v.to(device) if isinstance(v, torch.Tensor) else v for k, v in batch.items()}
+        inputs = policy.normalize_inputs(batch)
+        if config.image_features:
+            inputs = dict(inputs)
+            inputs["observation.images"] = torch.stack([inputs[key] for key in config.image_features], dim=-4)
+
+        with benchmark:
+            actions = policy.diffusion.generate_actions(inputs)
+        actions = policy.unnormalize_outputs({"action": actions})["action"]
+
+        target = batch["action"][:, start:end]
+        is_valid = ~batch["action_is_pad"][:, start:end]
+        squared_error = (actions - target).pow(2).mean(dim=-1)
+        sum_squared_error += squared_error[is_valid].sum().item()
+        num_actions += is_valid.sum().item()
+
+    return {
+        "action_mse": sum_squared_error / max(num_actions, 1),
+        "time_per_chunk_s": benchmark.total / max(benchmark.count, 1),
+    }
+
+
+def main(
+    policy_path: str,
+    repo_id: str,
+    episodes: list[int] | None,
+    samplers: list[str],
+    num_inference_steps: list[int],
+    batch_size: int,
+    num_batches: int | None,
+    device: str,
+    seed: int,
+    output_path: Path,
+):
+    device = get_safe_torch_device(device, log=True)
+    policy = DiffusionPolicy.from_pretrained(policy_path)
+    policy.to(device)
+    policy.eval()
+
+    ds_meta = LeRobotDatasetMetadata(repo_id)
+    delta_timestamps = resolve_delta_timestamps(policy.config, ds_meta)
+    dataset = LeRobotDataset(repo_id, episodes=episodes, delta_timestamps=delta_timestamps)
+    dataloader = torch.utils.data.DataLoader(
+        dataset,
+        batch_size=batch_size,
+        shuffle=True,
+        generator=torch.Generator().manual_seed(seed),
+        num_workers=4,
+        pin_memory=device.type != "cpu",
+    )
+
+    policy.config.warm_start = False
+    results = []
+    for sampler, steps in tqdm(list(itertools.product(samplers, num_inference_steps))):
+        policy.diffusion.set_sampler(sampler, steps)
+        policy.reset()
+        results.append(
+            {
+                "sampler": sampler,
+                "num_inference_steps": steps,
+                **evaluate_sampler(policy, dataloader, device, num_batches, seed),
+            }
+        )
+
+    df = pd.DataFrame(results)
+    print(df.to_string(index=False))
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    df.to_csv(output_path, index=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--policy-path",
+        type=str,
+        required=True,
+        help="Hub repository or local directory of the pretrained Diffusion Policy.",
+    )
+    parser.add_argument(
+        "--repo-id",
+        type=str,
+        required=True,
+        help="Dataset to compare the generated actions to.",
+    )
+    parser.add_argument(
+        "--episodes",
+        type=int,
+        nargs="*",
+        default=None,
+        help="Held-out episodes of the dataset, which were not used for training. Defaults to all episodes.",
+    )
+    parser.add_argument(
+        "--samplers",
+        type=str,
+        nargs="*",
+        default=["DDPM", "DDIM", "DPMSolver++", "consistency"],
+        help="Samplers to benchmark.",
+    )
+    parser.add_argument(
+        "--num-inference-steps",
+        type=int,
+        nargs="*",
+        default=[1, 2, 4, 10, 25, 100],
+        help="Numbers of reverse diffusion steps to benchmark for each sampler.",
+    )
+    parser.add_argument("--batch-size", type=int, default=64, help="Batch size of the inference.")
+    parser.add_argument(
+        "--num-batches",
+        type=int,
+        default=None,
+        help="Number of batches to evaluate each configuration on. Defaults to the whole dataset.",
+    )
+    parser.add_argument("--device", type=str, default="cuda", help="Device to run the policy on.")
+    parser.add_argument("--seed", type=int, default=1337, help="Seed of the batches and of the noise.")
+    parser.add_argument(
+        "--output-path",
+        type=Path,
+        default=Path("outputs/diffusion_sampler_benchmark.csv"),
+        help="Csv file to write the results to.",
+    )
+    args = parser.parse_args()
+    main(**vars(args))
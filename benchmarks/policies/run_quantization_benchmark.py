@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+
+# Copyright 2024 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compare the latency and actions of quantized policies to their float32 version on cpu.
+
+The pretrained policy is loaded in float32 and with each quantization (see `quantize_policy`), and rolled
+out with `select_action` on the frames of episodes of a dataset. For each quantization, the latency of
+`select_action` (which runs inference once per chunk of actions) and the mean squared error of the actions
+with respect to those of the float32 policy and to those of the dataset are reported in a csv file. The
+noise of stochastic policies (e.g. Diffusion Policy) is seeded identically for all quantizations.
+
+Example:
+
+```bash
+python benchmarks/policies/run_quantization_benchmark.py \
+    --policy-path lerobot/act_aloha_sim_transfer_cube_human \
+    --repo-id lerobot/aloha_sim_transfer_cube_human \
+    --episodes 0 1 \
+    --num-threads 4
+```
+"""
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import torch
+from tqdm import tqdm
+
+from lerobot.common.datasets.lerobot_dataset import LeRobotDataset
+from lerobot.common.policies.factory import get_policy_class
+from lerobot.common.policies.pretrained import PreTrainedPolicy
+from lerobot.common.utils.benchmark import TimeBenchmark
+from lerobot.common.utils.random_utils import seeded_context
+from lerobot.configs.policies import QUANTIZATIONS, PreTrainedConfig
+
+
+@torch.no_grad()
+def rollout(policy: PreTrainedPolicy, dataset: LeRobotDataset, seed: int) -> tuple[np.ndarray, dict]:
+    """Selects the actions of the policy on all the frames of the dataset, episode by episode."""
+    benchmark = TimeBenchmark()
+    latencies = []
+    actions = []
+    episode_index = None
+    for frame_index in tqdm(range(len(dataset)), leave=False):
+        item = dataset[frame_index]
+        if item["episode_index"].item() != episode_index:
+            episode_index = item["episode_index"].item()
+            policy.reset()
+        observation = {
+            key: value.unsqueeze(0)
+            for key, value in item.items()
+            if key.startswith("observation.") and isinstance(value, torch.Tensor)
+        }
+        with seeded_context(seed + frame_index), benchmark:
+            actions.append(policy.select_action(observation)[0].numpy())
+        latencies.append(benchmark.result)
+    latencies = np.array(latencies) * 1000
+    return np.stack(actions), {
+        "mean_latency_ms": latencies.mean(),
+        "p95_latency_ms": np.percentile(latencies, 95),
+        "max_latency_ms": latencies.max(),
+    }
+
+
+def main(
+    policy_path: str,
+    repo_id: str,
+    episodes: list[int] | None,
+    quantizations: list[str],
+    num_threads: int | None,
+    seed: int,
+    output_path: Path,
+):
+    if num_threads is not None:
+        torch.set_num_threads(num_threads)
+
+    dataset = LeRobotDataset(repo_id, episodes=episodes)
+    dataset_actions = torch.stack(dataset.hf_dataset["action"]).numpy()
+
+    results = []
+    fp32_actions = None
+    for quantization in [None, *quantizations]:
+        config = PreTrainedConfig.from_pretrained(policy_path)
+        config.device = "cpu"
+        policy_cls = get_policy_class(config.type)
+        policy = policy_cls.from_pretrained(policy_path, config=config, quantization=quantization)
+
+        actions, latencies = rollout(policy, dataset, seed)
+        if fp32_actions is None:
+            fp32_actions = actions
+        results.append(
+            {
+                "quantization": quantization or "fp32",
+                **latencies,
+                "action_mse_to_fp32": ((actions - fp32_actions) ** 2).mean(),
+                "action_mse_to_dataset": ((actions - dataset_actions) ** 2).mean(),
+            }
+        )
+
+    df = pd.DataFrame(results)
+    print(df.to_string(index=False))
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    df.to_csv(output_path, index=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--policy-path",
+        type=str,
+        required=True,
+        help="Hub repository or local directory of the pretrained float32 policy (e.g. ACT, Diffusion Policy "
+        "or VQ-BeT).",
+    )
+    parser.add_argument(
+        "--repo-id",
+        type=str,
+        required=True,
+        help="Dataset whose frames are given to the policy.",
+    )
+    parser.add_argument(
+        "--episodes",
+        type=int,
+        nargs="*",
+        default=[0],
+        help="Episodes of the dataset to roll the policy out on.",
+    )
+    parser.add_argument(
+        "--quantizations",
+        type=str,
+        nargs="*",
+        default=QUANTIZATIONS,
+        help="Quantizations to compare to float32.",
+    )
+    parser.add_argument(
+        "--num-threads",
+        type=int,
+        default=None,
+        help="Number of cpu threads of PyTorch, e.g. the number of cores of the robot computer.",
+    )
+    parser.add_argument("--seed", type=int, default=1337, help="Seed of the noise of stochastic policies.")
+    parser.add_argument(
+        "--output-path",
+        type=Path,
+        default=Path("outputs/quantization_benchmark.csv"),
+        help="Csv file to write the results to.",
+    )
+    args = parser.parse_args()
+    main(**vars(args))
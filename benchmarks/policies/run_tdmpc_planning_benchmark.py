@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+
+# Copyright 2024 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Measure the latency of the MPPI/CEM planning of TD-MPC.
+
+The planner of a randomly initialized TD-MPC with the default inference settings (`n_gaussian_samples`,
+`n_pi_samples`, `cem_iterations`, `horizon`...) plans from random latent states, as the latency of planning
+doesn't depend on the weights nor on the observation encoder. Each configuration is run eagerly and, with
+`--compile-mode`, compiled with `torch.compile` like with `--policy.compile=true`.
+
+Example:
+
+```bash
+python benchmarks/policies/run_tdmpc_planning_benchmark.py \
+    --device cuda \
+    --batch-sizes 1 8 \
+    --compile-mode default
+```
+"""
+
+import argparse
+
+import pandas as pd
+import torch
+
+from lerobot.common.policies.tdmpc.configuration_tdmpc import TDMPCConfig
+from lerobot.common.policies.tdmpc.modeling_tdmpc import TDMPCPolicy
+from lerobot.common.policies.utils import compile_policy
+from lerobot.common.utils.benchmark import TimeBenchmark
+from lerobot.common.utils.utils import get_safe_torch_device
+from lerobot.configs.types import FeatureType, PolicyFeature
+
+
+def make_policy(state_dim: int, action_dim: int, device: torch.device) -> TDMPCPolicy:
+    config = TDMPCConfig(
+        input_features={"observation.state": PolicyFeature(type=FeatureType.STATE, shape=(state_dim,))},
+        output_features={"action": PolicyFeature(type=FeatureType.ACTION, shape=(action_dim,))},
+        device=device.type,
+    )
+    # Without dataset stats, the actions are only unnormalized after planning, which isn't benchmarked
+    policy = TDMPCPolicy(config)
+    policy.to(device)
+    policy.eval()
+    return policy
+
+
+def benchmark_planning(
+    policy: TDMPCPolicy, batch_size: int, device: torch.device, warmup_iters: int, benchmark_iters: int
+) -> dict:
+    policy.reset()
+    z = torch.rand(batch_size, policy.config.latent_dim, device=device)
+    # Subsequent plans are warm-started from the previous ones, like during a rollout
+    for _ in range(warmup_iters):
+        policy.plan(z)
+
+    benchmark = TimeBenchmark(device=device)
+    for _ in range(benchmark_iters):
+        with benchmark:
+            policy.plan(z)
+    return {"time_per_plan_ms": benchmark.total / benchmark.count * 1000}
+
+
+def main(
+    device: str,
+    batch_sizes: list[int],
+    state_dim: int,
+    action_dim: int,
+    compile_mode: str | None,
+    warmup_iters: int,
+    benchmark_iters: int,
+):
+    device = get_safe_torch_device(device, log=True)
+    policy = make_policy(state_dim, action_dim, device)
+    print(
+        f"n_gaussian_samples={policy.config.n_gaussian_samples} n_pi_samples={policy.config.n_pi_samples} "
+        f"cem_iterations={policy.config.cem_iterations} horizon={policy.config.horizon}"
+    )
+
+    variants = ["eager"] if compile_mode is None else ["eager", f"compile-{compile_mode}"]
+    results = []
+    for variant in variants:
+        if variant != "eager":
+            compile_policy(policy, mode=None if compile_mode == "default" else compile_mode)
+        for batch_size in batch_sizes:
+            results.append(
+                {
+                    "variant": variant,
+                    "batch_size": batch_size,
+                    **benchmark_planning(policy, batch_size, device, warmup_iters, benchmark_iters),
+                }
+            )
+
+    print(pd.DataFrame(results).to_string(index=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--device", type=str, default="cuda", help="Device to run the planner on.")
+    parser.add_argument(
+        "--batch-sizes",
+        type=int,
+        nargs="*",
+        default=[1, 8],
+        help="Numbers of environments planned for at once.",
+    )
+    parser.add_argument("--state-dim", type=int, default=4, help="Dimension of the robot state.")
+    parser.add_argument("--action-dim", type=int, default=4, help="Dimension of the actions.")
+    parser.add_argument(
+        "--compile-mode",
+        type=str,
+        default=None,
+        help="Also benchmark the planner compiled with this `torch.compile` mode (e.g. default, "
+        "reduce-overhead).",
+    )
+    parser.add_argument("--warmup-iters", type=int, default=10, help="Number of plans before timing.")
+    parser.add_argument("--benchmark-iters", type=int, default=100, help="Number of timed plans.")
+    args = parser.parse_args()
+    main(**vars(args))
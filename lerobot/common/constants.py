@@ -33,10 +33,17 @@ TRAINING_STEP = "training_step.json"
 OPTIMIZER_STATE = "optimizer_state.safetensors"
 OPTIMIZER_PARAM_GROUPS = "optimizer_param_groups.json"
 SCHEDULER_STATE = "scheduler_state.json"
+EMA_STATE = "ema_state.safetensors"
+TRAINING_WEIGHTS = "training_weights.safetensors"
+MASTER_WEIGHTS = "master_weights.safetensors"
+CHECKPOINT_METRICS = "checkpoint_metrics.json"
+WEIGHT_BLOBS_DIR = ".blobs"
 
 # cache dir
 default_cache_path = Path(HF_HOME) / "lerobot"
 HF_LEROBOT_HOME = Path(os.getenv("HF_LEROBOT_HOME", default_cache_path)).expanduser()
+# torch.compile cache, can be overridden with TORCHINDUCTOR_CACHE_DIR
+COMPILE_CACHE_DIR = HF_LEROBOT_HOME / "compile_cache"
 
 if "LEROBOT_HOME" in os.environ:
     raise ValueError(
@@ -0,0 +1,84 @@
+# Copyright 2024 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This script converts a local LeRobot dataset storing its features of dtype 'image' as PNG bytes embedded in
+the parquet files into the raw images layout, where the frames of each episode and camera are stored as a
+single (T, C, H, W) uint8 array. Raw images are memory-mapped and read without any decoding. It will:
+
+- Decode the PNG images of each episode and write them in `frames/`.
+- Rewrite the parquet files of each episode without the image columns.
+- Add `raw_image_path` in `info.json`.
+
+Usage:
+
+```bash
+python lerobot/common/datasets/convert_images_to_raw.py \
+    --repo-id=lerobot/pusht_image \
+    --root=data/lerobot/pusht_image
+```
+
+"""
+
+import argparse
+import logging
+
+import datasets
+import numpy as np
+
+from lerobot.common.datasets.lerobot_dataset import LeRobotDatasetMetadata
+from lerobot.common.datasets.utils import DEFAULT_RAW_IMAGE_PATH, write_info, write_raw_images
+
+
+def convert_dataset_to_raw_images(repo_id: str, root: str | None = None) -> None:
+    meta = LeRobotDatasetMetadata(repo_id, root=root)
+    if len(meta.image_keys) == 0:
+        raise ValueError(f"{repo_id} doesn't contain any feature of dtype 'image'.")
+    if meta.raw_images:
+        logging.info(f"Images of {repo_id} are already stored as raw frames.")
+        return
+
+    meta.info["raw_image_path"] = DEFAULT_RAW_IMAGE_PATH
+    for ep_idx in meta.episodes:
+        data_path = meta.root / meta.get_data_file_path(ep_idx)
+        ep_dataset = datasets.Dataset.from_parquet(str(data_path))
+        for key in meta.image_keys:
+            # (H, W, C) PIL images -> (T, C, H, W) uint8 array
+            frames = np.stack([np.array(img.convert("RGB")) for img in ep_dataset[key]]).transpose(0, 3, 1, 2)
+            write_raw_images(frames, meta.root / meta.get_raw_image_file_path(ep_idx, key))
+
+        ep_dataset = ep_dataset.remove_columns(meta.image_keys)
+        ep_dataset.to_parquet(data_path)
+
+    write_info(meta.info, meta.root)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--repo-id",
+        type=str,
+        required=True,
+        help="Repository identifier on Hugging Face: a community or a user name `/` the name of the dataset "
+        "(e.g. `lerobot/pusht`, `cadene/aloha_sim_insertion_human`).",
+    )
+    parser.add_argument(
+        "--root",
+        type=str,
+        default=None,
+        help="Local directory of the dataset. Defaults to the LeRobot cache directory.",
+    )
+
+    args = parser.parse_args()
+    convert_dataset_to_raw_images(**vars(args))
@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+
+# Copyright 2024 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import multiprocessing
+import threading
+import time
+import traceback
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from lerobot.common.datasets.video_utils import decode_video_frames
+
+# Per-slot header: status, number of frames, channels, height, width, number of bytes of the error message
+HEADER_SIZE = 6
+STATUS_OK = 0
+STATUS_ERROR = 1
+# Owner of a slot which isn't reserved by any request
+NO_OWNER = -1
+# Interval at which a client waiting for its frames checks that the decoding processes are still alive
+LIVENESS_CHECK_INTERVAL_S = 1.0
+
+
+def decode_worker_process(
+    requests: multiprocessing.Queue,
+    shm: shared_memory.SharedMemory,
+    headers,
+    owners,
+    slot_locks: list,
+    slot_ready: list,
+    num_slots: int,
+    slot_size: int,
+):
+    # Parallelism comes from the number of processes, avoid oversubscribing the cpu with intra-op threads.
+    torch.set_num_threads(1)
+    slots = np.ndarray((num_slots, slot_size), dtype=np.uint8, buffer=shm.buf)
+    headers = np.frombuffer(headers, dtype=np.int64).reshape(num_slots, HEADER_SIZE)
+    owners = np.frombuffer(owners, dtype=np.int64)
+    while True:
+        item = requests.get()
+        if item is None:
+            break
+        slot, request_id, video_path, timestamps, tolerance_s, backend, decode_options = item
+        try:
+            frames = decode_video_frames(
+                video_path, timestamps, tolerance_s, backend, to_float=False, **decode_options
+            ).numpy()
+            if frames.nbytes > slot_size:
+                raise ValueError(
+                    f"Decoded frames ({frames.nbytes} bytes) don't fit in a slot of the decode service "
+                    f"({slot_size} bytes). Please increase `slot_size`."
+                )
+            data, header = frames.reshape(-1), (STATUS_OK, *frames.shape, 0)
+        except Exception:
+            message = traceback.format_exc().encode()[:slot_size]
+            data, header = np.frombuffer(message, dtype=np.uint8), (STATUS_ERROR, 0, 0, 0, 0, len(message))
+
+        # The client may have given up on this request (e.g. after a timeout) and its slot may now belong to
+        # another request, in which case the result is dropped.
+        with slot_locks[slot]:
+            if owners[slot] == request_id:
+                slots[slot, : len(data)] = data
+                headers[slot] = header
+                slot_ready[slot].release()
+
+
+class VideoDecodeService:
+    """
+    This class abstracts away a pool of processes decoding video frames on behalf of several clients,
+    typically the DataLoader workers of a `LeRobotDataset`, so that decoding parallelism can be scaled
+    independently of the number of dataset copies held by the DataLoader workers.
+
+    Decoded frames are written by the decoding processes in a ring of fixed-size slots of shared memory, which
+    avoids pickling frames through pipes. A client reserves one slot per video to decode, submits all of its
+    requests at once so that they are decoded in parallel, then copies the frames out of the slots and
+    releases them. Each request is tagged with a unique id which owns its slot until the slot is released, so
+    that a request completing after its client gave up on it never overwrites the frames of a later request.
+
+    The service must be started before the DataLoader workers, which inherit it. When `slot_size` is too small
+    to hold the frames of a request, the request fails with an error explaining how to fix it. When a decoding
+    process dies, or a request isn't decoded within `timeout_s` seconds, the waiting client raises an error
+    instead of hanging. Since clients can't reap the decoding processes, the process which started the service
+    reaps them and publishes their liveness in shared memory.
+    """
+
+    def __init__(self, num_processes: int, num_slots: int, slot_size: int, timeout_s: float = 60.0):
+        if num_processes <= 0:
+            raise ValueError("Number of processes must be greater than zero.")
+
+        self.num_processes = num_processes
+        self.num_slots = num_slots
+        self.slot_size = slot_size
+        self.timeout_s = timeout_s
+        self.shm = shared_memory.SharedMemory(create=True, size=num_slots * slot_size)
+        self.headers = multiprocessing.RawArray("q", num_slots * HEADER_SIZE)
+        self.owners = multiprocessing.RawArray("q", [NO_OWNER] * num_slots)
+        self.slot_locks = [multiprocessing.Lock() for _ in range(num_slots)]
+        self.slot_ready = [multiprocessing.Semaphore(0) for _ in range(num_slots)]
+        self.free_slots = multiprocessing.Queue()
+        for slot in range(num_slots):
+            self.free_slots.put(slot)
+        # Slots of a client are reserved all at once, so that clients never wait on each other's slots
+        self.reserve_lock = multiprocessing.Lock()
+        self.next_request_id = multiprocessing.RawValue("q", 0)
+        self.requests = multiprocessing.Queue()
+        self.processes = []
+        self._stopped = False
+
+        for _ in range(self.num_processes):
+            p = multiprocessing.Process(
+                target=decode_worker_process,
+                args=(
+                    self.requests,
+                    self.shm,
+                    self.headers,
+                    self.owners,
+                    self.slot_locks,
+                    self.slot_ready,
+                    num_slots,
+                    slot_size,
+                ),
+            )
+            p.daemon = True
+            p.start()
+            self.processes.append(p)
+        self.pids = [p.pid for p in self.processes]
+        self.alive = multiprocessing.RawArray("b", [1] * num_processes)
+        self._reaper = threading.Thread(target=self._reap_processes, daemon=True)
+        self._reaper.start()
+
+    def __getstate__(self) -> dict:
+        # Decoding processes are owned by the process which started the service
+        state = self.__dict__.copy()
+        state["processes"] = []
+        state["_reaper"] = None
+        return state
+
+    def _reap_processes(self) -> None:
+        sentinels = {p.sentinel: i for i, p in enumerate(self.processes)}
+        while sentinels:
+            for sentinel in wait(list(sentinels)):
+                i = sentinels.pop(sentinel)
+                self.processes[i].join()
+                self.alive[i] = 0
+
+    def decode(
+        self,
+        videos: dict[str, tuple[Path | str, list[float]]],
+        tolerance_s: float,
+        backend: str | None = None,
+        decode_options: dict[str, dict] | None = None,
+    ) -> dict[str, torch.Tensor]:
+        """Decodes the frames at the requested timestamps of each (video_path, timestamps) in `videos`, with
+        the same arguments and outputs as `decode_video_frames`."""
+        if len(videos) > self.num_slots:
+            raise ValueError(f"Can't decode {len(videos)} videos at once with {self.num_slots} slots.")
+
+        decode_options = decode_options if decode_options is not None else {}
+        slots_view = np.ndarray((self.num_slots, self.slot_size), dtype=np.uint8, buffer=self.shm.buf)
+        headers = np.frombuffer(self.headers, dtype=np.int64).reshape(self.num_slots, HEADER_SIZE)
+        owners = np.frombuffer(self.owners, dtype=np.int64)
+        with self.reserve_lock:
+            slots = {key: self.free_slots.get() for key in videos}
+            request_ids = {}
+            for key, slot in slots.items():
+                request_ids[key] = self.next_request_id.value
+                self.next_request_id.value += 1
+                owners[slot] = request_ids[key]
+
+        frames = {}
+        errors = []
+        try:
+            for key, (video_path, timestamps) in videos.items():
+                options = decode_options.get(key, {})
+                request = (slots[key], request_ids[key], str(video_path), timestamps, tolerance_s, backend)
+                self.requests.put((*request, options))
+
+            for key, slot in slots.items():
+                self._wait_slot(slot)
+                status, n, c, h, w, message_size = headers[slot].tolist()
+                if status == STATUS_ERROR:
+                    errors.append(bytes(slots_view[slot, :message_size]).decode())
+                else:
+                    # copy out of the slot before releasing it
+                    key_frames = slots_view[slot, : n * c * h * w].reshape(n, c, h, w).copy()
+                    frames[key] = torch.from_numpy(key_frames).type(torch.float32) / 255
+        finally:
+            for slot in slots.values():
+                self._release_slot(slot)
+
+        if errors:
+            raise RuntimeError("Video decoding failed in the decode service:\n" + "\n".join(errors))
+
+        return frames
+
+    def _wait_slot(self, slot: int) -> None:
+        deadline = time.monotonic() + self.timeout_s
+        while not self.slot_ready[slot].acquire(timeout=LIVENESS_CHECK_INTERVAL_S):
+            dead_pids = [pid for pid, alive in zip(self.pids, self.alive, strict=True) if not alive]
+            if dead_pids:
+                raise RuntimeError(
+                    f"Decoding processes {dead_pids} of the decode service died unexpectedly. The service "
+                    "can't be used anymore, please restart it."
+                )
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Video decoding timed out after {self.timeout_s}s in the decode service.")
+
+    def _release_slot(self, slot: int) -> None:
+        # Disowning the slot drops any late result of its request, and a result which completed after its
+        # client stopped waiting is drained so that it can't satisfy the next request of the slot.
+        with self.slot_locks[slot]:
+            self.owners[slot] = NO_OWNER
+            self.slot_ready[slot].acquire(block=False)
+        self.free_slots.put(slot)
+
+    def stop(self):
+        if self._stopped:
+            return
+
+        for _ in self.processes:
+            self.requests.put(None)
+        # The decoding processes are joined by the thread reaping them
+        if self._reaper is not None:
+            self._reaper.join()
+        self.requests.close()
+        self.requests.join_thread()
+        self.shm.close()
+        self.shm.unlink()
+
+        self._stopped = True
@@ -24,6 +24,7 @@ from lerobot.common.datasets.lerobot_dataset import (
     MultiLeRobotDataset,
 )
 from lerobot.common.datasets.transforms import ImageTransforms
+from lerobot.common.datasets.utils import dataset_to_policy_features
 from lerobot.configs.policies import PreTrainedConfig
 from lerobot.configs.train import TrainPipelineConfig
 
@@ -66,6 +67,54 @@ def resolve_delta_timestamps(
     return delta_timestamps
 
 
+def resolve_video_decode_options(
+    cfg: PreTrainedConfig, ds_meta: LeRobotDatasetMetadata
+) -> dict[str, dict] | None:
+    """Resolves the region of interest and the size at which video frames can be decoded, by reading the
+    'image_crop_shape' and 'image_max_shape' properties of the PreTrainedConfig.
+
+    The crop is a center crop, identical to the one done by the policy, so that the policy's own crop becomes
+    a no-op. The resize preserves the aspect ratio so that frames fit within 'image_max_shape', matching the
+    size and the interpolation of the resizing done by the policy before padding (see `crop_and_resize_frames`
+    for the rounding of resized frames). Frames are never upscaled at decoding time.
+
+    Args:
+        cfg (PreTrainedConfig): The PreTrainedConfig to read image shapes from.
+        ds_meta (LeRobotDatasetMetadata): The dataset from which video features shapes are read.
+
+    Returns:
+        dict[str, dict] | None: A dictionary of decoding options per video key, e.g.:
+            {
+                "observation.images.top": {"crop": (198, 278, 84, 84), "resize": None},
+            }
+            returns `None` if the the resulting dict is empty.
+    """
+    policy_features = dataset_to_policy_features(ds_meta.features)
+    video_decode_options = {}
+    for key in ds_meta.video_keys:
+        _, height, width = policy_features[key].shape
+        crop = resize = None
+        if cfg.image_crop_shape is not None:
+            crop_height, crop_width = cfg.image_crop_shape
+            # same rounding as torchvision's center crop
+            top = int(round((height - crop_height) / 2.0))
+            left = int(round((width - crop_width) / 2.0))
+            crop = (top, left, crop_height, crop_width)
+            height, width = crop_height, crop_width
+        if cfg.image_max_shape is not None:
+            max_height, max_width = cfg.image_max_shape
+            ratio = max(width / max_width, height / max_height)
+            if ratio > 1:
+                resize = (int(height / ratio), int(width / ratio))
+        if crop is not None or resize is not None:
+            video_decode_options[key] = {"crop": crop, "resize": resize}
+
+    if len(video_decode_options) == 0:
+        video_decode_options = None
+
+    return video_decode_options
+
+
 def make_dataset(cfg: TrainPipelineConfig) -> LeRobotDataset | MultiLeRobotDataset:
     """Handles the logic of setting up delta timestamps and image transforms before creating a dataset.
 
@@ -87,6 +136,9 @@ def make_dataset(cfg: TrainPipelineConfig) -> LeRobotDataset | MultiLeRobotDatas
             cfg.dataset.repo_id, root=cfg.dataset.root, revision=cfg.dataset.revision
         )
         delta_timestamps = resolve_delta_timestamps(cfg.policy, ds_meta)
+        video_decode_options = None
+        if cfg.dataset.video_decode_from_policy:
+            video_decode_options = resolve_video_decode_options(cfg.policy, ds_meta)
         dataset = LeRobotDataset(
             cfg.dataset.repo_id,
             root=cfg.dataset.root,
@@ -95,7 +147,10 @@ def make_dataset(cfg: TrainPipelineConfig) -> LeRobotDataset | MultiLeRobotDatas
             image_transforms=image_transforms,
             revision=cfg.dataset.revision,
             video_backend=cfg.dataset.video_backend,
+            video_decode_options=video_decode_options,
         )
+        if cfg.dataset.num_decode_processes > 0:
+            dataset.start_decode_service(cfg.dataset.num_decode_processes)
     else:
         raise NotImplementedError("The MultiLeRobotDataset isn't supported for now.")
         dataset = MultiLeRobotDataset(
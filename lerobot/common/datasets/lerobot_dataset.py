@@ -16,6 +16,7 @@
 import contextlib
 import logging
 import shutil
+import tempfile
 from pathlib import Path
 from typing import Callable
 
@@ -32,6 +33,7 @@ from huggingface_hub.errors import RevisionNotFoundError
 
 from lerobot.common.constants import HF_LEROBOT_HOME
 from lerobot.common.datasets.compute_stats import aggregate_stats, compute_episode_stats
+from lerobot.common.datasets.decode_service import VideoDecodeService
 from lerobot.common.datasets.image_writer import AsyncImageWriter, write_image
 from lerobot.common.datasets.utils import (
     DEFAULT_FEATURES,
@@ -55,7 +57,9 @@ from lerobot.common.datasets.utils import (
     is_valid_version,
     load_episodes,
     load_episodes_stats,
+    load_image_as_numpy,
     load_info,
+    load_raw_images,
     load_stats,
     load_tasks,
     validate_episode_buffer,
@@ -64,13 +68,16 @@ from lerobot.common.datasets.utils import (
     write_episode_stats,
     write_info,
     write_json,
+    write_raw_images,
 )
 from lerobot.common.datasets.video_utils import (
     VideoFrame,
+    decode_packed_video_frames,
     decode_video_frames,
     encode_video_frames,
     get_safe_default_codec,
     get_video_info,
+    pack_video_streams,
 )
 from lerobot.common.robot_devices.robots.utils import Robot
 
@@ -137,11 +144,19 @@ class LeRobotDatasetMetadata:
         fpath = self.data_path.format(episode_chunk=ep_chunk, episode_index=ep_index)
         return Path(fpath)
 
-    def get_video_file_path(self, ep_index: int, vid_key: str) -> Path:
+    def get_video_file_path(self, ep_index: int, vid_key: str | None = None) -> Path:
+        """Note: `vid_key` is ignored when videos are packed, since all keys share the same file."""
         ep_chunk = self.get_episode_chunk(ep_index)
         fpath = self.video_path.format(episode_chunk=ep_chunk, video_key=vid_key, episode_index=ep_index)
         return Path(fpath)
 
+    def get_raw_image_file_path(self, ep_index: int, image_key: str) -> Path:
+        ep_chunk = self.get_episode_chunk(ep_index)
+        fpath = self.raw_image_path.format(
+            episode_chunk=ep_chunk, image_key=image_key, episode_index=ep_index
+        )
+        return Path(fpath)
+
     def get_episode_chunk(self, ep_index: int) -> int:
         return ep_index // self.chunks_size
 
@@ -155,6 +170,28 @@ class LeRobotDatasetMetadata:
         """Formattable string for the video files."""
         return self.info["video_path"]
 
+    @property
+    def raw_image_path(self) -> str | None:
+        """Formattable string for the raw image files, when images are not embedded in the parquet files."""
+        return self.info.get("raw_image_path")
+
+    @property
+    def raw_images(self) -> bool:
+        """Whether images are stored as raw uint8 arrays instead of PNG bytes in the parquet files."""
+        return self.raw_image_path is not None
+
+    @property
+    def packed_videos(self) -> bool:
+        """Whether all camera streams of an episode are muxed as multiple streams of a single video file."""
+        return self.video_path is not None and "{video_key}" not in self.video_path
+
+    @property
+    def videos_per_episode(self) -> int:
+        """Number of video files written for each episode."""
+        if self.packed_videos:
+            return min(1, len(self.video_keys))
+        return len(self.video_keys)
+
     @property
     def robot_type(self) -> str | None:
         """Robot type used in recording this dataset."""
@@ -260,7 +297,7 @@ class LeRobotDatasetMetadata:
             self.info["total_chunks"] += 1
 
         self.info["splits"] = {"train": f"0:{self.info['total_episodes']}"}
-        self.info["total_videos"] += len(self.video_keys)
+        self.info["total_videos"] += self.videos_per_episode
         if len(self.video_keys) > 0:
             self.update_video_info()
 
@@ -283,10 +320,13 @@ class LeRobotDatasetMetadata:
         Warning: this function writes info from first episode videos, implicitly assuming that all videos have
         been encoded the same way. Also, this means it assumes the first episode exists.
         """
-        for key in self.video_keys:
+        for stream_index, key in enumerate(self.video_keys):
             if not self.features[key].get("info", None):
                 video_path = self.root / self.get_video_file_path(ep_index=0, vid_key=key)
-                self.info["features"][key]["info"] = get_video_info(video_path)
+                if self.packed_videos:
+                    self.info["features"][key]["info"] = get_video_info(video_path, stream_index)
+                else:
+                    self.info["features"][key]["info"] = get_video_info(video_path)
 
     def __repr__(self):
         feature_keys = list(self.features)
@@ -309,6 +349,8 @@ class LeRobotDatasetMetadata:
         robot_type: str | None = None,
         features: dict | None = None,
         use_videos: bool = True,
+        pack_videos: bool = False,
+        raw_images: bool = False,
     ) -> "LeRobotDatasetMetadata":
         """Creates metadata for a LeRobotDataset."""
         obj = cls.__new__(cls)
@@ -343,7 +385,9 @@ class LeRobotDatasetMetadata:
 
         obj.tasks, obj.task_to_task_index = {}, {}
         obj.episodes_stats, obj.stats, obj.episodes = {}, {}, {}
-        obj.info = create_empty_dataset_info(CODEBASE_VERSION, fps, robot_type, features, use_videos)
+        obj.info = create_empty_dataset_info(
+            CODEBASE_VERSION, fps, robot_type, features, use_videos, pack_videos, raw_images
+        )
         if len(obj.video_keys) > 0 and not use_videos:
             raise ValueError()
         write_json(obj.info, obj.root / INFO_PATH)
@@ -364,6 +408,7 @@ class LeRobotDataset(torch.utils.data.Dataset):
         force_cache_sync: bool = False,
         download_videos: bool = True,
         video_backend: str | None = None,
+        video_decode_options: dict[str, dict] | None = None,
     ):
         """
         2 modes are available for instantiating this class, depending on 2 different use cases:
@@ -465,6 +510,10 @@ class LeRobotDataset(torch.utils.data.Dataset):
                 True.
             video_backend (str | None, optional): Video backend to use for decoding videos. Defaults to torchcodec when available int the platform; otherwise, defaults to 'pyav'.
                 You can also use the 'pyav' decoder used by Torchvision, which used to be the default option, or 'video_reader' which is another decoder of Torchvision.
+            video_decode_options (dict[str, dict] | None, optional): Mapping from video keys to the 'crop' and
+                'resize' arguments of `decode_video_frames`, so that frames are cropped and/or downscaled at
+                decoding time rather than after being returned at full resolution. Note that the shapes stored
+                in the metadata are not updated accordingly. Defaults to None.
         """
         super().__init__()
         self.repo_id = repo_id
@@ -475,7 +524,9 @@ class LeRobotDataset(torch.utils.data.Dataset):
         self.tolerance_s = tolerance_s
         self.revision = revision if revision else CODEBASE_VERSION
         self.video_backend = video_backend if video_backend else get_safe_default_codec()
+        self.video_decode_options = video_decode_options
         self.delta_indices = None
+        self.decode_service = None
 
         # Unused attributes
         self.image_writer = None
@@ -487,6 +538,11 @@ class LeRobotDataset(torch.utils.data.Dataset):
         self.meta = LeRobotDatasetMetadata(
             self.repo_id, self.root, self.revision, force_cache_sync=force_cache_sync
         )
+        if self.meta.packed_videos and self.video_backend != "pyav":
+            logging.warning(
+                f"Videos of {self.repo_id} are packed, they are decoded with 'pyav' instead of the requested "
+                f"'{self.video_backend}' backend."
+            )
         if self.episodes is not None and self.meta._version >= packaging.version.parse("v2.1"):
             episodes_stats = [self.meta.episodes_stats[ep_idx] for ep_idx in self.episodes]
             self.stats = aggregate_stats(episodes_stats)
@@ -609,7 +665,14 @@ class LeRobotDataset(torch.utils.data.Dataset):
                 for vid_key in self.meta.video_keys
                 for ep_idx in episodes
             ]
-            fpaths += video_files
+            # packed videos share a single file for all keys
+            fpaths += list(dict.fromkeys(video_files))
+        if self.meta.raw_images:
+            fpaths += [
+                str(self.meta.get_raw_image_file_path(ep_idx, img_key))
+                for img_key in self.meta.image_keys
+                for ep_idx in episodes
+            ]
 
         return fpaths
 
@@ -627,7 +690,7 @@ class LeRobotDataset(torch.utils.data.Dataset):
         return hf_dataset
 
     def create_hf_dataset(self) -> datasets.Dataset:
-        features = get_hf_features_from_features(self.features)
+        features = get_hf_features_from_features(self.features, self.meta.raw_images)
         ft_dict = {col: [] for col in features}
         hf_dataset = datasets.Dataset.from_dict(ft_dict, features=features, split="train")
 
@@ -660,7 +723,7 @@ class LeRobotDataset(torch.utils.data.Dataset):
         if self.hf_dataset is not None:
             return self.hf_dataset.features
         else:
-            return get_hf_features_from_features(self.features)
+            return get_hf_features_from_features(self.features, self.meta.raw_images)
 
     def _get_query_indices(self, idx: int, ep_idx: int) -> tuple[dict[str, list[int | bool]]]:
         ep_start = self.episode_data_index["from"][ep_idx]
@@ -693,22 +756,65 @@ class LeRobotDataset(torch.utils.data.Dataset):
         return query_timestamps
 
     def _query_hf_dataset(self, query_indices: dict[str, list[int]]) -> dict:
+        external_keys = self.meta.video_keys + (self.meta.image_keys if self.meta.raw_images else [])
         return {
             key: torch.stack(self.hf_dataset.select(q_idx)[key])
             for key, q_idx in query_indices.items()
-            if key not in self.meta.video_keys
+            if key not in external_keys
         }
 
+    def _query_raw_images(
+        self, idx: int, frame_index: int, ep_idx: int, query_indices: dict[str, list[int]] | None = None
+    ) -> dict[str, torch.Tensor]:
+        item = {}
+        for img_key in self.meta.image_keys:
+            if query_indices is not None and img_key in query_indices:
+                # query indices always lie within the episode of `idx`
+                frame_indices = [frame_index + q_idx - idx for q_idx in query_indices[img_key]]
+            else:
+                frame_indices = [frame_index]
+            fpath = self.root / self.meta.get_raw_image_file_path(ep_idx, img_key)
+            item[img_key] = load_raw_images(fpath, frame_indices).squeeze(0)
+
+        return item
+
     def _query_videos(self, query_timestamps: dict[str, list[float]], ep_idx: int) -> dict[str, torch.Tensor]:
         """Note: When using data workers (e.g. DataLoader with num_workers>0), do not call this function
         in the main process (e.g. by using a second Dataloader with num_workers=0). It will result in a
         Segmentation Fault. This probably happens because a memory reference to the video loader is created in
         the main process and a subprocess fails to access it.
+
+        When a decode service is started (see `start_decode_service`), the videos of the sample are decoded in
+        parallel by its processes instead.
         """
+        if self.meta.packed_videos:
+            video_path = self.root / self.meta.get_video_file_path(ep_idx)
+            frames = decode_packed_video_frames(
+                video_path,
+                query_timestamps,
+                self.meta.video_keys,
+                self.tolerance_s,
+                decode_options=self.video_decode_options,
+            )
+            return {vid_key: vid_frames.squeeze(0) for vid_key, vid_frames in frames.items()}
+
+        if self.decode_service is not None:
+            videos = {
+                vid_key: (self.root / self.meta.get_video_file_path(ep_idx, vid_key), query_ts)
+                for vid_key, query_ts in query_timestamps.items()
+            }
+            frames = self.decode_service.decode(
+                videos, self.tolerance_s, self.video_backend, self.video_decode_options
+            )
+            return {vid_key: vid_frames.squeeze(0) for vid_key, vid_frames in frames.items()}
+
         item = {}
         for vid_key, query_ts in query_timestamps.items():
             video_path = self.root / self.meta.get_video_file_path(ep_idx, vid_key)
-            frames = decode_video_frames(video_path, query_ts, self.tolerance_s, self.video_backend)
+            decode_options = self.video_decode_options.get(vid_key, {}) if self.video_decode_options else {}
+            frames = decode_video_frames(
+                video_path, query_ts, self.tolerance_s, self.video_backend, **decode_options
+            )
             item[vid_key] = frames.squeeze(0)
 
         return item
@@ -739,6 +845,11 @@ class LeRobotDataset(torch.utils.data.Dataset):
             video_frames = self._query_videos(query_timestamps, ep_idx)
             item = {**video_frames, **item}
 
+        if self.meta.raw_images and len(self.meta.image_keys) > 0:
+            frame_index = item["frame_index"].item()
+            image_frames = self._query_raw_images(idx, frame_index, ep_idx, query_indices)
+            item = {**image_frames, **item}
+
         if self.image_transforms is not None:
             image_keys = self.meta.camera_keys
             for cam in image_keys:
@@ -873,6 +984,8 @@ class LeRobotDataset(torch.utils.data.Dataset):
 
         self._wait_image_writer()
         self._save_episode_table(episode_buffer, episode_index)
+        if self.meta.raw_images:
+            self._save_episode_raw_images(episode_buffer, episode_index)
         ep_stats = compute_episode_stats(episode_buffer, self.features)
 
         if len(self.meta.video_keys) > 0:
@@ -894,7 +1007,7 @@ class LeRobotDataset(torch.utils.data.Dataset):
         )
 
         video_files = list(self.root.rglob("*.mp4"))
-        assert len(video_files) == self.num_episodes * len(self.meta.video_keys)
+        assert len(video_files) == self.num_episodes * self.meta.videos_per_episode
 
         parquet_files = list(self.root.rglob("*.parquet"))
         assert len(parquet_files) == self.num_episodes
@@ -917,6 +1030,16 @@ class LeRobotDataset(torch.utils.data.Dataset):
         ep_data_path.parent.mkdir(parents=True, exist_ok=True)
         ep_dataset.to_parquet(ep_data_path)
 
+    def _save_episode_raw_images(self, episode_buffer: dict, episode_index: int) -> None:
+        for key in self.meta.image_keys:
+            frames = np.stack(
+                [
+                    load_image_as_numpy(fpath, dtype=np.uint8, channel_first=True)
+                    for fpath in episode_buffer[key]
+                ]
+            )
+            write_raw_images(frames, self.root / self.meta.get_raw_image_file_path(episode_index, key))
+
     def clear_episode_buffer(self) -> None:
         episode_index = self.episode_buffer["episode_index"]
         if self.image_writer is not None:
@@ -950,6 +1073,43 @@ class LeRobotDataset(torch.utils.data.Dataset):
             self.image_writer.stop()
             self.image_writer = None
 
+    def start_decode_service(
+        self, num_processes: int, num_slots: int | None = None, slot_size: int | None = None
+    ) -> None:
+        """
+        Starts a pool of `num_processes` processes decoding videos on behalf of this dataset and its copies.
+        This needs to be called before wrapping this dataset inside a parallelized DataLoader, so that all of
+        its workers submit to the same pool. Packed videos are not supported since they are already decoded in
+        a single pass.
+
+        By default, there are enough slots for every process to be busy while the videos of a sample are being
+        decoded, and slots are sized for the largest full resolution frames times the largest number of frames
+        queried per video.
+        """
+        if self.meta.packed_videos:
+            raise NotImplementedError("The decode service doesn't support packed videos.")
+        if self.decode_service is not None:
+            logging.warning(
+                "You are starting a new VideoDecodeService that is replacing an already existing one in the dataset."
+            )
+            self.stop_decode_service()
+
+        if num_slots is None:
+            num_slots = max(2 * num_processes, len(self.meta.video_keys))
+        if slot_size is None:
+            delta_indices = self.delta_indices if self.delta_indices is not None else {}
+            num_frames = max(len(delta_indices.get(key, [0])) for key in self.meta.video_keys)
+            frame_size = max(int(np.prod(self.meta.shapes[key])) for key in self.meta.video_keys)
+            slot_size = num_frames * frame_size
+
+        self.decode_service = VideoDecodeService(num_processes, num_slots, slot_size)
+
+    def stop_decode_service(self) -> None:
+        """Stops the decode service, if any. Videos are then decoded by the process calling `__getitem__`."""
+        if self.decode_service is not None:
+            self.decode_service.stop()
+            self.decode_service = None
+
     def _wait_image_writer(self) -> None:
         """Wait for asynchronous image writer to finish."""
         if self.image_writer is not None:
@@ -969,7 +1129,13 @@ class LeRobotDataset(torch.utils.data.Dataset):
         Use ffmpeg to convert frames stored as png into mp4 videos.
         Note: `encode_video_frames` is a blocking call. Making it asynchronous shouldn't speedup encoding,
         since video encoding with ffmpeg is already using multithreading.
+
+        When videos are packed, each camera is first encoded next to its frames, then all of them are muxed
+        into the episode video file.
         """
+        if self.meta.packed_videos:
+            return self._encode_episode_packed_video(episode_index)
+
         video_paths = {}
         for key in self.meta.video_keys:
             video_path = self.root / self.meta.get_video_file_path(episode_index, key)
@@ -984,6 +1150,26 @@ class LeRobotDataset(torch.utils.data.Dataset):
 
         return video_paths
 
+    def _encode_episode_packed_video(self, episode_index: int) -> dict:
+        packed_video_path = self.root / self.meta.get_video_file_path(episode_index)
+        video_paths = {key: str(packed_video_path) for key in self.meta.video_keys}
+        if packed_video_path.is_file():
+            # Skip if video is already encoded. Could be the case when resuming data recording.
+            return video_paths
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            stream_paths = {}
+            for key in self.meta.video_keys:
+                img_dir = self._get_image_file_path(
+                    episode_index=episode_index, image_key=key, frame_index=0
+                ).parent
+                stream_paths[key] = Path(tmp_dir) / f"{key}.mp4"
+                encode_video_frames(img_dir, stream_paths[key], self.fps, overwrite=True)
+
+            pack_video_streams(stream_paths, packed_video_path, overwrite=True)
+
+        return video_paths
+
     @classmethod
     def create(
         cls,
@@ -994,12 +1180,22 @@ class LeRobotDataset(torch.utils.data.Dataset):
         robot_type: str | None = None,
         features: dict | None = None,
         use_videos: bool = True,
+        pack_videos: bool = False,
+        raw_images: bool = False,
         tolerance_s: float = 1e-4,
         image_writer_processes: int = 0,
         image_writer_threads: int = 0,
         video_backend: str | None = None,
     ) -> "LeRobotDataset":
-        """Create a LeRobot Dataset from scratch in order to record data."""
+        """Create a LeRobot Dataset from scratch in order to record data.
+
+        Set `pack_videos` to mux all camera streams of an episode into a single video file, which is then
+        opened and seeked once per sample instead of once per camera.
+
+        Set `raw_images` to store features of dtype 'image' as raw uint8 arrays (one memory-mappable file per
+        episode and camera) instead of PNG bytes embedded in the parquet files, so that they are read without
+        any decoding.
+        """
         obj = cls.__new__(cls)
         obj.meta = LeRobotDatasetMetadata.create(
             repo_id=repo_id,
@@ -1009,6 +1205,8 @@ class LeRobotDataset(torch.utils.data.Dataset):
             robot_type=robot_type,
             features=features,
             use_videos=use_videos,
+            pack_videos=pack_videos,
+            raw_images=raw_images,
         )
         obj.repo_id = obj.meta.repo_id
         obj.root = obj.meta.root
@@ -1029,6 +1227,8 @@ class LeRobotDataset(torch.utils.data.Dataset):
         obj.delta_indices = None
         obj.episode_data_index = None
         obj.video_backend = video_backend if video_backend is not None else get_safe_default_codec()
+        obj.video_decode_options = None
+        obj.decode_service = None
         return obj
 
 
@@ -0,0 +1,91 @@
+# Copyright 2024 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This script converts a local LeRobot dataset storing one video file per camera and per episode into the packed
+layout, where all camera streams of an episode are muxed (without re-encoding) as multiple streams of a single
+video file. With the packed layout, each sample opens and seeks a single file instead of one per camera.
+
+Usage:
+
+```bash
+python lerobot/common/datasets/pack_videos.py \
+    --repo-id=lerobot/aloha_sim_insertion_human \
+    --root=data/lerobot/aloha_sim_insertion_human
+```
+
+"""
+
+import argparse
+import logging
+import shutil
+
+from lerobot.common.datasets.lerobot_dataset import LeRobotDatasetMetadata
+from lerobot.common.datasets.utils import DEFAULT_PACKED_VIDEO_PATH, write_info
+from lerobot.common.datasets.video_utils import pack_video_streams
+
+
+def pack_dataset_videos(repo_id: str, root: str | None = None, keep_unpacked: bool = False) -> None:
+    meta = LeRobotDatasetMetadata(repo_id, root=root)
+    if len(meta.video_keys) == 0:
+        raise ValueError(f"{repo_id} doesn't contain any video to pack.")
+    if meta.packed_videos:
+        logging.info(f"Videos of {repo_id} are already packed.")
+        return
+
+    unpacked_video_path = meta.video_path
+    for ep_idx in meta.episodes:
+        video_paths = {key: meta.root / meta.get_video_file_path(ep_idx, key) for key in meta.video_keys}
+        ep_chunk = meta.get_episode_chunk(ep_idx)
+        packed_video_path = meta.root / DEFAULT_PACKED_VIDEO_PATH.format(
+            episode_chunk=ep_chunk, episode_index=ep_idx
+        )
+        pack_video_streams(video_paths, packed_video_path, overwrite=True)
+
+    meta.info["video_path"] = DEFAULT_PACKED_VIDEO_PATH
+    meta.info["total_videos"] = meta.total_episodes
+    write_info(meta.info, meta.root)
+
+    if not keep_unpacked:
+        for chunk in range(meta.total_chunks):
+            for key in meta.video_keys:
+                key_dir = meta.root / unpacked_video_path.format(
+                    episode_chunk=chunk, video_key=key, episode_index=0
+                )
+                shutil.rmtree(key_dir.parent, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--repo-id",
+        type=str,
+        required=True,
+        help="Repository identifier on Hugging Face: a community or a user name `/` the name of the dataset "
+        "(e.g. `lerobot/pusht`, `cadene/aloha_sim_insertion_human`).",
+    )
+    parser.add_argument(
+        "--root",
+        type=str,
+        default=None,
+        help="Local directory of the dataset. Defaults to the LeRobot cache directory.",
+    )
+    parser.add_argument(
+        "--keep-unpacked",
+        action="store_true",
+        help="Keep the per-camera video files next to the packed ones.",
+    )
+
+    args = parser.parse_args()
+    pack_dataset_videos(**vars(args))
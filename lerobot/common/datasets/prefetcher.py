@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+# Copyright 2024 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import queue
+import threading
+from typing import Iterable, Iterator
+
+import torch
+
+_END = object()
+
+
+class DevicePrefetcher:
+    """
+    Iterates over the batches of `iterable` (typically a DataLoader), which are fetched and moved to `device`
+    in a background thread, so that waiting for the next batch and copying it to the device overlap with the
+    computations done on the previous one.
+
+    Up to `num_batches` batches are kept ready in advance. On cuda, host-to-device copies are issued on a
+    separate stream, and the stream consuming a batch waits for its copy to be done before using it. Pinning
+    host memory (`pin_memory=True` in the DataLoader) is required for these copies to be truly asynchronous.
+
+    Batches are expected to be dictionaries, as returned by the default collate function of the DataLoader.
+    Values which are not tensors are left untouched.
+    """
+
+    def __init__(self, iterable: Iterable[dict], device: torch.device, num_batches: int = 2):
+        if num_batches <= 0:
+            raise ValueError("Number of prefetched batches must be greater than zero.")
+
+        self.iterator = iter(iterable)
+        self.device = device
+        self.stream = torch.cuda.Stream(device) if device.type == "cuda" else None
+        self.queue = queue.Queue(maxsize=num_batches)
+        self._stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._worker_loop, daemon=True)
+        self.thread.start()
+
+    def _to_device(self, batch: dict) -> dict:
+        return {
+            key: val.to(self.device, non_blocking=True) if isinstance(val, torch.Tensor) else val
+            for key, val in batch.items()
+        }
+
+    def _worker_loop(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                batch = next(self.iterator)
+                if self.stream is not None:
+                    with torch.cuda.stream(self.stream):
+                        batch = self._to_device(batch)
+                        event = torch.cuda.Event()
+                        event.record(self.stream)
+                else:
+                    batch = self._to_device(batch)
+                    event = None
+            except StopIteration:
+                self._put(_END)
+                return
+            except Exception as e:
+                # Raised in the main thread by `__next__`
+                self._put(e)
+                return
+            self._put((batch, event))
+
+    def _put(self, item) -> None:
+        while not self._stop_event.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def __iter__(self) -> Iterator[dict]:
+        return self
+
+    def __next__(self) -> dict:
+        item = self.queue.get()
+        if item is _END:
+            raise StopIteration
+        if isinstance(item, Exception):
+            raise item
+
+        batch, event = item
+        if event is not None:
+            current_stream = torch.cuda.current_stream(self.device)
+            current_stream.wait_event(event)
+            # Prevent the caching allocator from reusing this memory before the current stream is done with it
+            for val in batch.values():
+                if isinstance(val, torch.Tensor):
+                    val.record_stream(current_stream)
+        return batch
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.thread.join()
@@ -13,6 +13,7 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import math
 from typing import Iterator, Union
 
 import torch
@@ -59,3 +60,73 @@ class EpisodeAwareSampler:
 
     def __len__(self) -> int:
         return len(self.indices)
+
+
+class DistributedEpisodeAwareSampler(EpisodeAwareSampler):
+    def __init__(
+        self,
+        episode_data_index: dict,
+        num_replicas: int,
+        rank: int,
+        episode_indices_to_use: Union[list, None] = None,
+        drop_n_first_frames: int = 0,
+        drop_n_last_frames: int = 0,
+        shuffle: bool = False,
+        seed: int = 0,
+    ):
+        """Sampler of `EpisodeAwareSampler` indices for distributed training, where each of the `num_replicas`
+        processes iterates over its own shard of the indices.
+
+        When shuffling, indices are permuted with the same seed on all processes before being sharded, so that
+        shards never overlap. The permutation changes at each iteration over the sampler, as long as all
+        processes iterate over it the same number of times. Indices are padded by repeating the first ones so
+        that all shards have the same length.
+
+        Args:
+            episode_data_index: Dictionary with keys 'from' and 'to' containing the start and end indices of each episode.
+            num_replicas: Number of processes participating in distributed training.
+            rank: Rank of the current process, in [0, num_replicas).
+            episode_indices_to_use: List of episode indices to use. If None, all episodes are used.
+                                    Assumes that episodes are indexed from 0 to N-1.
+            drop_n_first_frames: Number of frames to drop from the start of each episode.
+            drop_n_last_frames: Number of frames to drop from the end of each episode.
+            shuffle: Whether to shuffle the indices.
+            seed: Seed of the shuffling permutation, must be identical on all processes.
+        """
+        if not 0 <= rank < num_replicas:
+            raise ValueError(f"Invalid rank {rank}, rank should be in the interval [0, {num_replicas - 1}].")
+
+        super().__init__(
+            episode_data_index,
+            episode_indices_to_use=episode_indices_to_use,
+            drop_n_first_frames=drop_n_first_frames,
+            drop_n_last_frames=drop_n_last_frames,
+            shuffle=shuffle,
+        )
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.seed = seed
+        self.epoch = 0
+        self.num_samples = math.ceil(len(self.indices) / num_replicas)
+
+    def set_epoch(self, epoch: int) -> None:
+        self.epoch = epoch
+
+    def __iter__(self) -> Iterator[int]:
+        if self.shuffle:
+            generator = torch.Generator()
+            generator.manual_seed(self.seed + self.epoch)
+            indices = [self.indices[i] for i in torch.randperm(len(self.indices), generator=generator)]
+        else:
+            indices = list(self.indices)
+        self.epoch += 1
+
+        total_size = self.num_samples * self.num_replicas
+        padding_size = total_size - len(indices)
+        if padding_size > 0:
+            indices += (indices * math.ceil(padding_size / len(indices)))[:padding_size]
+
+        yield from indices[self.rank : total_size : self.num_replicas]
+
+    def __len__(self) -> int:
+        return self.num_samples
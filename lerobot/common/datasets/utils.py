@@ -53,8 +53,12 @@ EPISODES_STATS_PATH = "meta/episodes_stats.jsonl"
 TASKS_PATH = "meta/tasks.jsonl"
 
 DEFAULT_VIDEO_PATH = "videos/chunk-{episode_chunk:03d}/{video_key}/episode_{episode_index:06d}.mp4"
+# All camera streams of an episode muxed in a single file (note the absence of `{video_key}`)
+DEFAULT_PACKED_VIDEO_PATH = "videos/chunk-{episode_chunk:03d}/episode_{episode_index:06d}.mp4"
 DEFAULT_PARQUET_PATH = "data/chunk-{episode_chunk:03d}/episode_{episode_index:06d}.parquet"
 DEFAULT_IMAGE_PATH = "images/{image_key}/episode_{episode_index:06d}/frame_{frame_index:06d}.png"
+# Raw uint8 frames of an episode stored as a single (T, C, H, W) array, to be memory-mapped without decoding
+DEFAULT_RAW_IMAGE_PATH = "frames/chunk-{episode_chunk:03d}/{image_key}/episode_{episode_index:06d}.npy"
 
 DATASET_CARD_TEMPLATE = """
 ---
@@ -255,6 +259,26 @@ def load_image_as_numpy(
     return img_array
 
 
+def write_raw_images(frames: np.ndarray, fpath: Path) -> None:
+    """Writes the frames of an episode as a single (T, C, H, W) uint8 array in the .npy format, which has a
+    fixed stride per frame and can be memory-mapped with `load_raw_images`."""
+    if frames.dtype != np.uint8 or frames.ndim != 4:
+        raise ValueError(
+            f"Expected (T, C, H, W) uint8 frames, got {frames.dtype} frames of shape {frames.shape}."
+        )
+    fpath.parent.mkdir(exist_ok=True, parents=True)
+    np.save(fpath, np.ascontiguousarray(frames))
+
+
+def load_raw_images(fpath: Path, frame_indices: list[int]) -> torch.Tensor:
+    """Reads frames written by `write_raw_images` through a memory map, so that only the requested frames are
+    read from disk, without any decoding. Frames are returned as float32 in [0,1] range (channel first)."""
+    frames = np.load(fpath, mmap_mode="r")
+    # Fancy indexing on the memory map only copies the requested frames
+    frames = torch.from_numpy(frames[frame_indices])
+    return frames.type(torch.float32) / 255
+
+
 def hf_transform_to_torch(items_dict: dict[torch.Tensor | None]):
     """Get a transform function that convert items from Hugging Face dataset (pyarrow)
     to torch tensors. Importantly, images are converted from PIL, which corresponds to
@@ -360,11 +384,14 @@ def get_safe_version(repo_id: str, version: str | packaging.version.Version) ->
     raise ForwardCompatibilityError(repo_id, min(upper_versions))
 
 
-def get_hf_features_from_features(features: dict) -> datasets.Features:
+def get_hf_features_from_features(features: dict, raw_images: bool = False) -> datasets.Features:
     hf_features = {}
     for key, ft in features.items():
         if ft["dtype"] == "video":
             continue
+        elif ft["dtype"] == "image" and raw_images:
+            # Raw images are stored outside of the parquet files
+            continue
         elif ft["dtype"] == "image":
             hf_features[key] = datasets.Image()
         elif ft["shape"] == (1,):
@@ -434,8 +461,13 @@ def create_empty_dataset_info(
     robot_type: str,
     features: dict,
     use_videos: bool,
+    pack_videos: bool = False,
+    raw_images: bool = False,
 ) -> dict:
-    return {
+    video_path = None
+    if use_videos:
+        video_path = DEFAULT_PACKED_VIDEO_PATH if pack_videos else DEFAULT_VIDEO_PATH
+    info = {
         "codebase_version": codebase_version,
         "robot_type": robot_type,
         "total_episodes": 0,
@@ -447,9 +479,12 @@ def create_empty_dataset_info(
         "fps": fps,
         "splits": {},
         "data_path": DEFAULT_PARQUET_PATH,
-        "video_path": DEFAULT_VIDEO_PATH if use_videos else None,
+        "video_path": video_path,
         "features": features,
     }
+    if raw_images:
+        info["raw_image_path"] = DEFAULT_RAW_IMAGE_PATH
+    return info
 
 
 def get_episode_data_index(
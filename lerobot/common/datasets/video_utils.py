@@ -23,11 +23,13 @@ from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Any, ClassVar
 
+import av
 import pyarrow as pa
 import torch
 import torchvision
 from datasets.features.features import register_feature
 from PIL import Image
+from torch.nn import functional as F  # noqa: N812
 
 
 def get_safe_default_codec():
@@ -45,6 +47,9 @@ def decode_video_frames(
     timestamps: list[float],
     tolerance_s: float,
     backend: str | None = None,
+    crop: tuple[int, int, int, int] | None = None,
+    resize: tuple[int, int] | None = None,
+    to_float: bool = True,
 ) -> torch.Tensor:
     """
     Decodes video frames using the specified backend.
@@ -54,28 +59,62 @@ def decode_video_frames(
         timestamps (list[float]): List of timestamps to extract frames.
         tolerance_s (float): Allowed deviation in seconds for frame retrieval.
         backend (str, optional): Backend to use for decoding. Defaults to "torchcodec" when available in the platform; otherwise, defaults to "pyav"..
+        crop (tuple[int, int, int, int], optional): Region of interest (top, left, height, width) to keep from
+            the decoded frames. Defaults to None.
+        resize (tuple[int, int], optional): Target (height, width) of the returned frames, applied after
+            `crop`. Defaults to None.
+        to_float (bool, optional): Whether to convert the frames to float32 in [0,1] range, otherwise the
+            decoded uint8 frames are returned. Defaults to True.
 
     Returns:
-        torch.Tensor: Decoded frames.
+        torch.Tensor: Decoded frames (channel first).
 
     Currently supports torchcodec on cpu and pyav.
     """
     if backend is None:
         backend = get_safe_default_codec()
     if backend == "torchcodec":
-        return decode_video_frames_torchcodec(video_path, timestamps, tolerance_s)
+        return decode_video_frames_torchcodec(
+            video_path, timestamps, tolerance_s, crop=crop, resize=resize, to_float=to_float
+        )
     elif backend in ["pyav", "video_reader"]:
-        return decode_video_frames_torchvision(video_path, timestamps, tolerance_s, backend)
+        return decode_video_frames_torchvision(
+            video_path, timestamps, tolerance_s, backend, crop=crop, resize=resize, to_float=to_float
+        )
     else:
         raise ValueError(f"Unsupported video backend: {backend}")
 
 
+def crop_and_resize_frames(
+    frames: torch.Tensor,
+    crop: tuple[int, int, int, int] | None = None,
+    resize: tuple[int, int] | None = None,
+) -> torch.Tensor:
+    """Crops (top, left, height, width) then resizes to (height, width) a batch of uint8 channel-first frames.
+
+    This is meant to be applied on the decoded uint8 frames, before their conversion to float32, so that
+    discarded pixels are never converted nor copied. Frames are resized with the same bilinear interpolation
+    without antialiasing as the policies resizing their images (e.g. `resize_with_pad` of pi0), so they only
+    differ from the frames resized by the policy by their rounding to uint8, i.e. by at most 0.5 / 255.
+    """
+    if crop is not None:
+        top, left, height, width = crop
+        frames = frames[..., top : top + height, left : left + width]
+    if resize is not None and tuple(frames.shape[-2:]) != tuple(resize):
+        frames = F.interpolate(frames.float(), size=tuple(resize), mode="bilinear", align_corners=False)
+        frames = frames.round_().clamp_(0, 255).to(torch.uint8)
+    return frames
+
+
 def decode_video_frames_torchvision(
     video_path: Path | str,
     timestamps: list[float],
     tolerance_s: float,
     backend: str = "pyav",
     log_loaded_timestamps: bool = False,
+    crop: tuple[int, int, int, int] | None = None,
+    resize: tuple[int, int] | None = None,
+    to_float: bool = True,
 ) -> torch.Tensor:
     """Loads frames associated to the requested timestamps of a video
 
@@ -161,8 +200,12 @@ def decode_video_frames_torchvision(
     if log_loaded_timestamps:
         logging.info(f"{closest_ts=}")
 
+    # keep the region of interest before conversion to float
+    closest_frames = crop_and_resize_frames(closest_frames, crop, resize)
+
     # convert to the pytorch format which is float32 in [0,1] range (and channel first)
-    closest_frames = closest_frames.type(torch.float32) / 255
+    if to_float:
+        closest_frames = closest_frames.type(torch.float32) / 255
 
     assert len(timestamps) == len(closest_frames)
     return closest_frames
@@ -174,6 +217,9 @@ def decode_video_frames_torchcodec(
     tolerance_s: float,
     device: str = "cpu",
     log_loaded_timestamps: bool = False,
+    crop: tuple[int, int, int, int] | None = None,
+    resize: tuple[int, int] | None = None,
+    to_float: bool = True,
 ) -> torch.Tensor:
     """Loads frames associated with the requested timestamps of a video using torchcodec.
 
@@ -236,13 +282,117 @@ def decode_video_frames_torchcodec(
     if log_loaded_timestamps:
         logging.info(f"{closest_ts=}")
 
+    # keep the region of interest before conversion to float
+    closest_frames = crop_and_resize_frames(closest_frames, crop, resize)
+
     # convert to float32 in [0,1] range (channel first)
-    closest_frames = closest_frames.type(torch.float32) / 255
+    if to_float:
+        closest_frames = closest_frames.type(torch.float32) / 255
 
     assert len(timestamps) == len(closest_frames)
     return closest_frames
 
 
+def decode_packed_video_frames(
+    video_path: Path | str,
+    timestamps: dict[str, list[float]],
+    stream_keys: list[str],
+    tolerance_s: float,
+    log_loaded_timestamps: bool = False,
+    decode_options: dict[str, dict] | None = None,
+) -> dict[str, torch.Tensor]:
+    """Loads frames associated to the requested timestamps of several camera streams muxed in a single video.
+
+    Packed videos hold one video stream per camera key (see `pack_video_streams`), in the order given by
+    `stream_keys`. Instead of opening and seeking one file per camera, the container is opened and seeked once
+    and its packets are demuxed in a single pass, each decoded frame being routed back to its camera key.
+    Decoding of a stream stops as soon as its last requested timestamp has been reached.
+
+    Note: All streams of a packed video are expected to be encoded with the same fps and gop size, so that
+    their key frames are aligned and a single seek lands on a key frame for every stream.
+
+    `decode_options` optionally maps keys to the `crop` and `resize` arguments of `decode_video_frames`, which
+    are applied to the selected frames like in the other decoding paths (see `crop_and_resize_frames`).
+
+    Returns:
+        dict[str, torch.Tensor]: Decoded frames for each key of `timestamps`, as float32 in [0,1] range
+            (channel first).
+    """
+    video_path = str(video_path)
+    first_ts = min(min(ts) for ts in timestamps.values())
+    last_ts = {key: max(ts) for key, ts in timestamps.items()}
+
+    decode_options = decode_options if decode_options is not None else {}
+
+    loaded_frames = {key: [] for key in timestamps}
+    loaded_ts = {key: [] for key in timestamps}
+    with av.open(video_path) as container:
+        video_streams = container.streams.video
+        if len(video_streams) != len(stream_keys):
+            raise ValueError(
+                f"Expected {len(stream_keys)} video streams in {video_path} ({stream_keys}), "
+                f"found {len(video_streams)}."
+            )
+        streams = {key: video_streams[stream_keys.index(key)] for key in timestamps}
+        index_to_key = {stream.index: key for key, stream in streams.items()}
+
+        # access closest key frame preceding the first requested frame (offset is expressed in av.time_base)
+        container.seek(int(first_ts * av.time_base), backward=True, any_frame=False)
+
+        # load all frames until last requested frame of every stream
+        pending = set(timestamps)
+        for packet in container.demux(list(streams.values())):
+            key = index_to_key[packet.stream.index]
+            if key not in pending:
+                continue
+            for frame in packet.decode():
+                current_ts = float(frame.pts * frame.time_base)
+                if log_loaded_timestamps:
+                    logging.info(f"frame of '{key}' loaded at timestamp={current_ts:.4f}")
+                array = frame.to_ndarray(format="rgb24")
+                loaded_frames[key].append(torch.from_numpy(array).permute(2, 0, 1))
+                loaded_ts[key].append(current_ts)
+                if current_ts >= last_ts[key]:
+                    pending.discard(key)
+                    break
+            if not pending:
+                break
+
+    closest_frames = {}
+    for key, query_ts in timestamps.items():
+        query_ts = torch.tensor(query_ts)
+        key_loaded_ts = torch.tensor(loaded_ts[key])
+
+        # compute distances between each query timestamp and timestamps of all loaded frames
+        dist = torch.cdist(query_ts[:, None], key_loaded_ts[:, None], p=1)
+        min_, argmin_ = dist.min(1)
+
+        is_within_tol = min_ < tolerance_s
+        assert is_within_tol.all(), (
+            f"One or several query timestamps unexpectedly violate the tolerance ({min_[~is_within_tol]} > {tolerance_s=})."
+            "It means that the closest frame that can be loaded from the video is too far away in time."
+            "This might be due to synchronization issues with timestamps during data collection."
+            "To be safe, we advise to ignore this item during training."
+            f"\nqueried timestamps: {query_ts}"
+            f"\nloaded timestamps: {key_loaded_ts}"
+            f"\nvideo: {video_path}"
+            f"\nstream: {key}"
+        )
+
+        if log_loaded_timestamps:
+            logging.info(f"{key}: closest_ts={key_loaded_ts[argmin_]}")
+
+        frames = torch.stack([loaded_frames[key][idx] for idx in argmin_])
+        frames = crop_and_resize_frames(frames, **decode_options.get(key, {}))
+
+        # convert to the pytorch format which is float32 in [0,1] range (and channel first)
+        closest_frames[key] = frames.type(torch.float32) / 255
+
+        assert len(query_ts) == len(closest_frames[key])
+
+    return closest_frames
+
+
 def encode_video_frames(
     imgs_dir: Path | str,
     video_path: Path | str,
@@ -298,6 +448,45 @@ def encode_video_frames(
         )
 
 
+def pack_video_streams(
+    video_paths: dict[str, Path | str],
+    packed_video_path: Path | str,
+    log_level: str | None = "error",
+    overwrite: bool = False,
+) -> None:
+    """Muxes the video stream of each file in `video_paths` into a single container, without re-encoding.
+
+    Streams are written in the order of `video_paths` and tagged with their key as title, so that
+    `decode_packed_video_frames` can split them back to per-key frames. Timestamps are preserved as-is.
+    """
+    packed_video_path = Path(packed_video_path)
+    packed_video_path.parent.mkdir(parents=True, exist_ok=True)
+
+    ffmpeg_args = []
+    for path in video_paths.values():
+        ffmpeg_args += ["-i", str(path)]
+    for i in range(len(video_paths)):
+        ffmpeg_args += ["-map", f"{i}:v:0"]
+    ffmpeg_args += ["-c", "copy"]
+    for i, key in enumerate(video_paths):
+        ffmpeg_args += [f"-metadata:s:v:{i}", f"title={key}"]
+
+    if log_level is not None:
+        ffmpeg_args += ["-loglevel", str(log_level)]
+    if overwrite:
+        ffmpeg_args.append("-y")
+
+    ffmpeg_cmd = ["ffmpeg"] + ffmpeg_args + [str(packed_video_path)]
+    # redirect stdin to subprocess.DEVNULL to prevent reading random keyboard inputs from terminal
+    subprocess.run(ffmpeg_cmd, check=True, stdin=subprocess.DEVNULL)
+
+    if not packed_video_path.exists():
+        raise OSError(
+            f"Video packing did not work. File not found: {packed_video_path}. "
+            f"Try running the command manually to debug: `{' '.join(ffmpeg_cmd)}`"
+        )
+
+
 @dataclass
 class VideoFrame:
     # TODO(rcadene, lhoestq): move to Hugging Face `datasets` repo
@@ -366,13 +555,13 @@ def get_audio_info(video_path: Path | str) -> dict:
     }
 
 
-def get_video_info(video_path: Path | str) -> dict:
+def get_video_info(video_path: Path | str, stream_index: int = 0) -> dict:
     ffprobe_video_cmd = [
         "ffprobe",
         "-v",
         "error",
         "-select_streams",
-        "v:0",
+        f"v:{stream_index}",
         "-show_entries",
         "stream=r_frame_rate,width,height,codec_name,nb_frames,duration,pix_fmt",
         "-of",
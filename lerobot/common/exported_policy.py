@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+
+# Copyright 2024 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Runtime of the policies exported with `lerobot.common.policies.export.export_policy`.
+
+This module only depends on NumPy, and on onnxruntime or PyTorch depending on the format of the exported
+graph, so that ONNX policies run on the robot computer without importing PyTorch nor LeRobot's policies.
+
+Example:
+
+```python
+policy = ExportedPolicy("outputs/export/act_koch")
+policy.reset()
+while True:
+    observation = {
+        "observation.state": state[None],  # (1, state_dim) float32
+        "observation.images.laptop": image[None],  # (1, 3, H, W) float32 in [0, 1]
+    }
+    action = policy.select_action(observation)  # (1, action_dim) float32
+```
+"""
+
+import json
+from collections import deque
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+
+EXPORT_INFO = "export.json"
+EXPORT_FORMATS = {"onnx": "model.onnx", "torchscript": "model.pt"}
+EXPORT_OUTPUT_NAME = "action"
+
+
+def load_exported_graph(
+    export_dir: Path, info: dict, providers: list[str] | None = None
+) -> Callable[[list[np.ndarray]], np.ndarray]:
+    """Returns a function running the exported graph on its inputs, in the order of `info["inputs"]`."""
+    model_file = str(export_dir / EXPORT_FORMATS[info["format"]])
+    if info["format"] == "onnx":
+        import onnxruntime
+
+        session = onnxruntime.InferenceSession(model_file, providers=providers or ["CPUExecutionProvider"])
+        input_names = [spec["name"] for spec in info["inputs"]]
+
+        def run(inputs: list[np.ndarray]) -> np.ndarray:
+            return session.run([EXPORT_OUTPUT_NAME], dict(zip(input_names, inputs, strict=True)))[0]
+
+    else:
+        import torch
+
+        module = torch.jit.load(model_file, map_location="cpu")
+
+        def run(inputs: list[np.ndarray]) -> np.ndarray:
+            with torch.no_grad():
+                return module(*[torch.from_numpy(x) for x in inputs]).numpy()
+
+    return run
+
+
+class ExportedPolicy:
+    """Selects actions with an exported policy, like `PreTrainedPolicy.select_action` does.
+
+    The exported graph maps the observations to a chunk of unnormalized actions. The queues of observations
+    and actions, and ACT's temporal ensembling, are reproduced here in NumPy. Observations are dicts of
+    float32 arrays with a leading batch dimension, like the batches given to the PyTorch policy, and actions
+    are (batch_size, action_dim) float32 arrays.
+    """
+
+    def __init__(self, export_dir: str | Path, providers: list[str] | None = None):
+        """
+        Args:
+            export_dir: Directory written by `export_policy`.
+            providers: Execution providers of onnxruntime, defaults to cpu.
+        """
+        self.export_dir = Path(export_dir)
+        with open(self.export_dir / EXPORT_INFO) as f:
+            self.info = json.load(f)
+        self.input_names = [spec["name"] for spec in self.info["inputs"]]
+        # Length of the observation histories taken by the graph, or None if it takes the current ones only
+        self.n_obs_steps = self.info["n_obs_steps"]
+        self.n_action_steps = self.info["n_action_steps"]
+        self.temporal_ensemble_coeff = self.info["temporal_ensemble_coeff"]
+        self._run = load_exported_graph(self.export_dir, self.info, providers)
+        self.reset()
+
+    def reset(self):
+        """This should be called whenever the environment is reset."""
+        if self.n_obs_steps is not None:
+            self._observation_queues = {name: deque(maxlen=self.n_obs_steps) for name in self.input_names}
+        self._action_queue = deque(maxlen=self.n_action_steps)
+        self._ensembled_actions = None
+        self._ensembled_actions_count = None
+
+    def predict_action_chunk(self, observation: dict[str, np.ndarray]) -> np.ndarray:
+        """Runs the exported graph on `observation`, whose arrays have the shapes of `info["inputs"]`.
+
+        Returns:
+            (batch_size, chunk_size, action_dim) array of unnormalized actions.
+        """
+        inputs = []
+        for spec in self.info["inputs"]:
+            x = np.ascontiguousarray(observation[spec["name"]], dtype=np.float32)
+            if list(x.shape) != spec["shape"]:
+                raise ValueError(f"`{spec['name']}` should be of shape {spec['shape']}, got {list(x.shape)}.")
+            inputs.append(x)
+        return self._run(inputs)
+
+    def select_action(self, observation: dict[str, np.ndarray]) -> np.ndarray:
+        if self.n_obs_steps is not None:
+            for name in self.input_names:
+                queue = self._observation_queues[name]
+                # The history is initialized with copies of the first observation
+                queue.extend([observation[name]] * (queue.maxlen if len(queue) == 0 else 1))
+
+        if self.temporal_ensemble_coeff is not None:
+            return self._ensemble(self.predict_action_chunk(observation))
+
+        if len(self._action_queue) == 0:
+            if self.n_obs_steps is not None:
+                observation = {
+                    name: np.stack(self._observation_queues[name], axis=1) for name in self.input_names
+                }
+            actions = self.predict_action_chunk(observation)[:, : self.n_action_steps]
+            self._action_queue.extend(actions.transpose(1, 0, 2))
+        return self._action_queue.popleft()
+
+    def _ensemble(self, actions: np.ndarray) -> np.ndarray:
+        """Temporal ensembling of ACT (see `ACTTemporalEnsembler`) of the (batch_size, chunk_size, action_dim)
+        chunks of actions predicted at each step."""
+        chunk_size = actions.shape[1]
+        weights = np.exp(-self.temporal_ensemble_coeff * np.arange(chunk_size))
+        weights_cumsum = np.cumsum(weights)
+        if self._ensembled_actions is None:
+            self._ensembled_actions = actions.copy()
+            # Number of chunks averaged by each action of the ensemble
+            self._ensembled_actions_count = np.ones((chunk_size, 1), dtype=np.int64)
+        else:
+            count = self._ensembled_actions_count
+            self._ensembled_actions *= weights_cumsum[count - 1]
+            self._ensembled_actions += actions[:, :-1] * weights[count]
+            self._ensembled_actions /= weights_cumsum[count]
+            self._ensembled_actions = np.concatenate([self._ensembled_actions, actions[:, -1:]], axis=1)
+            self._ensembled_actions_count = np.concatenate(
+                [np.minimum(count + 1, chunk_size), np.ones((1, 1), dtype=np.int64)]
+            )
+        action = self._ensembled_actions[:, 0]
+        self._ensembled_actions = self._ensembled_actions[:, 1:]
+        self._ensembled_actions_count = self._ensembled_actions_count[1:]
+        return action
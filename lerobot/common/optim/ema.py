@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+
+# Copyright 2024 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+import torch
+from safetensors.torch import load_file, save_file
+from torch import nn
+
+from lerobot.common.constants import EMA_STATE
+
+
+class ExponentialMovingAverage:
+    """
+    Exponential moving average of the trainable parameters of a model, kept in float32 on `device` (the
+    device of the parameters by default, "cpu" to save device memory). All the averaged weights are updated
+    at once with fused `torch._foreach_lerp_` kernels.
+
+    `step` must be called after each optimizer step, with the float32 master weights of the parameters
+    when they are trained in low precision (see `MasterWeights.get_master_params`). The average is only
+    updated every `update_every` steps, with the decay raised to that power so that it covers the same number
+    of steps. With `warmup`, the decay is lowered at the beginning of training, where the weights change the
+    most, to min(decay, (1 + step) / (10 + step)).
+
+    The averaged weights can be temporarily loaded in the model with `apply` (e.g. for evaluation), or
+    retrieved as a state dict of the model with `get_model_state` (e.g. for export).
+    """
+
+    def __init__(
+        self,
+        model: nn.Module,
+        decay: float,
+        device: torch.device | str | None = None,
+        warmup: bool = True,
+        update_every: int = 1,
+    ):
+        if update_every < 1:
+            raise ValueError(f"`update_every` should be at least 1, got {update_every}.")
+
+        self.decay = decay
+        self.warmup = warmup
+        self.update_every = update_every
+        self.num_steps = 0
+        named_params = [(name, p) for name, p in model.named_parameters() if p.requires_grad]
+        self.names = [name for name, _ in named_params]
+        self.params = [p for _, p in named_params]
+        self.ema_params = [
+            p.detach().to(device=device if device is not None else p.device, dtype=torch.float32, copy=True)
+            for p in self.params
+        ]
+
+    def get_decay(self) -> float:
+        if not self.warmup:
+            return self.decay
+        return min(self.decay, (1 + self.num_steps) / (10 + self.num_steps))
+
+    @torch.no_grad()
+    def step(self, params: list[torch.Tensor] | None = None) -> None:
+        """
+        Args:
+            params: Values to average in place of the parameters of the model, in the same order as
+                `self.params` (e.g. their float32 master weights). Defaults to the parameters.
+        """
+        self.num_steps += 1
+        if self.num_steps % self.update_every != 0 or len(self.params) == 0:
+            return
+
+        decay = self.get_decay() ** self.update_every
+        params = [
+            p.detach().to(device=ema_p.device, dtype=ema_p.dtype)
+            for p, ema_p in zip(self.params if params is None else params, self.ema_params, strict=True)
+        ]
+        torch._foreach_lerp_(self.ema_params, params, 1.0 - decay)
+
+    @contextmanager
+    def apply(self) -> Iterator[None]:
+        """Loads the averaged weights in the model, and restores its own weights on exit."""
+        # Kept on the device of the averaged weights
+        backup = [
+            p.detach().to(e.device, copy=True) for p, e in zip(self.params, self.ema_params, strict=True)
+        ]
+        self._copy_to_params(self.ema_params)
+        try:
+            yield
+        finally:
+            self._copy_to_params(backup)
+
+    @torch.no_grad()
+    def _copy_to_params(self, tensors: list[torch.Tensor]) -> None:
+        for p, tensor in zip(self.params, tensors, strict=True):
+            p.copy_(tensor)
+
+    def get_model_state(self, model: nn.Module) -> dict[str, torch.Tensor]:
+        """Returns the state dict of `model` with the averaged weights in place of its parameters."""
+        ema_state = dict(zip(self.names, self.ema_params, strict=True))
+        return {key: ema_state.get(key, val) for key, val in model.state_dict().items()}
+
+    def state_dict(self) -> dict[str, torch.Tensor]:
+        state = {f"params/{name}": ema_p for name, ema_p in zip(self.names, self.ema_params, strict=True)}
+        state["num_steps"] = torch.tensor(self.num_steps)
+        return state
+
+    @torch.no_grad()
+    def load_state_dict(self, state: dict[str, torch.Tensor]) -> None:
+        for name, ema_p in zip(self.names, self.ema_params, strict=True):
+            ema_p.copy_(state[f"params/{name}"])
+        self.num_steps = int(state["num_steps"])
+
+
+def save_ema_state(ema: ExponentialMovingAverage, save_dir: Path) -> None:
+    state = {key: val.detach().cpu() for key, val in ema.state_dict().items()}
+    save_file(state, save_dir / EMA_STATE)
+
+
+def load_ema_state(ema: ExponentialMovingAverage, save_dir: Path) -> ExponentialMovingAverage:
+    ema.load_state_dict(load_file(save_dir / EMA_STATE))
+    return ema
@@ -14,14 +14,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import abc
-from dataclasses import asdict, dataclass
+import re
+from dataclasses import asdict, dataclass, field
 from pathlib import Path
+from typing import Iterable
 
 import draccus
 import torch
 from safetensors.torch import load_file, save_file
 
 from lerobot.common.constants import (
+    MASTER_WEIGHTS,
     OPTIMIZER_PARAM_GROUPS,
     OPTIMIZER_STATE,
 )
@@ -29,11 +32,25 @@ from lerobot.common.datasets.utils import flatten_dict, unflatten_dict, write_js
 from lerobot.common.utils.io_utils import deserialize_json_into_object
 
 
+@dataclass
+class ParamGroupConfig:
+    # Regular expression searched in the name of the policy's parameters (e.g. "^model\.backbone\.").
+    pattern: str
+    # Learning rate and weight decay of the matching parameters. Defaults to the optimizer's.
+    lr: float | None = None
+    weight_decay: float | None = None
+    # Set to true to freeze the matching parameters instead of optimizing them.
+    frozen: bool = False
+
+
 @dataclass
 class OptimizerConfig(draccus.ChoiceRegistry, abc.ABC):
     lr: float
     weight_decay: float
     grad_clip_norm: float
+    # Each parameter belongs to the first group whose pattern matches its name, or to a default group using
+    # the settings above. When set, these groups replace the policy's preset (`get_optim_params`).
+    param_groups: list[ParamGroupConfig] = field(default_factory=list)
 
     @property
     def type(self) -> str:
@@ -47,6 +64,37 @@ class OptimizerConfig(draccus.ChoiceRegistry, abc.ABC):
     def build(self) -> torch.optim.Optimizer:
         raise NotImplementedError
 
+    def get_state_size(self, params: Iterable[torch.Tensor]) -> int:
+        """Returns the number of bytes of the state held by the optimizer for `params`, once initialized."""
+        return 0
+
+    def _get_build_kwargs(self) -> dict:
+        kwargs = asdict(self)
+        kwargs.pop("grad_clip_norm")
+        kwargs.pop("param_groups")
+        # Left to torch's defaults when unset, as not all of its versions support them for all optimizers
+        for key in ["foreach", "fused"]:
+            if key in kwargs and kwargs[key] is None:
+                kwargs.pop(key)
+        return kwargs
+
+
+def _get_adam_state_size(params: Iterable[torch.Tensor], optim_bits: int) -> int:
+    # First and second moments, stored in the parameters' dtype or quantized to 8 bits
+    return sum(2 * p.numel() * (1 if optim_bits == 8 else p.element_size()) for p in params)
+
+
+def _build_adam_8bit(name: str, params: dict, kwargs: dict) -> torch.optim.Optimizer:
+    if kwargs.pop("foreach", None) or kwargs.pop("fused", None):
+        raise ValueError("`foreach` and `fused` are not supported with `optim_bits=8`.")
+    try:
+        import bitsandbytes as bnb
+    except ImportError as e:
+        raise ImportError(
+            "8-bit optimizers require bitsandbytes, which can be installed with `pip install bitsandbytes`."
+        ) from e
+    return getattr(bnb.optim, name)(params, **kwargs)
+
 
 @OptimizerConfig.register_subclass("adam")
 @dataclass
@@ -56,12 +104,27 @@ class AdamConfig(OptimizerConfig):
     eps: float = 1e-8
     weight_decay: float = 0.0
     grad_clip_norm: float = 10.0
+    # Use the multi-tensor (`foreach`) or single-kernel (`fused`) implementations of torch. Defaults to
+    # torch's choice.
+    foreach: bool | None = None
+    fused: bool | None = None
+    # Set to 8 to store the optimizer state quantized to 8 bits (requires bitsandbytes and cuda), which saves
+    # 75% of its memory. Otherwise, the state is stored in the dtype of the parameters.
+    optim_bits: int = 32
+
+    def __post_init__(self):
+        if self.optim_bits not in [8, 32]:
+            raise ValueError(f"`optim_bits` must be 8 or 32, got {self.optim_bits}.")
 
     def build(self, params: dict) -> torch.optim.Optimizer:
-        kwargs = asdict(self)
-        kwargs.pop("grad_clip_norm")
+        kwargs = self._get_build_kwargs()
+        if kwargs.pop("optim_bits") == 8:
+            return _build_adam_8bit("Adam8bit", params, kwargs)
         return torch.optim.Adam(params, **kwargs)
 
+    def get_state_size(self, params: Iterable[torch.Tensor]) -> int:
+        return _get_adam_state_size(params, self.optim_bits)
+
 
 @OptimizerConfig.register_subclass("adamw")
 @dataclass
@@ -71,12 +134,24 @@ class AdamWConfig(OptimizerConfig):
     eps: float = 1e-8
     weight_decay: float = 1e-2
     grad_clip_norm: float = 10.0
+    # See `AdamConfig`.
+    foreach: bool | None = None
+    fused: bool | None = None
+    optim_bits: int = 32
+
+    def __post_init__(self):
+        if self.optim_bits not in [8, 32]:
+            raise ValueError(f"`optim_bits` must be 8 or 32, got {self.optim_bits}.")
 
     def build(self, params: dict) -> torch.optim.Optimizer:
-        kwargs = asdict(self)
-        kwargs.pop("grad_clip_norm")
+        kwargs = self._get_build_kwargs()
+        if kwargs.pop("optim_bits") == 8:
+            return _build_adam_8bit("AdamW8bit", params, kwargs)
         return torch.optim.AdamW(params, **kwargs)
 
+    def get_state_size(self, params: Iterable[torch.Tensor]) -> int:
+        return _get_adam_state_size(params, self.optim_bits)
+
 
 @OptimizerConfig.register_subclass("sgd")
 @dataclass
@@ -87,12 +162,123 @@ class SGDConfig(OptimizerConfig):
     nesterov: bool = False
     weight_decay: float = 0.0
     grad_clip_norm: float = 10.0
+    # See `AdamConfig`.
+    foreach: bool | None = None
+    fused: bool | None = None
 
     def build(self, params: dict) -> torch.optim.Optimizer:
-        kwargs = asdict(self)
-        kwargs.pop("grad_clip_norm")
+        kwargs = self._get_build_kwargs()
         return torch.optim.SGD(params, **kwargs)
 
+    def get_state_size(self, params: Iterable[torch.Tensor]) -> int:
+        # Momentum buffers
+        return sum(p.numel() * p.element_size() for p in params) if self.momentum != 0 else 0
+
+
+class MasterWeights:
+    """
+    Float32 master copies of the parameters optimized by `optimizer`, for training a model whose weights are
+    kept in low precision (e.g. bfloat16), which can't accumulate small updates. The optimizer is modified in
+    place to update the master copies instead of the parameters, so it must not have taken any step yet.
+
+    The master copies are made from the current parameters, which should thus still be in float32, and be cast
+    to low precision afterwards with `cast_params`. After the backward pass, `copy_grads_to_master` must be
+    called before clipping gradients and stepping the optimizer, and `copy_master_to_params` after the step.
+    """
+
+    def __init__(self, optimizer: torch.optim.Optimizer):
+        if len(optimizer.state) > 0:
+            raise ValueError("Master weights must be created before the first step of the optimizer.")
+
+        self.params = []
+        self.master_params = []
+        for group in optimizer.param_groups:
+            master_group_params = [
+                torch.nn.Parameter(p.detach().to(torch.float32, copy=True)) for p in group["params"]
+            ]
+            self.params.extend(group["params"])
+            self.master_params.extend(master_group_params)
+            group["params"] = master_group_params
+        self._master_params_by_id = {id(p): m for p, m in zip(self.params, self.master_params, strict=True)}
+
+    @torch.no_grad()
+    def copy_grads_to_master(self) -> None:
+        for param, master_param in zip(self.params, self.master_params, strict=True):
+            master_param.grad = param.grad.float() if param.grad is not None else None
+            param.grad = None
+
+    @torch.no_grad()
+    def copy_master_to_params(self) -> None:
+        for param, master_param in zip(self.params, self.master_params, strict=True):
+            param.copy_(master_param)
+
+    @torch.no_grad()
+    def copy_params_to_master(self) -> None:
+        for param, master_param in zip(self.params, self.master_params, strict=True):
+            master_param.copy_(param)
+
+    def get_master_params(self, params: Iterable[torch.nn.Parameter]) -> list[torch.nn.Parameter]:
+        """Returns the master weights of `params`, or the parameters themselves when the optimizer doesn't
+        update them."""
+        return [self._master_params_by_id.get(id(p), p) for p in params]
+
+    def get_model_state(self, model: torch.nn.Module) -> dict[str, torch.Tensor]:
+        """Returns the state dict of `model` with the master weights in place of the parameters they
+        update."""
+        return {
+            key: self._master_params_by_id.get(id(val), val).detach()
+            for key, val in model.state_dict(keep_vars=True).items()
+        }
+
+    def cast_params(self, dtype: torch.dtype) -> None:
+        """Casts the parameters updated by the optimizer (and only them) to `dtype`."""
+        for param in self.params:
+            param.data = param.data.to(dtype=dtype)
+
+    def state_dict(self) -> dict[str, torch.Tensor]:
+        return {str(i): master_param.detach() for i, master_param in enumerate(self.master_params)}
+
+    @torch.no_grad()
+    def load_state_dict(self, state_dict: dict[str, torch.Tensor]) -> None:
+        if len(state_dict) != len(self.master_params):
+            raise ValueError(
+                f"Expected {len(self.master_params)} master weights, got {len(state_dict)} in the state dict."
+            )
+        for i, master_param in enumerate(self.master_params):
+            master_param.copy_(state_dict[str(i)])
+        self.copy_master_to_params()
+
+
+def make_param_groups(
+    named_parameters: Iterable[tuple[str, torch.nn.Parameter]], group_configs: list[ParamGroupConfig]
+) -> list[dict]:
+    """
+    Builds the parameter groups of an optimizer by assigning each parameter to the first group of
+    `group_configs` whose pattern matches its name, or to a default group when none does. Parameters of frozen
+    groups are frozen in place (`requires_grad=False`). They are left out of the optimizer, as are all the
+    parameters which don't require gradients. Empty groups are dropped.
+    """
+    default_group = {"params": []}
+    groups = []
+    for config in group_configs:
+        group = {"params": []}
+        if config.lr is not None:
+            group["lr"] = config.lr
+        if config.weight_decay is not None:
+            group["weight_decay"] = config.weight_decay
+        groups.append(group)
+
+    for name, param in named_parameters:
+        group_idx = next((i for i, c in enumerate(group_configs) if re.search(c.pattern, name)), None)
+        if group_idx is not None and group_configs[group_idx].frozen:
+            param.requires_grad_(False)
+        if not param.requires_grad:
+            continue
+        group = default_group if group_idx is None else groups[group_idx]
+        group["params"].append(param)
+
+    return [group for group in [default_group, *groups] if len(group["params"]) > 0]
+
 
 def save_optimizer_state(optimizer: torch.optim.Optimizer, save_dir: Path) -> None:
     state = optimizer.state_dict()
@@ -116,3 +302,13 @@ def load_optimizer_state(optimizer: torch.optim.Optimizer, save_dir: Path) -> to
 
     optimizer.load_state_dict(loaded_state_dict)
     return optimizer
+
+
+def save_master_weights_state(master_weights: MasterWeights, save_dir: Path) -> None:
+    state = {key: val.cpu() for key, val in master_weights.state_dict().items()}
+    save_file(state, save_dir / MASTER_WEIGHTS)
+
+
+def load_master_weights_state(master_weights: MasterWeights, save_dir: Path) -> MasterWeights:
+    master_weights.load_state_dict(load_file(save_dir / MASTER_WEIGHTS))
+    return master_weights
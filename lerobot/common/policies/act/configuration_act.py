@@ -123,6 +123,10 @@ class ACTConfig(PreTrainedConfig):
     use_vae: bool = True
     latent_dim: int = 32
     n_vae_encoder_layers: int = 4
+    # Recompute the activations of the encoder layers (including the VAE encoder's) and/or decoder layers
+    # during the backward pass instead of storing them, trading compute for memory during training.
+    encoder_activation_checkpointing: bool = False
+    decoder_activation_checkpointing: bool = False
 
     # Inference.
     # Note: the value used in ACT when temporal ensembling is enabled is 0.01.
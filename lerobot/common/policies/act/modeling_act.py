@@ -30,6 +30,7 @@ import torch
 import torch.nn.functional as F  # noqa: N812
 import torchvision
 from torch import Tensor, nn
+from torch.utils.checkpoint import checkpoint
 from torchvision.models._utils import IntermediateLayerGetter
 from torchvision.ops.misc import FrozenBatchNorm2d
 
@@ -78,6 +79,9 @@ class ACTPolicy(PreTrainedPolicy):
 
         self.reset()
 
+    def get_compiled_modules(self) -> list[nn.Module]:
+        return [self.model]
+
     def get_optim_params(self) -> dict:
         # TODO(aliberts, rcadene): As of now, lr_backbone == lr
         # Should we remove this and just `return self.parameters()`?
@@ -106,6 +110,17 @@ class ACTPolicy(PreTrainedPolicy):
         else:
             self._action_queue = deque([], maxlen=self.config.n_action_steps)
 
+    def get_rollout_state(self) -> dict:
+        if self.config.temporal_ensemble_coeff is not None:
+            return self.temporal_ensembler.get_state()
+        return {"action_queue": self._action_queue}
+
+    def set_rollout_state(self, state: dict) -> None:
+        if self.config.temporal_ensemble_coeff is not None:
+            self.temporal_ensembler.set_state(state)
+        else:
+            self._action_queue = state["action_queue"]
+
     @torch.no_grad
     def select_action(self, batch: dict[str, Tensor]) -> Tensor:
         """Select a single action given environment observations.
@@ -114,34 +129,37 @@ class ACTPolicy(PreTrainedPolicy):
         environment. It works by managing the actions in a queue and only calling `select_actions` when the
         queue is empty.
         """
-        self.eval()
-
-        batch = self.normalize_inputs(batch)
-        if self.config.image_features:
-            batch = dict(batch)  # shallow copy so that adding a key doesn't modify the original
-            batch["observation.images"] = [batch[key] for key in self.config.image_features]
-
         # If we are doing temporal ensembling, do online updates where we keep track of the number of actions
         # we are ensembling over.
         if self.config.temporal_ensemble_coeff is not None:
-            actions = self.model(batch)[0]  # (batch_size, chunk_size, action_dim)
-            actions = self.unnormalize_outputs({"action": actions})["action"]
+            actions = self.predict_action_chunk(batch)
             action = self.temporal_ensembler.update(actions)
             return action
 
         # Action queue logic for n_action_steps > 1. When the action_queue is depleted, populate it by
         # querying the policy.
         if len(self._action_queue) == 0:
-            actions = self.model(batch)[0][:, : self.config.n_action_steps]
-
-            # TODO(rcadene): make _forward return output dictionary?
-            actions = self.unnormalize_outputs({"action": actions})["action"]
+            actions = self.predict_action_chunk(batch)[:, : self.config.n_action_steps]
 
             # `self.model.forward` returns a (batch_size, n_action_steps, action_dim) tensor, but the queue
             # effectively has shape (n_action_steps, batch_size, *), hence the transpose.
             self._action_queue.extend(actions.transpose(0, 1))
         return self._action_queue.popleft()
 
+    @torch.no_grad
+    def predict_action_chunk(self, batch: dict[str, Tensor]) -> Tensor:
+        """Predict a (batch_size, chunk_size, action_dim) chunk of actions given environment observations."""
+        self.eval()
+
+        batch = self.normalize_inputs(batch)
+        if self.config.image_features:
+            batch = dict(batch)  # shallow copy so that adding a key doesn't modify the original
+            batch["observation.images"] = [batch[key] for key in self.config.image_features]
+
+        actions = self.model(batch)[0]  # (batch_size, chunk_size, action_dim)
+        # TODO(rcadene): make _forward return output dictionary?
+        return self.unnormalize_outputs({"action": actions})["action"]
+
     def forward(self, batch: dict[str, Tensor]) -> tuple[Tensor, dict]:
         """Run the batch through the model and compute the loss for training or validation."""
         batch = self.normalize_inputs(batch)
@@ -156,7 +174,7 @@ class ACTPolicy(PreTrainedPolicy):
             F.l1_loss(batch["action"], actions_hat, reduction="none") * ~batch["action_is_pad"].unsqueeze(-1)
         ).mean()
 
-        loss_dict = {"l1_loss": l1_loss.item()}
+        loss_dict = {"l1_loss": l1_loss.detach()}
         if self.config.use_vae:
             # Calculate Dₖₗ(latent_pdf || standard_normal). Note: After computing the KL-divergence for
             # each dimension independently, we sum over the latent dimension to get the total
@@ -165,7 +183,7 @@ class ACTPolicy(PreTrainedPolicy):
             mean_kld = (
                 (-0.5 * (1 + log_sigma_x2_hat - mu_hat.pow(2) - (log_sigma_x2_hat).exp())).sum(-1).mean()
             )
-            loss_dict["kld_loss"] = mean_kld.item()
+            loss_dict["kld_loss"] = mean_kld.detach()
             loss = l1_loss + mean_kld * self.config.kl_weight
         else:
             loss = l1_loss
@@ -215,52 +233,109 @@ class ACTTemporalEnsembler:
             avg /= exp_weights[:i+1].sum()
         print("online", avg)
         ```
+
+        The running averages are kept in a preallocated ring buffer of (chunk_size, batch_size, action_dim)
+        actions, whose slot `head` holds the next action to return. At each update, the number of predictions
+        previously averaged at position j of the chunk is min(num_updates, chunk_size - 1 - j), so the weights
+        of all the updates are precomputed, and an update is done in place without allocating memory (apart
+        from the returned action).
         """
         self.chunk_size = chunk_size
         self.ensemble_weights = torch.exp(-temporal_ensemble_coeff * torch.arange(chunk_size))
         self.ensemble_weights_cumsum = torch.cumsum(self.ensemble_weights, dim=0)
+        # (chunk_size, chunk_size, 1, 1) weights of the update with m = min(num_updates, chunk_size - 1), for
+        # each position of the chunk. The last position has no prior online average and is simply overwritten.
+        # The weights are extended by one for chunk_size = 1, where the counts are clamped to 1 but the only
+        # position of the chunk is the last one.
+        weights = torch.exp(-temporal_ensemble_coeff * torch.arange(chunk_size + 1))
+        weights_cumsum = torch.cumsum(weights, dim=0)
+        positions = torch.arange(chunk_size)
+        prev_counts = torch.minimum(positions[:, None], chunk_size - 1 - positions[None, :]).clamp(min=1)
+        self.prev_weights_cumsum = weights_cumsum[prev_counts - 1][..., None, None]
+        self.new_weights = weights[prev_counts][..., None, None]
+        self.new_weights_cumsum = weights_cumsum[prev_counts][..., None, None]
+        self.ensembled_actions = None
+        self._weighted_actions = None
         self.reset()
 
     def reset(self):
         """Resets the online computation variables."""
-        self.ensembled_actions = None
-        # (chunk_size,) count of how many actions are in the ensemble for each time step in the sequence.
-        self.ensembled_actions_count = None
+        self.num_updates = 0
+        # Position of the next action to return in the ring buffer.
+        self.head = 0
+
+    def get_state(self) -> dict:
+        """Returns a copy of the online averages, as a (batch_size, chunk_size, action_dim) tensor starting
+        with the next action to return, or None before the first update.
+
+        `num_updates` is capped to chunk_size - 1, past which updates don't depend on it, so that the states
+        of rollouts which are past their first chunk_size - 1 steps are the same (see
+        `PreTrainedPolicy.get_rollout_state`).
+        """
+        if self.num_updates == 0:
+            return {"num_updates": 0, "ensembled_actions": None}
+        ensembled_actions = torch.roll(self.ensembled_actions, -self.head, dims=0).transpose(0, 1)
+        return {
+            "num_updates": min(self.num_updates, max(self.chunk_size - 1, 1)),
+            "ensembled_actions": ensembled_actions,
+        }
+
+    def set_state(self, state: dict) -> None:
+        """Restores online averages returned by `get_state`."""
+        self.num_updates = state["num_updates"]
+        self.head = 0
+        if state["ensembled_actions"] is not None:
+            ensembled_actions = state["ensembled_actions"].transpose(0, 1)
+            self._allocate(ensembled_actions)
+            self.ensembled_actions.copy_(ensembled_actions)
+
+    def _allocate(self, actions: Tensor) -> None:
+        """Allocates the ring buffer for (chunk_size, batch_size, action_dim) `actions`, if needed."""
+        if (
+            self.ensembled_actions is None
+            or self.ensembled_actions.shape != actions.shape
+            or self.ensembled_actions.dtype != actions.dtype
+            or self.ensembled_actions.device != actions.device
+        ):
+            self.ensembled_actions = torch.empty_like(actions, memory_format=torch.contiguous_format)
+            self._weighted_actions = torch.empty_like(self.ensembled_actions)
+        self.prev_weights_cumsum = self.prev_weights_cumsum.to(device=actions.device)
+        self.new_weights = self.new_weights.to(device=actions.device)
+        self.new_weights_cumsum = self.new_weights_cumsum.to(device=actions.device)
 
     def update(self, actions: Tensor) -> Tensor:
         """
         Takes a (batch, chunk_size, action_dim) sequence of actions, update the temporal ensemble for all
         time steps, and pop/return the next batch of actions in the sequence.
         """
-        self.ensemble_weights = self.ensemble_weights.to(device=actions.device)
-        self.ensemble_weights_cumsum = self.ensemble_weights_cumsum.to(device=actions.device)
-        if self.ensembled_actions is None:
-            # Initializes `self._ensembled_action` to the sequence of actions predicted during the first
-            # time step of the episode.
-            self.ensembled_actions = actions.clone()
-            # Note: The last dimension is unsqueeze to make sure we can broadcast properly for tensor
-            # operations later.
-            self.ensembled_actions_count = torch.ones(
-                (self.chunk_size, 1), dtype=torch.long, device=self.ensembled_actions.device
-            )
+        actions = actions.transpose(0, 1)  # (chunk_size, batch, action_dim)
+        if self.num_updates == 0:
+            # Initializes the ring buffer to the sequence of actions predicted during the first time step of
+            # the episode.
+            self._allocate(actions)
+            self.head = 0
+            self.ensembled_actions.copy_(actions)
         else:
-            # self.ensembled_actions will have shape (batch_size, chunk_size - 1, action_dim). Compute
-            # the online update for those entries.
-            self.ensembled_actions *= self.ensemble_weights_cumsum[self.ensembled_actions_count - 1]
-            self.ensembled_actions += actions[:, :-1] * self.ensemble_weights[self.ensembled_actions_count]
-            self.ensembled_actions /= self.ensemble_weights_cumsum[self.ensembled_actions_count]
-            self.ensembled_actions_count = torch.clamp(self.ensembled_actions_count + 1, max=self.chunk_size)
-            # The last action, which has no prior online average, needs to get concatenated onto the end.
-            self.ensembled_actions = torch.cat([self.ensembled_actions, actions[:, -1:]], dim=1)
-            self.ensembled_actions_count = torch.cat(
-                [self.ensembled_actions_count, torch.ones_like(self.ensembled_actions_count[-1:])]
-            )
+            m = min(self.num_updates, self.chunk_size - 1)
+            # Positions [0, chunk_size - head) of the chunk are stored in slots [head, chunk_size) of the ring
+            # buffer, and positions [chunk_size - head, chunk_size) in slots [0, head).
+            split = self.chunk_size - self.head
+            for slots, positions in [
+                (slice(self.head, None), slice(None, split)),
+                (slice(None, self.head), slice(split, None)),
+            ]:
+                ensembled_actions = self.ensembled_actions[slots]
+                weighted_actions = self._weighted_actions[slots]
+                ensembled_actions *= self.prev_weights_cumsum[m, positions]
+                torch.mul(actions[positions], self.new_weights[m, positions], out=weighted_actions)
+                ensembled_actions += weighted_actions
+                ensembled_actions /= self.new_weights_cumsum[m, positions]
+            # The last action, which has no prior online average, goes in the slot of the last consumed one.
+            self.ensembled_actions[self.head - 1].copy_(actions[-1])
+        self.num_updates += 1
         # "Consume" the first action.
-        action, self.ensembled_actions, self.ensembled_actions_count = (
-            self.ensembled_actions[:, 0],
-            self.ensembled_actions[:, 1:],
-            self.ensembled_actions_count[1:],
-        )
+        action = self.ensembled_actions[self.head].clone()
+        self.head = (self.head + 1) % self.chunk_size
         return action
 
 
@@ -538,12 +613,16 @@ class ACTEncoder(nn.Module):
         num_layers = config.n_vae_encoder_layers if self.is_vae_encoder else config.n_encoder_layers
         self.layers = nn.ModuleList([ACTEncoderLayer(config) for _ in range(num_layers)])
         self.norm = nn.LayerNorm(config.dim_model) if config.pre_norm else nn.Identity()
+        self.activation_checkpointing = config.encoder_activation_checkpointing
 
     def forward(
         self, x: Tensor, pos_embed: Tensor | None = None, key_padding_mask: Tensor | None = None
     ) -> Tensor:
         for layer in self.layers:
-            x = layer(x, pos_embed=pos_embed, key_padding_mask=key_padding_mask)
+            if self.activation_checkpointing and self.training:
+                x = checkpoint(layer, x, pos_embed, key_padding_mask, use_reentrant=False)
+            else:
+                x = layer(x, pos_embed=pos_embed, key_padding_mask=key_padding_mask)
         x = self.norm(x)
         return x
 
@@ -593,6 +672,7 @@ class ACTDecoder(nn.Module):
         super().__init__()
         self.layers = nn.ModuleList([ACTDecoderLayer(config) for _ in range(config.n_decoder_layers)])
         self.norm = nn.LayerNorm(config.dim_model)
+        self.activation_checkpointing = config.decoder_activation_checkpointing
 
     def forward(
         self,
@@ -602,9 +682,14 @@ class ACTDecoder(nn.Module):
         encoder_pos_embed: Tensor | None = None,
     ) -> Tensor:
         for layer in self.layers:
-            x = layer(
-                x, encoder_out, decoder_pos_embed=decoder_pos_embed, encoder_pos_embed=encoder_pos_embed
-            )
+            if self.activation_checkpointing and self.training:
+                x = checkpoint(
+                    layer, x, encoder_out, decoder_pos_embed, encoder_pos_embed, use_reentrant=False
+                )
+            else:
+                x = layer(
+                    x, encoder_out, decoder_pos_embed=decoder_pos_embed, encoder_pos_embed=encoder_pos_embed
+                )
         if self.norm is not None:
             x = self.norm(x)
         return x
@@ -98,6 +98,19 @@ class DiffusionConfig(PreTrainedConfig):
         clip_sample_range: The magnitude of the clipping range as described above.
         num_inference_steps: Number of reverse diffusion steps to use at inference time (steps are evenly
             spaced). If not provided, this defaults to be the same as `num_train_timesteps`.
+        sampler: Name of the sampler used at inference time, which can differ from the noise scheduler used
+            for training as they share the same forward diffusion schedule. Supported options: ["DDPM",
+            "DDIM", "DPMSolver++", "consistency"]. "DPMSolver++" is the multistep DPM-Solver++ of
+            https://arxiv.org/abs/2211.01095, which gives good samples in 10-20 steps. "consistency" is the
+            multistep sampling of consistency models (https://arxiv.org/abs/2303.01469): each step predicts
+            the denoised actions with a single evaluation of the Unet and noises them back to the next
+            timestep, which allows for very few steps (1-4). If not provided, `noise_scheduler_type` is used.
+        warm_start: Whether to start the reverse diffusion of each chunk of actions (but the first one of an
+            episode) from the remaining actions of the previous chunk, noised to a fraction
+            `warm_start_noise_level` of the diffusion schedule, instead of pure noise. Only the denoising
+            steps below that noise level are run.
+        warm_start_noise_level: Fraction of the diffusion schedule, in (0, 1], to noise the previous chunk of
+            actions to when warm-starting.
         do_mask_loss_for_padding: Whether to mask the loss when there are copy-padded actions. See
             `LeRobotDataset` and `load_previous_and_future_frames` for more information. Note, this defaults
             to False as the original Diffusion Policy implementation does the same.
@@ -147,6 +160,9 @@ class DiffusionConfig(PreTrainedConfig):
 
     # Inference
     num_inference_steps: int | None = None
+    sampler: str | None = None
+    warm_start: bool = False
+    warm_start_noise_level: float = 0.5
 
     # Loss computation
     do_mask_loss_for_padding: bool = False
@@ -179,6 +195,13 @@ class DiffusionConfig(PreTrainedConfig):
                 f"`noise_scheduler_type` must be one of {supported_noise_schedulers}. "
                 f"Got {self.noise_scheduler_type}."
             )
+        supported_samplers = ["DDPM", "DDIM", "DPMSolver++", "consistency"]
+        if self.sampler is not None and self.sampler not in supported_samplers:
+            raise ValueError(f"`sampler` must be one of {supported_samplers}. Got {self.sampler}.")
+        if not 0.0 < self.warm_start_noise_level <= 1.0:
+            raise ValueError(
+                f"`warm_start_noise_level` must be in (0, 1]. Got {self.warm_start_noise_level}."
+            )
 
         # Check that the horizon size and U-Net downsampling is compatible.
         # U-Net downsamples by 2 with each stage.
@@ -235,3 +258,8 @@ class DiffusionConfig(PreTrainedConfig):
     @property
     def reward_delta_indices(self) -> None:
         return None
+
+    @property
+    def image_crop_shape(self) -> tuple[int, int] | None:
+        # A random crop can't be done ahead of the policy without changing the augmentation.
+        return self.crop_shape if not self.crop_is_random else None
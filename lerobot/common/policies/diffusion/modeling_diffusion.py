@@ -31,6 +31,7 @@ import torch.nn.functional as F  # noqa: N812
 import torchvision
 from diffusers.schedulers.scheduling_ddim import DDIMScheduler
 from diffusers.schedulers.scheduling_ddpm import DDPMScheduler
+from diffusers.schedulers.scheduling_dpmsolver_multistep import DPMSolverMultistepScheduler
 from torch import Tensor, nn
 
 from lerobot.common.constants import OBS_ENV, OBS_ROBOT
@@ -38,6 +39,7 @@ from lerobot.common.policies.diffusion.configuration_diffusion import DiffusionC
 from lerobot.common.policies.normalize import Normalize, Unnormalize
 from lerobot.common.policies.pretrained import PreTrainedPolicy
 from lerobot.common.policies.utils import (
+    crop_images,
     get_device_from_parameters,
     get_dtype_from_parameters,
     get_output_shape,
@@ -85,20 +87,37 @@ class DiffusionPolicy(PreTrainedPolicy):
 
         self.reset()
 
+    def get_compiled_modules(self) -> list[nn.Module]:
+        modules = [self.diffusion.unet]
+        if self.config.image_features:
+            rgb_encoder = self.diffusion.rgb_encoder
+            modules.extend(rgb_encoder if isinstance(rgb_encoder, nn.ModuleList) else [rgb_encoder])
+        return modules
+
     def get_optim_params(self) -> dict:
         return self.diffusion.parameters()
 
     def reset(self):
         """Clear observation and action queues. Should be called on `env.reset()`"""
+        self.diffusion.reset()
         self._queues = {
             "observation.state": deque(maxlen=self.config.n_obs_steps),
             "action": deque(maxlen=self.config.n_action_steps),
         }
         if self.config.image_features:
             self._queues["observation.images"] = deque(maxlen=self.config.n_obs_steps)
+            # Features of the queued frames, or None for the frames which haven't been encoded yet
+            self._queues["observation.image_features"] = deque(maxlen=self.config.n_obs_steps)
         if self.config.env_state_feature:
             self._queues["observation.environment_state"] = deque(maxlen=self.config.n_obs_steps)
 
+    def get_rollout_state(self) -> dict:
+        return {"queues": self._queues, "prev_sample": self.diffusion._prev_sample}
+
+    def set_rollout_state(self, state: dict) -> None:
+        self._queues = state["queues"]
+        self.diffusion._prev_sample = state["prev_sample"]
+
     @torch.no_grad
     def select_action(self, batch: dict[str, Tensor]) -> Tensor:
         """Select a single action given environment observations.
@@ -129,10 +148,20 @@ class DiffusionPolicy(PreTrainedPolicy):
             )
         # Note: It's important that this happens after stacking the images into a single key.
         self._queues = populate_queues(self._queues, batch)
+        if self.config.image_features:
+            # The features of the new frames are computed when they are needed (see `_get_image_features`)
+            image_features = self._queues["observation.image_features"]
+            image_features.extend([None] * (image_features.maxlen if len(image_features) == 0 else 1))
 
         if len(self._queues["action"]) == 0:
             # stack n latest observations from the queue
-            batch = {k: torch.stack(list(self._queues[k]), dim=1) for k in batch if k in self._queues}
+            batch = {
+                k: torch.stack(list(self._queues[k]), dim=1)
+                for k in batch
+                if k in self._queues and k != "observation.images"
+            }
+            if self.config.image_features:
+                batch["observation.image_features"] = self._get_image_features()
             actions = self.diffusion.generate_actions(batch)
 
             # TODO(rcadene): make above methods return output dictionary?
@@ -143,6 +172,26 @@ class DiffusionPolicy(PreTrainedPolicy):
         action = self._queues["action"].popleft()
         return action
 
+    def _get_image_features(self) -> Tensor:
+        """Returns the (B, n_obs_steps, feature_dim) features of the queued frames.
+
+        The image encoder is deterministic at inference time, so the features of each frame are queued along
+        with it, and only the frames which weren't encoded by a previous call are encoded (e.g. only the
+        newest one when `n_action_steps` is 1). Since they are part of the queues, the features are kept in
+        the rollout state of the policy (see `get_rollout_state`).
+        """
+        frames = self._queues["observation.images"]
+        image_features = self._queues["observation.image_features"]
+        missing = [i for i, features in enumerate(image_features) if features is None]
+        if missing:
+            # The queue is initialized with copies of the first frame, which are only encoded once.
+            new_frames = {id(frames[i]): frames[i] for i in missing}
+            new_features = self.diffusion.encode_images(torch.stack(list(new_frames.values()), dim=1))
+            new_features = dict(zip(new_frames, new_features.unbind(dim=1), strict=True))
+            for i in missing:
+                image_features[i] = new_features[id(frames[i])]
+        return torch.stack(list(image_features), dim=1)
+
     def forward(self, batch: dict[str, Tensor]) -> tuple[Tensor, None]:
         """Run the batch through the model and compute the loss for training or validation."""
         batch = self.normalize_inputs(batch)
@@ -157,7 +206,9 @@ class DiffusionPolicy(PreTrainedPolicy):
         return loss, None
 
 
-def _make_noise_scheduler(name: str, **kwargs: dict) -> DDPMScheduler | DDIMScheduler:
+def _make_noise_scheduler(
+    name: str, **kwargs: dict
+) -> DDPMScheduler | DDIMScheduler | DPMSolverMultistepScheduler:
     """
     Factory for noise scheduler instances of the requested type. All kwargs are passed
     to the scheduler.
@@ -166,6 +217,10 @@ def _make_noise_scheduler(name: str, **kwargs: dict) -> DDPMScheduler | DDIMSche
         return DDPMScheduler(**kwargs)
     elif name == "DDIM":
         return DDIMScheduler(**kwargs)
+    elif name == "DPMSolver++":
+        # DPM-Solver++ has no sample clipping option
+        kwargs = {k: v for k, v in kwargs.items() if k not in ["clip_sample", "clip_sample_range"]}
+        return DPMSolverMultistepScheduler(algorithm_type="dpmsolver++", solver_order=2, **kwargs)
     else:
         raise ValueError(f"Unsupported noise scheduler type {name}")
 
@@ -191,26 +246,52 @@ class DiffusionModel(nn.Module):
 
         self.unet = DiffusionConditionalUnet1d(config, global_cond_dim=global_cond_dim * config.n_obs_steps)
 
-        self.noise_scheduler = _make_noise_scheduler(
-            config.noise_scheduler_type,
-            num_train_timesteps=config.num_train_timesteps,
-            beta_start=config.beta_start,
-            beta_end=config.beta_end,
-            beta_schedule=config.beta_schedule,
-            clip_sample=config.clip_sample,
-            clip_sample_range=config.clip_sample_range,
-            prediction_type=config.prediction_type,
-        )
+        self.noise_scheduler = _make_noise_scheduler(config.noise_scheduler_type, **self._scheduler_kwargs())
+        self.set_sampler(config.sampler, config.num_inference_steps)
+        self.reset()
 
-        if config.num_inference_steps is None:
+    def _scheduler_kwargs(self) -> dict:
+        return {
+            "num_train_timesteps": self.config.num_train_timesteps,
+            "beta_start": self.config.beta_start,
+            "beta_end": self.config.beta_end,
+            "beta_schedule": self.config.beta_schedule,
+            "clip_sample": self.config.clip_sample,
+            "clip_sample_range": self.config.clip_sample_range,
+            "prediction_type": self.config.prediction_type,
+        }
+
+    def set_sampler(self, sampler: str | None = None, num_inference_steps: int | None = None) -> None:
+        """Sets the sampler and the number of reverse diffusion steps used at inference time. See
+        `DiffusionConfig` for the meaning and defaults of the arguments."""
+        self.sampler = sampler if sampler is not None else self.config.noise_scheduler_type
+        if self.sampler == "consistency":
+            # Relies on the forward diffusion schedule of the training noise scheduler only.
+            self.inference_scheduler = None
+        elif self.sampler == self.config.noise_scheduler_type:
+            self.inference_scheduler = self.noise_scheduler
+        else:
+            self.inference_scheduler = _make_noise_scheduler(self.sampler, **self._scheduler_kwargs())
+
+        if num_inference_steps is None:
             self.num_inference_steps = self.noise_scheduler.config.num_train_timesteps
         else:
-            self.num_inference_steps = config.num_inference_steps
+            self.num_inference_steps = num_inference_steps
+
+    def reset(self):
+        # Full horizon of (normalized) actions of the last generated chunk, used to warm-start the next one.
+        self._prev_sample = None
 
     # ========= inference  ============
     def conditional_sample(
-        self, batch_size: int, global_cond: Tensor | None = None, generator: torch.Generator | None = None
+        self,
+        batch_size: int,
+        global_cond: Tensor | None = None,
+        generator: torch.Generator | None = None,
+        init_sample: Tensor | None = None,
     ) -> Tensor:
+        """Samples a (batch_size, horizon, action_dim) trajectory of actions by reverse diffusion, starting
+        from pure noise, or from `init_sample` noised to `warm_start_noise_level` if provided."""
         device = get_device_from_parameters(self)
         dtype = get_dtype_from_parameters(self)
 
@@ -222,50 +303,97 @@ class DiffusionModel(nn.Module):
             generator=generator,
         )
 
-        self.noise_scheduler.set_timesteps(self.num_inference_steps)
-
-        for t in self.noise_scheduler.timesteps:
+        if self.sampler == "consistency":
+            num_train_timesteps = self.noise_scheduler.config.num_train_timesteps
+            timesteps = torch.linspace(num_train_timesteps - 1, 0, self.num_inference_steps).round().long()
+        else:
+            self.inference_scheduler.set_timesteps(self.num_inference_steps)
+            timesteps = self.inference_scheduler.timesteps
+
+        if init_sample is not None:
+            # Only run the denoising steps below the warm-start noise level.
+            max_timestep = self.config.warm_start_noise_level * (self.config.num_train_timesteps - 1)
+            warm_timesteps = timesteps[timesteps <= max_timestep]
+            if len(warm_timesteps) > 0:
+                timesteps = warm_timesteps
+                sample = self.noise_scheduler.add_noise(init_sample, sample, timesteps[:1].to(device))
+
+        for i, t in enumerate(timesteps):
             # Predict model output.
             model_output = self.unet(
                 sample,
                 torch.full(sample.shape[:1], t, dtype=torch.long, device=sample.device),
                 global_cond=global_cond,
             )
-            # Compute previous image: x_t -> x_t-1
-            sample = self.noise_scheduler.step(model_output, t, sample, generator=generator).prev_sample
+            if self.sampler == "consistency":
+                # Jump to the denoised sample, then noise it back to the next timestep.
+                sample = self._predict_original_sample(model_output, t, sample)
+                if i < len(timesteps) - 1:
+                    noise = torch.randn(
+                        sample.shape, dtype=sample.dtype, device=sample.device, generator=generator
+                    )
+                    next_t = timesteps[i + 1 : i + 2].to(device)
+                    sample = self.noise_scheduler.add_noise(sample, noise, next_t)
+            else:
+                # Compute previous image: x_t -> x_t-1
+                output = self.inference_scheduler.step(model_output, t, sample, generator=generator)
+                sample = output.prev_sample
 
         return sample
 
+    def _predict_original_sample(self, model_output: Tensor, t: Tensor, sample: Tensor) -> Tensor:
+        """Predicts the denoised sample x_0 from the noisy sample x_t and the output of the Unet."""
+        if self.config.prediction_type == "sample":
+            original_sample = model_output
+        else:
+            alpha_prod_t = self.noise_scheduler.alphas_cumprod.to(sample.device)[t].to(sample.dtype)
+            original_sample = (sample - (1 - alpha_prod_t) ** 0.5 * model_output) / alpha_prod_t**0.5
+        if self.config.clip_sample:
+            original_sample = original_sample.clamp(
+                -self.config.clip_sample_range, self.config.clip_sample_range
+            )
+        return original_sample
+
+    def _get_warm_start_sample(self) -> Tensor:
+        """Shifts the last chunk of actions by the `n_action_steps` actions executed since it was generated,
+        and pads it with its last action."""
+        shift = self.config.n_action_steps
+        prev_sample = self._prev_sample
+        return torch.cat([prev_sample[:, shift:], prev_sample[:, -1:].expand(-1, shift, -1)], dim=1)
+
+    def encode_images(self, images: Tensor) -> Tensor:
+        """Encodes (B, S, num_cameras, C, H, W) images into (B, S, num_cameras * feature_dim) features."""
+        batch_size, n_obs_steps = images.shape[:2]
+        if self.config.use_separate_rgb_encoder_per_camera:
+            # Combine batch and sequence dims while rearranging to make the camera index dimension first.
+            images_per_camera = einops.rearrange(images, "b s n ... -> n (b s) ...")
+            img_features_list = torch.cat(
+                [encoder(imgs) for encoder, imgs in zip(self.rgb_encoder, images_per_camera, strict=True)]
+            )
+            # Separate batch and sequence dims back out. The camera index dim gets absorbed into the
+            # feature dim (effectively concatenating the camera features).
+            img_features = einops.rearrange(
+                img_features_list, "(n b s) ... -> b s (n ...)", b=batch_size, s=n_obs_steps
+            )
+        else:
+            # Combine batch, sequence, and "which camera" dims before passing to shared encoder.
+            img_features = self.rgb_encoder(einops.rearrange(images, "b s n ... -> (b s n) ..."))
+            # Separate batch dim and sequence dim back out. The camera index dim gets absorbed into the
+            # feature dim (effectively concatenating the camera features).
+            img_features = einops.rearrange(
+                img_features, "(b s n) ... -> b s (n ...)", b=batch_size, s=n_obs_steps
+            )
+        return img_features
+
     def _prepare_global_conditioning(self, batch: dict[str, Tensor]) -> Tensor:
         """Encode image features and concatenate them all together along with the state vector."""
-        batch_size, n_obs_steps = batch[OBS_ROBOT].shape[:2]
         global_cond_feats = [batch[OBS_ROBOT]]
-        # Extract image features.
+        # Extract image features, unless they were already encoded.
         if self.config.image_features:
-            if self.config.use_separate_rgb_encoder_per_camera:
-                # Combine batch and sequence dims while rearranging to make the camera index dimension first.
-                images_per_camera = einops.rearrange(batch["observation.images"], "b s n ... -> n (b s) ...")
-                img_features_list = torch.cat(
-                    [
-                        encoder(images)
-                        for encoder, images in zip(self.rgb_encoder, images_per_camera, strict=True)
-                    ]
-                )
-                # Separate batch and sequence dims back out. The camera index dim gets absorbed into the
-                # feature dim (effectively concatenating the camera features).
-                img_features = einops.rearrange(
-                    img_features_list, "(n b s) ... -> b s (n ...)", b=batch_size, s=n_obs_steps
-                )
+            if "observation.image_features" in batch:
+                img_features = batch["observation.image_features"]
             else:
-                # Combine batch, sequence, and "which camera" dims before passing to shared encoder.
-                img_features = self.rgb_encoder(
-                    einops.rearrange(batch["observation.images"], "b s n ... -> (b s n) ...")
-                )
-                # Separate batch dim and sequence dim back out. The camera index dim gets absorbed into the
-                # feature dim (effectively concatenating the camera features).
-                img_features = einops.rearrange(
-                    img_features, "(b s n) ... -> b s (n ...)", b=batch_size, s=n_obs_steps
-                )
+                img_features = self.encode_images(batch["observation.images"])
             global_cond_feats.append(img_features)
 
         if self.config.env_state_feature:
@@ -281,6 +409,8 @@ class DiffusionModel(nn.Module):
             "observation.state": (B, n_obs_steps, state_dim)
 
             "observation.images": (B, n_obs_steps, num_cameras, C, H, W)
+                OR "observation.image_features": (B, n_obs_steps, num_cameras * feature_dim), as returned by
+                `encode_images`
                 AND/OR
             "observation.environment_state": (B, environment_dim)
         }
@@ -291,8 +421,14 @@ class DiffusionModel(nn.Module):
         # Encode image features and concatenate them all together along with the state vector.
         global_cond = self._prepare_global_conditioning(batch)  # (B, global_cond_dim)
 
+        init_sample = None
+        if self.config.warm_start and self._prev_sample is not None and len(self._prev_sample) == batch_size:
+            init_sample = self._get_warm_start_sample()
+
         # run sampling
-        actions = self.conditional_sample(batch_size, global_cond=global_cond)
+        actions = self.conditional_sample(batch_size, global_cond=global_cond, init_sample=init_sample)
+        if self.config.warm_start:
+            self._prev_sample = actions
 
         # Extract `n_action_steps` steps worth of actions (from the current observation).
         start = n_obs_steps - 1
@@ -449,12 +585,8 @@ class DiffusionRgbEncoder(nn.Module):
         # Set up optional preprocessing.
         if config.crop_shape is not None:
             self.do_crop = True
-            # Always use center crop for eval
-            self.center_crop = torchvision.transforms.CenterCrop(config.crop_shape)
-            if config.crop_is_random:
-                self.maybe_random_crop = torchvision.transforms.RandomCrop(config.crop_shape)
-            else:
-                self.maybe_random_crop = self.center_crop
+            self.crop_shape = config.crop_shape
+            self.crop_is_random = config.crop_is_random
         else:
             self.do_crop = False
 
@@ -502,11 +634,8 @@ class DiffusionRgbEncoder(nn.Module):
         """
         # Preprocess: maybe crop (if it was set up in the __init__).
         if self.do_crop:
-            if self.training:  # noqa: SIM108
-                x = self.maybe_random_crop(x)
-            else:
-                # Always use center crop for eval.
-                x = self.center_crop(x)
+            # Always use center crop for eval.
+            x = crop_images(x, self.crop_shape, random=self.crop_is_random and self.training)
         # Extract backbone feature.
         x = torch.flatten(self.pool(self.backbone(x)), start_dim=1)
         # Final linear layer with non-linearity.
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+
+# Copyright 2024 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Export of the inference graph of policies to ONNX or TorchScript, to run them with `ExportedPolicy`."""
+
+import json
+from pathlib import Path
+
+import torch
+from safetensors.torch import save_file
+from torch import Tensor, nn
+
+from lerobot.common.exported_policy import EXPORT_FORMATS, EXPORT_INFO, EXPORT_OUTPUT_NAME
+from lerobot.common.policies.pretrained import PreTrainedPolicy
+
+EXPORTABLE_POLICIES = ["act", "diffusion"]
+EXPORT_STATS = "stats.safetensors"
+
+
+class ActionChunkPredictor(nn.Module):
+    """The exported graph: predicts a chunk of unnormalized actions from the observations.
+
+    The inputs are the tensors of the input features of the policy, in the order of `input_names`.
+        - ACT: the inputs are the current observations, and the output is the
+          (batch_size, chunk_size, action_dim) chunk of actions.
+        - Diffusion Policy: the inputs are (batch_size, n_obs_steps, *) histories of observations, and the
+          output is the (batch_size, n_action_steps, action_dim) actions to execute from the current step.
+          Warm-starting is disabled, since it depends on the previous chunk.
+    """
+
+    def __init__(self, policy: PreTrainedPolicy):
+        super().__init__()
+        if policy.name not in EXPORTABLE_POLICIES:
+            raise NotImplementedError(
+                f"Export is implemented for the policies {EXPORTABLE_POLICIES}, got '{policy.name}'."
+            )
+        self.policy = policy
+        self.input_names = list(policy.config.input_features)
+
+    def forward(self, *inputs: Tensor) -> Tensor:
+        batch = dict(zip(self.input_names, inputs, strict=True))
+        if self.policy.name == "act":
+            return self.policy.predict_action_chunk(batch)
+
+        batch = self.policy.normalize_inputs(batch)
+        if self.policy.config.image_features:
+            batch["observation.images"] = torch.stack(
+                [batch[key] for key in self.policy.config.image_features], dim=-4
+            )
+        actions = self.policy.diffusion.generate_actions(batch)
+        return self.policy.unnormalize_outputs({"action": actions})["action"]
+
+
+def get_export_info(policy: PreTrainedPolicy, export_format: str, batch_size: int) -> dict:
+    """Describes the inputs of the exported graph, and the queues of `ExportedPolicy`."""
+    config = policy.config
+    n_obs_steps = config.n_obs_steps if policy.name == "diffusion" else None
+    history_shape = [] if n_obs_steps is None else [n_obs_steps]
+    return {
+        "policy_type": policy.name,
+        "format": export_format,
+        "inputs": [
+            {"name": key, "shape": [batch_size, *history_shape, *ft.shape]}
+            for key, ft in config.input_features.items()
+        ],
+        "n_obs_steps": n_obs_steps,
+        "n_action_steps": config.n_action_steps,
+        "temporal_ensemble_coeff": getattr(config, "temporal_ensemble_coeff", None),
+    }
+
+
+@torch.no_grad()
+def export_policy(
+    policy: PreTrainedPolicy,
+    output_dir: str | Path,
+    export_format: str = "onnx",
+    batch_size: int = 1,
+    opset_version: int = 17,
+) -> Path:
+    """Exports the chunk prediction graph of `policy` (see `ActionChunkPredictor`) for `batch_size`.
+
+    The graph is traced on cpu, normalization included. `output_dir` gets the graph, the config of the policy,
+    its normalization stats, and the description of the graph read by `ExportedPolicy` (`export.json`).
+
+    Args:
+        export_format: "onnx" (run with onnxruntime) or "torchscript".
+        batch_size: Batch size of the exported graph, which is fixed.
+        opset_version: ONNX opset of the graph.
+    Returns:
+        The path of the exported graph.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"`export_format` must be one of {list(EXPORT_FORMATS)}, got '{export_format}'.")
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    policy.to("cpu")
+    policy.eval()
+    predictor = ActionChunkPredictor(policy)
+    info = get_export_info(policy, export_format, batch_size)
+    example_inputs = tuple(torch.rand(spec["shape"]) for spec in info["inputs"])
+
+    model_file = output_dir / EXPORT_FORMATS[export_format]
+    # Warm-starting depends on the previous chunk, which isn't an input of the graph
+    warm_start = getattr(policy.config, "warm_start", False)
+    if warm_start:
+        policy.config.warm_start = False
+    try:
+        if export_format == "onnx":
+            torch.onnx.export(
+                predictor,
+                example_inputs,
+                str(model_file),
+                input_names=predictor.input_names,
+                output_names=[EXPORT_OUTPUT_NAME],
+                opset_version=opset_version,
+            )
+        else:
+            # The noise of Diffusion Policy is sampled in the graph, so its traces can't be compared
+            traced_predictor = torch.jit.trace(predictor, example_inputs, check_trace=False)
+            traced_predictor.save(str(model_file))
+    finally:
+        if warm_start:
+            policy.config.warm_start = True
+
+    policy.config._save_pretrained(output_dir)
+    stats = {
+        key: value.detach().contiguous()
+        for module_name in ["normalize_inputs", "unnormalize_outputs"]
+        for key, value in getattr(policy, module_name).state_dict(prefix=f"{module_name}.").items()
+    }
+    save_file(stats, output_dir / EXPORT_STATS)
+    with open(output_dir / EXPORT_INFO, "w") as f:
+        json.dump(info, f, indent=4)
+    return model_file
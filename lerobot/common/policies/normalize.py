@@ -55,8 +55,8 @@ def create_stats_buffers(
             shape = (c, 1, 1)
 
         # Note: we initialize mean, std, min, max to infinity. They should be overwritten
-        # downstream by `stats` or `policy.load_state_dict`, as expected. During forward,
-        # we assert they are not infinity anymore.
+        # downstream by `stats` or `policy.load_state_dict`, as expected. They are checked when
+        # they are set (see `update_affine_buffers`), and during forward we assert they were not infinity.
 
         buffer = {}
         if norm_mode is NormalizationMode.MEAN_STD:
@@ -106,10 +106,61 @@ def create_stats_buffers(
     return stats_buffers
 
 
-def _no_stats_error_str(name: str) -> str:
+def compute_affine_params(
+    buffer: nn.ParameterDict, norm_mode: NormalizationMode, inverse: bool = False
+) -> tuple[Tensor, Tensor]:
+    """
+    Compute the `scale` and `offset` such that normalizing data with the stats of `buffer` (or unnormalizing
+    it if `inverse`) is `x * scale + offset`.
+    """
+    if norm_mode is NormalizationMode.MEAN_STD:
+        mean = buffer["mean"]
+        std = buffer["std"]
+        if inverse:
+            return std, mean
+        scale = 1 / (std + 1e-8)
+        return scale, -mean * scale
+    elif norm_mode is NormalizationMode.MIN_MAX:
+        min = buffer["min"]
+        max = buffer["max"]
+        if inverse:
+            # [-1, 1] -> [min, max]
+            return (max - min) / 2, (max + min) / 2
+        # [min, max] -> [-1, 1]
+        scale = 2 / (max - min + 1e-8)
+        return scale, -min * scale - 1
+    else:
+        raise ValueError(norm_mode)
+
+
+def update_affine_buffers(module: "Normalize | Unnormalize", inverse: bool):
+    """
+    Validate the stats of `module` and (re)compute the `scale_*` and `offset_*` buffers used by its forward.
+
+    This runs when the module is created and after each `load_state_dict`, so that the forward doesn't check
+    the stats (which would synchronize the device with the host) nor recompute the affine parameters. The
+    buffers aren't persistent, so that the state dict only contains the stats, as before.
+    """
+    module.keys_without_stats = set()
+    for key, ft in module.features.items():
+        norm_mode = module.norm_map.get(ft.type, NormalizationMode.IDENTITY)
+        if norm_mode is NormalizationMode.IDENTITY:
+            continue
+
+        name = key.replace(".", "_")
+        buffer = getattr(module, "buffer_" + name)
+        if any(torch.isinf(stat).any() for stat in buffer.values()):
+            module.keys_without_stats.add(key)
+        with torch.no_grad():
+            scale, offset = compute_affine_params(buffer, norm_mode, inverse)
+        module.register_buffer("scale_" + name, scale.detach().clone(), persistent=False)
+        module.register_buffer("offset_" + name, offset.detach().clone(), persistent=False)
+
+
+def _no_stats_error_str(key: str) -> str:
     return (
-        f"`{name}` is infinity. You should either initialize with `stats` as an argument, or use a "
-        "pretrained model."
+        f"The stats of `{key}` are infinity. You should either initialize with `stats` as an argument, or "
+        "use a pretrained model."
     )
 
 
@@ -147,6 +198,12 @@ class Normalize(nn.Module):
         stats_buffers = create_stats_buffers(features, norm_map, stats)
         for key, buffer in stats_buffers.items():
             setattr(self, "buffer_" + key.replace(".", "_"), buffer)
+        # `self.scale_observation_state` and `self.offset_observation_state` are computed from the stats
+        update_affine_buffers(self, inverse=False)
+        self.register_load_state_dict_post_hook(self._load_state_dict_post_hook)
+
+    def _load_state_dict_post_hook(self, module: nn.Module, incompatible_keys):
+        update_affine_buffers(self, inverse=False)
 
     # TODO(rcadene): should we remove torch.no_grad?
     @torch.no_grad
@@ -161,25 +218,11 @@ class Normalize(nn.Module):
             if norm_mode is NormalizationMode.IDENTITY:
                 continue
 
-            buffer = getattr(self, "buffer_" + key.replace(".", "_"))
-
-            if norm_mode is NormalizationMode.MEAN_STD:
-                mean = buffer["mean"]
-                std = buffer["std"]
-                assert not torch.isinf(mean).any(), _no_stats_error_str("mean")
-                assert not torch.isinf(std).any(), _no_stats_error_str("std")
-                batch[key] = (batch[key] - mean) / (std + 1e-8)
-            elif norm_mode is NormalizationMode.MIN_MAX:
-                min = buffer["min"]
-                max = buffer["max"]
-                assert not torch.isinf(min).any(), _no_stats_error_str("min")
-                assert not torch.isinf(max).any(), _no_stats_error_str("max")
-                # normalize to [0,1]
-                batch[key] = (batch[key] - min) / (max - min + 1e-8)
-                # normalize to [-1, 1]
-                batch[key] = batch[key] * 2 - 1
-            else:
-                raise ValueError(norm_mode)
+            assert key not in self.keys_without_stats, _no_stats_error_str(key)
+            name = key.replace(".", "_")
+            scale = getattr(self, "scale_" + name)
+            offset = getattr(self, "offset_" + name)
+            batch[key] = torch.addcmul(offset, batch[key], scale)
         return batch
 
 
@@ -221,6 +264,11 @@ class Unnormalize(nn.Module):
         stats_buffers = create_stats_buffers(features, norm_map, stats)
         for key, buffer in stats_buffers.items():
             setattr(self, "buffer_" + key.replace(".", "_"), buffer)
+        update_affine_buffers(self, inverse=True)
+        self.register_load_state_dict_post_hook(self._load_state_dict_post_hook)
+
+    def _load_state_dict_post_hook(self, module: nn.Module, incompatible_keys):
+        update_affine_buffers(self, inverse=True)
 
     # TODO(rcadene): should we remove torch.no_grad?
     @torch.no_grad
@@ -234,21 +282,9 @@ class Unnormalize(nn.Module):
             if norm_mode is NormalizationMode.IDENTITY:
                 continue
 
-            buffer = getattr(self, "buffer_" + key.replace(".", "_"))
-
-            if norm_mode is NormalizationMode.MEAN_STD:
-                mean = buffer["mean"]
-                std = buffer["std"]
-                assert not torch.isinf(mean).any(), _no_stats_error_str("mean")
-                assert not torch.isinf(std).any(), _no_stats_error_str("std")
-                batch[key] = batch[key] * std + mean
-            elif norm_mode is NormalizationMode.MIN_MAX:
-                min = buffer["min"]
-                max = buffer["max"]
-                assert not torch.isinf(min).any(), _no_stats_error_str("min")
-                assert not torch.isinf(max).any(), _no_stats_error_str("max")
-                batch[key] = (batch[key] + 1) / 2
-                batch[key] = batch[key] * (max - min) + min
-            else:
-                raise ValueError(norm_mode)
+            assert key not in self.keys_without_stats, _no_stats_error_str(key)
+            name = key.replace(".", "_")
+            scale = getattr(self, "scale_" + name)
+            offset = getattr(self, "offset_" + name)
+            batch[key] = torch.addcmul(offset, batch[key], scale)
         return batch
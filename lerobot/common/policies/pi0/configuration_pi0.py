@@ -70,10 +70,23 @@ class PI0Config(PreTrainedConfig):
     use_cache: bool = True
     attention_implementation: str = "eager"  # or fa2, flex
 
+    # Inference optimizations (both require `use_cache`)
+    # Reuse the key value cache of the image and language tokens of the previous chunk when the language
+    # tokens are the same, and the mean absolute difference of the pixels (in [-1, 1]) of each image with
+    # those the cache was computed from is at most this threshold. None recomputes it for every chunk.
+    prefix_cache_threshold: float | None = None
+    # Run the denoising steps with static shapes: the key value cache is preallocated and updated in-place,
+    # and the masks, position ids and timesteps are only computed once per chunk, so that the steps don't
+    # synchronize the host with the device and can be compiled or captured in a CUDA graph.
+    static_inference: bool = False
+
     # Finetuning settings
     freeze_vision_encoder: bool = True
     train_expert_only: bool = False
     train_state_proj: bool = True
+    # Recompute the activations of the layers of PaliGemma and the Gemma expert during the backward pass
+    # instead of storing them, trading compute for memory during training.
+    activation_checkpointing: bool = False
 
     # Training presets
     optimizer_lr: float = 2.5e-5
@@ -102,6 +115,13 @@ class PI0Config(PreTrainedConfig):
                 f"Multiple observation steps not handled yet. Got `nobs_steps={self.n_obs_steps}`"
             )
 
+        if self.prefix_cache_threshold is not None and self.prefix_cache_threshold < 0:
+            raise ValueError(
+                f"`prefix_cache_threshold` should be non-negative, got {self.prefix_cache_threshold}."
+            )
+        if not self.use_cache and (self.prefix_cache_threshold is not None or self.static_inference):
+            raise ValueError("`prefix_cache_threshold` and `static_inference` require `use_cache=True`.")
+
         if self.use_delta_joint_actions_aloha:
             raise NotImplementedError(
                 "`use_delta_joint_actions_aloha` is used by pi0 for aloha real models. It is not ported yet in LeRobot."
@@ -147,3 +167,11 @@ class PI0Config(PreTrainedConfig):
     @property
     def reward_delta_indices(self) -> None:
         return None
+
+    @property
+    def image_max_shape(self) -> tuple[int, int] | None:
+        if self.resize_imgs_with_padding is None:
+            return None
+        # `resize_imgs_with_padding` is expressed as (width, height)
+        width, height = self.resize_imgs_with_padding
+        return (height, width)
@@ -11,23 +11,73 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+"""Benchmark the latency of the inference of pi0 with its inference options.
+
+By default, the pretrained `lerobot/pi0` is benchmarked on a frame of `danaaubakirova/koch_test`. With
+`--tiny`, a tiny randomly initialized pi0 is benchmarked on random inputs instead, which runs on CPU in
+seconds and doesn't download anything:
+
+```bash
+python lerobot/common/policies/pi0/conversion_scripts/benchmark.py --tiny --device cpu
+```
+
+Each chunk of actions is predicted from the same observation, so that the key value cache of the prefix is
+always reused when `prefix_cache_threshold` is set.
+"""
+
+import argparse
+from typing import Callable
 
 import torch
 
 from lerobot.common.datasets.lerobot_dataset import LeRobotDataset
 from lerobot.common.policies.factory import make_policy
+from lerobot.common.policies.pi0.configuration_pi0 import PI0Config
+from lerobot.common.policies.pi0.modeling_pi0 import PI0FlowMatching, make_tiny_architectures
+from lerobot.common.utils.benchmark import TimeBenchmark
 from lerobot.configs.policies import PreTrainedConfig
 
 torch.backends.cudnn.benchmark = True
 
+# (static_inference, prefix_cache_threshold) of each benchmarked variant
+VARIANTS = [(False, None), (True, None), (False, 0.0), (True, 0.0)]
+
+
+def make_tiny_model(
+    device: str, batch_size: int
+) -> tuple[PI0Config, PI0FlowMatching, Callable[[], torch.Tensor]]:
+    # 4x4 patches of 14x14 pixels per image
+    tiny_architectures = make_tiny_architectures(image_size=56, vocab_size=1000)
+    config = PI0Config(
+        device=device,
+        chunk_size=10,
+        n_action_steps=10,
+        max_state_dim=8,
+        max_action_dim=8,
+        resize_imgs_with_padding=(56, 56),
+        tokenizer_max_length=8,
+        proj_width=tiny_architectures["gemma_expert_config"]["hidden_size"],
+    )
+    model = PI0FlowMatching(config, **tiny_architectures)
+    model.to(device)
+    model.eval()
+
+    num_cameras = 2
+    images = [torch.rand(batch_size, 3, 56, 56, device=device) * 2 - 1 for _ in range(num_cameras)]
+    img_masks = [torch.ones(batch_size, dtype=torch.bool, device=device) for _ in range(num_cameras)]
+    lang_tokens = torch.randint(0, 1000, (batch_size, config.tokenizer_max_length), device=device)
+    lang_masks = torch.ones_like(lang_tokens, dtype=torch.bool)
+    state = torch.randn(batch_size, config.max_state_dim, device=device)
+
+    def predict_action_chunk():
+        return model.sample_actions(images, img_masks, lang_tokens, lang_masks, state)
+
+    return config, model, predict_action_chunk
 
-def main():
-    device = "cuda"
-    dataset_repo_id = "danaaubakirova/koch_test"
-    # model_name = "pi0_base"
-    # ckpt_torch_dir = Path.home() / f".cache/openpi/openpi-assets/checkpoints/{model_name}_pytorch"
-    ckpt_torch_dir = "lerobot/pi0"
 
+def make_pretrained_policy(
+    device: str, policy_path: str, dataset_repo_id: str
+) -> tuple[PI0Config, PI0FlowMatching, Callable[[], torch.Tensor]]:
     dataset = LeRobotDataset(dataset_repo_id, episodes=[0])
 
     dataloader = torch.utils.data.DataLoader(
@@ -43,40 +93,85 @@ def main():
         if isinstance(batch[k], torch.Tensor):
             batch[k] = batch[k].to(device=device, dtype=torch.float32)
 
-    cfg = PreTrainedConfig.from_pretrained(ckpt_torch_dir)
-    cfg.pretrained_path = ckpt_torch_dir
+    cfg = PreTrainedConfig.from_pretrained(policy_path)
+    cfg.pretrained_path = policy_path
+    cfg.device = device
     policy = make_policy(cfg, ds_meta=dataset.meta)
 
-    # policy = torch.compile(policy, mode="reduce-overhead")
+    def predict_action_chunk():
+        return policy.predict_action_chunk(batch)
 
-    warmup_iters = 10
-    benchmark_iters = 30
+    return policy.config, policy.model, predict_action_chunk
 
-    # Warmup
-    for _ in range(warmup_iters):
-        torch.cuda.synchronize()
-        policy.select_action(batch)
-        policy.reset()
-        torch.cuda.synchronize()
 
-    # Benchmark
-    start_event = torch.cuda.Event(enable_timing=True)
-    end_event = torch.cuda.Event(enable_timing=True)
+def main(
+    tiny: bool,
+    device: str,
+    policy_path: str,
+    dataset_repo_id: str,
+    batch_size: int,
+    compile_mode: str | None,
+    warmup_iters: int,
+    benchmark_iters: int,
+):
+    if tiny:
+        config, model, predict_action_chunk = make_tiny_model(device, batch_size)
+    else:
+        config, model, predict_action_chunk = make_pretrained_policy(device, policy_path, dataset_repo_id)
 
-    start_event.record()
-    for _ in range(benchmark_iters):
-        policy.select_action(batch)
-        policy.reset()
-    end_event.record()
+    if compile_mode is not None:
+        model.paligemma_with_expert.compile(mode=compile_mode)
 
-    # Synchronize and measure time
-    torch.cuda.synchronize()
-    elapsed_time_ms = start_event.elapsed_time(end_event)
+    for static_inference, prefix_cache_threshold in VARIANTS:
+        config.static_inference = static_inference
+        config.prefix_cache_threshold = prefix_cache_threshold
+        model.reset()
 
-    avg_time_per_iter = elapsed_time_ms / benchmark_iters
-    print(f"Average execution time per iteration: {avg_time_per_iter:.3f} ms")
+        for _ in range(warmup_iters):
+            predict_action_chunk()
+
+        benchmark = TimeBenchmark(device=device)
+        for _ in range(benchmark_iters):
+            with benchmark:
+                predict_action_chunk()
+
+        avg_time_per_iter = benchmark.total / benchmark.count * 1000
+        print(
+            f"static_inference={static_inference!s:<5} prefix_cache_threshold={prefix_cache_threshold!s:<4} "
+            f"Average execution time per iteration: {avg_time_per_iter:.3f} ms"
+        )
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--tiny",
+        action="store_true",
+        help="Benchmark a tiny randomly initialized pi0 on random inputs instead of the pretrained one.",
+    )
+    parser.add_argument("--device", type=str, default="cuda", help="Device to run the policy on.")
+    parser.add_argument(
+        "--policy-path",
+        type=str,
+        default="lerobot/pi0",
+        help="Hub repository or local directory of the pretrained pi0.",
+    )
+    parser.add_argument(
+        "--dataset-repo-id",
+        type=str,
+        default="danaaubakirova/koch_test",
+        help="Dataset of the observation fed to the pretrained pi0.",
+    )
+    parser.add_argument("--batch-size", type=int, default=1, help="Batch size of the tiny pi0's inference.")
+    parser.add_argument(
+        "--compile-mode",
+        type=str,
+        default=None,
+        help="Compile PaliGemma and the Gemma expert with this `torch.compile` mode (e.g. reduce-overhead).",
+    )
+    parser.add_argument("--warmup-iters", type=int, default=10)
+    parser.add_argument("--benchmark-iters", type=int, default=30)
+    args = parser.parse_args()
+
     with torch.inference_mode():
-        main()
+        main(**vars(args))
@@ -63,6 +63,7 @@ from lerobot.common.policies.pi0.configuration_pi0 import PI0Config
 from lerobot.common.policies.pi0.paligemma_with_expert import (
     PaliGemmaWithExpertConfig,
     PaliGemmaWithExpertModel,
+    StaticKVCache,
 )
 from lerobot.common.policies.pretrained import PreTrainedPolicy
 from lerobot.common.utils.utils import get_safe_dtype
@@ -249,6 +250,8 @@ class PI0Policy(PreTrainedPolicy):
         )
 
         self.language_tokenizer = AutoTokenizer.from_pretrained("google/paligemma-3b-pt-224")
+        # Tokens and masks of each task, on the device of the last batch it was part of
+        self._language_tokens_cache: dict[str, tuple[Tensor, Tensor]] = {}
         self.model = PI0FlowMatching(config)
 
         self.reset()
@@ -256,6 +259,18 @@ class PI0Policy(PreTrainedPolicy):
     def reset(self):
         """This should be called whenever the environment is reset."""
         self._action_queue = deque([], maxlen=self.config.n_action_steps)
+        self.model.reset()
+
+    def get_rollout_state(self) -> dict:
+        return {"action_queue": self._action_queue}
+
+    def set_rollout_state(self, state: dict) -> None:
+        self._action_queue = state["action_queue"]
+        # The prefix cache isn't part of the state, since it belongs to the previous rollout
+        self.model.reset()
+
+    def get_compiled_modules(self) -> list[nn.Module]:
+        return [self.model.paligemma_with_expert]
 
     def get_optim_params(self) -> dict:
         return self.parameters()
@@ -268,6 +283,19 @@ class PI0Policy(PreTrainedPolicy):
         environment. It works by managing the actions in a queue and only calling `select_actions` when the
         queue is empty.
         """
+        # Action queue logic for n_action_steps > 1. When the action_queue is depleted, populate it by
+        # querying the policy.
+        if len(self._action_queue) == 0:
+            actions = self.predict_action_chunk(batch, noise=noise)[:, : self.config.n_action_steps]
+
+            # `self.model.forward` returns a (batch_size, n_action_steps, action_dim) tensor, but the queue
+            # effectively has shape (n_action_steps, batch_size, *), hence the transpose.
+            self._action_queue.extend(actions.transpose(0, 1))
+        return self._action_queue.popleft()
+
+    @torch.no_grad
+    def predict_action_chunk(self, batch: dict[str, Tensor], noise: Tensor | None = None) -> Tensor:
+        """Predict a (batch_size, chunk_size, action_dim) chunk of actions given environment observations."""
         self.eval()
 
         if self.config.adapt_to_pi_aloha:
@@ -275,30 +303,21 @@ class PI0Policy(PreTrainedPolicy):
 
         batch = self.normalize_inputs(batch)
 
-        # Action queue logic for n_action_steps > 1. When the action_queue is depleted, populate it by
-        # querying the policy.
-        if len(self._action_queue) == 0:
-            images, img_masks = self.prepare_images(batch)
-            state = self.prepare_state(batch)
-            lang_tokens, lang_masks = self.prepare_language(batch)
-
-            actions = self.model.sample_actions(
-                images, img_masks, lang_tokens, lang_masks, state, noise=noise
-            )
+        images, img_masks = self.prepare_images(batch)
+        state = self.prepare_state(batch)
+        lang_tokens, lang_masks = self.prepare_language(batch)
 
-            # Unpad actions
-            original_action_dim = self.config.action_feature.shape[0]
-            actions = actions[:, :, :original_action_dim]
+        actions = self.model.sample_actions(images, img_masks, lang_tokens, lang_masks, state, noise=noise)
 
-            actions = self.unnormalize_outputs({"action": actions})["action"]
+        # Unpad actions
+        original_action_dim = self.config.action_feature.shape[0]
+        actions = actions[:, :, :original_action_dim]
 
-            if self.config.adapt_to_pi_aloha:
-                actions = self._pi_aloha_encode_actions(actions)
+        actions = self.unnormalize_outputs({"action": actions})["action"]
 
-            # `self.model.forward` returns a (batch_size, n_action_steps, action_dim) tensor, but the queue
-            # effectively has shape (n_action_steps, batch_size, *), hence the transpose.
-            self._action_queue.extend(actions.transpose(0, 1))
-        return self._action_queue.popleft()
+        if self.config.adapt_to_pi_aloha:
+            actions = self._pi_aloha_encode_actions(actions)
+        return actions
 
     def forward(self, batch: dict[str, Tensor], noise=None, time=None) -> tuple[Tensor, dict[str, Tensor]]:
         """Do a full training forward pass to compute the loss"""
@@ -317,21 +336,18 @@ class PI0Policy(PreTrainedPolicy):
 
         loss_dict = {}
         losses = self.model.forward(images, img_masks, lang_tokens, lang_masks, state, actions, noise, time)
-        loss_dict["losses_after_forward"] = losses.clone()
 
         if actions_is_pad is not None:
             in_episode_bound = ~actions_is_pad
             losses = losses * in_episode_bound.unsqueeze(-1)
-            loss_dict["losses_after_in_ep_bound"] = losses.clone()
 
         # Remove padding
         losses = losses[:, :, : self.config.max_action_dim]
-        loss_dict["losses_after_rm_padding"] = losses.clone()
 
         # For backward pass
         loss = losses.mean()
-        # For logging
-        loss_dict["l2_loss"] = loss.item()
+        # For logging, without synchronizing with the device
+        loss_dict["l2_loss"] = loss.detach()
 
         return loss, loss_dict
 
@@ -379,22 +395,36 @@ class PI0Policy(PreTrainedPolicy):
         return images, img_masks
 
     def prepare_language(self, batch) -> tuple[Tensor, Tensor]:
-        """Tokenize the text input"""
+        """Tokenize the text input.
+
+        Tasks are padded to `tokenizer_max_length` tokens, so the tokens of each task don't depend on the
+        other tasks of the batch. They are cached per task on the device, and only new tasks are tokenized.
+        """
         device = batch[OBS_ROBOT].device
         tasks = batch["task"]
 
-        # PaliGemma prompt has to end with a new line
-        tasks = [task if task.endswith("\n") else f"{task}\n" for task in tasks]
+        cache = self._language_tokens_cache
+        new_tasks = [
+            task for task in dict.fromkeys(tasks) if task not in cache or cache[task][0].device != device
+        ]
+        if len(new_tasks) > 0:
+            # PaliGemma prompt has to end with a new line
+            prompts = [task if task.endswith("\n") else f"{task}\n" for task in new_tasks]
+
+            tokenized_prompt = self.language_tokenizer.__call__(
+                prompts,
+                padding="max_length",
+                padding_side="right",
+                max_length=self.config.tokenizer_max_length,
+                return_tensors="pt",
+            )
+            new_tokens = tokenized_prompt["input_ids"].to(device=device)
+            new_masks = tokenized_prompt["attention_mask"].to(device=device, dtype=torch.bool)
+            for task, tokens, masks in zip(new_tasks, new_tokens, new_masks, strict=True):
+                cache[task] = (tokens, masks)
 
-        tokenized_prompt = self.language_tokenizer.__call__(
-            tasks,
-            padding="max_length",
-            padding_side="right",
-            max_length=self.config.tokenizer_max_length,
-            return_tensors="pt",
-        )
-        lang_tokens = tokenized_prompt["input_ids"].to(device=device)
-        lang_masks = tokenized_prompt["attention_mask"].to(device=device, dtype=torch.bool)
+        lang_tokens = torch.stack([cache[task][0] for task in tasks])
+        lang_masks = torch.stack([cache[task][1] for task in tasks])
 
         return lang_tokens, lang_masks
 
@@ -436,6 +466,40 @@ class PI0Policy(PreTrainedPolicy):
         return actions
 
 
+def make_tiny_architectures(image_size: int = 28, vocab_size: int = 100) -> dict[str, dict]:
+    """Returns the `paligemma_config` and `gemma_expert_config` arguments of `PI0FlowMatching` building a
+    PaliGemma and a Gemma expert of a few layers of a few channels, e.g. for tests and benchmarks. Images of
+    `image_size` pixels are split into patches of 14x14 pixels, and the `proj_width` of the config should be
+    the `hidden_size` of the Gemma expert.
+    """
+    gemma_config = {
+        "model_type": "gemma",
+        "hidden_activation": "gelu_pytorch_tanh",
+        "intermediate_size": 64,
+        "num_attention_heads": 8,
+        "num_key_value_heads": 1,
+        "head_dim": 16,
+        "num_hidden_layers": 2,
+        "vocab_size": vocab_size,
+    }
+    paligemma_config = {
+        "projection_dim": 64,
+        "image_token_index": vocab_size,
+        "text_config": {**gemma_config, "hidden_size": 64},
+        "vision_config": {
+            "model_type": "siglip_vision_model",
+            "hidden_size": 32,
+            "intermediate_size": 64,
+            "num_attention_heads": 2,
+            "num_hidden_layers": 1,
+            "image_size": image_size,
+            "patch_size": 14,
+            "vision_use_head": False,
+        },
+    }
+    return {"paligemma_config": paligemma_config, "gemma_expert_config": {**gemma_config, "hidden_size": 32}}
+
+
 class PI0FlowMatching(nn.Module):
     """
     π0: A Vision-Language-Action Flow Model for General Robot Control
@@ -463,14 +527,20 @@ class PI0FlowMatching(nn.Module):
     └──────────────────────────────┘
     """
 
-    def __init__(self, config):
+    def __init__(self, config, paligemma_config: dict | None = None, gemma_expert_config: dict | None = None):
+        """`paligemma_config` and `gemma_expert_config` override the default PaliGemma and Gemma expert
+        architectures of Pi0, e.g. to build a tiny model for tests and benchmarks (see
+        `make_tiny_architectures`)."""
         super().__init__()
         self.config = config
 
         paligemma_with_export_config = PaliGemmaWithExpertConfig(
+            paligemma_config=paligemma_config,
+            gemma_expert_config=gemma_expert_config,
             freeze_vision_encoder=self.config.freeze_vision_encoder,
             train_expert_only=self.config.train_expert_only,
             attention_implementation=self.config.attention_implementation,
+            activation_checkpointing=self.config.activation_checkpointing,
         )
         self.paligemma_with_expert = PaliGemmaWithExpertModel(paligemma_with_export_config)
 
@@ -482,7 +552,25 @@ class PI0FlowMatching(nn.Module):
         self.action_time_mlp_in = nn.Linear(self.config.proj_width * 2, self.config.proj_width)
         self.action_time_mlp_out = nn.Linear(self.config.proj_width, self.config.proj_width)
 
+        # Timesteps of the denoising steps of the static inference, accumulated in float32 like in
+        # `sample_actions`.
+        dt = torch.tensor(-1.0 / self.config.num_steps, dtype=torch.float32)
+        time = torch.tensor(1.0, dtype=torch.float32)
+        timesteps = []
+        while time >= -dt / 2:
+            timesteps.append(time.clone())
+            time += dt
+        self.register_buffer("timesteps", torch.stack(timesteps), persistent=False)
+
+        # Preallocated key value cache of the static inference
+        self._static_kv_cache = None
+
         self.set_requires_grad()
+        self.reset()
+
+    def reset(self):
+        """Clears the key value cache of the prefix kept for reuse, see `config.prefix_cache_threshold`."""
+        self._prefix_cache = None
 
     def set_requires_grad(self):
         for params in self.state_proj.parameters():
@@ -557,24 +645,35 @@ class PI0FlowMatching(nn.Module):
 
     def embed_suffix(self, state, noisy_actions, timestep):
         """Embed state, noisy_actions, timestep to prepare for Expert Gemma processing."""
+        embs = self.embed_suffix_tokens(state, noisy_actions, timestep)
+        pad_masks, att_masks = self.make_suffix_masks(embs.shape[0], embs.dtype, embs.device)
+        return embs, pad_masks, att_masks
+
+    def make_suffix_masks(self, bsize, dtype, device) -> tuple[torch.Tensor, torch.Tensor]:
+        """Make the padding and attention masks of the state and action tokens, which don't depend on their
+        values."""
+        # State and action tokens are never padded
+        pad_masks = torch.ones(bsize, 1 + self.config.n_action_steps, dtype=torch.bool, device=device)
+
+        # Set attention masks so that image and language inputs do not attend to state or actions, and so that
+        # image, language and state inputs do not attend to action tokens
+        att_masks = [1] + [1] + ([0] * (self.config.n_action_steps - 1))
+        att_masks = torch.tensor(att_masks, dtype=dtype, device=device)
+        att_masks = att_masks[None, :].expand(bsize, len(att_masks))
+
+        return pad_masks, att_masks
+
+    def embed_suffix_tokens(self, state, noisy_actions, timestep) -> torch.Tensor:
+        """Embed state, noisy_actions, timestep into the tokens of the suffix."""
         embs = []
-        pad_masks = []
-        att_masks = []
 
         # Embed state
         state_emb = self.state_proj(state)
         state_emb = state_emb.to(dtype=torch.bfloat16)
         embs.append(state_emb[:, None, :])
-        bsize = state_emb.shape[0]
         dtype = state_emb.dtype
         device = state_emb.device
 
-        state_mask = torch.ones(bsize, 1, dtype=torch.bool, device=device)
-        pad_masks.append(state_mask)
-
-        # Set attention masks so that image and language inputs do not attend to state or actions
-        att_masks += [1]
-
         # Embed timestep using sine-cosine positional encoding with sensitivity in the range [0, 1]
         time_emb = create_sinusoidal_pos_embedding(
             timestep, self.config.proj_width, min_period=4e-3, max_period=4.0, device=device
@@ -594,19 +693,7 @@ class PI0FlowMatching(nn.Module):
         # Add to input tokens
         embs.append(action_time_emb)
 
-        bsize, action_time_dim = action_time_emb.shape[:2]
-        action_time_mask = torch.ones(bsize, action_time_dim, dtype=torch.bool, device=device)
-        pad_masks.append(action_time_mask)
-
-        # Set attention masks so that image, language and state inputs do not attend to action tokens
-        att_masks += [1] + ([0] * (self.config.n_action_steps - 1))
-
-        embs = torch.cat(embs, dim=1)
-        pad_masks = torch.cat(pad_masks, dim=1)
-        att_masks = torch.tensor(att_masks, dtype=embs.dtype, device=embs.device)
-        att_masks = att_masks[None, :].expand(bsize, len(att_masks))
-
-        return embs, pad_masks, att_masks
+        return torch.cat(embs, dim=1)
 
     def forward(
         self, images, img_masks, lang_tokens, lang_masks, state, actions, noise=None, time=None
@@ -633,7 +720,7 @@ class PI0FlowMatching(nn.Module):
         att_2d_masks = make_att_2d_masks(pad_masks, att_masks)
         position_ids = torch.cumsum(pad_masks, dim=1) - 1
 
-        (_, suffix_out), _ = self.paligemma_with_expert.forward(
+        (_, suffix_out), _ = self.paligemma_with_expert(
             attention_mask=att_2d_masks,
             position_ids=position_ids,
             past_key_values=None,
@@ -658,21 +745,10 @@ class PI0FlowMatching(nn.Module):
             actions_shape = (bsize, self.config.n_action_steps, self.config.max_action_dim)
             noise = self.sample_noise(actions_shape, device)
 
-        prefix_embs, prefix_pad_masks, prefix_att_masks = self.embed_prefix(
-            images, img_masks, lang_tokens, lang_masks
-        )
-        prefix_att_2d_masks = make_att_2d_masks(prefix_pad_masks, prefix_att_masks)
-        prefix_position_ids = torch.cumsum(prefix_pad_masks, dim=1) - 1
+        prefix_pad_masks, past_key_values = self.get_prefix_cache(images, img_masks, lang_tokens, lang_masks)
 
-        # Compute image and language key value cache
-        _, past_key_values = self.paligemma_with_expert.forward(
-            attention_mask=prefix_att_2d_masks,
-            position_ids=prefix_position_ids,
-            past_key_values=None,
-            inputs_embeds=[prefix_embs, None],
-            use_cache=self.config.use_cache,
-            fill_kv_cache=True,
-        )
+        if self.config.static_inference:
+            return self.sample_actions_static(state, prefix_pad_masks, past_key_values, noise)
 
         dt = -1.0 / self.config.num_steps
         dt = torch.tensor(dt, dtype=torch.float32, device=device)
@@ -694,17 +770,99 @@ class PI0FlowMatching(nn.Module):
             time += dt
         return x_t
 
-    def denoise_step(
-        self,
-        state,
-        prefix_pad_masks,
-        past_key_values,
-        x_t,
-        timestep,
-    ):
-        """Apply one denoising step of the noise `x_t` at a given timestep."""
-        suffix_embs, suffix_pad_masks, suffix_att_masks = self.embed_suffix(state, x_t, timestep)
+    def sample_actions_static(self, state, prefix_pad_masks, past_key_values, noise) -> Tensor:
+        """Run the denoising steps with static shapes (see `config.static_inference`).
+
+        The masks and position ids of the suffix are computed once, the timesteps are precomputed, and the key
+        value states of the suffix are written in-place in the preallocated `past_key_values`, so that each
+        step runs the same kernels on tensors of the same shapes and addresses, without synchronizing the
+        host with the device.
+        """
+        bsize = state.shape[0]
+        dt = -1.0 / self.config.num_steps
+        dt = torch.tensor(dt, dtype=torch.float32, device=state.device)
+
+        suffix_pad_masks, suffix_att_masks = self.make_suffix_masks(bsize, torch.float32, state.device)
+        full_att_2d_masks, position_ids = self.make_suffix_att_2d_masks(
+            prefix_pad_masks, suffix_pad_masks, suffix_att_masks
+        )
+
+        x_t = noise
+        for time in self.timesteps:
+            suffix_embs = self.embed_suffix_tokens(state, x_t, time.expand(bsize))
+            v_t = self.predict_velocity(suffix_embs, full_att_2d_masks, position_ids, past_key_values)
+
+            # Euler step
+            x_t += dt * v_t
+        return x_t
 
+    def get_prefix_cache(self, images, img_masks, lang_tokens, lang_masks) -> tuple[Tensor, dict]:
+        """Compute the padding masks and the key value cache of the image and language tokens.
+
+        When `config.prefix_cache_threshold` is set, the cache is kept, and reused as long as the language
+        tokens are the same and the images are close enough to those it was computed from.
+        """
+        if self._can_reuse_prefix_cache(images, img_masks, lang_tokens, lang_masks):
+            return self._prefix_cache["prefix_pad_masks"], self._prefix_cache["past_key_values"]
+
+        prefix_embs, prefix_pad_masks, prefix_att_masks = self.embed_prefix(
+            images, img_masks, lang_tokens, lang_masks
+        )
+        prefix_att_2d_masks = make_att_2d_masks(prefix_pad_masks, prefix_att_masks)
+        prefix_position_ids = torch.cumsum(prefix_pad_masks, dim=1) - 1
+
+        past_key_values = None
+        if self.config.static_inference:
+            max_length = prefix_embs.shape[1] + 1 + self.config.n_action_steps
+            if self._static_kv_cache is None or self._static_kv_cache.max_length != max_length:
+                self._static_kv_cache = StaticKVCache(max_length)
+            past_key_values = self._static_kv_cache
+
+        # Compute image and language key value cache
+        _, past_key_values = self.paligemma_with_expert(
+            attention_mask=prefix_att_2d_masks,
+            position_ids=prefix_position_ids,
+            past_key_values=past_key_values,
+            inputs_embeds=[prefix_embs, None],
+            use_cache=self.config.use_cache,
+            fill_kv_cache=True,
+        )
+
+        if self.config.prefix_cache_threshold is not None:
+            self._prefix_cache = {
+                "images": [img.clone() for img in images],
+                "img_masks": [mask.clone() for mask in img_masks],
+                "lang_tokens": lang_tokens.clone(),
+                "lang_masks": lang_masks.clone(),
+                "prefix_pad_masks": prefix_pad_masks,
+                "past_key_values": past_key_values,
+            }
+        return prefix_pad_masks, past_key_values
+
+    def _can_reuse_prefix_cache(self, images, img_masks, lang_tokens, lang_masks) -> bool:
+        cache = self._prefix_cache
+        if self.config.prefix_cache_threshold is None or cache is None:
+            return False
+        if len(images) != len(cache["images"]) or lang_tokens.shape != cache["lang_tokens"].shape:
+            return False
+        if any(img.shape != ref.shape for img, ref in zip(images, cache["images"], strict=True)):
+            return False
+
+        # Only synchronize once with the device
+        same_tokens = torch.stack(
+            [(lang_tokens == cache["lang_tokens"]).all(), (lang_masks == cache["lang_masks"]).all()]
+            + [(mask == ref).all() for mask, ref in zip(img_masks, cache["img_masks"], strict=True)]
+        ).all()
+        image_changes = [
+            (img - ref).abs().flatten(1).mean(1).max()
+            for img, ref in zip(images, cache["images"], strict=True)
+        ]
+        image_change = torch.stack(image_changes).max()
+        return bool(same_tokens & (image_change <= self.config.prefix_cache_threshold))
+
+    def make_suffix_att_2d_masks(self, prefix_pad_masks, suffix_pad_masks, suffix_att_masks):
+        """Make the attention masks of the suffix tokens to the prefix and suffix tokens, and their position
+        ids."""
         suffix_len = suffix_pad_masks.shape[1]
         batch_size = prefix_pad_masks.shape[0]
         prefix_len = prefix_pad_masks.shape[1]
@@ -716,8 +874,26 @@ class PI0FlowMatching(nn.Module):
 
         prefix_offsets = torch.sum(prefix_pad_masks, dim=-1)[:, None]
         position_ids = prefix_offsets + torch.cumsum(suffix_pad_masks, dim=1) - 1
+        return full_att_2d_masks, position_ids
+
+    def denoise_step(
+        self,
+        state,
+        prefix_pad_masks,
+        past_key_values,
+        x_t,
+        timestep,
+    ):
+        """Apply one denoising step of the noise `x_t` at a given timestep."""
+        suffix_embs, suffix_pad_masks, suffix_att_masks = self.embed_suffix(state, x_t, timestep)
+        full_att_2d_masks, position_ids = self.make_suffix_att_2d_masks(
+            prefix_pad_masks, suffix_pad_masks, suffix_att_masks
+        )
+        return self.predict_velocity(suffix_embs, full_att_2d_masks, position_ids, past_key_values)
 
-        outputs_embeds, _ = self.paligemma_with_expert.forward(
+    def predict_velocity(self, suffix_embs, full_att_2d_masks, position_ids, past_key_values):
+        """Predict the velocity of the actions from the embedded suffix tokens and the prefix cache."""
+        outputs_embeds, _ = self.paligemma_with_expert(
             attention_mask=full_att_2d_masks,
             position_ids=position_ids,
             past_key_values=past_key_values,
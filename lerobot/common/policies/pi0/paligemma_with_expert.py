@@ -18,6 +18,7 @@ import torch
 import torch.version
 from pytest import Cache
 from torch import nn
+from torch.utils.checkpoint import checkpoint
 from transformers import (
     AutoConfig,
     GemmaForCausalLM,
@@ -56,6 +57,52 @@ def apply_rope(x, positions, max_wavelength=10_000):
     return res.to(dtype)
 
 
+class StaticKVCache(dict):
+    """
+    Key value cache of the prefix (image and language tokens) whose states are preallocated for `max_length`
+    tokens, the length of the prefix and of the suffix (state and action tokens) together.
+
+    The states of the prefix are written at the beginning of the preallocated states when filling the cache,
+    and those of the suffix are written at their end at each denoising step, instead of being concatenated to
+    those of the prefix. The shapes and the addresses of the states are thus the same at each step, as
+    required to compile the steps or to capture them in a CUDA graph.
+    """
+
+    def __init__(self, max_length: int):
+        super().__init__()
+        self.max_length = max_length
+
+    def update(
+        self, layer_idx: int, key_states: torch.Tensor, value_states: torch.Tensor, fill_kv_cache: bool
+    ) -> tuple[torch.Tensor, torch.Tensor]:
+        """Writes the key and value states of a layer in the cache, and returns those to attend to."""
+        if fill_kv_cache:
+            cache = self.get(layer_idx)
+            shape = (key_states.shape[0], self.max_length, *key_states.shape[2:])
+            if (
+                cache is None
+                or cache["key_states"].shape != shape
+                or cache["key_states"].dtype != key_states.dtype
+                or cache["key_states"].device != key_states.device
+            ):
+                cache = {
+                    "key_states": key_states.new_empty(shape),
+                    "value_states": value_states.new_empty(shape),
+                }
+                self[layer_idx] = cache
+            length = key_states.shape[1]
+            cache["key_states"][:, :length] = key_states
+            cache["value_states"][:, :length] = value_states
+            # The prefix only attends to itself
+            return key_states, value_states
+
+        cache = self[layer_idx]
+        length = key_states.shape[1]
+        cache["key_states"][:, -length:] = key_states
+        cache["value_states"][:, -length:] = value_states
+        return cache["key_states"], cache["value_states"]
+
+
 class PaliGemmaWithExpertConfig(PretrainedConfig):
     model_type = "PaliGemmaWithExpertModel"
     sub_configs = {"paligemma_config": AutoConfig, "gemma_expert_config": AutoConfig}
@@ -67,11 +114,13 @@ class PaliGemmaWithExpertConfig(PretrainedConfig):
         freeze_vision_encoder: bool = True,
         train_expert_only: bool = True,
         attention_implementation: str = "eager",
+        activation_checkpointing: bool = False,
         **kwargs,
     ):
         self.freeze_vision_encoder = freeze_vision_encoder
         self.train_expert_only = train_expert_only
         self.attention_implementation = attention_implementation
+        self.activation_checkpointing = activation_checkpointing
 
         if paligemma_config is None:
             # Default config from Pi0
@@ -111,13 +160,15 @@ class PaliGemmaWithExpertConfig(PretrainedConfig):
                     "vision_use_head": False,
                 },
             )
-        elif isinstance(self.paligemma_config, dict):
+        elif isinstance(paligemma_config, dict):
             # Override Pi0 default config for PaliGemma
-            if "model_type" not in gemma_expert_config:
+            if "model_type" not in paligemma_config:
                 paligemma_config["model_type"] = "paligemma"
 
             cfg_cls = CONFIG_MAPPING[paligemma_config["model_type"]]
             self.paligemma_config = cfg_cls(**paligemma_config)
+        else:
+            self.paligemma_config = paligemma_config
 
         if gemma_expert_config is None:
             # Default config from Pi0
@@ -145,13 +196,15 @@ class PaliGemmaWithExpertConfig(PretrainedConfig):
                 use_cache=True,
                 vocab_size=257152,
             )
-        elif isinstance(self.gemma_expert_config, dict):
+        elif isinstance(gemma_expert_config, dict):
             # Override Pi0 default config for Gemma Expert
             if "model_type" not in gemma_expert_config:
                 gemma_expert_config["model_type"] = "gemma"
 
-            cfg_cls = CONFIG_MAPPING[paligemma_config["model_type"]]
+            cfg_cls = CONFIG_MAPPING[gemma_expert_config["model_type"]]
             self.gemma_expert_config = cfg_cls(**gemma_expert_config)
+        else:
+            self.gemma_expert_config = gemma_expert_config
 
         super().__init__(**kwargs)
 
@@ -245,104 +298,141 @@ class PaliGemmaWithExpertModel(PreTrainedModel):
         num_layers = self.paligemma.config.text_config.num_hidden_layers
         head_dim = self.paligemma.config.text_config.head_dim
         for layer_idx in range(num_layers):
-            query_states = []
-            key_states = []
-            value_states = []
-            for i, hidden_states in enumerate(inputs_embeds):
-                if hidden_states is None:
-                    continue
-                layer = models[i].layers[layer_idx]
-                # normalizer = torch.tensor(models[i].config.hidden_size**0.5, dtype=hidden_states.dtype)
-                # hidden_states = hidden_states * normalizer
-                hidden_states = layer.input_layernorm(hidden_states)
-
-                input_shape = hidden_states.shape[:-1]
-                hidden_shape = (*input_shape, -1, layer.self_attn.head_dim)
-
-                hidden_states = hidden_states.to(dtype=torch.bfloat16)
-                query_state = layer.self_attn.q_proj(hidden_states).view(hidden_shape)
-                key_state = layer.self_attn.k_proj(hidden_states).view(hidden_shape)
-                value_state = layer.self_attn.v_proj(hidden_states).view(hidden_shape)
-
-                query_states.append(query_state)
-                key_states.append(key_state)
-                value_states.append(value_state)
-
-            # B,L,H,D with L sequence length, H number of heads, D head dim
-            # concatenate on the number of embeddings/tokens
-            query_states = torch.cat(query_states, dim=1)
-            key_states = torch.cat(key_states, dim=1)
-            value_states = torch.cat(value_states, dim=1)
-
-            query_states = apply_rope(query_states, position_ids)
-            key_states = apply_rope(key_states, position_ids)
-
-            if use_cache and past_key_values is None:
-                past_key_values = {}
-
-            if use_cache:
-                if fill_kv_cache:
-                    past_key_values[layer_idx] = {
-                        "key_states": key_states,
-                        "value_states": value_states,
-                    }
-                else:
-                    # TODO here, some optimization can be done - similar to a `StaticCache` we can declare the `max_len` before.
-                    # so we create an empty cache, with just one cuda malloc, and if (in autoregressive case) we reach
-                    # the max len, then we (for instance) double the cache size. This implementation already exists
-                    # in `transformers`. (molbap)
-                    key_states = torch.cat([past_key_values[layer_idx]["key_states"], key_states], dim=1)
-                    value_states = torch.cat(
-                        [past_key_values[layer_idx]["value_states"], value_states], dim=1
-                    )
-
-            attention_interface = self.get_attention_interface()
-            att_output = attention_interface(
-                attention_mask, batch_size, head_dim, query_states, key_states, value_states
+            layer_args = (
+                layer_idx,
+                inputs_embeds,
+                attention_mask,
+                position_ids,
+                past_key_values,
+                use_cache,
+                fill_kv_cache,
+                batch_size,
+                head_dim,
             )
-            att_output = att_output.to(dtype=torch.bfloat16)
+            if self.config.activation_checkpointing and self.training and not use_cache:
+                # Recompute the activations of the layer during the backward pass instead of storing them
+                inputs_embeds, past_key_values = checkpoint(
+                    self._forward_layer, *layer_args, use_reentrant=False
+                )
+            else:
+                inputs_embeds, past_key_values = self._forward_layer(*layer_args)
 
-            # first part of att_output is prefix (up to sequence length, [:, 0:prefix_seq_len])
-            outputs_embeds = []
-            start = 0
-            for i, hidden_states in enumerate(inputs_embeds):
-                layer = models[i].layers[layer_idx]
+        # final norm
+        outputs_embeds = []
+        for i, hidden_states in enumerate(inputs_embeds):
+            if hidden_states is not None:
+                out_emb = models[i].norm(hidden_states)
+                outputs_embeds.append(out_emb)
+            else:
+                outputs_embeds.append(None)
 
-                if hidden_states is not None:
-                    end = start + hidden_states.shape[1]
+        return outputs_embeds, past_key_values
 
-                    if att_output.dtype != layer.self_attn.o_proj.weight.dtype:
-                        att_output = att_output.to(layer.self_attn.o_proj.weight.dtype)
-                    out_emb = layer.self_attn.o_proj(att_output[:, start:end])
+    def _forward_layer(
+        self,
+        layer_idx: int,
+        inputs_embeds: List[torch.FloatTensor],
+        attention_mask: Optional[torch.Tensor],
+        position_ids: Optional[torch.LongTensor],
+        past_key_values: Optional[Union[List[torch.FloatTensor], Cache]],
+        use_cache: Optional[bool],
+        fill_kv_cache: Optional[bool],
+        batch_size: int,
+        head_dim: int,
+    ):
+        """Runs the `layer_idx`-th layer of the PaliGemma language model and of the Gemma expert, which attend
+        to each other's embeddings."""
+        models = [self.paligemma.language_model.model, self.gemma_expert.model]
 
-                    # TODO: first dropout (by default 0.0)
+        query_states = []
+        key_states = []
+        value_states = []
+        for i, hidden_states in enumerate(inputs_embeds):
+            if hidden_states is None:
+                continue
+            layer = models[i].layers[layer_idx]
+            # normalizer = torch.tensor(models[i].config.hidden_size**0.5, dtype=hidden_states.dtype)
+            # hidden_states = hidden_states * normalizer
+            hidden_states = layer.input_layernorm(hidden_states)
+
+            input_shape = hidden_states.shape[:-1]
+            hidden_shape = (*input_shape, -1, layer.self_attn.head_dim)
+
+            hidden_states = hidden_states.to(dtype=torch.bfloat16)
+            query_state = layer.self_attn.q_proj(hidden_states).view(hidden_shape)
+            key_state = layer.self_attn.k_proj(hidden_states).view(hidden_shape)
+            value_state = layer.self_attn.v_proj(hidden_states).view(hidden_shape)
+
+            query_states.append(query_state)
+            key_states.append(key_state)
+            value_states.append(value_state)
+
+        # B,L,H,D with L sequence length, H number of heads, D head dim
+        # concatenate on the number of embeddings/tokens
+        query_states = torch.cat(query_states, dim=1)
+        key_states = torch.cat(key_states, dim=1)
+        value_states = torch.cat(value_states, dim=1)
+
+        query_states = apply_rope(query_states, position_ids)
+        key_states = apply_rope(key_states, position_ids)
+
+        if use_cache and past_key_values is None:
+            past_key_values = {}
+
+        if isinstance(past_key_values, StaticKVCache):
+            key_states, value_states = past_key_values.update(
+                layer_idx, key_states, value_states, fill_kv_cache
+            )
+        elif use_cache:
+            if fill_kv_cache:
+                past_key_values[layer_idx] = {
+                    "key_states": key_states,
+                    "value_states": value_states,
+                }
+            else:
+                # TODO here, some optimization can be done - similar to a `StaticCache` we can declare the `max_len` before.
+                # so we create an empty cache, with just one cuda malloc, and if (in autoregressive case) we reach
+                # the max len, then we (for instance) double the cache size. This implementation already exists
+                # in `transformers`. (molbap)
+                key_states = torch.cat([past_key_values[layer_idx]["key_states"], key_states], dim=1)
+                value_states = torch.cat([past_key_values[layer_idx]["value_states"], value_states], dim=1)
+
+        attention_interface = self.get_attention_interface()
+        att_output = attention_interface(
+            attention_mask, batch_size, head_dim, query_states, key_states, value_states
+        )
+        att_output = att_output.to(dtype=torch.bfloat16)
 
-                    # first residual
-                    out_emb += hidden_states
-                    after_first_residual = out_emb.clone()
+        # first part of att_output is prefix (up to sequence length, [:, 0:prefix_seq_len])
+        outputs_embeds = []
+        start = 0
+        for i, hidden_states in enumerate(inputs_embeds):
+            layer = models[i].layers[layer_idx]
 
-                    out_emb = layer.post_attention_layernorm(out_emb)
-                    out_emb = layer.mlp(out_emb)
+            if hidden_states is not None:
+                end = start + hidden_states.shape[1]
 
-                    # TODO: second dropout (by default 0.0)
+                if att_output.dtype != layer.self_attn.o_proj.weight.dtype:
+                    att_output = att_output.to(layer.self_attn.o_proj.weight.dtype)
+                out_emb = layer.self_attn.o_proj(att_output[:, start:end])
 
-                    # second residual
-                    out_emb += after_first_residual
+                # TODO: first dropout (by default 0.0)
 
-                    outputs_embeds.append(out_emb)
+                # first residual
+                out_emb += hidden_states
+                after_first_residual = out_emb.clone()
 
-                    start = end
-                else:
-                    outputs_embeds.append(None)
+                out_emb = layer.post_attention_layernorm(out_emb)
+                out_emb = layer.mlp(out_emb)
 
-            inputs_embeds = outputs_embeds
+                # TODO: second dropout (by default 0.0)
+
+                # second residual
+                out_emb += after_first_residual
 
-        # final norm
-        outputs_embeds = []
-        for i, hidden_states in enumerate(inputs_embeds):
-            if hidden_states is not None:
-                out_emb = models[i].norm(hidden_states)
                 outputs_embeds.append(out_emb)
+
+                start = end
             else:
                 outputs_embeds.append(None)
 
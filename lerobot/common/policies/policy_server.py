@@ -0,0 +1,341 @@
+#!/usr/bin/env python
+
+# Copyright 2024 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Serve a single policy to several robots with dynamic batching.
+
+A `PolicyServer` hosts one `PreTrainedPolicy` and answers the `select_action` requests of several
+`PolicyClient`s (e.g. the `control_robot.py` processes of several arms running the same checkpoint) over a
+ZeroMQ socket, either a Unix socket ("ipc:///tmp/lerobot_policy_server") or a TCP one ("tcp://*:5560").
+
+Each client has its own rollout state (queues of observations and actions, warm-starts, ...), see
+`PreTrainedPolicy.get_rollout_state`. The requests received within a latency budget are batched: clients
+whose rollout states and observations have the same structure are served by a single call of
+`select_action` on their concatenated observations and states.
+
+Messages are multipart: a json header, followed by the raw bytes of the tensors it describes.
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from copy import copy, deepcopy
+from typing import Any, Hashable
+
+import numpy as np
+import torch
+import zmq
+from torch import Tensor
+
+from lerobot.common.policies.pretrained import PreTrainedPolicy
+from lerobot.common.policies.utils import get_autocast_dtype
+from lerobot.common.utils.utils import get_safe_torch_device
+from lerobot.configs.policies import PreTrainedConfig
+
+
+def encode_message(header: dict, batch: dict[str, Any] | None = None) -> list:
+    """Encodes `header` and a batch of tensors and json-serializable values (e.g. tasks) in frames."""
+    header = {**header, "tensors": [], "values": {}}
+    buffers = []
+    for key, value in (batch or {}).items():
+        if isinstance(value, Tensor):
+            value = value.detach().cpu()
+            if value.dtype == torch.bfloat16:
+                # bfloat16 has no numpy equivalent
+                value = value.float()
+            array = np.ascontiguousarray(value.numpy())
+            header["tensors"].append([key, array.dtype.str, list(array.shape)])
+            buffers.append(memoryview(array))
+        else:
+            header["values"][key] = value
+    return [json.dumps(header).encode(), *buffers]
+
+
+def decode_message(frames: list) -> tuple[dict, dict[str, Any]]:
+    """Decodes the header and the batch of a message encoded with `encode_message`."""
+    header = json.loads(frames[0])
+    batch = header.pop("values")
+    for (key, dtype, shape), buffer in zip(header.pop("tensors"), frames[1:], strict=True):
+        array = np.frombuffer(buffer, dtype=np.dtype(dtype)).reshape(shape)
+        # Copied since the buffer of the message is read-only
+        batch[key] = torch.from_numpy(array.copy())
+    return header, batch
+
+
+def get_rollout_state_signature(state: Any) -> Hashable:
+    """Returns the structure of a rollout state: the shapes of its tensors apart from their batch dimension,
+    and the other values it holds. States can only be merged when they have the same signature."""
+    if isinstance(state, Tensor):
+        return ("tensor", tuple(state.shape[1:]), state.dtype, state.device)
+    if isinstance(state, deque):
+        return ("deque", state.maxlen, tuple(get_rollout_state_signature(item) for item in state))
+    if isinstance(state, dict):
+        return ("dict", tuple((key, get_rollout_state_signature(item)) for key, item in state.items()))
+    if isinstance(state, (list, tuple)):
+        return (type(state).__name__, tuple(get_rollout_state_signature(item) for item in state))
+    return ("value", state)
+
+
+def merge_rollout_states(states: list[Any]) -> Any:
+    """Concatenates the tensors of rollout states of the same signature along their batch dimension."""
+    first = states[0]
+    if isinstance(first, Tensor):
+        return torch.cat(states)
+    if isinstance(first, deque):
+        return deque(
+            (merge_rollout_states(list(items)) for items in zip(*states, strict=True)), maxlen=first.maxlen
+        )
+    if isinstance(first, dict):
+        return {key: merge_rollout_states([state[key] for state in states]) for key in first}
+    if isinstance(first, (list, tuple)):
+        return type(first)(merge_rollout_states(list(items)) for items in zip(*states, strict=True))
+    return first
+
+
+def split_rollout_state(state: Any, batch_sizes: list[int]) -> list[Any]:
+    """Splits a merged rollout state into the states of batches of `batch_sizes`."""
+    if isinstance(state, Tensor):
+        return list(torch.split(state, batch_sizes))
+    if isinstance(state, deque):
+        splits = [split_rollout_state(item, batch_sizes) for item in state]
+        return [deque((split[i] for split in splits), maxlen=state.maxlen) for i in range(len(batch_sizes))]
+    if isinstance(state, dict):
+        splits = {key: split_rollout_state(item, batch_sizes) for key, item in state.items()}
+        return [{key: split[i] for key, split in splits.items()} for i in range(len(batch_sizes))]
+    if isinstance(state, (list, tuple)):
+        splits = [split_rollout_state(item, batch_sizes) for item in state]
+        return [type(state)(split[i] for split in splits) for i in range(len(batch_sizes))]
+    return [state] * len(batch_sizes)
+
+
+def get_batch_signature(batch: dict[str, Any]) -> Hashable:
+    """Returns the keys and the shapes (apart from the batch dimension) of the items of a batch."""
+    return tuple(
+        (key, tuple(value.shape[1:]), value.dtype) if isinstance(value, Tensor) else (key, type(value))
+        for key, value in batch.items()
+    )
+
+
+def merge_batches(batches: list[dict[str, Any]]) -> dict[str, Any]:
+    """Concatenates batches of the same signature. Non-tensor items (e.g. tasks) should be lists."""
+    return {
+        key: torch.cat([batch[key] for batch in batches])
+        if isinstance(value, Tensor)
+        else [item for batch in batches for item in batch[key]]
+        for key, value in batches[0].items()
+    }
+
+
+def get_batch_size(batch: dict[str, Any]) -> int:
+    return next(len(value) for value in batch.values() if isinstance(value, Tensor))
+
+
+class PolicyServer:
+    """
+    Hosts `policy` and serves the requests of `PolicyClient`s connected to `address`.
+
+    Requests are gathered until `max_batch_size` of them are pending, every known client has one pending,
+    or `batch_timeout_s` has elapsed since the first one, whichever comes first. This bounds the latency
+    added by the batching.
+
+    The rollout state of each client is created on its first request, and reset by `PolicyClient.reset`.
+    Requests of clients whose rollout states and observations have the same signature (see
+    `get_rollout_state_signature`) are batched. E.g. the clients of a policy predicting chunks of actions
+    which all need a new chunk are batched, while those which only pop an action from their queue are not.
+    """
+
+    def __init__(
+        self,
+        policy: PreTrainedPolicy,
+        address: str,
+        max_batch_size: int = 8,
+        batch_timeout_s: float = 0.005,
+    ):
+        if max_batch_size < 1:
+            raise ValueError(f"`max_batch_size` should be at least 1, got {max_batch_size}.")
+        if batch_timeout_s < 0:
+            raise ValueError(f"`batch_timeout_s` should be non-negative, got {batch_timeout_s}.")
+
+        self.policy = policy
+        self.address = address
+        self.max_batch_size = max_batch_size
+        self.batch_timeout_s = batch_timeout_s
+        self.device = get_safe_torch_device(policy.config.device)
+        self.amp_dtype = get_autocast_dtype(policy.config.precision)
+
+        self.policy.eval()
+        self.policy.reset()
+        self._initial_state = deepcopy(self.policy.get_rollout_state())
+        # Rollout state of each client, indexed by the identity of its socket
+        self.states: dict[bytes, Any] = {}
+
+        self.context = zmq.Context()
+        self.socket = self.context.socket(zmq.ROUTER)
+        self.socket.bind(address)
+        self.poller = zmq.Poller()
+        self.poller.register(self.socket, zmq.POLLIN)
+        self._stop_event = threading.Event()
+
+    def serve_forever(self) -> None:
+        """Serves requests until `stop` is called (e.g. from another thread)."""
+        logging.info(f"Serving {self.policy.name} policy at {self.address}")
+        while not self._stop_event.is_set():
+            if self.poller.poll(timeout=100):
+                self.process_requests(self._receive_requests())
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def close(self) -> None:
+        self.socket.close(linger=0)
+        self.context.term()
+
+    def _receive_requests(self) -> list[tuple[bytes, dict, dict[str, Any]]]:
+        requests = []
+        deadline = time.perf_counter() + self.batch_timeout_s
+        while len(requests) < self.max_batch_size:
+            try:
+                identity, *frames = self.socket.recv_multipart(zmq.NOBLOCK)
+            except zmq.Again:
+                # Stop waiting as soon as every known client has a pending request
+                pending_clients = {identity for identity, _, _ in requests}
+                remaining_ms = (deadline - time.perf_counter()) * 1000
+                if remaining_ms <= 0 or pending_clients.issuperset(self.states):
+                    break
+                if not self.poller.poll(timeout=remaining_ms):
+                    break
+                continue
+            header, batch = decode_message(frames)
+            requests.append((identity, header, batch))
+        return requests
+
+    def process_requests(self, requests: list[tuple[bytes, dict, dict[str, Any]]]) -> None:
+        groups: dict[Hashable, list[tuple[bytes, dict[str, Any]]]] = {}
+        for identity, header, batch in requests:
+            command = header["command"]
+            if command == "select_action":
+                if identity not in self.states:
+                    self.states[identity] = deepcopy(self._initial_state)
+                signature = (
+                    get_rollout_state_signature(self.states[identity]),
+                    get_batch_signature(batch),
+                )
+                groups.setdefault(signature, []).append((identity, batch))
+            elif command == "reset":
+                self.states[identity] = deepcopy(self._initial_state)
+                self._reply(identity, {"status": "ok"})
+            elif command == "close":
+                self.states.pop(identity, None)
+                self._reply(identity, {"status": "ok"})
+            else:
+                self._reply(identity, {"status": "error", "message": f"Unknown command '{command}'."})
+
+        for group in groups.values():
+            self._select_actions(group)
+
+    def _select_actions(self, requests: list[tuple[bytes, dict[str, Any]]]) -> None:
+        """Selects the actions of clients with rollout states and observations of the same signature."""
+        identities = [identity for identity, _ in requests]
+        batch_sizes = [get_batch_size(batch) for _, batch in requests]
+        try:
+            if len(requests) == 1:
+                state, batch = self.states[identities[0]], requests[0][1]
+            else:
+                state = merge_rollout_states([self.states[identity] for identity in identities])
+                batch = merge_batches([batch for _, batch in requests])
+            batch = {
+                key: value.to(self.device, non_blocking=True) if isinstance(value, Tensor) else value
+                for key, value in batch.items()
+            }
+
+            self.policy.set_rollout_state(state)
+            with (
+                torch.inference_mode(),
+                torch.autocast(device_type=self.device.type, dtype=self.amp_dtype)
+                if self.policy.config.use_amp
+                else nullcontext(),
+            ):
+                actions = self.policy.select_action(batch).to("cpu")
+            state = self.policy.get_rollout_state()
+        except Exception as e:
+            logging.exception("Failed to select the actions of a batch of clients.")
+            for identity in identities:
+                self._reply(identity, {"status": "error", "message": repr(e)})
+            return
+
+        states = [state] if len(requests) == 1 else split_rollout_state(state, batch_sizes)
+        for identity, client_state, client_actions in zip(
+            identities, states, torch.split(actions, batch_sizes), strict=True
+        ):
+            self.states[identity] = client_state
+            self._reply(identity, {"status": "ok"}, {"action": client_actions})
+
+    def _reply(self, identity: bytes, header: dict, batch: dict[str, Any] | None = None) -> None:
+        self.socket.send_multipart([identity, *encode_message(header, batch)])
+
+
+class PolicyClient:
+    """
+    Client of a `PolicyServer` hosting the policy of config `config`, which can be used in place of the
+    policy in `predict_action`.
+
+    The observations are prepared on CPU and sent to the server, which moves them to its own device, so the
+    client's copy of `config` uses the CPU without AMP. A request which isn't answered within `timeout_s`
+    raises a `TimeoutError`, and the client reconnects with a new rollout state.
+    """
+
+    def __init__(self, address: str, config: PreTrainedConfig, timeout_s: float = 10.0):
+        self.address = address
+        self.timeout_s = timeout_s
+        self.config = copy(config)
+        self.config.device = "cpu"
+        self.config.use_amp = False
+        self.context = zmq.Context()
+        self.socket = None
+        self._connect()
+
+    def _connect(self) -> None:
+        if self.socket is not None:
+            self.socket.close(linger=0)
+        self.socket = self.context.socket(zmq.DEALER)
+        self.socket.connect(self.address)
+
+    def _request(self, header: dict, batch: dict[str, Any] | None = None) -> dict[str, Any]:
+        self.socket.send_multipart(encode_message(header, batch))
+        if not self.socket.poll(timeout=self.timeout_s * 1000):
+            # A late answer would be mistaken for the answer to the next request
+            self._connect()
+            raise TimeoutError(f"The policy server at {self.address} didn't answer within {self.timeout_s}s.")
+        reply, batch = decode_message(self.socket.recv_multipart())
+        if reply["status"] != "ok":
+            raise RuntimeError(f"The policy server at {self.address} failed: {reply['message']}")
+        return batch
+
+    def select_action(self, batch: dict[str, Any]) -> Tensor:
+        return self._request({"command": "select_action"}, batch)["action"]
+
+    def reset(self) -> None:
+        self._request({"command": "reset"})
+
+    def close(self) -> None:
+        """Releases the rollout state of the client on the server, and closes the connection."""
+        try:
+            self._request({"command": "close"})
+        finally:
+            self.socket.close(linger=0)
+            self.context.term()
@@ -12,20 +12,22 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import abc
+import json
 import logging
 import os
 from pathlib import Path
-from typing import Type, TypeVar
+from typing import Any, Type, TypeVar
 
 import packaging
 import safetensors
 from huggingface_hub import hf_hub_download
-from huggingface_hub.constants import SAFETENSORS_SINGLE_FILE
+from huggingface_hub.constants import SAFETENSORS_INDEX_FILE, SAFETENSORS_SINGLE_FILE
 from huggingface_hub.errors import HfHubHTTPError
 from safetensors.torch import load_model as load_model_as_safetensor
 from safetensors.torch import save_model as save_model_as_safetensor
 from torch import Tensor, nn
 
+from lerobot.common.policies.quantization import quantize_policy
 from lerobot.common.utils.hub import HubMixin
 from lerobot.configs.policies import PreTrainedConfig
 
@@ -69,6 +71,8 @@ class PreTrainedPolicy(nn.Module, HubMixin, abc.ABC):
             raise TypeError(f"Class {cls.__name__} must define 'name'")
 
     def _save_pretrained(self, save_directory: Path) -> None:
+        if self.config.quantization is not None:
+            raise RuntimeError("Quantized policies can't be saved, save the float32 policy instead.")
         self.config._save_pretrained(save_directory)
         model_to_save = self.module if hasattr(self, "module") else self
         save_model_as_safetensor(model_to_save, str(save_directory / SAFETENSORS_SINGLE_FILE))
@@ -87,11 +91,16 @@ class PreTrainedPolicy(nn.Module, HubMixin, abc.ABC):
         local_files_only: bool = False,
         revision: str | None = None,
         strict: bool = False,
+        quantization: str | None = None,
         **kwargs,
     ) -> T:
         """
         The policy is set in evaluation mode by default using `policy.eval()` (dropout modules are
         deactivated). To train it, you should first set it back in training mode with `policy.train()`.
+
+        With `quantization` ("int8-dynamic" or "int8-weight-only", defaults to `config.quantization`), the
+        Linear and convolution layers of the policy are quantized after loading its float32 weights, to run it
+        on cpu (see `quantize_policy`).
         """
         if config is None:
             config = PreTrainedConfig.from_pretrained(
@@ -110,7 +119,12 @@ class PreTrainedPolicy(nn.Module, HubMixin, abc.ABC):
         if os.path.isdir(model_id):
             print("Loading weights from local directory")
             model_file = os.path.join(model_id, SAFETENSORS_SINGLE_FILE)
-            policy = cls._load_as_safetensor(instance, model_file, config.device, strict)
+            index_file = os.path.join(model_id, SAFETENSORS_INDEX_FILE)
+            if not os.path.isfile(model_file) and os.path.isfile(index_file):
+                # Sharded weights, e.g. from a checkpoint with deduplicated weights
+                policy = cls._load_as_sharded_safetensors(instance, index_file, config.device, strict)
+            else:
+                policy = cls._load_as_safetensor(instance, model_file, config.device, strict)
         else:
             try:
                 model_file = hf_hub_download(
@@ -132,6 +146,10 @@ class PreTrainedPolicy(nn.Module, HubMixin, abc.ABC):
 
         policy.to(config.device)
         policy.eval()
+        if quantization is None:
+            quantization = config.quantization
+        if quantization is not None:
+            quantize_policy(policy, quantization)
         return policy
 
     @classmethod
@@ -150,6 +168,28 @@ class PreTrainedPolicy(nn.Module, HubMixin, abc.ABC):
             safetensors.torch.load_model(model, model_file, strict=strict, device=map_location)
         return model
 
+    @classmethod
+    def _load_as_sharded_safetensors(cls, model: T, index_file: str, map_location: str, strict: bool) -> T:
+        with open(index_file) as f:
+            weight_map = json.load(f)["weight_map"]
+        state_dict = {}
+        for shard_file in sorted(set(weight_map.values())):
+            shard_path = os.path.join(os.path.dirname(index_file), shard_file)
+            state_dict.update(safetensors.torch.load_file(shard_path, device=map_location))
+
+        missing_keys, unexpected_keys = model.load_state_dict(state_dict, strict=False)
+        if strict:
+            # Tied weights are only saved once
+            model_state = model.state_dict()
+            loaded_ptrs = {model_state[key].data_ptr() for key in state_dict if key in model_state}
+            missing_keys = [key for key in missing_keys if model_state[key].data_ptr() not in loaded_ptrs]
+            if missing_keys or unexpected_keys:
+                raise RuntimeError(
+                    f"Error(s) in loading state_dict for {model.__class__.__name__}: "
+                    f"missing keys {missing_keys}, unexpected keys {unexpected_keys}."
+                )
+        return model
+
     # def generate_model_card(self, *args, **kwargs) -> ModelCard:
     #     card = ModelCard.from_template(
     #         card_data=self._hub_mixin_info.model_card_data,
@@ -160,6 +200,13 @@ class PreTrainedPolicy(nn.Module, HubMixin, abc.ABC):
     #     )
     #     return card
 
+    def get_compiled_modules(self) -> list[nn.Module]:
+        """
+        Returns the submodules compiled with `torch.compile` when `config.compile` is set. Their `forward`
+        should be the hot path of both `forward` and `select_action`, without graph breaks.
+        """
+        return []
+
     @abc.abstractmethod
     def get_optim_params(self) -> dict:
         """
@@ -197,3 +244,25 @@ class PreTrainedPolicy(nn.Module, HubMixin, abc.ABC):
         with caching.
         """
         raise NotImplementedError
+
+    def predict_action_chunk(self, batch: dict[str, Tensor]) -> Tensor:
+        """Return the whole (batch_size, chunk_size, action_dim) chunk of actions predicted from the current
+        observations, without going through (nor updating) the caches of `select_action`.
+
+        Only implemented by the policies which predict sequences of actions.
+        """
+        raise NotImplementedError(f"{self.__class__.__name__} doesn't predict chunks of actions.")
+
+    def get_rollout_state(self) -> dict[str, Any]:
+        """Return the state kept by `select_action` between the steps of a rollout (e.g. queues of
+        observations and actions), which `reset` re-initializes.
+
+        Its tensors have the batch dimension first, and can be nested in dicts, lists, tuples and deques.
+        This lets several rollouts share the policy by swapping their states with `set_rollout_state`, and
+        rollouts whose states have the same structure be batched by concatenating their tensors (see
+        `lerobot.common.policies.policy_server`). Stateless policies return an empty dict.
+        """
+        return {}
+
+    def set_rollout_state(self, state: dict[str, Any]) -> None:
+        """Restore a state returned by `get_rollout_state`, possibly merged with those of other rollouts."""
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+
+# Copyright 2024 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Int8 quantization of policies for inference on cpu.
+
+Quantization doesn't need calibration data, so quantized policies are built from their float32 checkpoints
+when loading them (see `PreTrainedPolicy.from_pretrained`), rather than exported to separate checkpoints.
+"""
+
+import logging
+from typing import Callable
+
+import torch
+import torch.nn.functional as F  # noqa: N812
+from torch import Tensor, nn
+
+from lerobot.configs.policies import QUANTIZATIONS
+
+
+def quantize_per_channel(weight: Tensor) -> tuple[Tensor, Tensor]:
+    """Symmetric int8 quantization of `weight` with one scale per output channel (its first dimension).
+
+    Returns:
+        The int8 weight, and the float32 scales broadcastable to it, such that weight ≈ int8_weight * scale.
+    """
+    weight = weight.detach().float()
+    max_abs = weight.flatten(1).abs().amax(dim=1).clamp(min=1e-8)
+    scale = (max_abs / 127).reshape(-1, *[1] * (weight.ndim - 1))
+    int8_weight = torch.round(weight / scale).clamp_(-127, 127).to(torch.int8)
+    return int8_weight, scale
+
+
+class Int8WeightOnlyLinear(nn.Module):
+    """Linear layer with int8 weights, which are dequantized on the fly."""
+
+    def __init__(self, linear: nn.Linear):
+        super().__init__()
+        self.in_features = linear.in_features
+        self.out_features = linear.out_features
+        int8_weight, scale = quantize_per_channel(linear.weight)
+        self.register_buffer("int8_weight", int8_weight)
+        self.register_buffer("scale", scale)
+        self.bias = linear.bias
+
+    def forward(self, x: Tensor) -> Tensor:
+        return F.linear(x, (self.int8_weight * self.scale).to(x.dtype), self.bias)
+
+    def extra_repr(self) -> str:
+        return f"in_features={self.in_features}, out_features={self.out_features}"
+
+
+class Int8WeightOnlyConv(nn.Module):
+    """Convolution layer (1D or 2D) with int8 weights, which are dequantized on the fly."""
+
+    def __init__(self, conv: nn.Conv1d | nn.Conv2d):
+        super().__init__()
+        int8_weight, scale = quantize_per_channel(conv.weight)
+        self.register_buffer("int8_weight", int8_weight)
+        self.register_buffer("scale", scale)
+        # The convolution keeps its hyperparameters and bias, and is applied with the dequantized weights
+        del conv.weight
+        self.conv = conv
+
+    def forward(self, x: Tensor) -> Tensor:
+        return self.conv._conv_forward(x, (self.int8_weight * self.scale).to(x.dtype), self.conv.bias)
+
+
+def _replace_modules(module: nn.Module, types: tuple[type, ...], make_replacement: Callable) -> None:
+    """Recursively replaces the submodules of `module` of one of the exact `types` with `make_replacement`.
+
+    Subclasses are left untouched, e.g. the output projection of `nn.MultiheadAttention` whose weight is
+    accessed directly by its parent.
+    """
+    for name, child in module.named_children():
+        if type(child) in types:
+            setattr(module, name, make_replacement(child))
+        else:
+            _replace_modules(child, types, make_replacement)
+
+
+@torch.no_grad()
+def quantize_policy(policy: nn.Module, quantization: str) -> None:
+    """Quantizes in-place the Linear and convolution layers of a float32 policy, to run it on cpu.
+
+    - "int8-dynamic": Linear layers are replaced by dynamically quantized ones, which quantize their inputs on
+      the fly and compute with int8 kernels (fbgemm on x86, qnnpack on ARM). PyTorch has no such kernels for
+      convolutions, which are quantized like with "int8-weight-only".
+    - "int8-weight-only": Linear and convolution layers store int8 weights, which are dequantized on the fly.
+      The computations are those of the float32 policy, with 4x smaller weights.
+
+    Weights are quantized symmetrically with one scale per output channel. The policy is moved to cpu and its
+    config is updated accordingly (`device` and `precision`). Quantized policies are only meant for inference,
+    and can't be trained nor saved.
+    """
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"`quantization` must be one of {QUANTIZATIONS}, got '{quantization}'.")
+
+    config = policy.config
+    if config.device != "cpu":
+        logging.warning(f"Quantized policies run on cpu. Switching from '{config.device}' to 'cpu'.")
+        config.device = "cpu"
+    if config.precision != "fp32":
+        logging.warning(f"Quantized policies run in float32. Switching from '{config.precision}' to 'fp32'.")
+        config.precision = "fp32"
+        config.use_amp = False
+    config.quantization = quantization
+
+    policy.to(device="cpu", dtype=torch.float32)
+    policy.eval()
+    if quantization == "int8-dynamic":
+        torch.ao.quantization.quantize_dynamic(policy, {nn.Linear}, dtype=torch.qint8, inplace=True)
+    else:
+        _replace_modules(policy, (nn.Linear,), Int8WeightOnlyLinear)
+    _replace_modules(policy, (nn.Conv1d, nn.Conv2d), Int8WeightOnlyConv)
@@ -88,8 +88,17 @@ class TDMPCPolicy(PreTrainedPolicy):
         for param in self.model_target.parameters():
             param.requires_grad = False
 
+        # Workspace of `plan`, kept across episodes.
+        self._plan_actions: Tensor | None = None
+
         self.reset()
 
+    def get_compiled_modules(self) -> list[nn.Module]:
+        # The TOLD model is queried through several methods during training, compile its components. Its
+        # `forward` is the value estimation of the trajectories sampled when planning.
+        model = self.model
+        return [model, model._encoder, model._dynamics, model._reward, model._pi, *model._Qs, model._V]
+
     def get_optim_params(self) -> dict:
         return self.parameters()
 
@@ -110,6 +119,15 @@ class TDMPCPolicy(PreTrainedPolicy):
         # CEM for the next step.
         self._prev_mean: torch.Tensor | None = None
 
+    def get_rollout_state(self) -> dict:
+        # `_prev_mean` is (horizon, batch, action_dim)
+        prev_mean = None if self._prev_mean is None else self._prev_mean.transpose(0, 1)
+        return {"queues": self._queues, "prev_mean": prev_mean}
+
+    def set_rollout_state(self, state: dict) -> None:
+        self._queues = state["queues"]
+        self._prev_mean = None if state["prev_mean"] is None else state["prev_mean"].transpose(0, 1)
+
     @torch.no_grad()
     def select_action(self, batch: dict[str, Tensor]) -> Tensor:
         """Select a single action given environment observations."""
@@ -162,85 +180,72 @@ class TDMPCPolicy(PreTrainedPolicy):
     def plan(self, z: Tensor) -> Tensor:
         """Plan sequence of actions using TD-MPC inference.
 
+        The sampled trajectories are written in place in a workspace which is reused across calls (see
+        `_get_plan_workspace`), and all of them are evaluated at once by `estimate_value`.
+
         Args:
             z: (batch, latent_dim,) tensor for the initial state.
         Returns:
             (horizon, batch, action_dim,) tensor for the planned trajectory of actions.
         """
-        device = get_device_from_parameters(self)
-
         batch_size = z.shape[0]
+        n_samples = self.config.n_gaussian_samples + self.config.n_pi_samples
 
-        # Sample Nπ trajectories from the policy.
-        pi_actions = torch.empty(
-            self.config.horizon,
-            self.config.n_pi_samples,
-            batch_size,
-            self.config.action_feature.shape[0],
-            device=device,
-        )
+        # (horizon, n_samples, batch, action_dim) trajectories: the gaussian samples followed by the policy
+        # samples.
+        actions = self._get_plan_workspace(z)
+        gaussian_actions = actions[:, : self.config.n_gaussian_samples]
+        pi_actions = actions[:, self.config.n_gaussian_samples :]
+
+        # Sample Nπ trajectories from the policy. They are the same for all the CEM iterations.
         if self.config.n_pi_samples > 0:
-            _z = einops.repeat(z, "b d -> n b d", n=self.config.n_pi_samples)
+            _z = z.expand(self.config.n_pi_samples, *z.shape)
             for t in range(self.config.horizon):
                 # Note: Adding a small amount of noise here doesn't hurt during inference and may even be
                 # helpful for CEM.
                 pi_actions[t] = self.model.pi(_z, self.config.min_std)
                 _z = self.model.latent_dynamics(_z, pi_actions[t])
 
-        # In the CEM loop we will need this for a call to estimate_value with the gaussian sampled
-        # trajectories.
-        z = einops.repeat(z, "b d -> n b d", n=self.config.n_gaussian_samples + self.config.n_pi_samples)
+        # In the CEM loop we will need this for a call to estimate_value with all the sampled trajectories.
+        # Expanding doesn't copy, the latents are only materialized by the first step of the rollout.
+        z = z.expand(n_samples, *z.shape)
 
         # Model Predictive Path Integral (MPPI) with the cross-entropy method (CEM) as the optimization
         # algorithm.
         # The initial mean and standard deviation for the cross-entropy method (CEM).
         mean = torch.zeros(
-            self.config.horizon, batch_size, self.config.action_feature.shape[0], device=device
+            self.config.horizon,
+            batch_size,
+            self.config.action_feature.shape[0],
+            device=actions.device,
+            dtype=actions.dtype,
         )
         # Maybe warm start CEM with the mean from the previous step.
         if self._prev_mean is not None:
             mean[:-1] = self._prev_mean[1:]
-        std = self.config.max_std * torch.ones_like(mean)
+        std = torch.full_like(mean, self.config.max_std)
 
         for _ in range(self.config.cem_iterations):
-            # Randomly sample action trajectories for the gaussian distribution.
-            std_normal_noise = torch.randn(
-                self.config.horizon,
-                self.config.n_gaussian_samples,
-                batch_size,
-                self.config.action_feature.shape[0],
-                device=std.device,
-            )
-            gaussian_actions = torch.clamp(mean.unsqueeze(1) + std.unsqueeze(1) * std_normal_noise, -1, 1)
+            # Randomly sample action trajectories for the gaussian distribution, in place.
+            gaussian_actions.normal_().mul_(std.unsqueeze(1)).add_(mean.unsqueeze(1)).clamp_(-1, 1)
 
             # Compute elite actions.
-            actions = torch.cat([gaussian_actions, pi_actions], dim=1)
-            value = self.estimate_value(z, actions).nan_to_num_(0)
-            elite_idxs = torch.topk(value, self.config.n_elites, dim=0).indices  # (n_elites, batch)
-            elite_value = value.take_along_dim(elite_idxs, dim=0)  # (n_elites, batch)
+            value = self.estimate_value(z, actions).nan_to_num_(0)  # (n_samples, batch)
+            # (n_elites, batch)
+            elite_value, elite_idxs = torch.topk(value, self.config.n_elites, dim=0)
             # (horizon, n_elites, batch, action_dim)
-            elite_actions = actions.take_along_dim(einops.rearrange(elite_idxs, "n b -> 1 n b 1"), dim=1)
+            elite_actions = actions.take_along_dim(elite_idxs[None, :, :, None], dim=1)
 
             # Update gaussian PDF parameters to be the (weighted) mean and standard deviation of the elites.
-            max_value = elite_value.max(0, keepdim=True)[0]  # (1, batch)
             # The weighting is a softmax over trajectory values. Note that this is not the same as the usage
-            # of Ω in eqn 4 of the TD-MPC paper. Instead it is the normalized version of it: s = Ω/ΣΩ. This
+            # of Ω in eqn 4 of the TD-MPC paper. Instead it is the normalized version of it: s = Ω/ΣΩ. This
             # makes the equations: μ = Σ(s⋅Γ), σ = Σ(s⋅(Γ-μ)²).
-            score = torch.exp(self.config.elite_weighting_temperature * (elite_value - max_value))
-            score /= score.sum(axis=0, keepdim=True)
+            score = torch.softmax(self.config.elite_weighting_temperature * elite_value, dim=0)
             # (horizon, batch, action_dim)
-            _mean = torch.sum(einops.rearrange(score, "n b -> n b 1") * elite_actions, dim=1)
-            _std = torch.sqrt(
-                torch.sum(
-                    einops.rearrange(score, "n b -> n b 1")
-                    * (elite_actions - einops.rearrange(_mean, "h b d -> h 1 b d")) ** 2,
-                    dim=1,
-                )
-            )
+            _mean = torch.einsum("nb,hnbd->hbd", score, elite_actions)
+            _std = torch.einsum("nb,hnbd->hbd", score, (elite_actions - _mean.unsqueeze(1)).square_()).sqrt_()
             # Update mean with an exponential moving average, and std with a direct replacement.
-            mean = (
-                self.config.gaussian_mean_momentum * mean + (1 - self.config.gaussian_mean_momentum) * _mean
-            )
+            mean.lerp_(_mean, 1 - self.config.gaussian_mean_momentum)
             std = _std.clamp_(self.config.min_std, self.config.max_std)
 
         # Keep track of the mean for warm-starting subsequent steps.
@@ -248,59 +253,43 @@ class TDMPCPolicy(PreTrainedPolicy):
 
         # Randomly select one of the elite actions from the last iteration of MPPI/CEM using the softmax
         # scores from the last iteration.
-        actions = elite_actions[:, torch.multinomial(score.T, 1).squeeze(), torch.arange(batch_size)]
+        actions = elite_actions[
+            :, torch.multinomial(score.T, 1).squeeze(1), torch.arange(batch_size, device=score.device)
+        ]
 
         return actions
 
+    def _get_plan_workspace(self, z: Tensor) -> Tensor:
+        """
+        Returns the (horizon, n_samples, batch, action_dim) buffer of the trajectories sampled by `plan`,
+        which is only allocated again when the batch size, device or dtype of the latents `z` change.
+        """
+        shape = (
+            self.config.horizon,
+            self.config.n_gaussian_samples + self.config.n_pi_samples,
+            z.shape[0],
+            self.config.action_feature.shape[0],
+        )
+        if (
+            self._plan_actions is None
+            or self._plan_actions.shape != shape
+            or self._plan_actions.dtype != z.dtype
+            or self._plan_actions.device != z.device
+        ):
+            self._plan_actions = torch.empty(shape, device=z.device, dtype=z.dtype)
+        return self._plan_actions
+
     @torch.no_grad()
     def estimate_value(self, z: Tensor, actions: Tensor):
-        """Estimates the value of a trajectory as per eqn 4 of the FOWM paper.
+        """Estimates the value of a trajectory as per eqn 4 of the FOWM paper (see `TDMPCTOLD.forward`).
 
         Args:
-            z: (batch, latent_dim) tensor of initial latent states.
-            actions: (horizon, batch, action_dim) tensor of action trajectories.
+            z: (*, latent_dim) tensor of initial latent states.
+            actions: (horizon, *, action_dim) tensor of action trajectories.
         Returns:
-            (batch,) tensor of values.
+            (*,) tensor of values.
         """
-        # Initialize return and running discount factor.
-        G, running_discount = 0, 1
-        # Iterate over the actions in the trajectory to simulate the trajectory using the latent dynamics
-        # model. Keep track of return.
-        for t in range(actions.shape[0]):
-            # We will compute the reward in a moment. First compute the uncertainty regularizer from eqn 4
-            # of the FOWM paper.
-            if self.config.uncertainty_regularizer_coeff > 0:
-                regularization = -(
-                    self.config.uncertainty_regularizer_coeff * self.model.Qs(z, actions[t]).std(0)
-                )
-            else:
-                regularization = 0
-            # Estimate the next state (latent) and reward.
-            z, reward = self.model.latent_dynamics_and_reward(z, actions[t])
-            # Update the return and running discount.
-            G += running_discount * (reward + regularization)
-            running_discount *= self.config.discount
-        # Add the estimated value of the final state (using the minimum for a conservative estimate).
-        # Do so by predicting the next action, then taking a minimum over the ensemble of state-action value
-        # estimators.
-        # Note: This small amount of added noise seems to help a bit at inference time as observed by success
-        # metrics over 50 episodes of xarm_lift_medium_replay.
-        next_action = self.model.pi(z, self.config.min_std)  # (batch, action_dim)
-        terminal_values = self.model.Qs(z, next_action)  # (ensemble, batch)
-        # Randomly choose 2 of the Qs for terminal value estimation (as in App C. of the FOWM paper).
-        if self.config.q_ensemble_size > 2:
-            G += (
-                running_discount
-                * torch.min(terminal_values[torch.randint(0, self.config.q_ensemble_size, size=(2,))], dim=0)[
-                    0
-                ]
-            )
-        else:
-            G += running_discount * torch.min(terminal_values, dim=0)[0]
-        # Finally, also regularize the terminal value.
-        if self.config.uncertainty_regularizer_coeff > 0:
-            G -= running_discount * self.config.uncertainty_regularizer_coeff * terminal_values.std(0)
-        return G
+        return self.model(z, actions)
 
     def forward(self, batch: dict[str, Tensor]) -> tuple[Tensor, dict]:
         """Run the batch through the model and compute the loss.
@@ -356,7 +345,7 @@ class TDMPCPolicy(PreTrainedPolicy):
         # Compute Q and V value predictions based on the latent rollout.
         q_preds_ensemble = self.model.Qs(z_preds[:-1], action)  # (ensemble, horizon, batch)
         v_preds = self.model.V(z_preds[:-1])
-        info.update({"Q": q_preds_ensemble.mean().item(), "V": v_preds.mean().item()})
+        info.update({"Q": q_preds_ensemble.detach().mean(), "V": v_preds.detach().mean()})
 
         # Compute various targets with stopgrad.
         with torch.no_grad():
@@ -490,12 +479,12 @@ class TDMPCPolicy(PreTrainedPolicy):
 
         info.update(
             {
-                "consistency_loss": consistency_loss.item(),
-                "reward_loss": reward_loss.item(),
-                "Q_value_loss": q_value_loss.item(),
-                "V_value_loss": v_value_loss.item(),
-                "pi_loss": pi_loss.item(),
-                "sum_loss": loss.item() * self.config.horizon,
+                "consistency_loss": consistency_loss.detach(),
+                "reward_loss": reward_loss.detach(),
+                "Q_value_loss": q_value_loss.detach(),
+                "V_value_loss": v_value_loss.detach(),
+                "pi_loss": pi_loss.detach(),
+                "sum_loss": loss.detach() * self.config.horizon,
             }
         )
 
@@ -600,6 +589,51 @@ class TDMPCTOLD(nn.Module):
             nn.init.zeros_(m[-1].weight)
             nn.init.zeros_(m[-1].bias)  # this has already been done, but keep this line here for good measure
 
+    def forward(self, z: Tensor, actions: Tensor) -> Tensor:
+        """Estimates the value of trajectories as per eqn 4 of the FOWM paper.
+
+        This is the hot path of planning with MPPI/CEM. The trajectories of all the samples are rolled out
+        together, with a single input to the dynamics, reward and Q networks per step.
+
+        Args:
+            z: (*, latent_dim) tensor of initial latent states.
+            actions: (horizon, *, action_dim) tensor of action trajectories.
+        Returns:
+            (*,) tensor of values.
+        """
+        # Initialize return and running discount factor.
+        G, running_discount = 0, 1
+        # Iterate over the actions in the trajectory to simulate the trajectory using the latent dynamics
+        # model. Keep track of return.
+        for t in range(actions.shape[0]):
+            x = torch.cat([z.expand(*actions.shape[1:-1], -1), actions[t]], dim=-1)
+            reward = self._reward(x).squeeze(-1)
+            # Uncertainty regularizer from eqn 4 of the FOWM paper.
+            if self.config.uncertainty_regularizer_coeff > 0:
+                reward = reward - self.config.uncertainty_regularizer_coeff * self._q_ensemble(x).std(0)
+            # Estimate the next state (latent).
+            z = self._dynamics(x)
+            # Update the return and running discount.
+            G = G + running_discount * reward
+            running_discount *= self.config.discount
+        # Add the estimated value of the final state (using the minimum for a conservative estimate).
+        # Do so by predicting the next action, then taking a minimum over the ensemble of state-action value
+        # estimators.
+        # Note: This small amount of added noise seems to help a bit at inference time as observed by success
+        # metrics over 50 episodes of xarm_lift_medium_replay.
+        next_action = self.pi(z, self.config.min_std)  # (*, action_dim)
+        terminal_values = self.Qs(z, next_action)  # (ensemble, *)
+        # Randomly choose 2 of the Qs for terminal value estimation (as in App C. of the FOWM paper).
+        if self.config.q_ensemble_size > 2:
+            idxs = torch.randint(0, self.config.q_ensemble_size, size=(2,), device=terminal_values.device)
+            G = G + running_discount * terminal_values[idxs].min(dim=0)[0]
+        else:
+            G = G + running_discount * terminal_values.min(dim=0)[0]
+        # Finally, also regularize the terminal value.
+        if self.config.uncertainty_regularizer_coeff > 0:
+            G = G - running_discount * self.config.uncertainty_regularizer_coeff * terminal_values.std(0)
+        return G
+
     def encode(self, obs: dict[str, Tensor]) -> Tensor:
         """Encodes an observation into its latent representation."""
         return self._encoder(obs)
@@ -672,7 +706,7 @@ class TDMPCTOLD(nn.Module):
         """
         x = torch.cat([z, a], dim=-1)
         if not return_min:
-            return torch.stack([q(x).squeeze(-1) for q in self._Qs], dim=0)
+            return self._q_ensemble(x)
         else:
             if len(self._Qs) > 2:  # noqa: SIM108
                 Qs = [self._Qs[i] for i in np.random.choice(len(self._Qs), size=2)]
@@ -680,6 +714,10 @@ class TDMPCTOLD(nn.Module):
                 Qs = self._Qs
             return torch.stack([q(x).squeeze(-1) for q in Qs], dim=0).min(dim=0)[0]
 
+    def _q_ensemble(self, x: Tensor) -> Tensor:
+        """Predicts the (q_ensemble, *) state-action values of the (*, latent_dim + action_dim) inputs `x`."""
+        return torch.stack([q(x).squeeze(-1) for q in self._Qs], dim=0)
+
 
 class TDMPCObservationEncoder(nn.Module):
     """Encode image and/or state vector observations."""
@@ -794,6 +832,8 @@ def random_shifts_aug(x: Tensor, max_random_shift_ratio: float) -> Tensor:
 
 def update_ema_parameters(ema_net: nn.Module, net: nn.Module, alpha: float):
     """Update EMA parameters in place with ema_param <- alpha * ema_param + (1 - alpha) * param."""
+    ema_params = []
+    params = []
     for ema_module, module in zip(ema_net.modules(), net.modules(), strict=True):
         for (n_p_ema, p_ema), (n_p, p) in zip(
             ema_module.named_parameters(recurse=False), module.named_parameters(recurse=False), strict=True
@@ -803,10 +843,15 @@ def update_ema_parameters(ema_net: nn.Module, net: nn.Module, alpha: float):
                 raise RuntimeError("Dict parameter not supported")
             if isinstance(module, nn.modules.batchnorm._BatchNorm) or not p.requires_grad:
                 # Copy BatchNorm parameters, and non-trainable parameters directly.
-                p_ema.copy_(p.to(dtype=p_ema.dtype).data)
-            with torch.no_grad():
-                p_ema.mul_(alpha)
-                p_ema.add_(p.to(dtype=p_ema.dtype).data, alpha=1 - alpha)
+                with torch.no_grad():
+                    p_ema.copy_(p.to(dtype=p_ema.dtype).data)
+            else:
+                ema_params.append(p_ema)
+                params.append(p.to(dtype=p_ema.dtype).data)
+    if len(ema_params) > 0:
+        # All the parameters are updated at once with fused kernels
+        with torch.no_grad():
+            torch._foreach_lerp_(ema_params, params, 1 - alpha)
 
 
 def flatten_forward_unflatten(fn: Callable[[Tensor], Tensor], image_tensor: Tensor) -> Tensor:
@@ -14,9 +14,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
+
 import torch
 from torch import nn
 
+from lerobot.common.constants import COMPILE_CACHE_DIR
+from lerobot.common.policies.pretrained import PreTrainedPolicy
+
 
 def populate_queues(queues, batch):
     for key in batch:
@@ -65,3 +70,51 @@ def get_output_shape(module: nn.Module, input_shape: tuple) -> tuple:
     with torch.inference_mode():
         output = module(dummy_input)
     return tuple(output.shape)
+
+
+def crop_images(images: torch.Tensor, crop_shape: tuple[int, int], random: bool = False) -> torch.Tensor:
+    """Crops (*, H, W) images to (height, width) `crop_shape`, at their center or at a random location shared
+    by all the images, like `torchvision.transforms.CenterCrop` and `RandomCrop`.
+
+    The random location is kept on the device of the images, instead of being read back as python integers
+    like torchvision does, so that random cropping doesn't cause graph breaks with `torch.compile`.
+    """
+    height, width = images.shape[-2:]
+    crop_height, crop_width = crop_shape
+    if not random:
+        top = int(round((height - crop_height) / 2.0))
+        left = int(round((width - crop_width) / 2.0))
+        return images[..., top : top + crop_height, left : left + crop_width]
+
+    top = torch.randint(0, height - crop_height + 1, (1,), device=images.device)
+    left = torch.randint(0, width - crop_width + 1, (1,), device=images.device)
+    rows = top + torch.arange(crop_height, device=images.device)
+    cols = left + torch.arange(crop_width, device=images.device)
+    return images[..., rows[:, None], cols]
+
+
+def get_autocast_dtype(precision: str) -> torch.dtype | None:
+    """Returns the dtype of `torch.autocast` for a policy's `precision`, or None when not autocasting."""
+    if precision in ["amp-bf16", "pure-bf16"]:
+        return torch.bfloat16
+    if precision == "amp-fp16":
+        return torch.float16
+    return None
+
+
+def compile_policy(policy: PreTrainedPolicy, mode: str | None = None) -> None:
+    """Compiles in-place the modules returned by `policy.get_compiled_modules()` with `torch.compile`.
+
+    Modules are compiled in-place, so that the keys of the policy's state dict are unchanged, and with
+    `fullgraph=True`, so that a graph break raises an error instead of silently splitting their graph.
+    Inductor's graph cache is stored in `COMPILE_CACHE_DIR` (unless TORCHINDUCTOR_CACHE_DIR is set), so that
+    compilation results are reused across processes. The batch dimension is assumed static, and is
+    automatically marked as dynamic by dynamo after being seen with a second size (e.g. the last partial batch
+    of an epoch), which costs a single recompilation.
+    """
+    import torch._inductor.config as inductor_config
+
+    os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", str(COMPILE_CACHE_DIR))
+    inductor_config.fx_graph_cache = True
+    for module in policy.get_compiled_modules():
+        module.compile(mode=mode, fullgraph=True)
@@ -82,6 +82,8 @@ class VQBeTConfig(PreTrainedConfig):
         gpt_n_head: Number of headers of GPT
         gpt_hidden_dim: Size of hidden dimensions of GPT
         dropout: Dropout rate for GPT
+        gpt_activation_checkpointing: Whether to recompute the activations of the GPT blocks during the
+            backward pass instead of storing them, trading compute for memory during training.
         mlp_hidden_dim: Size of hidden dimensions of offset header / bin prediction headers parts of VQ-BeT
         offset_loss_weight:  A constant that is multiplied to the offset loss
         primary_code_loss_weight: A constant that is multiplied to the primary code prediction loss
@@ -125,6 +127,7 @@ class VQBeTConfig(PreTrainedConfig):
     gpt_n_head: int = 8
     gpt_hidden_dim: int = 512
     dropout: float = 0.1
+    gpt_activation_checkpointing: bool = False
     mlp_hidden_dim: int = 1024
     offset_loss_weight: float = 10000.0
     primary_code_loss_weight: float = 5.0
@@ -198,3 +201,8 @@ class VQBeTConfig(PreTrainedConfig):
     @property
     def reward_delta_indices(self) -> None:
         return None
+
+    @property
+    def image_crop_shape(self) -> tuple[int, int] | None:
+        # A random crop can't be done ahead of the policy without changing the augmentation.
+        return self.crop_shape if not self.crop_is_random else None
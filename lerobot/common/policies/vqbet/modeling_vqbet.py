@@ -29,7 +29,12 @@ from torch import Tensor, nn
 
 from lerobot.common.policies.normalize import Normalize, Unnormalize
 from lerobot.common.policies.pretrained import PreTrainedPolicy
-from lerobot.common.policies.utils import get_device_from_parameters, get_output_shape, populate_queues
+from lerobot.common.policies.utils import (
+    crop_images,
+    get_device_from_parameters,
+    get_output_shape,
+    populate_queues,
+)
 from lerobot.common.policies.vqbet.configuration_vqbet import VQBeTConfig
 from lerobot.common.policies.vqbet.vqbet_utils import GPT, ResidualVQ
 
@@ -72,6 +77,10 @@ class VQBeTPolicy(PreTrainedPolicy):
 
         self.reset()
 
+    def get_compiled_modules(self) -> list[nn.Module]:
+        # The action head is left out: its residual VQ relies on data-dependent control flow.
+        return [self.vqbet.rgb_encoder, self.vqbet.policy]
+
     def get_optim_params(self) -> dict:
         vqvae_params = (
             list(self.vqbet.action_head.vqvae_model.encoder.parameters())
@@ -123,6 +132,12 @@ class VQBeTPolicy(PreTrainedPolicy):
             "action": deque(maxlen=self.config.action_chunk_size),
         }
 
+    def get_rollout_state(self) -> dict:
+        return {"queues": self._queues}
+
+    def set_rollout_state(self, state: dict) -> None:
+        self._queues = state["queues"]
+
     @torch.no_grad
     def select_action(self, batch: dict[str, Tensor]) -> Tensor:
         """Select a single action given environment observations.
@@ -470,7 +485,7 @@ class VQBeTHead(nn.Module):
             [len(torch.unique(metric[2][:, i])) for i in range(self.vqvae_model.vqvae_num_layers)]
         )
         n_different_combinations = len(torch.unique(metric[2], dim=0))
-        recon_l1_error = metric[0].detach().cpu().item()
+        recon_l1_error = metric[0].detach()
         self.vqvae_model.optimized_steps += 1
         # if we updated RVQ more than `n_vqvae_training_steps` steps, we freeze the RVQ part.
         if self.vqvae_model.optimized_steps >= n_vqvae_training_steps:
@@ -640,14 +655,14 @@ class VQBeTHead(nn.Module):
 
         loss_dict = {
             "loss": loss,
-            "classification_loss": cbet_loss.detach().cpu().item(),
-            "offset_loss": offset_loss.detach().cpu().item(),
-            "equal_primary_code_rate": equal_primary_code_rate.detach().cpu().item(),
-            "equal_secondary_code_rate": equal_secondary_code_rate.detach().cpu().item(),
-            "vq_action_error": vq_action_error.detach().cpu().item(),
-            "offset_action_error": offset_action_error.detach().cpu().item(),
-            "action_error_max": action_error_max.detach().cpu().item(),
-            "action_mse_error": action_mse_error.detach().cpu().item(),
+            "classification_loss": cbet_loss.detach(),
+            "offset_loss": offset_loss.detach(),
+            "equal_primary_code_rate": equal_primary_code_rate.detach(),
+            "equal_secondary_code_rate": equal_secondary_code_rate.detach(),
+            "vq_action_error": vq_action_error.detach(),
+            "offset_action_error": offset_action_error.detach(),
+            "action_error_max": action_error_max.detach(),
+            "action_mse_error": action_mse_error.detach(),
         }
         return loss_dict
 
@@ -665,12 +680,8 @@ class VQBeTRgbEncoder(nn.Module):
         # Set up optional preprocessing.
         if config.crop_shape is not None:
             self.do_crop = True
-            # Always use center crop for eval
-            self.center_crop = torchvision.transforms.CenterCrop(config.crop_shape)
-            if config.crop_is_random:
-                self.maybe_random_crop = torchvision.transforms.RandomCrop(config.crop_shape)
-            else:
-                self.maybe_random_crop = self.center_crop
+            self.crop_shape = config.crop_shape
+            self.crop_is_random = config.crop_is_random
         else:
             self.do_crop = False
 
@@ -717,11 +728,8 @@ class VQBeTRgbEncoder(nn.Module):
         """
         # Preprocess: maybe crop (if it was set up in the __init__).
         if self.do_crop:
-            if self.training:  # noqa: SIM108
-                x = self.maybe_random_crop(x)
-            else:
-                # Always use center crop for eval.
-                x = self.center_crop(x)
+            # Always use center crop for eval.
+            x = crop_images(x, self.crop_shape, random=self.crop_is_random and self.training)
         # Extract backbone feature.
         x = torch.flatten(self.pool(self.backbone(x)), start_dim=1)
         # Final linear layer with non-linearity.
@@ -861,7 +869,7 @@ class VqVae(nn.Module):
             encoder_loss.clone().detach(),
             vq_loss_state.clone().detach(),
             vq_code,
-            rep_loss.item(),
+            rep_loss.detach(),
         )
         return rep_loss, metric
 
@@ -29,6 +29,7 @@ from einops import pack, rearrange, reduce, repeat, unpack
 from torch import einsum, nn
 from torch.cuda.amp import autocast
 from torch.optim import Optimizer
+from torch.utils.checkpoint import checkpoint
 
 from lerobot.common.policies.vqbet.configuration_vqbet import VQBeTConfig
 
@@ -215,7 +216,10 @@ class GPT(nn.Module):
         pos_emb = self.transformer.wpe(pos)  # position embeddings of shape (1, t, gpt_hidden_dim)
         x = self.transformer.drop(tok_emb + pos_emb)
         for block in self.transformer.h:
-            x = block(x)
+            if self.config.gpt_activation_checkpointing and self.training:
+                x = checkpoint(block, x, use_reentrant=False)
+            else:
+                x = block(x)
         x = self.transformer.ln_f(x)
         logits = self.lm_head(x)
         return logits
@@ -87,6 +87,15 @@ class RecordControlConfig(ControlConfig):
     play_sounds: bool = True
     # Resume recording on an existing dataset.
     resume: bool = False
+    # Compute the next chunk of actions of the policy in the background while the current one is executed,
+    # once no more than `async_refill_threshold` actions are left (half of `chunk_size` by default).
+    # Only supported by policies predicting chunks of actions (e.g. ACT, pi0). The policy's `n_action_steps`
+    # and ACT's temporal ensembling are then ignored (see `AsyncActionChunkInference`).
+    async_inference: bool = False
+    async_refill_threshold: int | None = None
+    # Address of a policy server (see lerobot/scripts/serve_policy.py) hosting the policy, which is then not
+    # loaded by this process, e.g. "ipc:///tmp/lerobot_policy_server". `policy` still provides its config.
+    policy_server: str | None = None
 
     def __post_init__(self):
         # HACK: We parse again the cli args here to get the pretrained path if there was one.
@@ -96,6 +105,12 @@ class RecordControlConfig(ControlConfig):
             self.policy = PreTrainedConfig.from_pretrained(policy_path, cli_overrides=cli_overrides)
             self.policy.pretrained_path = policy_path
 
+        if self.policy_server is not None:
+            if self.policy is None:
+                raise ValueError("The config of the policy served at `policy_server` should be provided.")
+            if self.async_inference:
+                raise ValueError("`async_inference` isn't supported with a `policy_server`.")
+
 
 @ControlConfig.register_subclass("replay")
 @dataclass
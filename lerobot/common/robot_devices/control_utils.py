@@ -18,8 +18,11 @@
 
 
 import logging
+import queue
+import threading
 import time
 import traceback
+from collections import deque
 from contextlib import nullcontext
 from copy import copy
 from functools import cache
@@ -101,19 +104,24 @@ def is_headless():
         return True
 
 
-def predict_action(observation, policy, device, use_amp):
+def prepare_observation(observation, device):
     observation = copy(observation)
+    # Convert to pytorch format: channel first and float32 in [0,1] with batch dimension
+    for name in observation:
+        if "image" in name:
+            observation[name] = observation[name].type(torch.float32) / 255
+            observation[name] = observation[name].permute(2, 0, 1).contiguous()
+        observation[name] = observation[name].unsqueeze(0)
+        observation[name] = observation[name].to(device)
+    return observation
+
+
+def predict_action(observation, policy, device, use_amp):
     with (
         torch.inference_mode(),
         torch.autocast(device_type=device.type) if device.type == "cuda" and use_amp else nullcontext(),
     ):
-        # Convert to pytorch format: channel first and float32 in [0,1] with batch dimension
-        for name in observation:
-            if "image" in name:
-                observation[name] = observation[name].type(torch.float32) / 255
-                observation[name] = observation[name].permute(2, 0, 1).contiguous()
-            observation[name] = observation[name].unsqueeze(0)
-            observation[name] = observation[name].to(device)
+        observation = prepare_observation(observation, device)
 
         # Compute the next action with the policy
         # based on the current observation
@@ -128,6 +136,131 @@ def predict_action(observation, policy, device, use_amp):
     return action
 
 
+def predict_action_chunk(observation, policy, device, use_amp):
+    with (
+        torch.inference_mode(),
+        torch.autocast(device_type=device.type) if device.type == "cuda" and use_amp else nullcontext(),
+    ):
+        observation = prepare_observation(observation, device)
+        # Remove batch dimension and move to cpu: (chunk_size, action_dim)
+        actions = policy.predict_action_chunk(observation).squeeze(0).to("cpu")
+    return actions
+
+
+class AsyncActionChunkInference:
+    """
+    Runs the inference of the chunks of actions of `policy` (see `PreTrainedPolicy.predict_action_chunk`) in
+    a background thread, so that the next chunk is computed while the current one is executed by the robot.
+
+    `select_action` is called once per control step with the latest observation. It returns the next action
+    of the current chunk, and requests a new chunk computed from this observation when no more than
+    `refill_threshold` actions are left. Once computed, the new chunk replaces the remaining actions, after
+    discarding its first actions: those of the control steps elapsed during the inference, which are stale.
+
+    `select_action` only waits for the inference when no action is left, i.e. for the first chunk, or when the
+    inference takes longer than `refill_threshold` control steps. Otherwise, it returns immediately.
+
+    `refill_threshold` defaults to half of the chunk predicted by the policy (`chunk_size`), rather than of
+    `n_action_steps`, which is 1 with ACT's temporal ensembling and would make every inference blocking.
+
+    Since the chunks bypass `select_action`, the policy's own action queue is not used: `n_action_steps` is
+    ignored, and so is ACT's temporal ensembling (`temporal_ensemble_coeff`), the actions of consecutive
+    chunks are never averaged.
+    """
+
+    def __init__(
+        self,
+        policy: PreTrainedPolicy,
+        device: torch.device,
+        use_amp: bool,
+        refill_threshold: int | None = None,
+    ):
+        predict_action_chunk = getattr(type(policy), "predict_action_chunk", None)
+        if predict_action_chunk is None or predict_action_chunk is PreTrainedPolicy.predict_action_chunk:
+            raise ValueError(
+                f"Async inference requires a policy predicting chunks of actions (e.g. ACT, pi0), but "
+                f"{type(policy).__name__} doesn't implement `predict_action_chunk`."
+            )
+        if refill_threshold is None:
+            refill_threshold = policy.config.chunk_size // 2
+        if refill_threshold < 0:
+            raise ValueError(f"`refill_threshold` should be non-negative, got {refill_threshold}.")
+
+        self.policy = policy
+        self.device = device
+        self.use_amp = use_amp
+        self.refill_threshold = refill_threshold
+        self.actions = deque()
+        # Number of actions returned by `select_action` so far
+        self.step = 0
+        self.pending = False
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.thread = threading.Thread(target=self._worker_loop, daemon=True)
+        self.thread.start()
+        self._stopped = False
+
+    def _worker_loop(self) -> None:
+        while True:
+            item = self.requests.get()
+            if item is None:
+                break
+            observation, step = item
+            try:
+                actions = predict_action_chunk(observation, self.policy, self.device, self.use_amp)
+            except Exception as e:
+                # Raised in the main thread by `select_action`
+                self.results.put(e)
+                continue
+            self.results.put((actions, step))
+
+    def _request(self, observation) -> None:
+        self.requests.put((observation, self.step))
+        self.pending = True
+
+    def select_action(self, observation) -> torch.Tensor:
+        if not self.pending and len(self.actions) <= self.refill_threshold:
+            self._request(observation)
+
+        while self.pending:
+            try:
+                result = self.results.get(block=len(self.actions) == 0)
+            except queue.Empty:
+                break
+            self.pending = False
+            if isinstance(result, Exception):
+                raise RuntimeError("Inference of a chunk of actions failed in the background.") from result
+
+            actions, step = result
+            actions = actions[self.step - step :]
+            if len(actions) > 0:
+                self.actions = deque(actions)
+            elif len(self.actions) == 0:
+                # The whole chunk is stale, predict a new one from the latest observation
+                self._request(observation)
+
+        self.step += 1
+        return self.actions.popleft()
+
+    def reset(self) -> None:
+        """Discards the remaining actions and the chunk being computed, to be called when the environment is
+        reset."""
+        if self.pending:
+            self.results.get()
+            self.pending = False
+        self.actions.clear()
+        self.step = 0
+        self.policy.reset()
+
+    def stop(self) -> None:
+        if self._stopped:
+            return
+
+        self.requests.put(None)
+        self.thread.join()
+        self._stopped = True
+
+
 def init_keyboard_listener():
     # Allow to exit early while recording an episode or resetting the environment,
     # by tapping the right arrow key '->'. This might require a sudo permission
@@ -196,6 +329,8 @@ def record_episode(
     policy,
     fps,
     single_task,
+    async_inference=False,
+    async_refill_threshold=None,
 ):
     control_loop(
         robot=robot,
@@ -207,6 +342,8 @@ def record_episode(
         fps=fps,
         teleoperate=policy is None,
         single_task=single_task,
+        async_inference=async_inference,
+        async_refill_threshold=async_refill_threshold,
     )
 
 
@@ -221,6 +358,8 @@ def control_loop(
     policy: PreTrainedPolicy = None,
     fps: int | None = None,
     single_task: str | None = None,
+    async_inference: bool = False,
+    async_refill_threshold: int | None = None,
 ):
     # TODO(rcadene): Add option to record logs
     if not robot.is_connected:
@@ -241,6 +380,12 @@ def control_loop(
     if dataset is not None and fps is not None and dataset.fps != fps:
         raise ValueError(f"The dataset fps should be equal to requested fps ({dataset['fps']} != {fps}).")
 
+    async_policy = None
+    if policy is not None and async_inference:
+        async_policy = AsyncActionChunkInference(
+            policy, get_safe_torch_device(policy.config.device), policy.config.use_amp, async_refill_threshold
+        )
+
     timestamp = 0
     start_episode_t = time.perf_counter()
     while timestamp < control_time_s:
@@ -251,10 +396,14 @@ def control_loop(
         else:
             observation = robot.capture_observation()
 
-            if policy is not None:
+            if async_policy is not None:
+                pred_action = async_policy.select_action(observation)
+            elif policy is not None:
                 pred_action = predict_action(
                     observation, policy, get_safe_torch_device(policy.config.device), policy.config.use_amp
                 )
+
+            if policy is not None:
                 # Action can eventually be clipped using `max_relative_target`,
                 # so action actually sent is saved in the dataset.
                 action = robot.send_action(pred_action)
@@ -282,6 +431,9 @@ def control_loop(
             events["exit_early"] = False
             break
 
+    if async_policy is not None:
+        async_policy.stop()
+
 
 def reset_environment(robot, events, reset_time_s, fps):
     # TODO(rcadene): refactor warmup_record and reset_environment
@@ -16,6 +16,9 @@
 import threading
 import time
 from contextlib import ContextDecorator
+from pathlib import Path
+
+import torch
 
 
 class TimeBenchmark(ContextDecorator):
@@ -25,9 +28,19 @@ class TimeBenchmark(ContextDecorator):
     This class supports both context manager and decorator usage, and is thread-safe for multithreaded
     environments.
 
+    Elapsed times are also summed over all the uses of the benchmark until `reset` is called, see `total`.
+
+    On cuda, work is executed asynchronously from the host, so measuring the host time spent in a block only
+    measures the time to launch its kernels. When `device` is a cuda device, the block is timed with cuda
+    events recorded on the current stream instead, which doesn't synchronize the host with the device. Elapsed
+    times are only read (waiting for the device to reach the end of the block) when accessing `result` or
+    `total`.
+
     Args:
         print: If True, prints the elapsed time upon exiting the context or completing the function. Defaults
         to False.
+        device: The device running the computations of the timed block. Defaults to None, which times the
+        block on the host.
 
     Examples:
 
@@ -68,25 +81,99 @@ class TimeBenchmark(ContextDecorator):
         Block took approximately 10.00 milliseconds
     """
 
-    def __init__(self, print=False):
+    def __init__(self, print=False, device: torch.device | str | None = None):
         self.local = threading.local()
         self.print_time = print
+        self.use_cuda_events = device is not None and torch.device(device).type == "cuda"
+
+    def _get_pending_events(self) -> list[tuple[torch.cuda.Event, torch.cuda.Event]]:
+        if not hasattr(self.local, "pending_events"):
+            self.local.pending_events = []
+        return self.local.pending_events
 
     def __enter__(self):
+        if self.use_cuda_events:
+            self.local.start_event = torch.cuda.Event(enable_timing=True)
+            self.local.start_event.record()
         self.local.start_time = time.perf_counter()
         return self
 
     def __exit__(self, *exc):
         self.local.end_time = time.perf_counter()
-        self.local.elapsed_time = self.local.end_time - self.local.start_time
+        if self.use_cuda_events:
+            end_event = torch.cuda.Event(enable_timing=True)
+            end_event.record()
+            self._get_pending_events().append((self.local.start_event, end_event))
+            self.local.elapsed_time = None
+        else:
+            self.local.elapsed_time = self.local.end_time - self.local.start_time
+            self.local.total_time = getattr(self.local, "total_time", 0.0) + self.local.elapsed_time
+        self.local.count = getattr(self.local, "count", 0) + 1
         if self.print_time:
-            print(f"Elapsed time: {self.local.elapsed_time:.4f} seconds")
+            print(f"Elapsed time: {self.result:.4f} seconds")
         return False
 
+    def _resolve_pending_events(self) -> None:
+        pending_events = self._get_pending_events()
+        if len(pending_events) == 0:
+            return
+        pending_events[-1][1].synchronize()
+        elapsed_times = [start.elapsed_time(end) / 1e3 for start, end in pending_events]
+        self.local.elapsed_time = elapsed_times[-1]
+        self.local.total_time = getattr(self.local, "total_time", 0.0) + sum(elapsed_times)
+        pending_events.clear()
+
+    def reset(self) -> None:
+        """Resets `total` and `count`."""
+        self._get_pending_events().clear()
+        self.local.total_time = 0.0
+        self.local.count = 0
+
     @property
     def result(self):
+        self._resolve_pending_events()
         return getattr(self.local, "elapsed_time", None)
 
+    @property
+    def total(self) -> float:
+        """Sum of the elapsed times of all the uses of the benchmark since the last `reset`."""
+        self._resolve_pending_events()
+        return getattr(self.local, "total_time", 0.0)
+
+    @property
+    def count(self) -> int:
+        """Number of uses of the benchmark since the last `reset`."""
+        return getattr(self.local, "count", 0)
+
     @property
     def result_ms(self):
         return self.result * 1e3
+
+
+def make_profiler(
+    output_dir: Path,
+    wait_steps: int,
+    warmup_steps: int,
+    active_steps: int,
+    record_shapes: bool = False,
+    profile_memory: bool = False,
+    with_stack: bool = False,
+    worker_name: str | None = None,
+) -> torch.profiler.profile:
+    """
+    Makes a `torch.profiler.profile` which, once started, records a trace of `active_steps` steps after
+    skipping `wait_steps` steps and warming up for `warmup_steps` steps. `profiler.step()` must be called at
+    the end of each step. The trace is written in `output_dir`, and can be opened with TensorBoard or
+    https://ui.perfetto.dev.
+    """
+    activities = [torch.profiler.ProfilerActivity.CPU]
+    if torch.cuda.is_available():
+        activities.append(torch.profiler.ProfilerActivity.CUDA)
+    return torch.profiler.profile(
+        activities=activities,
+        schedule=torch.profiler.schedule(wait=wait_steps, warmup=warmup_steps, active=active_steps, repeat=1),
+        on_trace_ready=torch.profiler.tensorboard_trace_handler(str(output_dir), worker_name=worker_name),
+        record_shapes=record_shapes,
+        profile_memory=profile_memory,
+        with_stack=with_stack,
+    )
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+# Copyright 2024 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+
+import torch
+import torch.distributed as dist
+
+from lerobot.common.utils.logging_utils import MetricsTracker
+
+
+def is_distributed() -> bool:
+    """Whether the current process is part of an initialized process group."""
+    return dist.is_available() and dist.is_initialized()
+
+
+def get_world_size() -> int:
+    return dist.get_world_size() if is_distributed() else 1
+
+
+def get_rank() -> int:
+    return dist.get_rank() if is_distributed() else 0
+
+
+def is_main_process() -> bool:
+    return get_rank() == 0
+
+
+def init_distributed(device: torch.device, backend: str | None = None) -> bool:
+    """
+    Initializes the default process group when the current process has been launched by `torchrun` (or any
+    launcher setting the `WORLD_SIZE`, `RANK`, `LOCAL_RANK`, `MASTER_ADDR` and `MASTER_PORT` environment
+    variables) with more than one process.
+
+    On cuda, each process is bound to the gpu matching its local rank, so that tensors and modules moved to
+    "cuda" end up on that gpu. The backend defaults to 'nccl' on cuda and 'gloo' otherwise.
+
+    Returns:
+        bool: Whether the process group was initialized.
+    """
+    if int(os.environ.get("WORLD_SIZE", 1)) <= 1:
+        return False
+
+    if device.type == "cuda":
+        torch.cuda.set_device(int(os.environ["LOCAL_RANK"]))
+    if backend is None:
+        backend = "nccl" if device.type == "cuda" else "gloo"
+    dist.init_process_group(backend=backend)
+    return True
+
+
+def cleanup_distributed() -> None:
+    if is_distributed():
+        dist.destroy_process_group()
+
+
+def barrier() -> None:
+    if is_distributed():
+        dist.barrier()
+
+
+def all_reduce_metrics(metrics: MetricsTracker, device: torch.device) -> None:
+    """
+    Averages the meters of `metrics` over all processes, weighting each process by its number of updates.
+    This is a collective operation: it must be called by all processes.
+    """
+    if not is_distributed():
+        return
+
+    metrics.sync()
+    meters = list(metrics.metrics.values())
+    # (num_meters, 2): sum and count of each meter
+    stats = torch.tensor([[m.sum, m.count] for m in meters], dtype=torch.float64, device=device)
+    dist.all_reduce(stats, op=dist.ReduceOp.SUM)
+    for m, (total, count) in zip(meters, stats.tolist(), strict=True):
+        m.sum = total
+        m.count = count
+        m.avg = total / count if count > 0 else 0.0
@@ -15,6 +15,8 @@
 # limitations under the License.
 from typing import Any
 
+import torch
+
 from lerobot.common.utils.utils import format_big_number
 
 
@@ -22,6 +24,9 @@ class AverageMeter:
     """
     Computes and stores the average and current value
     Adapted from https://github.com/pytorch/examples/blob/main/imagenet/main.py
+
+    Values can be given as (scalar) tensors, in which case they are accumulated on their device without
+    synchronizing with the host. They are only copied to the host when the average is read, through `sync`.
     """
 
     def __init__(self, name: str, fmt: str = ":f"):
@@ -35,13 +40,33 @@ class AverageMeter:
         self.sum = 0.0
         self.count = 0.0
 
-    def update(self, val: float, n: int = 1) -> None:
+    def update(self, val: float | torch.Tensor, n: int = 1) -> None:
+        if isinstance(val, torch.Tensor):
+            # Accumulated in full precision, e.g. for losses computed with bf16 autocast
+            val = val.detach().float()
         self.val = val
         self.sum += val * n
         self.count += n
-        self.avg = self.sum / self.count
+        if not self.is_pending():
+            self.avg = self.sum / self.count
+
+    def is_pending(self) -> bool:
+        """Whether some values are still accumulated on device."""
+        return isinstance(self.sum, torch.Tensor) or isinstance(self.val, torch.Tensor)
+
+    def sync(self) -> None:
+        """Copies the values accumulated on device to the host, which waits for the computations producing
+        them to be done."""
+        if not self.is_pending():
+            return
+        if isinstance(self.val, torch.Tensor):
+            self.val = self.val.item()
+        if isinstance(self.sum, torch.Tensor):
+            self.sum = self.sum.item()
+        self.avg = self.sum / self.count if self.count > 0 else 0.0
 
     def __str__(self):
+        self.sync()
         fmtstr = "{name}:{avg" + self.fmt + "}"
         return fmtstr.format(**self.__dict__)
 
@@ -60,9 +85,9 @@ class MetricsTracker:
     # update metrics derived from step (samples, episodes, epochs) at each training step
     train_metrics.step()
 
-    # update various metrics
+    # update various metrics, possibly with device tensors which are only synchronized when displayed
     loss = policy.forward(batch)
-    train_metrics.loss = loss
+    train_metrics.loss = loss.detach()
 
     # display current metrics
     logging.info(train_metrics)
@@ -123,12 +148,13 @@ class MetricsTracker:
         else:
             raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{name}'")
 
-    def step(self) -> None:
+    def step(self, num_samples: int | None = None) -> None:
         """
-        Updates metrics that depend on 'step' for one step.
+        Updates metrics that depend on 'step' for one step, during which `num_samples` samples were seen
+        (defaults to the batch size).
         """
         self.steps += 1
-        self.samples += self._batch_size
+        self.samples += num_samples if num_samples is not None else self._batch_size
         self.episodes = self.samples / self._avg_samples_per_ep
         self.epochs = self.samples / self._num_frames
 
@@ -145,10 +171,16 @@ class MetricsTracker:
         ]
         return " ".join(display_list)
 
+    def sync(self) -> None:
+        """Copies the values accumulated on device by the meters to the host (see `AverageMeter.sync`)."""
+        for m in self.metrics.values():
+            m.sync()
+
     def to_dict(self, use_avg: bool = True) -> dict[str, int | float]:
         """
         Returns the current metric values (or averages if `use_avg=True`) as a dict.
         """
+        self.sync()
         return {
             "steps": self.steps,
             "samples": self.samples,
@@ -13,25 +13,54 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import contextlib
+import copy
+import hashlib
 import logging
+import os
+import queue
+import shutil
+import threading
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Callable
 
+import torch
+from huggingface_hub.constants import SAFETENSORS_INDEX_FILE, SAFETENSORS_SINGLE_FILE
+from safetensors.torch import load_model, save_file
 from termcolor import colored
 from torch.optim import Optimizer
 from torch.optim.lr_scheduler import LRScheduler
 
 from lerobot.common.constants import (
     CHECKPOINTS_DIR,
+    EMA_STATE,
     LAST_CHECKPOINT_LINK,
+    MASTER_WEIGHTS,
+    OPTIMIZER_PARAM_GROUPS,
+    OPTIMIZER_STATE,
     PRETRAINED_MODEL_DIR,
+    RNG_STATE,
+    SCHEDULER_STATE,
     TRAINING_STATE_DIR,
     TRAINING_STEP,
+    TRAINING_WEIGHTS,
+    WEIGHT_BLOBS_DIR,
+)
+from lerobot.common.datasets.utils import flatten_dict, load_json, write_json
+from lerobot.common.optim.ema import ExponentialMovingAverage, load_ema_state, save_ema_state
+from lerobot.common.optim.optimizers import (
+    MasterWeights,
+    load_master_weights_state,
+    load_optimizer_state,
+    save_master_weights_state,
+    save_optimizer_state,
 )
-from lerobot.common.datasets.utils import load_json, write_json
-from lerobot.common.optim.optimizers import load_optimizer_state, save_optimizer_state
 from lerobot.common.optim.schedulers import load_scheduler_state, save_scheduler_state
 from lerobot.common.policies.pretrained import PreTrainedPolicy
-from lerobot.common.utils.random_utils import load_rng_state, save_rng_state
+from lerobot.common.utils.random_utils import load_rng_state, save_rng_state, serialize_rng_state
+from lerobot.configs.default import CheckpointRetentionConfig
+from lerobot.configs.policies import PreTrainedConfig
 from lerobot.configs.train import TrainPipelineConfig
 
 
@@ -67,6 +96,52 @@ def update_last_checkpoint(checkpoint_dir: Path) -> Path:
     last_checkpoint_dir.symlink_to(relative_target)
 
 
+class FrozenDigestCache:
+    """
+    Digests of the frozen parameters of a policy, kept across the checkpoints of a run so that
+    `save_deduplicated_weights` doesn't hash them in full at every save.
+
+    A digest is reused as long as the fingerprint of its parameter (storage, layout and version counter, which
+    is bumped by in-place operations) is unchanged. Writes through `.data` don't bump the version counter, so
+    buffers, which are commonly updated this way (e.g. codebooks) and are small, are always hashed.
+    """
+
+    def __init__(self):
+        self.entries: dict[str, tuple[tuple, str]] = {}
+
+    @staticmethod
+    def get_fingerprints(policy: PreTrainedPolicy) -> dict[str, tuple]:
+        """Fingerprints of the frozen parameters of `policy`, taken when its state is copied."""
+        return {
+            key: (
+                param.device,
+                param.data_ptr(),
+                param.dtype,
+                tuple(param.shape),
+                param.stride(),
+                param._version,
+            )
+            for key, param in policy.named_parameters(remove_duplicate=False)
+            if not param.requires_grad
+        }
+
+    def get_digests(
+        self, model_state: dict[str, torch.Tensor], fingerprints: dict[str, tuple]
+    ) -> dict[str, str]:
+        """Returns the digests of the tensors of `model_state` with a fingerprint, only hashing those whose
+        fingerprint changed since the previous call."""
+        entries = {}
+        for key, fingerprint in fingerprints.items():
+            if key not in model_state:
+                continue
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != fingerprint:
+                entry = (fingerprint, _hash_tensor(key, model_state[key]))
+            entries[key] = entry
+        self.entries = entries
+        return {key: digest for key, (_, digest) in entries.items()}
+
+
 def save_checkpoint(
     checkpoint_dir: Path,
     step: int,
@@ -74,6 +149,11 @@ def save_checkpoint(
     policy: PreTrainedPolicy,
     optimizer: Optimizer,
     scheduler: LRScheduler | None = None,
+    blobs_dir: Path | None = None,
+    ema: ExponentialMovingAverage | None = None,
+    export_ema: bool = False,
+    master_weights: MasterWeights | None = None,
+    digest_cache: FrozenDigestCache | None = None,
 ) -> None:
     """This function creates the following directory structure:
 
@@ -83,11 +163,14 @@ def save_checkpoint(
     │   ├── model.safetensors  # policy weights
     │   └── train_config.json  # train config
     └── training_state/
+        ├── ema_state.safetensors  # moving average of the policy weights (if any)
+        ├── master_weights.safetensors  # float32 master weights of the optimizer (if any)
         ├── optimizer_param_groups.json  #  optimizer param groups
         ├── optimizer_state.safetensors  # optimizer state
         ├── rng_state.safetensors  # rng states
         ├── scheduler_state.json  # scheduler state
-        └── training_step.json  # training step
+        ├── training_step.json  # training step
+        └── training_weights.safetensors  # policy weights, when the averaged ones are exported
 
     Args:
         cfg (TrainPipelineConfig): The training config used for this run.
@@ -95,11 +178,44 @@ def save_checkpoint(
         policy (PreTrainedPolicy): The policy to save.
         optimizer (Optimizer | None, optional): The optimizer to save the state from. Defaults to None.
         scheduler (LRScheduler | None, optional): The scheduler to save the state from. Defaults to None.
+        blobs_dir (Path | None, optional): If provided, the policy weights are saved as shards deduplicated
+            in this directory (see `save_deduplicated_weights`) instead of `model.safetensors`. Defaults to
+            None.
+        ema (ExponentialMovingAverage | None, optional): The moving average of the policy weights to save
+            the state from. Defaults to None.
+        export_ema (bool, optional): Whether to save the averaged weights of `ema` as the policy weights.
+            The policy's own weights are then saved in `training_state/training_weights.safetensors`.
+            Defaults to False.
+        master_weights (MasterWeights | None, optional): The float32 master weights updated by the optimizer,
+            when the policy's weights are in low precision. They are saved as the policy weights in place of
+            their low precision copies, unless the averaged weights are exported. Defaults to None.
+        digest_cache (FrozenDigestCache | None, optional): Digests of the frozen parameters from the previous
+            checkpoints, reused when saving deduplicated weights. Defaults to None.
     """
+    export_ema = export_ema and ema is not None
     pretrained_dir = checkpoint_dir / PRETRAINED_MODEL_DIR
-    policy.save_pretrained(pretrained_dir)
+    if blobs_dir is not None or export_ema or master_weights is not None:
+        pretrained_dir.mkdir(parents=True, exist_ok=True)
+        policy.config._save_pretrained(pretrained_dir)
+        model_state = _get_exported_model_state(policy, ema if export_ema else None, master_weights)
+        model_state = {key: val.detach().cpu() for key, val in _get_unique_tensors(model_state).items()}
+        if blobs_dir is not None:
+            digests = None
+            if digest_cache is not None:
+                digests = digest_cache.get_digests(model_state, digest_cache.get_fingerprints(policy))
+            save_deduplicated_weights(
+                model_state, get_frozen_keys(policy), pretrained_dir, blobs_dir, digests
+            )
+        else:
+            save_file(model_state, pretrained_dir / SAFETENSORS_SINGLE_FILE)
+    else:
+        policy.save_pretrained(pretrained_dir)
     cfg.save_pretrained(pretrained_dir)
-    save_training_state(checkpoint_dir, step, optimizer, scheduler)
+    save_training_state(checkpoint_dir, step, optimizer, scheduler, ema, master_weights)
+    if export_ema:
+        training_weights = _get_unique_tensors(policy.state_dict())
+        training_weights = {key: val.detach().cpu() for key, val in training_weights.items()}
+        save_file(training_weights, checkpoint_dir / TRAINING_STATE_DIR / TRAINING_WEIGHTS)
 
 
 def save_training_state(
@@ -107,9 +223,12 @@ def save_training_state(
     train_step: int,
     optimizer: Optimizer | None = None,
     scheduler: LRScheduler | None = None,
+    ema: ExponentialMovingAverage | None = None,
+    master_weights: MasterWeights | None = None,
 ) -> None:
     """
-    Saves the training step, optimizer state, scheduler state, and rng state.
+    Saves the training step, optimizer state, scheduler state, moving average of the weights, master weights
+    and rng state.
 
     Args:
         save_dir (Path): The directory to save artifacts to.
@@ -118,6 +237,10 @@ def save_training_state(
             Defaults to None.
         scheduler (LRScheduler | None, optional): The scheduler from which to save the state_dict.
             Defaults to None.
+        ema (ExponentialMovingAverage | None, optional): The moving average from which to save the
+            state_dict. Defaults to None.
+        master_weights (MasterWeights | None, optional): The float32 master weights to save. Defaults to
+            None.
     """
     save_dir = checkpoint_dir / TRAINING_STATE_DIR
     save_dir.mkdir(parents=True, exist_ok=True)
@@ -127,19 +250,35 @@ def save_training_state(
         save_optimizer_state(optimizer, save_dir)
     if scheduler is not None:
         save_scheduler_state(scheduler, save_dir)
+    if ema is not None:
+        save_ema_state(ema, save_dir)
+    if master_weights is not None:
+        save_master_weights_state(master_weights, save_dir)
 
 
 def load_training_state(
-    checkpoint_dir: Path, optimizer: Optimizer, scheduler: LRScheduler | None
+    checkpoint_dir: Path,
+    optimizer: Optimizer,
+    scheduler: LRScheduler | None,
+    ema: ExponentialMovingAverage | None = None,
+    policy: PreTrainedPolicy | None = None,
+    master_weights: MasterWeights | None = None,
 ) -> tuple[int, Optimizer, LRScheduler | None]:
     """
-    Loads the training step, optimizer state, scheduler state, and rng state.
-    This is used to resume a training run.
+    Loads the training step, optimizer state, scheduler state, moving average of the weights, master weights
+    and rng state. This is used to resume a training run.
 
     Args:
         checkpoint_dir (Path): The checkpoint directory. Should contain a 'training_state' dir.
         optimizer (Optimizer): The optimizer to load the state_dict to.
         scheduler (LRScheduler | None): The scheduler to load the state_dict to (can be None).
+        ema (ExponentialMovingAverage | None, optional): The moving average to load the state_dict to.
+            It's left untouched if the checkpoint doesn't have one. Defaults to None.
+        policy (PreTrainedPolicy | None, optional): The policy to load the training weights to, when the
+            checkpoint exported averaged weights (see `save_checkpoint`). Defaults to None.
+        master_weights (MasterWeights | None, optional): The float32 master weights to load, which are copied
+            to the policy's weights. Checkpoints without master weights rebuild them from the policy's
+            weights. Defaults to None.
 
     Raises:
         NotADirectoryError: If 'checkpoint_dir' doesn't contain a 'training_state' dir
@@ -157,5 +296,379 @@ def load_training_state(
     optimizer = load_optimizer_state(optimizer, training_state_dir)
     if scheduler is not None:
         scheduler = load_scheduler_state(scheduler, training_state_dir)
+    if ema is not None and (training_state_dir / EMA_STATE).is_file():
+        ema = load_ema_state(ema, training_state_dir)
+    if policy is not None and (training_state_dir / TRAINING_WEIGHTS).is_file():
+        load_model(policy, training_state_dir / TRAINING_WEIGHTS, strict=False)
+    if master_weights is not None:
+        if (training_state_dir / MASTER_WEIGHTS).is_file():
+            load_master_weights_state(master_weights, training_state_dir)
+        else:
+            master_weights.copy_params_to_master()
 
     return step, optimizer, scheduler
+
+
+@dataclass
+class CheckpointSnapshot:
+    """Copy of the training state at a given step, to be written by `AsyncCheckpointWriter`."""
+
+    checkpoint_dir: Path
+    step: int
+    cfg: TrainPipelineConfig
+    policy_config: PreTrainedConfig
+    model_state: dict[str, torch.Tensor]
+    optimizer_state: dict[str, torch.Tensor]
+    optimizer_param_groups: list[dict]
+    scheduler_state: dict | None
+    rng_state: dict[str, torch.Tensor]
+    buffers: dict[str, torch.Tensor]
+    frozen_keys: set[str]
+    frozen_fingerprints: dict[str, tuple]
+    ema_state: dict[str, torch.Tensor] | None = None
+    training_weights: dict[str, torch.Tensor] | None = None
+    master_weights_state: dict[str, torch.Tensor] | None = None
+    blobs_dir: Path | None = None
+    copy_done: torch.cuda.Event | None = None
+    callback: Callable[[Path], None] | None = None
+
+
+class AsyncCheckpointWriter:
+    """
+    Saves checkpoints with the same structure as `save_checkpoint`, while only blocking the training loop for
+    the time needed to copy the policy and optimizer states to cpu memory (pinned when they are on cuda).
+
+    Checkpoints are written by a background thread in a temporary directory, which is atomically renamed to
+    the checkpoint directory once complete. The last checkpoint link is only updated after that, so that an
+    interrupted run can always be resumed from a complete checkpoint.
+
+    At most `max_in_flight` snapshots are held in memory, and their cpu buffers are reused from one
+    checkpoint to the next. `save` blocks until the oldest snapshot is written when this limit is reached.
+    Errors raised while writing a checkpoint are raised by the next call to `save`, `wait` or `stop`.
+    The digests of frozen parameters are cached across checkpoints (see `FrozenDigestCache`).
+    """
+
+    def __init__(self, max_in_flight: int = 1):
+        if max_in_flight <= 0:
+            raise ValueError("Number of checkpoints in flight must be greater than zero.")
+
+        self.max_in_flight = max_in_flight
+        self.free_buffers = queue.Queue()
+        for _ in range(max_in_flight):
+            self.free_buffers.put({})
+        self.queue = queue.Queue()
+        self.error = None
+        self.digest_cache = FrozenDigestCache()
+        self.thread = threading.Thread(target=self._worker_loop, daemon=True)
+        self.thread.start()
+        self._stopped = False
+
+    def save(
+        self,
+        checkpoint_dir: Path,
+        step: int,
+        cfg: TrainPipelineConfig,
+        policy: PreTrainedPolicy,
+        optimizer: Optimizer,
+        scheduler: LRScheduler | None = None,
+        callback: Callable[[Path], None] | None = None,
+        blobs_dir: Path | None = None,
+        ema: ExponentialMovingAverage | None = None,
+        export_ema: bool = False,
+        master_weights: MasterWeights | None = None,
+    ) -> None:
+        """Snapshots the training state and returns before it's written. `callback` is called with
+        `checkpoint_dir` from the background thread once the checkpoint is complete (e.g. to upload it).
+        `blobs_dir`, `ema`, `export_ema` and `master_weights` have the same meaning as in `save_checkpoint`.
+        """
+        self._raise_error()
+        buffers = self.free_buffers.get()
+
+        export_ema = export_ema and ema is not None
+        ema_state = training_weights = None
+        if ema is not None:
+            ema_state = self._copy_to_cpu(ema.state_dict(), buffers, "ema/")
+        if export_ema:
+            model_state = self._copy_to_cpu(
+                _get_unique_tensors(ema.get_model_state(policy)), buffers, "model/"
+            )
+            training_weights = self._copy_to_cpu(
+                _get_unique_tensors(policy.state_dict()), buffers, "training_weights/"
+            )
+        else:
+            model_state = self._copy_to_cpu(
+                _get_unique_tensors(_get_exported_model_state(policy, master_weights=master_weights)),
+                buffers,
+                "model/",
+            )
+        optimizer_state_dict = optimizer.state_dict()
+        optimizer_param_groups = copy.deepcopy(optimizer_state_dict.pop("param_groups"))
+        optimizer_state = self._copy_to_cpu(flatten_dict(optimizer_state_dict), buffers, "optimizer/")
+        master_weights_state = None
+        if master_weights is not None:
+            master_weights_state = self._copy_to_cpu(master_weights.state_dict(), buffers, "master_weights/")
+
+        copy_done = None
+        if torch.cuda.is_available():
+            copy_done = torch.cuda.Event()
+            copy_done.record()
+
+        snapshot = CheckpointSnapshot(
+            checkpoint_dir=checkpoint_dir,
+            step=step,
+            cfg=cfg,
+            policy_config=policy.config,
+            model_state=model_state,
+            optimizer_state=optimizer_state,
+            optimizer_param_groups=optimizer_param_groups,
+            scheduler_state=copy.deepcopy(scheduler.state_dict()) if scheduler is not None else None,
+            rng_state=flatten_dict(serialize_rng_state()),
+            buffers=buffers,
+            frozen_keys=get_frozen_keys(policy),
+            frozen_fingerprints=self.digest_cache.get_fingerprints(policy),
+            ema_state=ema_state,
+            training_weights=training_weights,
+            master_weights_state=master_weights_state,
+            blobs_dir=blobs_dir,
+            copy_done=copy_done,
+            callback=callback,
+        )
+        self.queue.put(snapshot)
+
+    @staticmethod
+    def _copy_to_cpu(
+        state: dict[str, torch.Tensor], buffers: dict[str, torch.Tensor], prefix: str
+    ) -> dict[str, torch.Tensor]:
+        cpu_state = {}
+        for key, tensor in state.items():
+            buffer = buffers.get(prefix + key)
+            if buffer is None or buffer.shape != tensor.shape or buffer.dtype != tensor.dtype:
+                buffer = torch.empty(tensor.shape, dtype=tensor.dtype, pin_memory=tensor.is_cuda)
+                buffers[prefix + key] = buffer
+            cpu_state[key] = buffer.copy_(tensor, non_blocking=tensor.is_cuda)
+        return cpu_state
+
+    def _worker_loop(self) -> None:
+        while True:
+            snapshot = self.queue.get()
+            if snapshot is None:
+                self.queue.task_done()
+                break
+            try:
+                self._write(snapshot)
+            except Exception as e:
+                logging.exception(f"Failed to write checkpoint {snapshot.checkpoint_dir}")
+                self.error = e
+            finally:
+                self.free_buffers.put(snapshot.buffers)
+                self.queue.task_done()
+
+    def _write(self, snapshot: CheckpointSnapshot) -> None:
+        if snapshot.copy_done is not None:
+            snapshot.copy_done.synchronize()
+
+        checkpoint_dir = snapshot.checkpoint_dir
+        tmp_dir = checkpoint_dir.with_name(f".{checkpoint_dir.name}.tmp")
+        if tmp_dir.exists():
+            shutil.rmtree(tmp_dir)
+
+        pretrained_dir = tmp_dir / PRETRAINED_MODEL_DIR
+        pretrained_dir.mkdir(parents=True)
+        snapshot.policy_config._save_pretrained(pretrained_dir)
+        if snapshot.blobs_dir is not None:
+            digests = self.digest_cache.get_digests(snapshot.model_state, snapshot.frozen_fingerprints)
+            save_deduplicated_weights(
+                snapshot.model_state, snapshot.frozen_keys, pretrained_dir, snapshot.blobs_dir, digests
+            )
+        else:
+            save_file(snapshot.model_state, pretrained_dir / SAFETENSORS_SINGLE_FILE)
+        snapshot.cfg.save_pretrained(pretrained_dir)
+
+        training_state_dir = tmp_dir / TRAINING_STATE_DIR
+        training_state_dir.mkdir()
+        save_training_step(snapshot.step, training_state_dir)
+        save_file(snapshot.rng_state, training_state_dir / RNG_STATE)
+        save_file(snapshot.optimizer_state, training_state_dir / OPTIMIZER_STATE)
+        write_json(snapshot.optimizer_param_groups, training_state_dir / OPTIMIZER_PARAM_GROUPS)
+        if snapshot.scheduler_state is not None:
+            write_json(snapshot.scheduler_state, training_state_dir / SCHEDULER_STATE)
+        if snapshot.ema_state is not None:
+            save_file(snapshot.ema_state, training_state_dir / EMA_STATE)
+        if snapshot.training_weights is not None:
+            save_file(snapshot.training_weights, training_state_dir / TRAINING_WEIGHTS)
+        if snapshot.master_weights_state is not None:
+            save_file(snapshot.master_weights_state, training_state_dir / MASTER_WEIGHTS)
+
+        if checkpoint_dir.exists():
+            shutil.rmtree(checkpoint_dir)
+        tmp_dir.rename(checkpoint_dir)
+        update_last_checkpoint(checkpoint_dir)
+
+        if snapshot.callback is not None:
+            snapshot.callback(checkpoint_dir)
+
+    def _raise_error(self) -> None:
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise RuntimeError("Writing a checkpoint failed in the background.") from error
+
+    def wait(self) -> None:
+        """Blocks until all the checkpoints saved so far are written."""
+        self.queue.join()
+        self._raise_error()
+
+    def stop(self) -> None:
+        if self._stopped:
+            return
+
+        self.queue.put(None)
+        self.thread.join()
+        self._stopped = True
+        self._raise_error()
+
+
+def _get_exported_model_state(
+    policy: PreTrainedPolicy,
+    ema: ExponentialMovingAverage | None = None,
+    master_weights: MasterWeights | None = None,
+) -> dict[str, torch.Tensor]:
+    """Returns the state dict saved as the policy weights: the averaged weights of `ema` if given, otherwise
+    the float32 master weights if given, otherwise the policy's own weights."""
+    if ema is not None:
+        return ema.get_model_state(policy)
+    if master_weights is not None:
+        return master_weights.get_model_state(policy)
+    return policy.state_dict()
+
+
+def _get_unique_tensors(state_dict: dict[str, torch.Tensor]) -> dict[str, torch.Tensor]:
+    """Drops the tensors sharing their memory with a previous one (e.g. tied weights), like `save_model` from
+    safetensors does, so that they are only saved once."""
+    unique_tensors = {}
+    seen = set()
+    for key, tensor in state_dict.items():
+        ptr = (tensor.device, tensor.untyped_storage().data_ptr(), tensor.storage_offset(), tensor.shape)
+        if ptr not in seen:
+            seen.add(ptr)
+            unique_tensors[key] = tensor
+    return unique_tensors
+
+
+def get_frozen_keys(policy: PreTrainedPolicy) -> set[str]:
+    """Returns the keys of the policy's state dict which are not updated by the optimizer: buffers and
+    parameters which don't require gradients."""
+    named_parameters = policy.named_parameters(remove_duplicate=False)
+    trainable_keys = {key for key, param in named_parameters if param.requires_grad}
+    return set(policy.state_dict()) - trainable_keys
+
+
+def _hash_tensor(key: str, tensor: torch.Tensor) -> str:
+    tensor = tensor.contiguous()
+    hasher = hashlib.sha256(f"{key}:{tensor.dtype}:{tuple(tensor.shape)}".encode())
+    hasher.update(tensor.reshape(-1).view(torch.uint8).numpy())
+    return hasher.hexdigest()
+
+
+def _hash_tensors(tensors: dict[str, torch.Tensor], digests: dict[str, str] | None = None) -> str:
+    """Hashes the digests of `tensors`, which are looked up in `digests` before being computed."""
+    digests = digests or {}
+    hasher = hashlib.sha256()
+    for key in sorted(tensors):
+        digest = digests[key] if key in digests else _hash_tensor(key, tensors[key])
+        hasher.update(digest.encode())
+    return hasher.hexdigest()
+
+
+def save_deduplicated_weights(
+    model_state: dict[str, torch.Tensor],
+    frozen_keys: set[str],
+    save_dir: Path,
+    blobs_dir: Path,
+    digests: dict[str, str] | None = None,
+) -> None:
+    """
+    Saves the (cpu) tensors of `model_state` in two safetensors shards, one for the frozen tensors (see
+    `get_frozen_keys`) and one for the others, indexed by a `model.safetensors.index.json` file which maps
+    each tensor to its shard (the sharded format supported by `PreTrainedPolicy.from_pretrained`).
+
+    Shards are content-addressed: they are named after the hash of their tensors, and stored once in
+    `blobs_dir` from which they are hardlinked in `save_dir`. Hence, frozen weights (e.g. a frozen vision
+    backbone) only take disk space once for all the checkpoints of a run. Blobs which are not linked anymore
+    are deleted by `prune_checkpoints`.
+
+    `digests` holds the already known digests of some tensors (see `FrozenDigestCache`), which are not
+    hashed again.
+    """
+    blobs_dir.mkdir(parents=True, exist_ok=True)
+    save_dir.mkdir(parents=True, exist_ok=True)
+    frozen_state = {key: val for key, val in model_state.items() if key in frozen_keys}
+    trainable_state = {key: val for key, val in model_state.items() if key not in frozen_keys}
+
+    weight_map = {}
+    for shard_state in [frozen_state, trainable_state]:
+        if len(shard_state) == 0:
+            continue
+        digest = _hash_tensors(shard_state, digests)
+        blob_file = blobs_dir / f"{digest}.safetensors"
+        shard_file = f"model-{digest[:16]}.safetensors"
+        try:
+            os.link(blob_file, save_dir / shard_file)
+        except FileNotFoundError:
+            # Written in the checkpoint first, so that it's never an unlinked blob
+            save_file(shard_state, save_dir / shard_file)
+            with contextlib.suppress(FileExistsError):
+                os.link(save_dir / shard_file, blob_file)
+        weight_map.update({key: shard_file for key in shard_state})
+
+    write_json({"metadata": {}, "weight_map": weight_map}, save_dir / SAFETENSORS_INDEX_FILE)
+
+
+def prune_checkpoints(
+    checkpoints_dir: Path, retention: CheckpointRetentionConfig, metrics: dict[int, float] | None = None
+) -> list[Path]:
+    """
+    Deletes the checkpoints of `checkpoints_dir` which are not retained by `retention`, then the blobs of
+    deduplicated weights which are not linked by any checkpoint anymore. The last checkpoint is always kept.
+
+    Args:
+        checkpoints_dir (Path): The directory containing step checkpoints.
+        retention (CheckpointRetentionConfig): Which checkpoints to keep.
+        metrics (dict[int, float] | None, optional): Value of `retention.keep_best_metric` at each step
+            where it was evaluated. Defaults to None.
+
+    Returns:
+        list[Path]: The deleted checkpoints.
+    """
+    checkpoints = {
+        int(path.name): path
+        for path in checkpoints_dir.iterdir()
+        if path.name.isdigit() and path.is_dir() and not path.is_symlink()
+    }
+    if retention.keep_last is None:
+        keep = set(checkpoints)
+    else:
+        keep = set(sorted(checkpoints)[-retention.keep_last :])
+    if retention.keep_every is not None:
+        keep |= {step for step in checkpoints if step % retention.keep_every == 0}
+    if retention.keep_best_metric is not None and metrics:
+        evaluated = {step: val for step, val in metrics.items() if step in checkpoints}
+        if evaluated:
+            best = min if retention.lower_is_better else max
+            keep.add(best(evaluated, key=evaluated.get))
+    last_checkpoint_dir = checkpoints_dir / LAST_CHECKPOINT_LINK
+    if last_checkpoint_dir.is_symlink():
+        keep.add(int(last_checkpoint_dir.resolve().name))
+
+    pruned = []
+    for step, path in sorted(checkpoints.items()):
+        if step not in keep:
+            shutil.rmtree(path)
+            pruned.append(path)
+
+    blobs_dir = checkpoints_dir / WEIGHT_BLOBS_DIR
+    if pruned and blobs_dir.is_dir():
+        for blob_file in blobs_dir.iterdir():
+            if blob_file.stat().st_nlink == 1:
+                blob_file.unlink()
+
+    return pruned
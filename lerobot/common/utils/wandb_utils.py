@@ -19,7 +19,7 @@ import re
 from glob import glob
 from pathlib import Path
 
-from huggingface_hub.constants import SAFETENSORS_SINGLE_FILE
+from huggingface_hub.constants import SAFETENSORS_INDEX_FILE, SAFETENSORS_SINGLE_FILE
 from termcolor import colored
 
 from lerobot.common.constants import PRETRAINED_MODEL_DIR
@@ -104,7 +104,14 @@ class WandBLogger:
         artifact_name = f"{self._group}-{step_id}"
         artifact_name = get_safe_wandb_artifact_name(artifact_name)
         artifact = self._wandb.Artifact(artifact_name, type="model")
-        artifact.add_file(checkpoint_dir / PRETRAINED_MODEL_DIR / SAFETENSORS_SINGLE_FILE)
+        pretrained_dir = checkpoint_dir / PRETRAINED_MODEL_DIR
+        if (pretrained_dir / SAFETENSORS_SINGLE_FILE).is_file():
+            artifact.add_file(pretrained_dir / SAFETENSORS_SINGLE_FILE)
+        else:
+            # Deduplicated weights, see `save_deduplicated_weights`
+            artifact.add_file(pretrained_dir / SAFETENSORS_INDEX_FILE)
+            for shard_file in pretrained_dir.glob("model-*.safetensors"):
+                artifact.add_file(shard_file)
         self._wandb.log_artifact(artifact)
 
     def log_dict(self, d: dict, step: int, mode: str = "train"):
@@ -36,7 +36,16 @@ class DatasetConfig:
     image_transforms: ImageTransformsConfig = field(default_factory=ImageTransformsConfig)
     revision: str | None = None
     use_imagenet_stats: bool = True
+    # Backend decoding videos. Packed videos (see `LeRobotDataset.create`) are always decoded with 'pyav',
+    # which demuxes all their streams in a single pass.
     video_backend: str = field(default_factory=get_safe_default_codec)
+    # Set to true to crop and/or downscale video frames at decoding time, the same way the policy would right
+    # after receiving them (see `PreTrainedConfig.image_crop_shape` and `PreTrainedConfig.image_max_shape`).
+    video_decode_from_policy: bool = False
+    # Number of processes of a decode service shared by all dataloader workers (0 to decode videos in the
+    # dataloader workers themselves). This allows to scale decoding independently of `num_workers`, which is
+    # often limited by host memory since each worker holds a copy of the dataset.
+    num_decode_processes: int = 0
 
 
 @dataclass
@@ -50,6 +59,25 @@ class WandBConfig:
     run_id: str | None = None
 
 
+@dataclass
+class CheckpointRetentionConfig:
+    # Number of most recent checkpoints to keep. All checkpoints are kept when None.
+    keep_last: int | None = None
+    # Checkpoints of steps which are a multiple of `keep_every` are never deleted.
+    keep_every: int | None = None
+    # Aggregated eval metric (e.g. "pc_success" or "avg_sum_reward") whose best checkpoint is never deleted.
+    keep_best_metric: str | None = None
+    lower_is_better: bool = False
+    # Save policy weights as shards stored once per content in `checkpoints/.blobs` and hardlinked in each
+    # checkpoint, so that weights which don't change during training (e.g. frozen backbones) are only stored
+    # once.
+    deduplicate_weights: bool = False
+
+    def __post_init__(self):
+        if self.keep_last is not None and self.keep_last < 1:
+            raise ValueError(f"`keep_last` should be at least 1, got {self.keep_last}.")
+
+
 @dataclass
 class EvalConfig:
     n_episodes: int = 50
@@ -68,3 +96,41 @@ class EvalConfig:
                 f"to increase the number of episodes to match the batch size (e.g. `eval.n_episodes={self.batch_size}`), "
                 f"or lower the batch size (e.g. `eval.batch_size={self.n_episodes}`)."
             )
+
+
+@dataclass
+class ProfilerConfig:
+    # Set to true to record a torch.profiler trace of `active_steps` training steps in the `profiler`
+    # directory of the run, after skipping `wait_steps` steps and warming up for `warmup_steps` steps.
+    enable: bool = False
+    wait_steps: int = 10
+    warmup_steps: int = 2
+    active_steps: int = 5
+    record_shapes: bool = False
+    profile_memory: bool = False
+    with_stack: bool = False
+
+
+@dataclass
+class EMAConfig:
+    # Set to true to keep an exponential moving average of the trainable weights of the policy, updated after
+    # each optimizer step.
+    enable: bool = False
+    decay: float = 0.9999
+    # Use a lower decay at the beginning of training: min(decay, (1 + step) / (10 + step)).
+    warmup: bool = True
+    # Update the average every `update_every` optimizer steps only (with the decay raised to that power).
+    update_every: int = 1
+    # Device of the averaged weights, defaults to the device of the policy. Set to "cpu" to save memory.
+    device: str | None = None
+    # Evaluate the policy with the averaged weights during training.
+    use_for_eval: bool = True
+    # Save the averaged weights in the `pretrained_model` of checkpoints. The training weights are then saved
+    # in `training_state`, to resume training from them.
+    export: bool = False
+
+    def __post_init__(self):
+        if not 0.0 <= self.decay < 1.0:
+            raise ValueError(f"`decay` should be in [0, 1), got {self.decay}.")
+        if self.update_every < 1:
+            raise ValueError(f"`update_every` should be at least 1, got {self.update_every}.")
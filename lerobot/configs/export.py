@@ -0,0 +1,59 @@
+# Copyright 2024 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from dataclasses import dataclass
+from pathlib import Path
+
+from lerobot.common import policies  # noqa: F401
+from lerobot.common.exported_policy import EXPORT_FORMATS
+from lerobot.configs import parser
+from lerobot.configs.policies import PreTrainedConfig
+
+
+@dataclass
+class ExportPipelineConfig:
+    # The pretrained policy to export, loaded with `--policy.path` from the repo ID of a model hosted on the
+    # Hub or a directory containing weights saved using `Policy.save_pretrained`.
+    policy: PreTrainedConfig | None = None
+    # Directory to write the exported graph, the config and the normalization stats of the policy to.
+    output_dir: Path | None = None
+    # onnx | torchscript
+    export_format: str = "onnx"
+    # Batch size of the exported graph, e.g. the number of robots controlled together.
+    batch_size: int = 1
+    # ONNX opset of the exported graph.
+    opset_version: int = 17
+
+    def __post_init__(self):
+        # HACK: We parse again the cli args here to get the pretrained path if there was one.
+        policy_path = parser.get_path_arg("policy")
+        if policy_path:
+            cli_overrides = parser.get_cli_overrides("policy")
+            self.policy = PreTrainedConfig.from_pretrained(policy_path, cli_overrides=cli_overrides)
+            self.policy.pretrained_path = policy_path
+        else:
+            raise ValueError("A pretrained policy should be provided with `--policy.path`.")
+
+        if self.output_dir is None:
+            raise ValueError("The directory to export the policy to should be provided with `--output_dir`.")
+        if self.export_format not in EXPORT_FORMATS:
+            raise ValueError(
+                f"`export_format` must be one of {list(EXPORT_FORMATS)}, got '{self.export_format}'."
+            )
+        if self.batch_size < 1:
+            raise ValueError(f"`batch_size` should be at least 1, got {self.batch_size}.")
+
+    @classmethod
+    def __get_path_fields__(cls) -> list[str]:
+        """This enables the parser to load config from the policy using `--policy.path=local/dir`"""
+        return ["policy"]
@@ -12,8 +12,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import abc
+import json
 import logging
 import os
+import tempfile
 from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Type, TypeVar
@@ -31,6 +33,10 @@ from lerobot.configs.types import FeatureType, NormalizationMode, PolicyFeature
 
 # Generic variable that is either PreTrainedConfig or a subclass thereof
 T = TypeVar("T", bound="PreTrainedConfig")
+ConfigT = TypeVar("ConfigT")
+
+PRECISIONS = ["fp32", "amp-fp16", "amp-bf16", "pure-bf16"]
+QUANTIZATIONS = ["int8-dynamic", "int8-weight-only"]
 
 
 @dataclass
@@ -59,6 +65,27 @@ class PreTrainedConfig(draccus.ChoiceRegistry, HubMixin, abc.ABC):
     # `use_amp` determines whether to use Automatic Mixed Precision (AMP) for training and evaluation. With AMP,
     # automatic gradient scaling is used.
     use_amp: bool = False
+    # Precision of the weights and computations of the policy during training, among:
+    # - "fp32": float32 weights and computations.
+    # - "amp-fp16" / "amp-bf16": float32 weights, forward pass in `torch.autocast` with float16 / bfloat16.
+    # - "pure-bf16": bfloat16 weights and forward pass in `torch.autocast` with bfloat16. The optimizer
+    #   updates float32 master copies of the weights, which are copied back to the bfloat16 weights after
+    #   each step.
+    # Defaults to the autocast dtype of the device (float16 on cuda, bfloat16 on cpu) when `use_amp` is true,
+    # "fp32" otherwise. `use_amp` is then set according to `precision`, and can't be combined with "fp32" nor
+    # "pure-bf16". When loading a saved config, overriding only one of them derives the other one again (see
+    # `parse_with_precision_overrides`).
+    precision: str | None = None
+    # Compile the hot path of the policy (see `PreTrainedPolicy.get_compiled_modules`) with `torch.compile`.
+    # Compiled graphs are cached on disk so that restarts and evaluations don't recompile from scratch.
+    compile: bool = False
+    # `mode` of `torch.compile`: default | reduce-overhead | max-autotune
+    compile_mode: str | None = None
+    # Quantize the Linear and convolution layers of a pretrained float32 policy when loading it, to run it on
+    # cpu (see `lerobot.common.policies.quantization.quantize_policy`):
+    # - "int8-dynamic": int8 weights, with the activations of Linear layers quantized on the fly.
+    # - "int8-weight-only": int8 weights, dequantized on the fly and computations in float32.
+    quantization: str | None = None
 
     def __post_init__(self):
         self.pretrained_path = None
@@ -67,12 +94,27 @@ class PreTrainedConfig(draccus.ChoiceRegistry, HubMixin, abc.ABC):
             logging.warning(f"Device '{self.device}' is not available. Switching to '{auto_device}'.")
             self.device = auto_device.type
 
+        if self.use_amp and self.precision is not None and not self.precision.startswith("amp-"):
+            raise ValueError(
+                f"`use_amp` conflicts with `precision='{self.precision}'`. Set `precision` to 'amp-fp16' or "
+                "'amp-bf16' instead of `use_amp`."
+            )
+        if self.precision is None:
+            default_amp_precision = "amp-bf16" if self.device == "cpu" else "amp-fp16"
+            self.precision = default_amp_precision if self.use_amp else "fp32"
+        if self.precision not in PRECISIONS:
+            raise ValueError(f"`precision` must be one of {PRECISIONS}, got '{self.precision}'.")
+
         # Automatically deactivate AMP if necessary
-        if self.use_amp and not is_amp_available(self.device):
+        if self.precision != "fp32" and not is_amp_available(self.device):
             logging.warning(
                 f"Automatic Mixed Precision (amp) is not available on device '{self.device}'. Deactivating AMP."
             )
-            self.use_amp = False
+            self.precision = "fp32"
+        self.use_amp = self.precision.startswith("amp-")
+
+        if self.quantization is not None and self.quantization not in QUANTIZATIONS:
+            raise ValueError(f"`quantization` must be one of {QUANTIZATIONS}, got '{self.quantization}'.")
 
     @property
     def type(self) -> str:
@@ -120,6 +162,16 @@ class PreTrainedConfig(draccus.ChoiceRegistry, HubMixin, abc.ABC):
     def image_features(self) -> dict[str, PolicyFeature]:
         return {key: ft for key, ft in self.input_features.items() if ft.type is FeatureType.VISUAL}
 
+    @property
+    def image_crop_shape(self) -> tuple[int, int] | None:
+        """(H, W) shape of the deterministic center crop applied by the policy to its input images, if any."""
+        return None
+
+    @property
+    def image_max_shape(self) -> tuple[int, int] | None:
+        """(H, W) shape the policy resizes its input images to fit in (preserving aspect ratio), if any."""
+        return None
+
     @property
     def action_feature(self) -> PolicyFeature | None:
         for _, ft in self.output_features.items():
@@ -173,4 +225,34 @@ class PreTrainedConfig(draccus.ChoiceRegistry, HubMixin, abc.ABC):
         # HACK: this is very ugly, ideally we'd like to be able to do that natively with draccus
         # something like --policy.path (in addition to --policy.type)
         cli_overrides = policy_kwargs.pop("cli_overrides", [])
-        return draccus.parse(cls, config_file, args=cli_overrides)
+        return parse_with_precision_overrides(cls, config_file, cli_overrides)
+
+
+def parse_with_precision_overrides(
+    cls: Type[ConfigT], config_file: str | Path, cli_args: list[str], prefix: str = ""
+) -> ConfigT:
+    """Parses `config_file` overridden by `cli_args`, like `draccus.parse`.
+
+    `use_amp` and `precision` are saved after one was derived from the other, so when only one of them is
+    overridden, the saved value of the other one is ignored and derived again. For instance, `--use_amp=true`
+    over a saved "fp32" precision requests the default AMP precision. They only conflict when both are
+    overridden. `prefix` is the path of the policy config in `config_file`, e.g. "policy." for a
+    `TrainPipelineConfig`.
+    """
+    overridden = {arg.removeprefix("--").split("=")[0] for arg in cli_args}
+    overridden_precision_args = [arg for arg in ("use_amp", "precision") if f"{prefix}{arg}" in overridden]
+    if len(overridden_precision_args) != 1:
+        return draccus.parse(cls, config_file, args=cli_args)
+
+    with open(config_file) as f:
+        config = json.load(f)
+    policy_config = config
+    for key in prefix.split(".")[:-1]:
+        policy_config = policy_config[key]
+    derived_arg = "precision" if overridden_precision_args[0] == "use_amp" else "use_amp"
+    policy_config.pop(derived_arg, None)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_config_file = Path(tmp_dir) / Path(config_file).name
+        with open(tmp_config_file, "w") as f:
+            json.dump(config, f, indent=4)
+        return draccus.parse(cls, tmp_config_file, args=cli_args)
@@ -0,0 +1,52 @@
+# Copyright 2024 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from dataclasses import dataclass
+
+from lerobot.common import policies  # noqa: F401
+from lerobot.configs import parser
+from lerobot.configs.policies import PreTrainedConfig
+
+
+@dataclass
+class ServePipelineConfig:
+    # The pretrained policy to serve, loaded with `--policy.path` from the repo ID of a model hosted on the
+    # Hub or a directory containing weights saved using `Policy.save_pretrained`.
+    policy: PreTrainedConfig | None = None
+    # ZeroMQ address the server binds to, e.g. "ipc:///tmp/lerobot_policy_server" for a Unix socket, or
+    # "tcp://*:5560" for robots controlled from other computers.
+    address: str = "ipc:///tmp/lerobot_policy_server"
+    # Maximum number of requests processed together.
+    max_batch_size: int = 8
+    # Maximum time to wait for the requests of other clients after receiving one, in milliseconds.
+    batch_timeout_ms: float = 5.0
+
+    def __post_init__(self):
+        # HACK: We parse again the cli args here to get the pretrained path if there was one.
+        policy_path = parser.get_path_arg("policy")
+        if policy_path:
+            cli_overrides = parser.get_cli_overrides("policy")
+            self.policy = PreTrainedConfig.from_pretrained(policy_path, cli_overrides=cli_overrides)
+            self.policy.pretrained_path = policy_path
+        else:
+            raise ValueError("A pretrained policy should be provided with `--policy.path`.")
+
+        if self.max_batch_size < 1:
+            raise ValueError(f"`max_batch_size` should be at least 1, got {self.max_batch_size}.")
+        if self.batch_timeout_ms < 0:
+            raise ValueError(f"`batch_timeout_ms` should be non-negative, got {self.batch_timeout_ms}.")
+
+    @classmethod
+    def __get_path_fields__(cls) -> list[str]:
+        """This enables the parser to load config from the policy using `--policy.path=local/dir`"""
+        return ["policy"]
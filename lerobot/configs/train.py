@@ -26,8 +26,15 @@ from lerobot.common.optim import OptimizerConfig
 from lerobot.common.optim.schedulers import LRSchedulerConfig
 from lerobot.common.utils.hub import HubMixin
 from lerobot.configs import parser
-from lerobot.configs.default import DatasetConfig, EvalConfig, WandBConfig
-from lerobot.configs.policies import PreTrainedConfig
+from lerobot.configs.default import (
+    CheckpointRetentionConfig,
+    DatasetConfig,
+    EMAConfig,
+    EvalConfig,
+    ProfilerConfig,
+    WandBConfig,
+)
+from lerobot.configs.policies import PreTrainedConfig, parse_with_precision_overrides
 
 TRAIN_CONFIG_NAME = "train_config.json"
 
@@ -51,18 +58,36 @@ class TrainPipelineConfig(HubMixin):
     seed: int | None = 1000
     # Number of workers for the dataloader.
     num_workers: int = 4
+    # Batch size of each process in distributed training.
     batch_size: int = 8
+    # Each batch is split into this many micro-batches, whose gradients are accumulated before a single
+    # optimizer step. This reduces the memory needed for a given `batch_size`, which is still the number of
+    # samples per optimizer step (per process).
+    gradient_accumulation_steps: int = 1
+    # Number of batches fetched and moved to the device in the background, ahead of the training step which
+    # consumes them (e.g. 2). Each batch is fetched in the training loop by default.
+    prefetch_batches: int = 0
     steps: int = 100_000
     eval_freq: int = 20_000
     log_freq: int = 200
     save_checkpoint: bool = True
     # Checkpoint is saved every `save_freq` training iterations and after the last training step.
     save_freq: int = 20_000
+    # Write checkpoints in the background, after copying the training state to cpu memory. At most
+    # `max_checkpoints_in_flight` copies are held in memory, training blocks when this limit is reached.
+    async_checkpoint: bool = False
+    max_checkpoints_in_flight: int = 1
     use_policy_training_preset: bool = True
+    # Set to true in distributed training for policies with parameters which don't receive gradients at every
+    # step (e.g. VQ-BeT, which trains its VQ-VAE and GPT in separate phases).
+    ddp_find_unused_parameters: bool = False
     optimizer: OptimizerConfig | None = None
     scheduler: LRSchedulerConfig | None = None
+    checkpoint_retention: CheckpointRetentionConfig = field(default_factory=CheckpointRetentionConfig)
+    ema: EMAConfig = field(default_factory=EMAConfig)
     eval: EvalConfig = field(default_factory=EvalConfig)
     wandb: WandBConfig = field(default_factory=WandBConfig)
+    profiler: ProfilerConfig = field(default_factory=ProfilerConfig)
 
     def __post_init__(self):
         self.checkpoint_path = None
@@ -107,6 +132,12 @@ class TrainPipelineConfig(HubMixin):
             train_dir = f"{now:%Y-%m-%d}/{now:%H-%M-%S}_{self.job_name}"
             self.output_dir = Path("outputs/train") / train_dir
 
+        if not 1 <= self.gradient_accumulation_steps <= self.batch_size:
+            raise ValueError(
+                f"`gradient_accumulation_steps` ({self.gradient_accumulation_steps}) should be between 1 and "
+                f"`batch_size` ({self.batch_size})."
+            )
+
         if isinstance(self.dataset.repo_id, list):
             raise NotImplementedError("LeRobotMultiDataset is not currently implemented.")
 
@@ -170,6 +201,6 @@ class TrainPipelineConfig(HubMixin):
                 ) from e
 
         cli_args = kwargs.pop("cli_args", [])
-        cfg = draccus.parse(cls, config_file, args=cli_args)
+        cfg = parse_with_precision_overrides(cls, config_file, cli_args, prefix="policy.")
 
         return cfg
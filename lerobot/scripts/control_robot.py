@@ -142,6 +142,7 @@ from pprint import pformat
 # from safetensors.torch import load_file, save_file
 from lerobot.common.datasets.lerobot_dataset import LeRobotDataset
 from lerobot.common.policies.factory import make_policy
+from lerobot.common.policies.policy_server import PolicyClient
 from lerobot.common.robot_devices.control_configs import (
     CalibrateControlConfig,
     ControlPipelineConfig,
@@ -266,8 +267,13 @@ def record(
             image_writer_threads=cfg.num_image_writer_threads_per_camera * len(robot.cameras),
         )
 
-    # Load pretrained policy
-    policy = None if cfg.policy is None else make_policy(cfg.policy, ds_meta=dataset.meta)
+    # Load pretrained policy, or connect to the server hosting it
+    if cfg.policy is None:
+        policy = None
+    elif cfg.policy_server is not None:
+        policy = PolicyClient(cfg.policy_server, cfg.policy)
+    else:
+        policy = make_policy(cfg.policy, ds_meta=dataset.meta)
 
     if not robot.is_connected:
         robot.connect()
@@ -300,6 +306,8 @@ def record(
             policy=policy,
             fps=cfg.fps,
             single_task=cfg.single_task,
+            async_inference=cfg.async_inference,
+            async_refill_threshold=cfg.async_refill_threshold,
         )
 
         # Execute a few seconds without recording to give time to manually reset the environment
@@ -327,6 +335,8 @@ def record(
 
     log_say("Stop recording", cfg.play_sounds, blocking=True)
     stop_recording(robot, listener, cfg.display_cameras)
+    if isinstance(policy, PolicyClient):
+        policy.close()
 
     if cfg.push_to_hub:
         dataset.push_to_hub(tags=cfg.tags, private=cfg.private)
@@ -69,7 +69,7 @@ from lerobot.common.envs.factory import make_env
 from lerobot.common.envs.utils import preprocess_observation
 from lerobot.common.policies.factory import make_policy
 from lerobot.common.policies.pretrained import PreTrainedPolicy
-from lerobot.common.policies.utils import get_device_from_parameters
+from lerobot.common.policies.utils import get_autocast_dtype, get_device_from_parameters
 from lerobot.common.utils.io_utils import write_video
 from lerobot.common.utils.random_utils import set_seed
 from lerobot.common.utils.utils import (
@@ -477,7 +477,11 @@ def eval_main(cfg: EvalPipelineConfig):
     )
     policy.eval()
 
-    with torch.no_grad(), torch.autocast(device_type=device.type) if cfg.policy.use_amp else nullcontext():
+    amp_dtype = get_autocast_dtype(cfg.policy.precision)
+    with (
+        torch.no_grad(),
+        torch.autocast(device_type=device.type, dtype=amp_dtype) if cfg.policy.use_amp else nullcontext(),
+    ):
         info = eval_policy(
             env,
             policy,
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+
+# Copyright 2024 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Export the inference graph of a pretrained policy (ACT or Diffusion Policy) to ONNX or TorchScript.
+
+```
+python lerobot/scripts/export_policy.py \
+    --policy.path=outputs/train/act_koch_pick_place_lego/checkpoints/080000/pretrained_model \
+    --output_dir=outputs/export/act_koch_pick_place_lego \
+    --export_format=onnx
+```
+
+The ONNX dependencies are installed with `pip install -e ".[onnx]"`. The exported policy is then run on the
+robot computer with NumPy and onnxruntime only:
+```python
+from lerobot.common.exported_policy import ExportedPolicy
+
+policy = ExportedPolicy("outputs/export/act_koch_pick_place_lego")
+action = policy.select_action(observation)
+```
+
+You can learn about the CLI options for this script in the `ExportPipelineConfig` in lerobot/configs/export.py
+"""
+
+import logging
+from dataclasses import asdict
+from pprint import pformat
+
+from lerobot.common.policies.export import export_policy
+from lerobot.common.policies.factory import get_policy_class
+from lerobot.common.utils.utils import init_logging
+from lerobot.configs import parser
+from lerobot.configs.export import ExportPipelineConfig
+
+
+@parser.wrap()
+def export(cfg: ExportPipelineConfig):
+    logging.info(pformat(asdict(cfg)))
+
+    # The graph is traced on cpu
+    cfg.policy.device = "cpu"
+    policy_cls = get_policy_class(cfg.policy.type)
+    policy = policy_cls.from_pretrained(cfg.policy.pretrained_path, config=cfg.policy)
+
+    model_file = export_policy(
+        policy,
+        cfg.output_dir,
+        export_format=cfg.export_format,
+        batch_size=cfg.batch_size,
+        opset_version=cfg.opset_version,
+    )
+    logging.info(f"Exported the policy to {model_file}")
+
+
+if __name__ == "__main__":
+    init_logging()
+    export()
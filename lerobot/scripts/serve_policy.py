@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+# Copyright 2024 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Serve a pretrained policy to several robots from a single process, with dynamic batching.
+
+Start the server with the checkpoint shared by the robots:
+```
+python lerobot/scripts/serve_policy.py \
+    --policy.path=outputs/train/act_koch_pick_place_lego/checkpoints/080000/pretrained_model \
+    --address=ipc:///tmp/lerobot_policy_server
+```
+
+Then point the control process of each robot to the server instead of loading its own copy of the policy:
+```
+python lerobot/scripts/control_robot.py \
+    --robot.type=koch \
+    --control.type=record \
+    --control.policy.path=outputs/train/act_koch_pick_place_lego/checkpoints/080000/pretrained_model \
+    --control.policy_server=ipc:///tmp/lerobot_policy_server \
+    ...
+```
+
+You can learn about the CLI options for this script in the `ServePipelineConfig` in lerobot/configs/serve.py
+"""
+
+import logging
+from dataclasses import asdict
+from pprint import pformat
+
+import torch
+
+from lerobot.common.policies.factory import get_policy_class
+from lerobot.common.policies.policy_server import PolicyServer
+from lerobot.common.policies.utils import compile_policy
+from lerobot.common.utils.utils import get_safe_torch_device, init_logging
+from lerobot.configs import parser
+from lerobot.configs.serve import ServePipelineConfig
+
+
+@parser.wrap()
+def serve_policy(cfg: ServePipelineConfig):
+    logging.info(pformat(asdict(cfg)))
+
+    device = get_safe_torch_device(cfg.policy.device, log=True)
+    torch.backends.cudnn.benchmark = True
+    torch.backends.cuda.matmul.allow_tf32 = True
+
+    policy_cls = get_policy_class(cfg.policy.type)
+    policy = policy_cls.from_pretrained(cfg.policy.pretrained_path, config=cfg.policy)
+    policy.to(device)
+    if cfg.policy.compile:
+        compile_policy(policy, mode=cfg.policy.compile_mode)
+
+    server = PolicyServer(
+        policy,
+        cfg.address,
+        max_batch_size=cfg.max_batch_size,
+        batch_timeout_s=cfg.batch_timeout_ms / 1000,
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("Stopping the policy server.")
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    init_logging()
+    serve_policy()
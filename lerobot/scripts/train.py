@@ -22,22 +22,40 @@ from typing import Any
 import torch
 from termcolor import colored
 from torch.amp import GradScaler
+from torch.nn.parallel import DistributedDataParallel
 from torch.optim import Optimizer
 
+from lerobot.common.constants import CHECKPOINT_METRICS, CHECKPOINTS_DIR, WEIGHT_BLOBS_DIR
 from lerobot.common.datasets.factory import make_dataset
-from lerobot.common.datasets.sampler import EpisodeAwareSampler
-from lerobot.common.datasets.utils import cycle
+from lerobot.common.datasets.prefetcher import DevicePrefetcher
+from lerobot.common.datasets.sampler import DistributedEpisodeAwareSampler, EpisodeAwareSampler
+from lerobot.common.datasets.utils import cycle, load_json, write_json
 from lerobot.common.envs.factory import make_env
+from lerobot.common.optim.ema import ExponentialMovingAverage
 from lerobot.common.optim.factory import make_optimizer_and_scheduler
+from lerobot.common.optim.optimizers import MasterWeights
 from lerobot.common.policies.factory import make_policy
 from lerobot.common.policies.pretrained import PreTrainedPolicy
-from lerobot.common.policies.utils import get_device_from_parameters
+from lerobot.common.policies.utils import get_autocast_dtype, get_device_from_parameters
+from lerobot.common.utils.benchmark import TimeBenchmark, make_profiler
+from lerobot.common.utils.distributed_utils import (
+    all_reduce_metrics,
+    barrier,
+    cleanup_distributed,
+    get_rank,
+    get_world_size,
+    init_distributed,
+    is_main_process,
+)
 from lerobot.common.utils.logging_utils import AverageMeter, MetricsTracker
 from lerobot.common.utils.random_utils import set_seed
 from lerobot.common.utils.train_utils import (
+    AsyncCheckpointWriter,
+    FrozenDigestCache,
     get_step_checkpoint_dir,
     get_step_identifier,
     load_training_state,
+    prune_checkpoints,
     save_checkpoint,
     update_last_checkpoint,
 )
@@ -53,9 +71,30 @@ from lerobot.configs.train import TrainPipelineConfig
 from lerobot.scripts.eval import eval_policy
 
 
+def get_batch_size(batch: dict) -> int:
+    return next(len(val) for val in batch.values() if isinstance(val, torch.Tensor))
+
+
+def split_batch(batch: dict, num_micro_batches: int) -> list[dict]:
+    """Splits the samples of `batch` into `num_micro_batches` micro-batches of (almost) equal sizes. Values
+    which are neither tensors nor lists with one element per sample are shared by all micro-batches."""
+    batch_size = get_batch_size(batch)
+    bounds = [round(i * batch_size / num_micro_batches) for i in range(num_micro_batches + 1)]
+    micro_batches = []
+    for start, end in zip(bounds[:-1], bounds[1:], strict=True):
+        if start == end:
+            continue
+        micro_batch = {}
+        for key, val in batch.items():
+            is_per_sample = isinstance(val, (torch.Tensor, list)) and len(val) == batch_size
+            micro_batch[key] = val[start:end] if is_per_sample else val
+        micro_batches.append(micro_batch)
+    return micro_batches
+
+
 def update_policy(
     train_metrics: MetricsTracker,
-    policy: PreTrainedPolicy,
+    policy: PreTrainedPolicy | DistributedDataParallel,
     batch: Any,
     optimizer: Optimizer,
     grad_clip_norm: float,
@@ -63,43 +102,88 @@ def update_policy(
     lr_scheduler=None,
     use_amp: bool = False,
     lock=None,
+    gradient_accumulation_steps: int = 1,
+    timers: dict[str, TimeBenchmark] | None = None,
+    amp_dtype: torch.dtype | None = None,
+    master_weights: MasterWeights | None = None,
+    ema: ExponentialMovingAverage | None = None,
 ) -> tuple[MetricsTracker, dict]:
     start_time = time.perf_counter()
+    # Time spent in the "forward_s", "backward_s" and "optim_s" sections of the update
+    timers = timers if timers is not None else {}
     device = get_device_from_parameters(policy)
     policy.train()
-    with torch.autocast(device_type=device.type) if use_amp else nullcontext():
-        loss, output_dict = policy.forward(batch)
-        # TODO(rcadene): policy.unnormalize_outputs(out_dict)
-    grad_scaler.scale(loss).backward()
-
-    # Unscale the gradient of the optimizer's assigned params in-place **prior to gradient clipping**.
-    grad_scaler.unscale_(optimizer)
-
-    grad_norm = torch.nn.utils.clip_grad_norm_(
-        policy.parameters(),
-        grad_clip_norm,
-        error_if_nonfinite=False,
-    )
 
-    # Optimizer's gradients are already unscaled, so scaler.step does not unscale them,
-    # although it still skips optimizer.step() if the gradients contain infs or NaNs.
-    with lock if lock is not None else nullcontext():
-        grad_scaler.step(optimizer)
-    # Updates the scale for next iteration.
-    grad_scaler.update()
-
-    optimizer.zero_grad()
-
-    # Step through pytorch scheduler at every batch instead of epoch
-    if lr_scheduler is not None:
-        lr_scheduler.step()
+    if gradient_accumulation_steps > 1:
+        micro_batches = split_batch(batch, gradient_accumulation_steps)
+    else:
+        micro_batches = [batch]
+    batch_size = get_batch_size(batch)
+    loss = 0.0
+    output_dict = {}
+    for i, micro_batch in enumerate(micro_batches):
+        # Each micro-batch loss is the mean over its samples, weight it so that the accumulated gradients are
+        # the gradients of the mean loss over the whole batch.
+        weight = get_batch_size(micro_batch) / batch_size
+        # Gradients are only synchronized between processes on the last backward pass
+        is_last = i == len(micro_batches) - 1
+        no_sync = isinstance(policy, DistributedDataParallel) and not is_last
+        with policy.no_sync() if no_sync else nullcontext():
+            with (
+                timers.get("forward_s", nullcontext()),
+                torch.autocast(device_type=device.type, dtype=amp_dtype) if use_amp else nullcontext(),
+            ):
+                micro_loss, micro_output_dict = policy.forward(micro_batch)
+                # TODO(rcadene): policy.unnormalize_outputs(out_dict)
+            with timers.get("backward_s", nullcontext()):
+                grad_scaler.scale(micro_loss * weight).backward()
+
+        loss += micro_loss.detach() * weight
+        if micro_output_dict:
+            for key, val in micro_output_dict.items():
+                if isinstance(val, (int, float)) or (isinstance(val, torch.Tensor) and val.ndim == 0):
+                    output_dict[key] = output_dict.get(key, 0.0) + val * weight
+                else:
+                    output_dict[key] = val
+
+    with timers.get("optim_s", nullcontext()):
+        if master_weights is not None:
+            master_weights.copy_grads_to_master()
+        # Unscale the gradient of the optimizer's assigned params in-place **prior to gradient clipping**.
+        grad_scaler.unscale_(optimizer)
+
+        grad_norm = torch.nn.utils.clip_grad_norm_(
+            master_weights.master_params if master_weights is not None else policy.parameters(),
+            grad_clip_norm,
+            error_if_nonfinite=False,
+        )
 
-    if has_method(policy, "update"):
+        # Optimizer's gradients are already unscaled, so scaler.step does not unscale them,
+        # although it still skips optimizer.step() if the gradients contain infs or NaNs.
+        with lock if lock is not None else nullcontext():
+            grad_scaler.step(optimizer)
+        # Updates the scale for next iteration.
+        grad_scaler.update()
+
+        optimizer.zero_grad()
+        if master_weights is not None:
+            master_weights.copy_master_to_params()
+        if ema is not None:
+            # The float32 master weights are averaged, rather than their rounded low precision copies
+            ema.step(master_weights.get_master_params(ema.params) if master_weights is not None else None)
+
+        # Step through pytorch scheduler at every batch instead of epoch
+        if lr_scheduler is not None:
+            lr_scheduler.step()
+
+    unwrapped_policy = policy.module if isinstance(policy, DistributedDataParallel) else policy
+    if has_method(unwrapped_policy, "update"):
         # To possibly update an internal buffer (for instance an Exponential Moving Average like in TDMPC).
-        policy.update()
+        unwrapped_policy.update()
 
-    train_metrics.loss = loss.item()
-    train_metrics.grad_norm = grad_norm.item()
+    # Device tensors, only synchronized with the host when metrics are logged
+    train_metrics.loss = loss
+    train_metrics.grad_norm = grad_norm
     train_metrics.lr = optimizer.param_groups[0]["lr"]
     train_metrics.update_s = time.perf_counter() - start_time
     return train_metrics, output_dict
@@ -108,30 +192,44 @@ def update_policy(
 @parser.wrap()
 def train(cfg: TrainPipelineConfig):
     cfg.validate()
+
+    # Check device is available
+    device = get_safe_torch_device(cfg.policy.device, log=True)
+    # Distributed training when launched with `torchrun --nproc_per_node=N lerobot/scripts/train.py ...`
+    distributed = init_distributed(device)
+    if not is_main_process():
+        # Only the main process logs, saves checkpoints and evaluates the policy
+        logging.getLogger().setLevel(logging.WARNING)
+
     logging.info(pformat(cfg.to_dict()))
 
-    if cfg.wandb.enable and cfg.wandb.project:
+    if cfg.wandb.enable and cfg.wandb.project and is_main_process():
         wandb_logger = WandBLogger(cfg)
     else:
         wandb_logger = None
         logging.info(colored("Logs will be saved locally.", "yellow", attrs=["bold"]))
 
     if cfg.seed is not None:
-        set_seed(cfg.seed)
+        # Model weights are broadcast from the main process by DDP, so different seeds only decorrelate the
+        # data augmentations of each process.
+        set_seed(cfg.seed + get_rank())
 
-    # Check device is available
-    device = get_safe_torch_device(cfg.policy.device, log=True)
     torch.backends.cudnn.benchmark = True
     torch.backends.cuda.matmul.allow_tf32 = True
 
     logging.info("Creating dataset")
-    dataset = make_dataset(cfg)
+    # Let the main process download the dataset before the others load it from the cache
+    if is_main_process():
+        dataset = make_dataset(cfg)
+    barrier()
+    if not is_main_process():
+        dataset = make_dataset(cfg)
 
     # Create environment used for evaluating checkpoints during training on simulation data.
     # On real-world data, no need to create an environment as evaluations are done outside train.py,
     # using the eval.py instead, with gym_dora environment and dora-rs.
     eval_env = None
-    if cfg.eval_freq > 0 and cfg.env is not None:
+    if cfg.eval_freq > 0 and cfg.env is not None and is_main_process():
         logging.info("Creating env")
         eval_env = make_env(cfg.env, n_envs=cfg.eval.batch_size)
 
@@ -140,18 +238,58 @@ def train(cfg: TrainPipelineConfig):
         cfg=cfg.policy,
         ds_meta=dataset.meta,
     )
+    # All precisions but "fp32" autocast the forward pass, including "pure-bf16"
+    use_autocast = cfg.policy.precision != "fp32"
+    amp_dtype = get_autocast_dtype(cfg.policy.precision)
 
     logging.info("Creating optimizer and scheduler")
     optimizer, lr_scheduler = make_optimizer_and_scheduler(cfg, policy)
-    grad_scaler = GradScaler(device.type, enabled=cfg.policy.use_amp)
+    # Only needed for the limited range of float16
+    grad_scaler = GradScaler(device.type, enabled=cfg.policy.precision == "amp-fp16")
+
+    # Created before the parameters are cast to low precision, so that the average starts from float32 weights
+    ema = None
+    if cfg.ema.enable:
+        ema = ExponentialMovingAverage(
+            policy,
+            cfg.ema.decay,
+            device=cfg.ema.device,
+            warmup=cfg.ema.warmup,
+            update_every=cfg.ema.update_every,
+        )
+
+    master_weights = None
+    if cfg.policy.precision == "pure-bf16":
+        # The master weights are copied from the float32 parameters, before casting the parameters updated by
+        # the optimizer to bfloat16. The others (e.g. frozen ones, and the normalization stats which are
+        # parameters too) are kept in float32, the forward pass runs in autocast anyway.
+        master_weights = MasterWeights(optimizer)
+        master_weights.cast_params(torch.bfloat16)
 
     step = 0  # number of policy updates (forward + backward + optim)
 
     if cfg.resume:
-        step, optimizer, lr_scheduler = load_training_state(cfg.checkpoint_path, optimizer, lr_scheduler)
+        step, optimizer, lr_scheduler = load_training_state(
+            cfg.checkpoint_path,
+            optimizer,
+            lr_scheduler,
+            ema=ema,
+            policy=policy,
+            master_weights=master_weights,
+        )
+
+    train_policy = policy
+    if distributed:
+        train_policy = DistributedDataParallel(
+            policy,
+            device_ids=[torch.cuda.current_device()] if device.type == "cuda" else None,
+            find_unused_parameters=cfg.ddp_find_unused_parameters,
+        )
 
     num_learnable_params = sum(p.numel() for p in policy.parameters() if p.requires_grad)
     num_total_params = sum(p.numel() for p in policy.parameters())
+    optimized_params = [p for group in optimizer.param_groups for p in group["params"]]
+    optimizer_state_bytes = cfg.optimizer.get_state_size(optimized_params)
 
     logging.info(colored("Output dir:", "yellow", attrs=["bold"]) + f" {cfg.output_dir}")
     if cfg.env is not None:
@@ -161,9 +299,22 @@ def train(cfg: TrainPipelineConfig):
     logging.info(f"{dataset.num_episodes=}")
     logging.info(f"{num_learnable_params=} ({format_big_number(num_learnable_params)})")
     logging.info(f"{num_total_params=} ({format_big_number(num_total_params)})")
+    logging.info(f"{optimizer_state_bytes=} ({format_big_number(optimizer_state_bytes)}B)")
+    if distributed:
+        logging.info(f"Distributed training on {get_world_size()} processes")
 
     # create dataloader for offline training
-    if hasattr(cfg.policy, "drop_n_last_frames"):
+    if distributed:
+        shuffle = False
+        sampler = DistributedEpisodeAwareSampler(
+            dataset.episode_data_index,
+            num_replicas=get_world_size(),
+            rank=get_rank(),
+            drop_n_last_frames=getattr(cfg.policy, "drop_n_last_frames", 0),
+            shuffle=True,
+            seed=cfg.seed if cfg.seed is not None else 0,
+        )
+    elif hasattr(cfg.policy, "drop_n_last_frames"):
         shuffle = False
         sampler = EpisodeAwareSampler(
             dataset.episode_data_index,
@@ -184,6 +335,8 @@ def train(cfg: TrainPipelineConfig):
         drop_last=False,
     )
     dl_iter = cycle(dataloader)
+    if cfg.prefetch_batches > 0:
+        dl_iter = DevicePrefetcher(dl_iter, device, num_batches=cfg.prefetch_batches)
 
     policy.train()
 
@@ -193,64 +346,162 @@ def train(cfg: TrainPipelineConfig):
         "lr": AverageMeter("lr", ":0.1e"),
         "update_s": AverageMeter("updt_s", ":.3f"),
         "dataloading_s": AverageMeter("data_s", ":.3f"),
+        "samples_per_step": AverageMeter("smpl/stp", ":.0f"),
+        "h2d_s": AverageMeter("h2d_s", ":.3f"),
+        "forward_s": AverageMeter("fwd_s", ":.3f"),
+        "backward_s": AverageMeter("bwd_s", ":.3f"),
+        "optim_s": AverageMeter("optim_s", ":.3f"),
     }
+    if device.type == "cuda":
+        train_metrics["peak_memory_gb"] = AverageMeter("mem_gb", ":.2f")
+    # Timed on the device, without synchronizing it with the host, and averaged per step at log steps
+    step_timers = {
+        name: TimeBenchmark(device=device) for name in ["h2d_s", "forward_s", "backward_s", "optim_s"]
+    }
+    num_timed_steps = 0
 
+    # `batch_size` is per process, each update consumes `batch_size * world_size` samples
     train_tracker = MetricsTracker(
-        cfg.batch_size, dataset.num_frames, dataset.num_episodes, train_metrics, initial_step=step
+        cfg.batch_size * get_world_size(),
+        dataset.num_frames,
+        dataset.num_episodes,
+        train_metrics,
+        initial_step=step,
     )
 
+    checkpoint_writer = None
+    if cfg.save_checkpoint and cfg.async_checkpoint and is_main_process():
+        checkpoint_writer = AsyncCheckpointWriter(max_in_flight=cfg.max_checkpoints_in_flight)
+
+    checkpoints_dir = cfg.output_dir / CHECKPOINTS_DIR
+    retention = cfg.checkpoint_retention
+    blobs_dir = checkpoints_dir / WEIGHT_BLOBS_DIR if retention.deduplicate_weights else None
+    # Digests of the frozen weights, only hashed once across synchronous checkpoints
+    digest_cache = FrozenDigestCache()
+    # Value of `retention.keep_best_metric` at each evaluation step
+    checkpoint_metrics = {}
+    if cfg.resume and (checkpoints_dir / CHECKPOINT_METRICS).is_file():
+        checkpoint_metrics = {int(k): v for k, v in load_json(checkpoints_dir / CHECKPOINT_METRICS).items()}
+
+    profiler = None
+    if cfg.profiler.enable:
+        profiler = make_profiler(
+            cfg.output_dir / "profiler",
+            wait_steps=cfg.profiler.wait_steps,
+            warmup_steps=cfg.profiler.warmup_steps,
+            active_steps=cfg.profiler.active_steps,
+            record_shapes=cfg.profiler.record_shapes,
+            profile_memory=cfg.profiler.profile_memory,
+            with_stack=cfg.profiler.with_stack,
+            worker_name=f"rank{get_rank()}",
+        )
+        profiler.start()
+
     logging.info("Start offline training on a fixed dataset")
     for _ in range(step, cfg.steps):
+        # When prefetching, this only measures the time the training loop is stalled waiting for data
         start_time = time.perf_counter()
         batch = next(dl_iter)
         train_tracker.dataloading_s = time.perf_counter() - start_time
 
-        for key in batch:
-            if isinstance(batch[key], torch.Tensor):
-                batch[key] = batch[key].to(device, non_blocking=True)
+        # No-op for batches already moved to the device by the prefetcher, whose copies overlap with training
+        with step_timers["h2d_s"]:
+            for key in batch:
+                if isinstance(batch[key], torch.Tensor):
+                    batch[key] = batch[key].to(device, non_blocking=True)
 
         train_tracker, output_dict = update_policy(
             train_tracker,
-            policy,
+            train_policy,
             batch,
             optimizer,
             cfg.optimizer.grad_clip_norm,
             grad_scaler=grad_scaler,
             lr_scheduler=lr_scheduler,
-            use_amp=cfg.policy.use_amp,
+            use_amp=use_autocast,
+            gradient_accumulation_steps=cfg.gradient_accumulation_steps,
+            timers=step_timers,
+            amp_dtype=amp_dtype,
+            master_weights=master_weights,
+            ema=ema,
         )
+        num_timed_steps += 1
+        if profiler is not None:
+            profiler.step()
 
         # Note: eval and checkpoint happens *after* the `step`th training update has completed, so we
         # increment `step` here.
         step += 1
-        train_tracker.step()
+        num_samples = get_batch_size(batch) * get_world_size()
+        train_tracker.samples_per_step = num_samples
+        train_tracker.step(num_samples)
         is_log_step = cfg.log_freq > 0 and step % cfg.log_freq == 0
         is_saving_step = step % cfg.save_freq == 0 or step == cfg.steps
         is_eval_step = cfg.eval_freq > 0 and step % cfg.eval_freq == 0
 
         if is_log_step:
+            for name, timer in step_timers.items():
+                train_tracker.metrics[name].update(timer.total / num_timed_steps, n=num_timed_steps)
+                timer.reset()
+            num_timed_steps = 0
+            if device.type == "cuda":
+                # Peak memory allocated during the steps since the last log
+                train_tracker.peak_memory_gb = torch.cuda.max_memory_allocated(device) / 1e9
+                torch.cuda.reset_peak_memory_stats(device)
+            all_reduce_metrics(train_tracker, device)
             logging.info(train_tracker)
             if wandb_logger:
                 wandb_log_dict = train_tracker.to_dict()
                 if output_dict:
-                    wandb_log_dict.update(output_dict)
+                    for key, val in output_dict.items():
+                        is_scalar_tensor = isinstance(val, torch.Tensor) and val.ndim == 0
+                        wandb_log_dict[key] = val.item() if is_scalar_tensor else val
                 wandb_logger.log_dict(wandb_log_dict, step)
             train_tracker.reset_averages()
 
-        if cfg.save_checkpoint and is_saving_step:
+        if cfg.save_checkpoint and is_saving_step and is_main_process():
             logging.info(f"Checkpoint policy after step {step}")
             checkpoint_dir = get_step_checkpoint_dir(cfg.output_dir, cfg.steps, step)
-            save_checkpoint(checkpoint_dir, step, cfg, policy, optimizer, lr_scheduler)
-            update_last_checkpoint(checkpoint_dir)
-            if wandb_logger:
-                wandb_logger.log_policy(checkpoint_dir)
+            if checkpoint_writer is not None:
+                log_policy = wandb_logger.log_policy if wandb_logger else None
+                checkpoint_writer.save(
+                    checkpoint_dir,
+                    step,
+                    cfg,
+                    policy,
+                    optimizer,
+                    lr_scheduler,
+                    callback=log_policy,
+                    blobs_dir=blobs_dir,
+                    ema=ema,
+                    export_ema=cfg.ema.export,
+                    master_weights=master_weights,
+                )
+            else:
+                save_checkpoint(
+                    checkpoint_dir,
+                    step,
+                    cfg,
+                    policy,
+                    optimizer,
+                    lr_scheduler,
+                    blobs_dir=blobs_dir,
+                    ema=ema,
+                    export_ema=cfg.ema.export,
+                    master_weights=master_weights,
+                    digest_cache=digest_cache,
+                )
+                update_last_checkpoint(checkpoint_dir)
+                if wandb_logger:
+                    wandb_logger.log_policy(checkpoint_dir)
 
-        if cfg.env and is_eval_step:
+        if eval_env and is_eval_step:
             step_id = get_step_identifier(step, cfg.steps)
             logging.info(f"Eval policy at step {step}")
             with (
                 torch.no_grad(),
-                torch.autocast(device_type=device.type) if cfg.policy.use_amp else nullcontext(),
+                torch.autocast(device_type=device.type, dtype=amp_dtype) if use_autocast else nullcontext(),
+                ema.apply() if ema is not None and cfg.ema.use_for_eval else nullcontext(),
             ):
                 eval_info = eval_policy(
                     eval_env,
@@ -260,6 +511,9 @@ def train(cfg: TrainPipelineConfig):
                     max_episodes_rendered=4,
                     start_seed=cfg.seed,
                 )
+            if retention.keep_best_metric is not None:
+                checkpoint_metrics[step] = eval_info["aggregated"][retention.keep_best_metric]
+                write_json(checkpoint_metrics, checkpoints_dir / CHECKPOINT_METRICS)
 
             eval_metrics = {
                 "avg_sum_reward": AverageMeter("∑rwrd", ":.3f"),
@@ -278,8 +532,22 @@ def train(cfg: TrainPipelineConfig):
                 wandb_logger.log_dict(wandb_log_dict, step, mode="eval")
                 wandb_logger.log_video(eval_info["video_paths"][0], step, mode="eval")
 
+        # Pruned once the checkpoint and eval metric of this step are known, as the best checkpoint is kept
+        is_pruning_step = cfg.save_checkpoint and (is_saving_step or is_eval_step) and is_main_process()
+        if is_pruning_step and checkpoints_dir.is_dir():
+            for pruned_dir in prune_checkpoints(checkpoints_dir, retention, checkpoint_metrics):
+                logging.info(f"Deleted checkpoint {pruned_dir}")
+
     if eval_env:
         eval_env.close()
+    if checkpoint_writer is not None:
+        checkpoint_writer.stop()
+    if isinstance(dl_iter, DevicePrefetcher):
+        dl_iter.stop()
+    if profiler is not None:
+        profiler.stop()
+    dataset.stop_decode_service()
+    cleanup_distributed()
     logging.info("End of training")
 
 
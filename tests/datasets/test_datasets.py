@@ -34,11 +34,14 @@ from lerobot.common.datasets.lerobot_dataset import (
     LeRobotDataset,
     MultiLeRobotDataset,
 )
+from lerobot.common.datasets.pack_videos import pack_dataset_videos
 from lerobot.common.datasets.utils import (
+    DEFAULT_VIDEO_PATH,
     create_branch,
     flatten_dict,
     unflatten_dict,
 )
+from lerobot.common.datasets.video_utils import decode_video_frames
 from lerobot.common.envs.factory import make_env_config
 from lerobot.common.policies.factory import make_policy_config
 from lerobot.common.robot_devices.robots.utils import make_robot
@@ -83,6 +86,37 @@ def test_same_attributes_defined(tmp_path, lerobot_dataset_factory):
     assert init_attr == create_attr
 
 
+def test_create_packed_videos(tmp_path):
+    robot = make_robot("koch", mock=True)
+    dataset = LeRobotDataset.create(
+        repo_id=DUMMY_REPO_ID, fps=30, robot=robot, root=tmp_path / "packed", pack_videos=True
+    )
+    assert len(dataset.meta.video_keys) > 1
+    assert dataset.meta.packed_videos
+    assert dataset.meta.videos_per_episode == 1
+    video_paths = {dataset.meta.get_video_file_path(0, key) for key in dataset.meta.video_keys}
+    assert video_paths == {dataset.meta.get_video_file_path(0)}
+
+
+def test_packed_videos_round_trip(tmp_path, video_dataset_factory):
+    """Check that the frames decoded from packed videos are those of the per-camera videos they were packed
+    from."""
+    root = tmp_path / "packed"
+    video_dataset_factory(root)
+    pack_dataset_videos(DUMMY_REPO_ID, root=root, keep_unpacked=True)
+    dataset = LeRobotDataset(DUMMY_REPO_ID, root=root, video_backend="pyav")
+    assert dataset.meta.packed_videos
+
+    for idx in [0, 4, len(dataset) - 1]:
+        item = dataset[idx]
+        for key in dataset.meta.video_keys:
+            video_path = root / DEFAULT_VIDEO_PATH.format(episode_chunk=0, video_key=key, episode_index=0)
+            expected_frames = decode_video_frames(
+                video_path, [item["timestamp"].item()], dataset.tolerance_s, backend="pyav"
+            )
+            torch.testing.assert_close(item[key], expected_frames.squeeze(0), rtol=0, atol=0)
+
+
 def test_dataset_initialization(tmp_path, lerobot_dataset_factory):
     kwargs = {
         "repo_id": DUMMY_REPO_ID,
@@ -307,6 +341,21 @@ def test_add_frame_image_uint8(image_dataset):
     assert dataset[0]["image"].shape == torch.Size(DUMMY_CHW)
 
 
+def test_add_frame_raw_image_uint8(tmp_path, empty_lerobot_dataset_factory):
+    features = {"image": {"dtype": "image", "shape": DUMMY_CHW, "names": ["channels", "height", "width"]}}
+    dataset = empty_lerobot_dataset_factory(root=tmp_path / "test", features=features, raw_images=True)
+    images = [np.random.randint(0, 256, DUMMY_HWC, dtype=np.uint8) for _ in range(3)]
+    for image in images:
+        dataset.add_frame({"image": image, "task": "Dummy task"})
+    dataset.save_episode()
+
+    assert dataset.meta.raw_images
+    assert "image" not in dataset.hf_dataset.column_names
+    for i, image in enumerate(images):
+        expected = torch.from_numpy(image).permute(2, 0, 1).float() / 255
+        torch.testing.assert_close(dataset[i]["image"], expected)
+
+
 def test_add_frame_image_pil(image_dataset):
     dataset = image_dataset
     image = np.random.randint(0, 256, DUMMY_HWC, dtype=np.uint8)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+
+# Copyright 2024 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import multiprocessing
+import os
+import signal
+
+import pytest
+import torch
+
+from lerobot.common.datasets.decode_service import VideoDecodeService
+from lerobot.common.datasets.video_utils import decode_video_frames
+
+
+def test_init_zero_processes():
+    with pytest.raises(ValueError):
+        VideoDecodeService(num_processes=0, num_slots=1, slot_size=1)
+
+
+def test_decode_error_is_raised_in_client(tmp_path):
+    service = VideoDecodeService(num_processes=2, num_slots=2, slot_size=1024)
+    try:
+        videos = {
+            "laptop": (tmp_path / "missing_laptop.mp4", [0.0]),
+            "phone": (tmp_path / "missing_phone.mp4", [0.0]),
+        }
+        with pytest.raises(RuntimeError, match="decode service"):
+            service.decode(videos, tolerance_s=1e-4, backend="pyav")
+
+        # slots are released after a failure
+        assert sorted(service.free_slots.get() for _ in range(2)) == [0, 1]
+    finally:
+        service.stop()
+
+
+def test_decode_too_many_videos():
+    service = VideoDecodeService(num_processes=1, num_slots=1, slot_size=1024)
+    try:
+        videos = {"laptop": ("laptop.mp4", [0.0]), "phone": ("phone.mp4", [0.0])}
+        with pytest.raises(ValueError):
+            service.decode(videos, tolerance_s=1e-4)
+    finally:
+        service.stop()
+
+
+def test_decode_process_died(tmp_path):
+    service = VideoDecodeService(num_processes=1, num_slots=1, slot_size=1024)
+    try:
+        service.processes[0].kill()
+        service.processes[0].join()
+        with pytest.raises(RuntimeError, match="died"):
+            service.decode({"laptop": (tmp_path / "laptop.mp4", [0.0])}, tolerance_s=1e-4, backend="pyav")
+    finally:
+        service.stop()
+
+
+def _decode_in_client(service, video_path, errors):
+    try:
+        service.decode({"laptop": (video_path, [0.0])}, tolerance_s=1e-4, backend="pyav")
+    except Exception as e:
+        errors.put(f"{type(e).__name__}: {e}")
+
+
+def test_decode_process_died_in_client(tmp_path):
+    """Clients, like DataLoader workers, don't own the decoding processes and can't reap them."""
+    ctx = multiprocessing.get_context("fork")
+    service = VideoDecodeService(num_processes=1, num_slots=1, slot_size=1024)
+    try:
+        os.kill(service.pids[0], signal.SIGKILL)
+        errors = ctx.Queue()
+        client = ctx.Process(target=_decode_in_client, args=(service, tmp_path / "laptop.mp4", errors))
+        client.start()
+        client.join(timeout=30)
+        assert not client.is_alive()
+        assert "died" in errors.get(timeout=1)
+    finally:
+        service.stop()
+
+
+def test_decode_timeout(tmp_path):
+    service = VideoDecodeService(num_processes=1, num_slots=1, slot_size=1024, timeout_s=0.5)
+    os.kill(service.pids[0], signal.SIGSTOP)
+    try:
+        with pytest.raises(TimeoutError):
+            service.decode({"laptop": (tmp_path / "laptop.mp4", [0.0])}, tolerance_s=1e-4, backend="pyav")
+    finally:
+        os.kill(service.pids[0], signal.SIGCONT)
+        service.stop()
+
+
+def test_decode_after_timeout(tmp_path, video_dataset_factory):
+    """A request completing after its client timed out must not satisfy the next request of its slot."""
+    dataset = video_dataset_factory(tmp_path / "dataset")
+    video_path = dataset.root / dataset.meta.get_video_file_path(0, dataset.meta.video_keys[0])
+    service = VideoDecodeService(num_processes=1, num_slots=1, slot_size=2**20, timeout_s=0.5)
+    os.kill(service.pids[0], signal.SIGSTOP)
+    try:
+        with pytest.raises(TimeoutError):
+            service.decode({"laptop": (video_path, [0.0])}, dataset.tolerance_s, backend="pyav")
+        os.kill(service.pids[0], signal.SIGCONT)
+        service.timeout_s = 30
+
+        frames = service.decode({"laptop": (video_path, [0.3])}, dataset.tolerance_s, backend="pyav")
+        expected = decode_video_frames(video_path, [0.3], dataset.tolerance_s, backend="pyav")
+        torch.testing.assert_close(frames["laptop"], expected, rtol=0, atol=0)
+        assert service.free_slots.get(timeout=1) == 0
+    finally:
+        os.kill(service.pids[0], signal.SIGCONT)
+        service.stop()
+
+
+def test_dataset_decode_service(tmp_path, video_dataset_factory):
+    """Frames decoded by the service, including in DataLoader workers, are those of `decode_video_frames`."""
+    dataset = video_dataset_factory(tmp_path / "dataset", video_backend="pyav")
+    expected = {
+        key: decode_video_frames(
+            dataset.root / dataset.meta.get_video_file_path(0, key),
+            [idx / dataset.fps for idx in range(len(dataset))],
+            dataset.tolerance_s,
+            backend="pyav",
+        )
+        for key in dataset.meta.video_keys
+    }
+
+    dataset.start_decode_service(num_processes=2)
+    try:
+        for idx in range(len(dataset)):
+            item = dataset[idx]
+            for key in dataset.meta.video_keys:
+                torch.testing.assert_close(item[key], expected[key][idx], rtol=0, atol=0)
+
+        dataloader = torch.utils.data.DataLoader(dataset, batch_size=len(dataset), num_workers=2)
+        batch = next(iter(dataloader))
+        for key in dataset.meta.video_keys:
+            torch.testing.assert_close(batch[key], expected[key], rtol=0, atol=0)
+    finally:
+        dataset.stop_decode_service()
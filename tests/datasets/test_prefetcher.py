@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+# Copyright 2024 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import pytest
+import torch
+
+from lerobot.common.datasets.prefetcher import DevicePrefetcher
+from lerobot.common.datasets.utils import cycle
+
+
+def test_init_zero_batches():
+    with pytest.raises(ValueError):
+        DevicePrefetcher([], torch.device("cpu"), num_batches=0)
+
+
+def test_prefetch_preserves_order():
+    batches = [{"index": torch.tensor([i]), "task": [f"task {i}"]} for i in range(5)]
+    prefetcher = DevicePrefetcher(batches, torch.device("cpu"), num_batches=2)
+    for expected, batch in zip(batches, prefetcher, strict=True):
+        torch.testing.assert_close(batch["index"], expected["index"])
+        assert batch["task"] == expected["task"]
+    prefetcher.stop()
+
+
+def test_prefetch_exhausted():
+    prefetcher = DevicePrefetcher([{"index": torch.tensor([0])}], torch.device("cpu"))
+    next(prefetcher)
+    with pytest.raises(StopIteration):
+        next(prefetcher)
+    prefetcher.stop()
+
+
+def test_prefetch_error_is_raised():
+    def batches():
+        yield {"index": torch.tensor([0])}
+        raise RuntimeError("loading failed")
+
+    prefetcher = DevicePrefetcher(batches(), torch.device("cpu"))
+    next(prefetcher)
+    with pytest.raises(RuntimeError, match="loading failed"):
+        next(prefetcher)
+    prefetcher.stop()
+
+
+def test_stop_infinite_iterator():
+    prefetcher = DevicePrefetcher(cycle([{"index": torch.tensor([0])}]), torch.device("cpu"), num_batches=1)
+    next(prefetcher)
+    prefetcher.stop()
+    assert not prefetcher.thread.is_alive()
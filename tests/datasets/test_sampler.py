@@ -16,7 +16,7 @@
 from datasets import Dataset
 
 from lerobot.common.datasets.push_dataset_to_hub.utils import calculate_episode_data_index
-from lerobot.common.datasets.sampler import EpisodeAwareSampler
+from lerobot.common.datasets.sampler import DistributedEpisodeAwareSampler, EpisodeAwareSampler
 from lerobot.common.datasets.utils import (
     hf_transform_to_torch,
 )
@@ -88,3 +88,46 @@ def test_shuffle():
     assert sampler.indices == [0, 1, 2, 3, 4, 5]
     assert len(sampler) == 6
     assert set(sampler) == {0, 1, 2, 3, 4, 5}
+
+
+def test_distributed_shards():
+    dataset = Dataset.from_dict(
+        {
+            "timestamp": [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7],
+            "index": [0, 1, 2, 3, 4, 5, 6],
+            "episode_index": [0, 0, 1, 2, 2, 2, 2],
+        },
+    )
+    dataset.set_transform(hf_transform_to_torch)
+    episode_data_index = calculate_episode_data_index(dataset)
+    samplers = [
+        DistributedEpisodeAwareSampler(
+            episode_data_index, num_replicas=2, rank=rank, drop_n_last_frames=1, shuffle=True, seed=1
+        )
+        for rank in range(2)
+    ]
+    shards = [list(sampler) for sampler in samplers]
+    assert [len(sampler) for sampler in samplers] == [2, 2]
+    assert [len(shard) for shard in shards] == [2, 2]
+    # no overlap between shards, and all indices are sampled
+    assert sorted(shards[0] + shards[1]) == [0, 3, 4, 5]
+
+    # the permutation changes at every iteration, identically on all ranks
+    next_shards = [list(sampler) for sampler in samplers]
+    assert sorted(next_shards[0] + next_shards[1]) == [0, 3, 4, 5]
+    samplers[0].set_epoch(0)
+    assert list(samplers[0]) == shards[0]
+
+
+def test_distributed_padding():
+    dataset = Dataset.from_dict(
+        {
+            "timestamp": [0.1, 0.2, 0.3],
+            "index": [0, 1, 2],
+            "episode_index": [0, 0, 1],
+        },
+    )
+    dataset.set_transform(hf_transform_to_torch)
+    episode_data_index = calculate_episode_data_index(dataset)
+    shards = [list(DistributedEpisodeAwareSampler(episode_data_index, 2, rank)) for rank in range(2)]
+    assert shards == [[0, 2], [1, 0]]
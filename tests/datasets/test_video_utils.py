@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+# Copyright 2024 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import pytest
+import torch
+from torchvision.transforms import CenterCrop
+
+from lerobot.common.datasets.factory import resolve_video_decode_options
+from lerobot.common.datasets.lerobot_dataset import LeRobotDataset
+from lerobot.common.datasets.video_utils import crop_and_resize_frames, decode_video_frames
+from lerobot.common.policies.factory import make_policy_config
+from lerobot.common.policies.utils import crop_images
+from lerobot.common.utils.import_utils import is_package_available
+from tests.fixtures.constants import DUMMY_REPO_ID
+from tests.utils import require_package
+
+BACKENDS = [
+    "pyav",
+    pytest.param(
+        "torchcodec",
+        marks=pytest.mark.skipif(not is_package_available("torchcodec"), reason="torchcodec not installed"),
+    ),
+]
+
+
+def test_crop_and_resize_frames_noop():
+    frames = torch.randint(0, 256, (2, 3, 48, 64), dtype=torch.uint8)
+    assert crop_and_resize_frames(frames) is frames
+
+
+def test_crop_frames_matches_center_crop():
+    frames = torch.randint(0, 256, (2, 3, 48, 64), dtype=torch.uint8)
+    top = int(round((48 - 20) / 2.0))
+    left = int(round((64 - 30) / 2.0))
+    cropped = crop_and_resize_frames(frames, crop=(top, left, 20, 30))
+    torch.testing.assert_close(cropped, CenterCrop((20, 30))(frames))
+
+
+def test_resize_frames_keeps_uint8():
+    frames = torch.randint(0, 256, (2, 3, 48, 64), dtype=torch.uint8)
+    resized = crop_and_resize_frames(frames, crop=(0, 0, 40, 40), resize=(20, 20))
+    assert resized.shape == (2, 3, 20, 20)
+    assert resized.dtype == torch.uint8
+
+
+@require_package("transformers")
+def test_resize_frames_matches_pi0():
+    """Check that frames are resized like pi0 resizes its images, up to their rounding to uint8, so that the
+    policy's own resize is a no-op."""
+    from lerobot.common.policies.pi0.modeling_pi0 import resize_with_pad
+
+    frames = torch.randint(0, 256, (2, 3, 48, 64), dtype=torch.uint8)
+    resized = crop_and_resize_frames(frames, resize=(24, 32)).float() / 255
+    expected = resize_with_pad(frames.float() / 255, 32, 24, pad_value=0)
+    torch.testing.assert_close(resized, expected, rtol=0, atol=0.5 / 255 + 1e-6)
+    torch.testing.assert_close(resize_with_pad(resized, 32, 24, pad_value=0), resized, rtol=0, atol=0)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_decode_video_frames_crop_and_resize(tmp_path, video_dataset_factory, backend):
+    """Check that both backends crop and resize the frames they decode like `crop_and_resize_frames`."""
+    dataset = video_dataset_factory(tmp_path / "dataset")
+    video_path = dataset.root / dataset.meta.get_video_file_path(0, dataset.meta.video_keys[0])
+    timestamps = [0.0, 0.1]
+    crop, resize = (8, 12, 80, 100), (40, 50)
+    frames = decode_video_frames(video_path, timestamps, dataset.tolerance_s, backend, to_float=False)
+    decoded = decode_video_frames(
+        video_path, timestamps, dataset.tolerance_s, backend, crop=crop, resize=resize
+    )
+    expected = crop_and_resize_frames(frames, crop=crop, resize=resize).float() / 255
+    torch.testing.assert_close(decoded, expected, rtol=0, atol=0)
+
+
+def make_decoded_datasets(root, video_dataset_factory, policy_cfg, backend):
+    """Returns a dataset of full resolution frames, and the same dataset decoding frames with the options
+    resolved from `policy_cfg`."""
+    dataset = video_dataset_factory(root, video_backend=backend)
+    decode_options = resolve_video_decode_options(policy_cfg, dataset.meta)
+    assert decode_options is not None
+    decoded_dataset = LeRobotDataset(
+        DUMMY_REPO_ID, root=root, video_backend=backend, video_decode_options=decode_options
+    )
+    return dataset, decoded_dataset
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_dataset_decode_options_diffusion(tmp_path, video_dataset_factory, backend):
+    """Check that a dataset crops frames at decoding time like Diffusion Policy crops its images."""
+    policy_cfg = make_policy_config("diffusion", crop_shape=(80, 100), crop_is_random=False)
+    dataset, decoded_dataset = make_decoded_datasets(
+        tmp_path / "dataset", video_dataset_factory, policy_cfg, backend
+    )
+    for idx in [0, len(dataset) - 1]:
+        item, decoded_item = dataset[idx], decoded_dataset[idx]
+        for key in dataset.meta.video_keys:
+            assert decoded_item[key].shape == (3, 80, 100)
+            expected = crop_images(item[key], policy_cfg.crop_shape)
+            torch.testing.assert_close(decoded_item[key], expected, rtol=0, atol=0)
+            # The policy's own crop is a no-op
+            torch.testing.assert_close(
+                crop_images(decoded_item[key], policy_cfg.crop_shape), decoded_item[key]
+            )
+
+
+@require_package("transformers")
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_dataset_decode_options_pi0(tmp_path, video_dataset_factory, backend):
+    """Check that a dataset resizes frames at decoding time like pi0 resizes its images, up to their rounding
+    to uint8."""
+    from lerobot.common.policies.pi0.modeling_pi0 import resize_with_pad
+
+    # (width, height), the 96x128 frames are resized to 42x56 then padded to 48x56 by the policy
+    policy_cfg = make_policy_config("pi0", resize_imgs_with_padding=(56, 48))
+    dataset, decoded_dataset = make_decoded_datasets(
+        tmp_path / "dataset", video_dataset_factory, policy_cfg, backend
+    )
+    for idx in [0, len(dataset) - 1]:
+        item, decoded_item = dataset[idx], decoded_dataset[idx]
+        for key in dataset.meta.video_keys:
+            assert decoded_item[key].shape == (3, 42, 56)
+            expected = resize_with_pad(item[key][None], 56, 48, pad_value=0)
+            actual = resize_with_pad(decoded_item[key][None], 56, 48, pad_value=0)
+            torch.testing.assert_close(actual, expected, rtol=0, atol=0.5 / 255 + 1e-6)
@@ -35,6 +35,7 @@ from lerobot.common.datasets.utils import (
 from tests.fixtures.constants import (
     DEFAULT_FPS,
     DUMMY_CAMERA_FEATURES,
+    DUMMY_HWC,
     DUMMY_MOTOR_FEATURES,
     DUMMY_REPO_ID,
     DUMMY_ROBOT_TYPE,
@@ -446,3 +447,29 @@ def lerobot_dataset_factory(
 @pytest.fixture(scope="session")
 def empty_lerobot_dataset_factory() -> LeRobotDatasetFactory:
     return partial(LeRobotDataset.create, repo_id=DUMMY_REPO_ID, fps=DEFAULT_FPS)
+
+
+@pytest.fixture(scope="session")
+def video_dataset_factory(img_array_factory) -> LeRobotDatasetFactory:
+    def _create_video_dataset(
+        root: Path, num_frames: int = 10, pack_videos: bool = False, **kwargs
+    ) -> LeRobotDataset:
+        """Records an episode of two cameras, encodes their videos, then loads the dataset from `root`."""
+        features = {
+            f"observation.images.{camera}": {
+                "dtype": "video",
+                "shape": DUMMY_HWC,
+                "names": ["height", "width", "channels"],
+            }
+            for camera in DUMMY_CAMERA_FEATURES
+        }
+        dataset = LeRobotDataset.create(
+            repo_id=DUMMY_REPO_ID, fps=DEFAULT_FPS, root=root, features=features, pack_videos=pack_videos
+        )
+        for _ in range(num_frames):
+            frame = {key: img_array_factory(height=DUMMY_HWC[0], width=DUMMY_HWC[1]) for key in features}
+            dataset.add_frame({**frame, "task": "Dummy task"})
+        dataset.save_episode()
+        return LeRobotDataset(repo_id=DUMMY_REPO_ID, root=root, **kwargs)
+
+    return _create_video_dataset
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+
+# Copyright 2024 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import pytest
+import torch
+from torch import nn
+
+from lerobot.common.constants import EMA_STATE
+from lerobot.common.optim.ema import ExponentialMovingAverage, load_ema_state, save_ema_state
+from lerobot.common.optim.optimizers import MasterWeights, SGDConfig
+
+
+def make_model() -> nn.Module:
+    model = nn.Sequential(nn.Linear(4, 4), nn.Linear(4, 2))
+    model[1].bias.requires_grad_(False)
+    return model
+
+
+@torch.no_grad()
+def set_weights(model: nn.Module, value: float) -> None:
+    for p in model.parameters():
+        if p.requires_grad:
+            p.fill_(value)
+
+
+def test_ema_step():
+    model = make_model()
+    set_weights(model, 0.0)
+    ema = ExponentialMovingAverage(model, decay=0.9, warmup=False)
+    assert ema.names == ["0.weight", "0.bias", "1.weight"]
+
+    set_weights(model, 1.0)
+    ema.step()
+    ema.step()
+    for ema_p in ema.ema_params:
+        torch.testing.assert_close(ema_p, torch.full_like(ema_p, 1 - 0.9**2))
+
+
+def test_ema_warmup():
+    ema = ExponentialMovingAverage(make_model(), decay=0.999, warmup=True)
+    assert ema.get_decay() == pytest.approx(1 / 10)
+    ema.num_steps = 10_000
+    assert ema.get_decay() == 0.999
+
+
+def test_ema_update_every():
+    model = make_model()
+    set_weights(model, 0.0)
+    ema = ExponentialMovingAverage(model, decay=0.9, warmup=False, update_every=2)
+
+    set_weights(model, 1.0)
+    ema.step()
+    torch.testing.assert_close(ema.ema_params[0], torch.zeros_like(ema.ema_params[0]))
+    ema.step()
+    torch.testing.assert_close(ema.ema_params[0], torch.full_like(ema.ema_params[0], 1 - 0.9**2))
+
+
+def test_ema_invalid_update_every():
+    with pytest.raises(ValueError):
+        ExponentialMovingAverage(make_model(), decay=0.9, update_every=0)
+
+
+def test_ema_low_precision_model():
+    model = make_model().to(torch.bfloat16)
+    ema = ExponentialMovingAverage(model, decay=0.9, device="cpu")
+    assert all(ema_p.dtype == torch.float32 for ema_p in ema.ema_params)
+    ema.step()
+
+
+def test_ema_master_weights():
+    model = make_model()
+    ema = ExponentialMovingAverage(model, decay=0.0, warmup=False)
+    optimizer = SGDConfig(lr=1e-3).build([p for p in model.parameters() if p.requires_grad])
+    master_weights = MasterWeights(optimizer)
+    master_weights.cast_params(torch.bfloat16)
+    with torch.no_grad():
+        for master_param in master_weights.master_params:
+            master_param.fill_(1 + 1e-3)
+    master_weights.copy_master_to_params()
+
+    # The float32 master weights are averaged, not their rounded bfloat16 copies
+    ema.step(master_weights.get_master_params(ema.params))
+    for ema_p in ema.ema_params:
+        torch.testing.assert_close(ema_p, torch.full_like(ema_p, 1 + 1e-3), rtol=0, atol=0)
+
+
+def test_ema_apply():
+    model = make_model()
+    set_weights(model, 0.0)
+    ema = ExponentialMovingAverage(model, decay=0.5, warmup=False)
+    set_weights(model, 1.0)
+    ema.step()
+
+    with ema.apply():
+        torch.testing.assert_close(model[0].weight, torch.full_like(model[0].weight, 0.5))
+    torch.testing.assert_close(model[0].weight, torch.ones_like(model[0].weight))
+
+
+def test_ema_get_model_state():
+    model = make_model()
+    set_weights(model, 0.0)
+    ema = ExponentialMovingAverage(model, decay=0.5, warmup=False)
+    set_weights(model, 1.0)
+    ema.step()
+
+    model_state = ema.get_model_state(model)
+    assert set(model_state) == set(model.state_dict())
+    torch.testing.assert_close(model_state["0.weight"], torch.full_like(model[0].weight, 0.5))
+    # Parameters which aren't averaged are those of the model
+    assert model_state["1.bias"] is not None
+    torch.testing.assert_close(model_state["1.bias"], model[1].bias)
+
+
+def test_save_load_ema_state(tmp_path):
+    model = make_model()
+    ema = ExponentialMovingAverage(model, decay=0.9)
+    set_weights(model, 1.0)
+    ema.step()
+    save_ema_state(ema, tmp_path)
+    assert (tmp_path / EMA_STATE).is_file()
+
+    loaded_ema = load_ema_state(ExponentialMovingAverage(make_model(), decay=0.9), tmp_path)
+    assert loaded_ema.num_steps == 1
+    for ema_p, loaded_ema_p in zip(ema.ema_params, loaded_ema.ema_params, strict=True):
+        torch.testing.assert_close(ema_p, loaded_ema_p)
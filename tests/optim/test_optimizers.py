@@ -21,8 +21,11 @@ from lerobot.common.constants import (
 from lerobot.common.optim.optimizers import (
     AdamConfig,
     AdamWConfig,
+    MasterWeights,
+    ParamGroupConfig,
     SGDConfig,
     load_optimizer_state,
+    make_param_groups,
     save_optimizer_state,
 )
 
@@ -42,6 +45,77 @@ def test_optimizer_build(config_cls, expected_class, model_params):
     assert optimizer.defaults["lr"] == config.lr
 
 
+@pytest.mark.parametrize("config_cls", [AdamConfig, AdamWConfig, SGDConfig])
+def test_optimizer_build_foreach(config_cls, model_params):
+    optimizer = config_cls(foreach=True).build(model_params)
+    assert optimizer.defaults["foreach"] is True
+
+
+def test_optimizer_invalid_optim_bits():
+    with pytest.raises(ValueError):
+        AdamWConfig(optim_bits=16)
+
+
+def test_optimizer_get_state_size(model_params):
+    param_bytes = sum(p.numel() * p.element_size() for p in model_params)
+    assert AdamConfig().get_state_size(model_params) == 2 * param_bytes
+    assert AdamWConfig(optim_bits=8).get_state_size(model_params) == param_bytes // 2
+    assert SGDConfig().get_state_size(model_params) == 0
+    assert SGDConfig(momentum=0.9).get_state_size(model_params) == param_bytes
+
+
+def test_make_param_groups():
+    model = torch.nn.ModuleDict(
+        {
+            "backbone": torch.nn.Linear(4, 4),
+            "head": torch.nn.Linear(4, 2),
+            "encoder": torch.nn.Linear(4, 4),
+        }
+    )
+    group_configs = [
+        ParamGroupConfig(pattern=r"^backbone\.", frozen=True),
+        ParamGroupConfig(pattern=r"^head\.", lr=1e-5, weight_decay=0.0),
+    ]
+    param_groups = make_param_groups(model.named_parameters(), group_configs)
+
+    assert not any(p.requires_grad for p in model["backbone"].parameters())
+    assert len(param_groups) == 2
+    assert param_groups[0]["params"] == list(model["encoder"].parameters())
+    assert "lr" not in param_groups[0]
+    assert param_groups[1]["params"] == list(model["head"].parameters())
+    assert param_groups[1]["lr"] == 1e-5
+    assert param_groups[1]["weight_decay"] == 0.0
+
+    optimizer = AdamWConfig(lr=1e-3).build(param_groups)
+    assert [group["lr"] for group in optimizer.param_groups] == [1e-3, 1e-5]
+
+
+def test_master_weights():
+    param = torch.nn.Parameter(torch.ones(4, dtype=torch.bfloat16))
+    optimizer = SGDConfig(lr=1e-3).build([param])
+    master_weights = MasterWeights(optimizer)
+    assert optimizer.param_groups[0]["params"] == master_weights.master_params
+
+    for _ in range(10):
+        (param.float() * 1.0).sum().backward()
+        master_weights.copy_grads_to_master()
+        assert param.grad is None
+        optimizer.step()
+        optimizer.zero_grad()
+        master_weights.copy_master_to_params()
+
+    # Each update is too small to change the bfloat16 weights, but they accumulate in the master weights
+    master_param = master_weights.master_params[0]
+    assert master_param.dtype == torch.float32
+    torch.testing.assert_close(master_param, torch.full((4,), 1 - 10 * 1e-3))
+    torch.testing.assert_close(param, master_param.to(torch.bfloat16))
+
+
+def test_master_weights_after_step(optimizer):
+    with pytest.raises(ValueError):
+        MasterWeights(optimizer)
+
+
 def test_save_optimizer_state(optimizer, tmp_path):
     save_optimizer_state(optimizer, tmp_path)
     assert (tmp_path / OPTIMIZER_STATE).is_file()
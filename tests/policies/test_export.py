@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+# Copyright 2024 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import numpy as np
+import pytest
+import torch
+
+from lerobot.common.exported_policy import EXPORT_INFO, ExportedPolicy
+from lerobot.common.policies.export import EXPORT_STATS, export_policy
+from tests.utils import make_tiny_observation, make_tiny_policy, require_package
+
+
+def make_observation() -> dict[str, np.ndarray]:
+    return {key: val.numpy() for key, val in make_tiny_observation().items()}
+
+
+@pytest.mark.parametrize("n_action_steps, temporal_ensemble_coeff", [(3, None), (1, 0.01)])
+def test_export_act_torchscript(tmp_path, n_action_steps, temporal_ensemble_coeff):
+    """Check that the exported ACT selects the actions of the policy, with queues or temporal ensembling."""
+    policy = make_tiny_policy(
+        "act", n_action_steps=n_action_steps, temporal_ensemble_coeff=temporal_ensemble_coeff
+    )
+    export_policy(policy, tmp_path, export_format="torchscript")
+    assert (tmp_path / EXPORT_INFO).is_file()
+    assert (tmp_path / EXPORT_STATS).is_file()
+
+    exported_policy = ExportedPolicy(tmp_path)
+    policy.reset()
+    for _ in range(7):
+        observation = make_observation()
+        action = exported_policy.select_action(observation)
+        expected_action = policy.select_action({k: torch.from_numpy(v) for k, v in observation.items()})
+        np.testing.assert_allclose(action, expected_action.numpy(), rtol=1e-4, atol=1e-4)
+
+
+@require_package("onnx")
+@require_package("onnxruntime")
+def test_export_act_onnx(tmp_path):
+    policy = make_tiny_policy("act")
+    export_policy(policy, tmp_path, export_format="onnx")
+
+    exported_policy = ExportedPolicy(tmp_path)
+    observation = make_observation()
+    actions = exported_policy.predict_action_chunk(observation)
+    with torch.no_grad():
+        batch = {k: torch.from_numpy(v) for k, v in observation.items()}
+        expected_actions = policy.predict_action_chunk(batch)
+    np.testing.assert_allclose(actions, expected_actions.numpy(), rtol=1e-4, atol=1e-4)
+
+
+def check_diffusion_export(tmp_path, export_format: str):
+    """Check that the exported Diffusion Policy takes histories of observations, and runs once per chunk."""
+    policy = make_tiny_policy("diffusion")
+    export_policy(policy, tmp_path, export_format=export_format)
+
+    exported_policy = ExportedPolicy(tmp_path)
+    assert exported_policy.info["inputs"][0]["shape"] == [1, policy.config.n_obs_steps, 6]
+    run = exported_policy._run
+    num_runs = 0
+
+    def counting_run(inputs):
+        nonlocal num_runs
+        num_runs += 1
+        return run(inputs)
+
+    exported_policy._run = counting_run
+    for _ in range(2 * policy.config.n_action_steps):
+        action = exported_policy.select_action(make_observation())
+        assert action.shape == (1, 6)
+        assert np.isfinite(action).all()
+    assert num_runs == 2
+
+
+def test_export_diffusion_torchscript(tmp_path):
+    check_diffusion_export(tmp_path, "torchscript")
+
+
+@require_package("onnx")
+@require_package("onnxruntime")
+def test_export_diffusion_onnx(tmp_path):
+    check_diffusion_export(tmp_path, "onnx")
+
+
+def test_export_invalid_shape(tmp_path):
+    export_policy(make_tiny_policy("act"), tmp_path, export_format="torchscript")
+    observation = make_observation()
+    observation["observation.state"] = observation["observation.state"][:, :5]
+    with pytest.raises(ValueError):
+        ExportedPolicy(tmp_path).select_action(observation)
+
+
+def test_export_unsupported_policy(tmp_path):
+    with pytest.raises(NotImplementedError):
+        export_policy(make_tiny_policy("tdmpc"), tmp_path, export_format="torchscript")
@@ -16,10 +16,12 @@
 import inspect
 from copy import deepcopy
 from pathlib import Path
+from types import SimpleNamespace
 
 import einops
 import pytest
 import torch
+import torchvision
 from safetensors.torch import load_file
 
 from lerobot import available_policies
@@ -36,12 +38,14 @@ from lerobot.common.policies.factory import (
 )
 from lerobot.common.policies.normalize import Normalize, Unnormalize
 from lerobot.common.policies.pretrained import PreTrainedPolicy
+from lerobot.common.policies.utils import compile_policy, crop_images
 from lerobot.common.utils.random_utils import seeded_context
 from lerobot.configs.default import DatasetConfig
+from lerobot.configs.policies import PreTrainedConfig
 from lerobot.configs.train import TrainPipelineConfig
 from lerobot.configs.types import FeatureType, NormalizationMode, PolicyFeature
 from tests.artifacts.policies.save_policy_to_safetensors import get_policy_stats
-from tests.utils import DEVICE, require_cpu, require_env, require_x86_64_kernel
+from tests.utils import DEVICE, require_cpu, require_env, require_package, require_x86_64_kernel
 
 
 @pytest.fixture
@@ -259,6 +263,384 @@ def test_save_and_load_pretrained(dummy_dataset_metadata, tmp_path, policy_name:
     torch.testing.assert_close(list(policy.parameters()), list(loaded_policy.parameters()), rtol=0, atol=0)
 
 
+@require_cpu
+def test_compile_act_matches_eager(dummy_dataset_metadata, tmp_path, monkeypatch):
+    """Check that compiling the ACT policy with inductor on cpu keeps its state dict and outputs unchanged."""
+    monkeypatch.setenv("TORCHINDUCTOR_CACHE_DIR", str(tmp_path / "compile_cache"))
+    policy_cfg = make_policy_config("act", device="cpu")
+    policy = make_policy(policy_cfg, ds_meta=dummy_dataset_metadata)
+    policy.eval()
+    eager_policy = deepcopy(policy)
+
+    compile_policy(policy)
+    assert list(policy.state_dict()) == list(eager_policy.state_dict())
+
+    # The second batch size triggers a single recompilation with a dynamic batch dimension
+    for batch_size in [2, 1]:
+        batch = {
+            "observation.state": torch.randn(batch_size, 6),
+            "observation.images": [torch.randn(batch_size, 3, 84, 84)],
+        }
+        with torch.no_grad():
+            actions, _ = policy.model(batch)
+            eager_actions, _ = eager_policy.model(batch)
+        torch.testing.assert_close(actions, eager_actions, rtol=1e-4, atol=1e-4)
+    assert any(path.is_file() for path in (tmp_path / "compile_cache").rglob("*"))
+
+
+def test_crop_images():
+    images = torch.rand(2, 3, 10, 12)
+    torch.testing.assert_close(
+        crop_images(images, (7, 8)), torchvision.transforms.CenterCrop((7, 8))(images), rtol=0, atol=0
+    )
+    cropped = crop_images(images, (7, 8), random=True)
+    windows = images.unfold(2, 7, 1).unfold(3, 8, 1)  # (B, C, 4, 5, 7, 8)
+    matches = (windows == cropped[:, :, None, None]).flatten(-2).all(-1).all(1).all(0)
+    assert matches.any()
+
+
+def make_training_batch(policy_cfg, batch_size: int) -> dict[str, torch.Tensor]:
+    """Makes a random training batch with the features and temporal dimensions expected by a policy."""
+
+    def make_steps(delta_indices: list | None) -> tuple[int, ...]:
+        return () if delta_indices is None else (len(delta_indices),)
+
+    batch = {"index": torch.arange(batch_size)}
+    features = [
+        (key, ft.shape, make_steps(policy_cfg.observation_delta_indices))
+        for key, ft in policy_cfg.input_features.items()
+    ]
+    features.append(("action", policy_cfg.action_feature.shape, make_steps(policy_cfg.action_delta_indices)))
+    if policy_cfg.reward_delta_indices is not None:
+        features.append(("next.reward", (), make_steps(policy_cfg.reward_delta_indices)))
+    for key, shape, steps in features:
+        batch[key] = torch.rand(batch_size, *steps, *shape)
+        if steps:
+            batch[f"{key}_is_pad"] = torch.zeros(batch_size, *steps, dtype=torch.bool)
+    return batch
+
+
+def check_partial_last_batch_compilation(train_step) -> None:
+    """Runs `train_step(batch_size)` on full batches, the partial last batch of an epoch, then on another
+    batch size, and checks that dynamo captures full graphs, which are recompiled at most once with a dynamic
+    batch dimension."""
+    from torch._dynamo.utils import counters
+
+    counters.clear()
+    num_graphs = []
+    for batch_size in [4, 4, 3, 2]:
+        train_step(batch_size)
+        num_graphs.append(counters["stats"]["unique_graphs"])
+    assert not counters["graph_break"]
+    assert num_graphs[0] > 0
+    assert num_graphs[1] == num_graphs[0]
+    assert num_graphs[2] <= 2 * num_graphs[0]
+    assert num_graphs[3] == num_graphs[2]
+
+
+@require_cpu
+@pytest.mark.parametrize(
+    "policy_name, policy_kwargs",
+    [
+        ("act", {}),
+        ("diffusion", {"down_dims": (64, 128), "crop_shape": (76, 76)}),
+        ("tdmpc", {"latent_dim": 16, "mlp_dim": 32, "q_ensemble_size": 2}),
+        ("vqbet", {"crop_shape": (76, 76), "gpt_n_layer": 2, "gpt_n_head": 2, "gpt_hidden_dim": 64}),
+    ],
+)
+def test_compile_policy_partial_last_batch(
+    dummy_dataset_metadata, tmp_path, monkeypatch, policy_name, policy_kwargs
+):
+    """Check that the compiled modules of a policy are captured in full graphs during training, and that they
+    are recompiled at most once, with a dynamic batch dimension, for the partial last batch of an epoch."""
+    monkeypatch.setenv("TORCHINDUCTOR_CACHE_DIR", str(tmp_path / "compile_cache"))
+    policy_cfg = make_policy_config(policy_name, device="cpu", **policy_kwargs)
+    policy = make_policy(policy_cfg, ds_meta=dummy_dataset_metadata)
+    policy.train()
+    if policy_name == "vqbet":
+        # Skip the discretization phase, which doesn't use the compiled modules
+        policy.vqbet.action_head.vqvae_model.discretized.fill_(True)
+    torch._dynamo.reset()
+    compile_policy(policy)
+
+    def train_step(batch_size: int):
+        loss, _ = policy.forward(make_training_batch(policy_cfg, batch_size))
+        loss.backward()
+
+    check_partial_last_batch_compilation(train_step)
+
+
+@require_cpu
+@require_package("transformers")
+def test_compile_pi0_partial_last_batch(tmp_path, monkeypatch):
+    """Same as `test_compile_policy_partial_last_batch` for pi0, with a tiny PaliGemma and Gemma expert."""
+    from lerobot.common.policies.pi0.configuration_pi0 import PI0Config
+    from lerobot.common.policies.pi0.modeling_pi0 import PI0FlowMatching, make_tiny_architectures
+
+    monkeypatch.setenv("TORCHINDUCTOR_CACHE_DIR", str(tmp_path / "compile_cache"))
+    tiny_architectures = make_tiny_architectures()
+    config = PI0Config(
+        device="cpu",
+        chunk_size=4,
+        n_action_steps=4,
+        max_state_dim=6,
+        max_action_dim=6,
+        proj_width=tiny_architectures["gemma_expert_config"]["hidden_size"],
+    )
+    model = PI0FlowMatching(config, **tiny_architectures)
+    model.train()
+    torch._dynamo.reset()
+    compile_policy(SimpleNamespace(get_compiled_modules=lambda: [model.paligemma_with_expert]))
+
+    def train_step(batch_size: int):
+        losses = model.forward(
+            [torch.rand(batch_size, 3, 28, 28) * 2 - 1],
+            [torch.ones(batch_size, dtype=torch.bool)],
+            torch.randint(0, 100, (batch_size, 5)),
+            torch.ones(batch_size, 5, dtype=torch.bool),
+            torch.randn(batch_size, 6),
+            torch.randn(batch_size, 4, 6),
+        )
+        losses.mean().backward()
+
+    check_partial_last_batch_compilation(train_step)
+
+
+@require_cpu
+def test_act_activation_checkpointing_matches(dummy_dataset_metadata):
+    """Check that activation checkpointing in ACT keeps its outputs and gradients unchanged."""
+    policy_cfg = make_policy_config("act", device="cpu", use_vae=False)
+    policy = make_policy(policy_cfg, ds_meta=dummy_dataset_metadata)
+    policy.train()
+    checkpointed_policy = deepcopy(policy)
+    checkpointed_policy.model.encoder.activation_checkpointing = True
+    checkpointed_policy.model.decoder.activation_checkpointing = True
+
+    batch = {
+        "observation.state": torch.randn(2, 6),
+        "observation.images": [torch.randn(2, 3, 84, 84)],
+    }
+    outputs = []
+    for p in [policy, checkpointed_policy]:
+        # Same dropout masks in both policies, which are also reproduced when recomputing activations
+        with seeded_context(1337):
+            actions, _ = p.model(batch)
+        actions.sum().backward()
+        outputs.append(actions)
+
+    torch.testing.assert_close(outputs[0], outputs[1])
+    for param, checkpointed_param in zip(policy.parameters(), checkpointed_policy.parameters(), strict=True):
+        if param.grad is not None:
+            torch.testing.assert_close(param.grad, checkpointed_param.grad)
+
+
+@pytest.mark.parametrize("sampler", ["DDPM", "DDIM", "DPMSolver++", "consistency"])
+def test_diffusion_samplers(dummy_dataset_metadata, sampler):
+    """Check that each sampler of Diffusion Policy runs, including when warm-starting from the last chunk."""
+    policy_cfg = make_policy_config(
+        "diffusion",
+        device="cpu",
+        down_dims=(64, 128),
+        sampler=sampler,
+        num_inference_steps=4,
+        warm_start=True,
+    )
+    policy = make_policy(policy_cfg, ds_meta=dummy_dataset_metadata)
+    policy.eval()
+    batch = {
+        "observation.state": torch.randn(2, 6),
+        "observation.images.laptop": torch.rand(2, 3, 84, 84),
+    }
+    # The second chunk of actions is warm-started from the first one
+    for _ in range(2 * policy_cfg.n_action_steps):
+        assert policy.select_action(batch).shape == (2, 6)
+    assert policy.diffusion._prev_sample is not None
+
+    policy.reset()
+    assert policy.diffusion._prev_sample is None
+
+
+def test_diffusion_image_features_cache(dummy_dataset_metadata):
+    """Check that each frame is only encoded once during rollouts of Diffusion Policy, including when they
+    swap their rollout states."""
+    policy_cfg = make_policy_config(
+        "diffusion", device="cpu", down_dims=(64, 128), n_action_steps=1, num_inference_steps=2
+    )
+    policy = make_policy(policy_cfg, ds_meta=dummy_dataset_metadata)
+    policy.eval()
+    num_encoded_images = 0
+    rgb_encoder_forward = policy.diffusion.rgb_encoder.forward
+
+    def counting_forward(x):
+        nonlocal num_encoded_images
+        num_encoded_images += len(x)
+        return rgb_encoder_forward(x)
+
+    policy.diffusion.rgb_encoder.forward = counting_forward
+    batch_size, num_steps = 2, 5
+    # Two rollouts sharing the policy by swapping their states, like with the policy server
+    states = [policy.get_rollout_state()]
+    policy.reset()
+    states.append(policy.get_rollout_state())
+    for _ in range(num_steps):
+        for i, state in enumerate(states):
+            policy.set_rollout_state(state)
+            batch = {
+                "observation.state": torch.randn(batch_size, 6),
+                "observation.images.laptop": torch.rand(batch_size, 3, 84, 84),
+            }
+            policy.select_action(batch)
+            states[i] = policy.get_rollout_state()
+    assert num_encoded_images == len(states) * batch_size * num_steps
+    assert all(features is not None for features in policy._queues["observation.image_features"])
+
+
+def test_diffusion_invalid_sampler():
+    with pytest.raises(ValueError):
+        make_policy_config("diffusion", sampler="unknown")
+
+
+def test_tdmpc_plan(dummy_dataset_metadata):
+    """Check that TD-MPC estimates values like a step by step rollout, and that planning reuses buffers."""
+    policy_cfg = make_policy_config(
+        "tdmpc",
+        device="cpu",
+        latent_dim=16,
+        mlp_dim=32,
+        q_ensemble_size=2,
+        n_gaussian_samples=16,
+        n_pi_samples=4,
+        n_elites=4,
+    )
+    policy = make_policy(policy_cfg, ds_meta=dummy_dataset_metadata)
+    policy.eval()
+    model = policy.model
+    # The last layers of the reward and Q networks are zero-initialized
+    for module in [model._reward, *model._Qs]:
+        torch.nn.init.normal_(module[-1].weight)
+
+    z = torch.rand(3, policy_cfg.latent_dim)
+    actions = torch.rand(policy_cfg.horizon, 3, 6) * 2 - 1
+    coeff = policy_cfg.uncertainty_regularizer_coeff
+    expected_value, running_discount, _z = 0, 1, z
+    with torch.no_grad(), seeded_context(1337):
+        for t in range(policy_cfg.horizon):
+            regularization = -coeff * model.Qs(_z, actions[t]).std(0)
+            _z, reward = model.latent_dynamics_and_reward(_z, actions[t])
+            expected_value += running_discount * (reward + regularization)
+            running_discount *= policy_cfg.discount
+        terminal_values = model.Qs(_z, model.pi(_z, policy_cfg.min_std))
+        expected_value += running_discount * (terminal_values.min(0)[0] - coeff * terminal_values.std(0))
+    with seeded_context(1337):
+        value = policy.estimate_value(z, actions)
+    torch.testing.assert_close(value, expected_value)
+
+    policy.plan(torch.rand(2, policy_cfg.latent_dim))
+    workspace = policy._plan_actions
+    # The second plan is warm-started from the first one
+    planned_actions = policy.plan(torch.rand(2, policy_cfg.latent_dim))
+    assert planned_actions.shape == (policy_cfg.horizon, 2, 6)
+    assert policy._plan_actions is workspace
+
+    # The workspace is only allocated again when the batch size changes
+    policy.reset()
+    assert policy.plan(torch.rand(3, policy_cfg.latent_dim)).shape == (policy_cfg.horizon, 3, 6)
+    assert policy._plan_actions.shape == (policy_cfg.horizon, 20, 3, 6)
+
+
+@require_package("transformers")
+@pytest.mark.parametrize("prefix_cache_threshold", [None, 0.0])
+def test_pi0_static_inference(prefix_cache_threshold):
+    """Check that the static inference of pi0 and the reuse of its prefix cache match the default one."""
+    from lerobot.common.policies.pi0.configuration_pi0 import PI0Config
+    from lerobot.common.policies.pi0.modeling_pi0 import PI0FlowMatching, make_tiny_architectures
+
+    tiny_architectures = make_tiny_architectures()
+    config = PI0Config(
+        device="cpu",
+        chunk_size=4,
+        n_action_steps=4,
+        max_state_dim=6,
+        max_action_dim=6,
+        proj_width=tiny_architectures["gemma_expert_config"]["hidden_size"],
+    )
+    model = PI0FlowMatching(config, **tiny_architectures)
+    model.eval()
+
+    images = [torch.rand(2, 3, 28, 28) * 2 - 1]
+    img_masks = [torch.ones(2, dtype=torch.bool)]
+    lang_tokens = torch.randint(0, 100, (2, 5))
+    lang_masks = torch.tensor([[True] * 5, [True] * 3 + [False] * 2])
+    state = torch.randn(2, 6)
+    noise = torch.randn(2, 4, 6)
+    inputs = (images, img_masks, lang_tokens, lang_masks, state)
+
+    with torch.no_grad():
+        expected_actions = model.sample_actions(*inputs, noise=noise.clone())
+
+        config.static_inference = True
+        config.prefix_cache_threshold = prefix_cache_threshold
+        model.reset()
+        # The second chunk reuses the prefix cache when `prefix_cache_threshold` is set
+        for _ in range(2):
+            actions = model.sample_actions(*inputs, noise=noise.clone())
+            torch.testing.assert_close(actions, expected_actions)
+    assert (model._prefix_cache is not None) == (prefix_cache_threshold is not None)
+
+    model.reset()
+    assert model._prefix_cache is None
+
+
+@pytest.mark.parametrize(
+    "use_amp, precision, expected_precision",
+    [
+        (False, None, "fp32"),
+        (True, None, "amp-bf16"),
+        (True, "amp-bf16", "amp-bf16"),
+        (False, "pure-bf16", "pure-bf16"),
+    ],
+)
+def test_policy_config_precision(use_amp, precision, expected_precision):
+    policy_cfg = make_policy_config("act", device="cpu", use_amp=use_amp, precision=precision)
+    assert policy_cfg.precision == expected_precision
+    assert policy_cfg.use_amp == expected_precision.startswith("amp-")
+
+
+def test_policy_config_invalid_precision():
+    with pytest.raises(ValueError):
+        make_policy_config("act", device="cpu", precision="fp8")
+
+
+@pytest.mark.parametrize("precision", ["fp32", "pure-bf16"])
+def test_policy_config_precision_conflicts_with_amp(precision):
+    with pytest.raises(ValueError):
+        make_policy_config("act", device="cpu", use_amp=True, precision=precision)
+
+
+@pytest.mark.parametrize(
+    "saved_kwargs, cli_overrides, expected_precision",
+    [
+        ({}, ["--use_amp=true"], "amp-bf16"),
+        ({"precision": "pure-bf16"}, ["--use_amp=true"], "amp-bf16"),
+        ({"use_amp": True}, ["--precision=fp32"], "fp32"),
+        ({"use_amp": True}, ["--precision=pure-bf16"], "pure-bf16"),
+        ({"use_amp": True}, ["--use_amp=false"], "fp32"),
+    ],
+)
+def test_policy_config_precision_overrides(tmp_path, saved_kwargs, cli_overrides, expected_precision):
+    """Overriding only one of `use_amp` and `precision` of a saved config derives the other one again."""
+    make_policy_config("act", device="cpu", **saved_kwargs)._save_pretrained(tmp_path)
+    policy_cfg = PreTrainedConfig.from_pretrained(tmp_path, cli_overrides=cli_overrides)
+    assert policy_cfg.precision == expected_precision
+    assert policy_cfg.use_amp == expected_precision.startswith("amp-")
+
+
+def test_policy_config_precision_overrides_conflict(tmp_path):
+    make_policy_config("act", device="cpu")._save_pretrained(tmp_path)
+    with pytest.raises(ValueError):
+        PreTrainedConfig.from_pretrained(tmp_path, cli_overrides=["--use_amp=true", "--precision=fp32"])
+
+
 @pytest.mark.parametrize("insert_temporal_dim", [False, True])
 def test_normalize(insert_temporal_dim):
     """
@@ -361,6 +743,53 @@ def test_normalize(insert_temporal_dim):
     unnormalize(output_batch)
 
 
+@pytest.mark.parametrize("norm_mode", [NormalizationMode.MEAN_STD, NormalizationMode.MIN_MAX])
+def test_normalize_affine(norm_mode):
+    """Test that the precomputed affine normalization matches the stats, including after loading them."""
+    features = {
+        "observation.image": PolicyFeature(type=FeatureType.VISUAL, shape=(3, 96, 96)),
+        "observation.state": PolicyFeature(type=FeatureType.STATE, shape=(10,)),
+    }
+    norm_map = {"VISUAL": norm_mode, "STATE": norm_mode}
+    stats = {
+        "observation.image": {
+            "mean": torch.rand(3, 1, 1),
+            "std": torch.rand(3, 1, 1) + 0.5,
+            "min": -torch.rand(3, 1, 1),
+            "max": torch.rand(3, 1, 1) + 0.5,
+        },
+        "observation.state": {
+            "mean": torch.randn(10),
+            "std": torch.rand(10) + 0.5,
+            "min": -torch.rand(10) - 1,
+            "max": torch.rand(10) + 1,
+        },
+    }
+    batch = {
+        "observation.image": torch.rand(2, 3, 96, 96),
+        "observation.state": torch.randn(2, 10),
+    }
+
+    normalize = Normalize(features, norm_map, stats=None)
+    normalize.load_state_dict(Normalize(features, norm_map, stats=stats).state_dict())
+    assert set(normalize.state_dict()) == {
+        f"buffer_{key.replace('.', '_')}.{stat}"
+        for key in features
+        for stat in (["mean", "std"] if norm_mode is NormalizationMode.MEAN_STD else ["min", "max"])
+    }
+    normalized_batch = normalize(batch)
+    for key, x in batch.items():
+        if norm_mode is NormalizationMode.MEAN_STD:
+            expected = (x - stats[key]["mean"]) / (stats[key]["std"] + 1e-8)
+        else:
+            expected = (x - stats[key]["min"]) / (stats[key]["max"] - stats[key]["min"] + 1e-8) * 2 - 1
+        torch.testing.assert_close(normalized_batch[key], expected)
+
+    unnormalize = Unnormalize(features, norm_map, stats=stats)
+    for key, x in unnormalize(normalized_batch).items():
+        torch.testing.assert_close(x, batch[key], rtol=1e-5, atol=1e-5)
+
+
 @pytest.mark.parametrize(
     "ds_repo_id, policy_name, policy_kwargs, file_name_extra",
     [
@@ -482,3 +911,64 @@ def test_act_temporal_ensembler():
         assert torch.all(offline_avg <= einops.reduce(seq_slice, "b s 1 -> b 1", "max"))
         # Selected atol=1e-4 keeping in mind actions in [-1, 1] and excepting 0.01% error.
         torch.testing.assert_close(online_avg, offline_avg, rtol=1e-4, atol=1e-4)
+
+
+class ReferenceACTTemporalEnsembler:
+    """The original implementation of `ACTTemporalEnsembler`, which reallocates its averages at each step."""
+
+    def __init__(self, temporal_ensemble_coeff: float, chunk_size: int) -> None:
+        self.chunk_size = chunk_size
+        self.ensemble_weights = torch.exp(-temporal_ensemble_coeff * torch.arange(chunk_size))
+        self.ensemble_weights_cumsum = torch.cumsum(self.ensemble_weights, dim=0)
+        self.ensembled_actions = None
+        self.ensembled_actions_count = None
+
+    def update(self, actions: torch.Tensor) -> torch.Tensor:
+        if self.ensembled_actions is None:
+            self.ensembled_actions = actions.clone()
+            self.ensembled_actions_count = torch.ones((self.chunk_size, 1), dtype=torch.long)
+        else:
+            self.ensembled_actions *= self.ensemble_weights_cumsum[self.ensembled_actions_count - 1]
+            self.ensembled_actions += actions[:, :-1] * self.ensemble_weights[self.ensembled_actions_count]
+            self.ensembled_actions /= self.ensemble_weights_cumsum[self.ensembled_actions_count]
+            self.ensembled_actions_count = torch.clamp(self.ensembled_actions_count + 1, max=self.chunk_size)
+            self.ensembled_actions = torch.cat([self.ensembled_actions, actions[:, -1:]], dim=1)
+            self.ensembled_actions_count = torch.cat(
+                [self.ensembled_actions_count, torch.ones_like(self.ensembled_actions_count[-1:])]
+            )
+        action, self.ensembled_actions, self.ensembled_actions_count = (
+            self.ensembled_actions[:, 0],
+            self.ensembled_actions[:, 1:],
+            self.ensembled_actions_count[1:],
+        )
+        return action
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 10])
+@pytest.mark.parametrize("temporal_ensemble_coeff", [0.01, -0.1])
+def test_act_temporal_ensembler_matches_reference(chunk_size, temporal_ensemble_coeff):
+    """Check that the ring buffer gives exactly the actions of the original implementation."""
+    ensembler = ACTTemporalEnsembler(temporal_ensemble_coeff, chunk_size)
+    reference_ensembler = ReferenceACTTemporalEnsembler(temporal_ensemble_coeff, chunk_size)
+    with seeded_context(0):
+        episode = torch.randn(3 * chunk_size + 5, 2, chunk_size, 3)
+    for actions in episode:
+        expected_action = reference_ensembler.update(actions)
+        torch.testing.assert_close(ensembler.update(actions), expected_action, rtol=0, atol=0)
+
+
+def test_act_temporal_ensembler_reset():
+    """Check that the ensembler gives the same actions after a reset, even when the batch size changed."""
+    chunk_size = 10
+    ensembler = ACTTemporalEnsembler(0.01, chunk_size)
+    with seeded_context(0):
+        episode = torch.rand(15, 2, chunk_size, 3)
+        other_episode = torch.rand(15, 4, chunk_size, 3)
+
+    expected_actions = [ensembler.update(actions) for actions in episode]
+    ensembler.reset()
+    for actions in other_episode:
+        ensembler.update(actions)
+    ensembler.reset()
+    for actions, expected_action in zip(episode, expected_actions, strict=True):
+        torch.testing.assert_close(ensembler.update(actions), expected_action, rtol=0, atol=0)
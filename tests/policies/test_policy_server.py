@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+
+# Copyright 2024 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+import torch
+import zmq
+
+from lerobot.common.policies.act.modeling_act import ACTTemporalEnsembler
+from lerobot.common.policies.policy_server import (
+    PolicyClient,
+    PolicyServer,
+    decode_message,
+    encode_message,
+    get_rollout_state_signature,
+    merge_rollout_states,
+    split_rollout_state,
+)
+
+
+class CountingPolicy:
+    """Returns the observed state plus the number of steps of the rollout, and records the batch sizes."""
+
+    name = "counting"
+
+    def __init__(self, fail: bool = False):
+        self.config = SimpleNamespace(device="cpu", precision="fp32", use_amp=False)
+        self.fail = fail
+        self.batch_sizes = []
+        self.reset()
+
+    def eval(self):
+        pass
+
+    def reset(self):
+        self._steps = deque([torch.zeros(1, 1)], maxlen=1)
+
+    def get_rollout_state(self) -> dict:
+        return {"steps": self._steps}
+
+    def set_rollout_state(self, state: dict) -> None:
+        self._steps = state["steps"]
+
+    def select_action(self, batch: dict[str, torch.Tensor]) -> torch.Tensor:
+        if self.fail:
+            raise ValueError("inference failed")
+        self.batch_sizes.append(len(batch["observation.state"]))
+        steps = self._steps.popleft()
+        self._steps.append(steps + 1)
+        return batch["observation.state"] + steps
+
+
+@pytest.fixture
+def make_server():
+    servers = []
+
+    def _make_server(policy, **kwargs) -> tuple[PolicyServer, str]:
+        server = PolicyServer(policy, "tcp://127.0.0.1:*", **kwargs)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        servers.append((server, thread))
+        return server, server.socket.getsockopt_string(zmq.LAST_ENDPOINT)
+
+    yield _make_server
+    for server, thread in servers:
+        server.stop()
+        thread.join()
+        server.close()
+
+
+def test_encode_decode_message():
+    batch = {
+        "observation.state": torch.randn(2, 6),
+        "observation.image": torch.randint(0, 255, (2, 3, 4, 4), dtype=torch.uint8),
+        "task": ["pick", "place"],
+    }
+    header, decoded_batch = decode_message(encode_message({"command": "select_action"}, batch))
+    assert header == {"command": "select_action"}
+    assert decoded_batch.keys() == batch.keys()
+    assert decoded_batch["task"] == batch["task"]
+    for key in ["observation.state", "observation.image"]:
+        assert decoded_batch[key].dtype == batch[key].dtype
+        torch.testing.assert_close(decoded_batch[key], batch[key])
+
+
+def test_merge_split_rollout_states():
+    states = [
+        {"queue": deque([torch.full((1, 3), float(i)), torch.full((1, 3), i + 0.5)], maxlen=4), "step": 2}
+        for i in range(3)
+    ]
+    assert len({get_rollout_state_signature(state) for state in states}) == 1
+    merged_state = merge_rollout_states(states)
+    assert merged_state["queue"].maxlen == 4
+    assert merged_state["queue"][0].shape == (3, 3)
+
+    split_states = split_rollout_state(merged_state, [1, 1, 1])
+    for state, split_state in zip(states, split_states, strict=True):
+        assert split_state["step"] == 2
+        assert split_state["queue"].maxlen == 4
+        for item, split_item in zip(state["queue"], split_state["queue"], strict=True):
+            torch.testing.assert_close(item, split_item)
+
+    # States with queues of different lengths can't be merged
+    states[0]["queue"].popleft()
+    assert get_rollout_state_signature(states[0]) != get_rollout_state_signature(states[1])
+
+
+def test_act_temporal_ensembler_rollout_state():
+    """Check that swapping and merging rollout states of the temporal ensembler doesn't change its actions."""
+    chunk_size, start_steps = 5, [0, 2]
+    expected_ensemblers = [ACTTemporalEnsembler(0.01, chunk_size) for _ in start_steps]
+    ensembler = ACTTemporalEnsembler(0.01, chunk_size)
+    states = [ensembler.get_state() for _ in start_steps]
+    num_merged_steps = 0
+    for step in range(3 * chunk_size):
+        rollouts = [i for i, start_step in enumerate(start_steps) if step >= start_step]
+        chunks = [torch.randn(1, chunk_size, 2) for _ in rollouts]
+        expected_actions = [
+            expected_ensemblers[i].update(chunk) for i, chunk in zip(rollouts, chunks, strict=True)
+        ]
+
+        signatures = {get_rollout_state_signature(states[i]) for i in rollouts}
+        if len(rollouts) > 1 and len(signatures) == 1:
+            # Rollouts past their first `chunk_size - 1` steps are batched
+            num_merged_steps += 1
+            ensembler.set_state(merge_rollout_states([states[i] for i in rollouts]))
+            actions = list(torch.split(ensembler.update(torch.cat(chunks)), 1))
+            for i, state in zip(rollouts, split_rollout_state(ensembler.get_state(), [1, 1]), strict=True):
+                states[i] = state
+        else:
+            actions = []
+            for i, chunk in zip(rollouts, chunks, strict=True):
+                ensembler.set_state(states[i])
+                actions.append(ensembler.update(chunk))
+                states[i] = ensembler.get_state()
+
+        for action, expected_action in zip(actions, expected_actions, strict=True):
+            torch.testing.assert_close(action, expected_action)
+    assert num_merged_steps == 3 * chunk_size - (start_steps[1] + chunk_size - 1)
+
+
+def test_policy_server(make_server):
+    policy = CountingPolicy()
+    _, address = make_server(policy, max_batch_size=4, batch_timeout_s=1.0)
+    clients = [PolicyClient(address, policy.config) for _ in range(2)]
+
+    def select_action(client_idx: int) -> float:
+        batch = {"observation.state": torch.full((1, 1), 10.0 * client_idx)}
+        return clients[client_idx].select_action(batch).item()
+
+    try:
+        with ThreadPoolExecutor(len(clients)) as executor:
+            for step in range(3):
+                assert list(executor.map(select_action, range(len(clients)))) == [step, 10 + step]
+        # Once both clients are known to the server, their concurrent requests are batched
+        assert 2 in policy.batch_sizes
+
+        clients[0].reset()
+        assert select_action(0) == 0
+        assert select_action(1) == 13
+    finally:
+        for client in clients:
+            client.close()
+
+
+def test_policy_server_error(make_server):
+    policy = CountingPolicy(fail=True)
+    _, address = make_server(policy)
+    client = PolicyClient(address, policy.config)
+    try:
+        with pytest.raises(RuntimeError, match="inference failed"):
+            client.select_action({"observation.state": torch.zeros(1, 1)})
+    finally:
+        client.close()
+
+
+def test_policy_server_invalid_batch_size():
+    with pytest.raises(ValueError):
+        PolicyServer(CountingPolicy(), "tcp://127.0.0.1:*", max_batch_size=0)
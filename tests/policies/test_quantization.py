@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+# Copyright 2024 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import pytest
+import torch
+from torch import nn
+
+from lerobot.common.policies.quantization import (
+    Int8WeightOnlyConv,
+    Int8WeightOnlyLinear,
+    quantize_per_channel,
+    quantize_policy,
+)
+from lerobot.configs.policies import QUANTIZATIONS
+from tests.utils import make_tiny_observation, make_tiny_policy
+
+
+def test_quantize_per_channel():
+    weight = torch.randn(8, 4, 3)
+    int8_weight, scale = quantize_per_channel(weight)
+    assert int8_weight.dtype == torch.int8
+    assert scale.shape == (8, 1, 1)
+    assert int8_weight.abs().flatten(1).amax(dim=1).tolist() == [127] * 8
+    assert ((int8_weight * scale - weight).abs() <= scale / 2 + 1e-6).all()
+
+
+@pytest.mark.parametrize(
+    "module, quantized_cls, input_shape",
+    [
+        (nn.Linear(16, 8), Int8WeightOnlyLinear, (2, 5, 16)),
+        (nn.Conv1d(16, 8, 3, padding=1), Int8WeightOnlyConv, (2, 16, 10)),
+        (nn.Conv2d(16, 8, 3, stride=2, bias=False), Int8WeightOnlyConv, (2, 16, 10, 10)),
+    ],
+)
+def test_int8_weight_only_modules(module, quantized_cls, input_shape):
+    x = torch.randn(input_shape)
+    with torch.no_grad():
+        expected = module(x)
+        quantized_module = quantized_cls(module)
+        torch.testing.assert_close(quantized_module(x), expected, rtol=0.05, atol=0.05)
+
+
+@pytest.mark.parametrize("quantization", QUANTIZATIONS)
+@pytest.mark.parametrize("policy_name", ["act", "diffusion", "vqbet"])
+def test_quantize_policy(policy_name, quantization):
+    policy = make_tiny_policy(policy_name)
+    quantize_policy(policy, quantization)
+    assert policy.config.quantization == quantization
+    # Weight-only quantized convolutions keep their float module, without its weight
+    assert not any(
+        type(m) in (nn.Linear, nn.Conv1d, nn.Conv2d) and "weight" in m._parameters for m in policy.modules()
+    )
+
+    action = policy.select_action(make_tiny_observation())
+    assert action.shape == (1, 6)
+    assert torch.isfinite(action).all()
+
+
+def test_quantize_policy_invalid():
+    with pytest.raises(ValueError):
+        quantize_policy(make_tiny_policy("act"), "int4")
+
+
+def test_from_pretrained_quantization(tmp_path):
+    policy = make_tiny_policy("act")
+    policy.save_pretrained(tmp_path)
+
+    quantized_policy = policy.__class__.from_pretrained(tmp_path, quantization="int8-weight-only")
+    assert quantized_policy.config.quantization == "int8-weight-only"
+    assert any(isinstance(m, Int8WeightOnlyLinear) for m in quantized_policy.modules())
+    observation = make_tiny_observation()
+    with torch.no_grad():
+        actions = quantized_policy.predict_action_chunk(observation)
+        torch.testing.assert_close(actions, policy.predict_action_chunk(observation), rtol=0.1, atol=0.1)
+
+    # Quantized policies are built from float32 checkpoints
+    with pytest.raises(RuntimeError):
+        quantized_policy.save_pretrained(tmp_path / "quantized")
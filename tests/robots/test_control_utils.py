@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+
+# Copyright 2024 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import time
+from types import SimpleNamespace
+
+import pytest
+import torch
+
+from lerobot.common.robot_devices.control_utils import AsyncActionChunkInference, control_loop
+
+
+class MockChunkPolicy:
+    """Predicts the chunk of actions [step, step + 1, ...] from an observation of the current step."""
+
+    def __init__(
+        self, chunk_size: int, inference_time_s: float = 0.0, fail: bool = False, n_action_steps: int = 1
+    ):
+        self.config = SimpleNamespace(
+            chunk_size=chunk_size, n_action_steps=n_action_steps, device="cpu", use_amp=False
+        )
+        self.chunk_size = chunk_size
+        self.inference_time_s = inference_time_s
+        self.fail = fail
+        self.num_resets = 0
+
+    def predict_action_chunk(self, batch: dict[str, torch.Tensor]) -> torch.Tensor:
+        if self.fail:
+            raise ValueError("inference failed")
+        time.sleep(self.inference_time_s)
+        step = batch["observation.state"][0, 0]
+        return (step + torch.arange(self.chunk_size)).reshape(1, self.chunk_size, 1)
+
+    def reset(self):
+        self.num_resets += 1
+
+
+class MockRobot:
+    """Observes the index of the control step, and stops the control loop after `num_steps` steps."""
+
+    robot_type = "mock"
+    leader_arms = {}
+    follower_arms = {}
+    cameras = {}
+
+    def __init__(self, events: dict, num_steps: int):
+        self.events = events
+        self.num_steps = num_steps
+        self.is_connected = True
+        self.logs = {}
+        self.step = 0
+        self.sent_actions = []
+
+    def capture_observation(self) -> dict[str, torch.Tensor]:
+        observation = make_observation(self.step)
+        self.step += 1
+        if self.step == self.num_steps:
+            self.events["exit_early"] = True
+        return observation
+
+    def send_action(self, action: torch.Tensor) -> torch.Tensor:
+        self.sent_actions.append(action.item())
+        return action
+
+
+class MockDataset:
+    fps = 30
+
+    def __init__(self):
+        self.frames = []
+
+    def add_frame(self, frame: dict):
+        self.frames.append(frame)
+
+
+def make_observation(step: int) -> dict[str, torch.Tensor]:
+    return {"observation.state": torch.tensor([float(step)])}
+
+
+@pytest.mark.parametrize("inference_time_s", [0.0, 0.02])
+def test_async_action_chunk_inference(inference_time_s):
+    policy = MockChunkPolicy(chunk_size=10, inference_time_s=inference_time_s)
+    inference = AsyncActionChunkInference(policy, torch.device("cpu"), use_amp=False, refill_threshold=5)
+    try:
+        for step in range(40):
+            # The actions of the control steps elapsed during the inference are discarded
+            assert inference.select_action(make_observation(step)).item() == step
+            time.sleep(0.005)
+    finally:
+        inference.stop()
+
+
+def test_async_action_chunk_inference_reset():
+    policy = MockChunkPolicy(chunk_size=10)
+    inference = AsyncActionChunkInference(policy, torch.device("cpu"), use_amp=False, refill_threshold=2)
+    try:
+        for step in range(3):
+            inference.select_action(make_observation(step))
+        inference.reset()
+        assert policy.num_resets == 1
+        assert inference.select_action(make_observation(0)).item() == 0
+    finally:
+        inference.stop()
+
+
+def test_async_action_chunk_inference_error():
+    policy = MockChunkPolicy(chunk_size=10, fail=True)
+    inference = AsyncActionChunkInference(policy, torch.device("cpu"), use_amp=False, refill_threshold=2)
+    try:
+        with pytest.raises(RuntimeError, match="chunk of actions"):
+            inference.select_action(make_observation(0))
+    finally:
+        inference.stop()
+
+
+def test_async_action_chunk_inference_default_threshold():
+    # With ACT's temporal ensembling, `n_action_steps` is 1
+    policy = MockChunkPolicy(chunk_size=10, n_action_steps=1)
+    inference = AsyncActionChunkInference(policy, torch.device("cpu"), use_amp=False)
+    try:
+        assert inference.refill_threshold == 5
+    finally:
+        inference.stop()
+
+
+@pytest.mark.parametrize("async_inference", [False, True])
+def test_control_loop_policy(async_inference):
+    """Check that the actions of the policy are sent to the robot and recorded, with and without async
+    inference."""
+    events = {"exit_early": False}
+    robot = MockRobot(events, num_steps=25)
+    dataset = MockDataset()
+    policy = MockChunkPolicy(chunk_size=10)
+    policy.select_action = lambda batch: policy.predict_action_chunk(batch)[:, 0]
+    control_loop(
+        robot,
+        dataset=dataset,
+        events=events,
+        policy=policy,
+        single_task="task",
+        async_inference=async_inference,
+    )
+
+    assert robot.sent_actions == list(range(25))
+    assert [frame["action"].item() for frame in dataset.frames] == list(range(25))
+    assert all(frame["task"] == "task" for frame in dataset.frames)
+
+
+def test_async_action_chunk_inference_invalid_threshold():
+    policy = MockChunkPolicy(chunk_size=10)
+    with pytest.raises(ValueError):
+        AsyncActionChunkInference(policy, torch.device("cpu"), use_amp=False, refill_threshold=-1)
+
+
+def test_async_action_chunk_inference_unsupported_policy():
+    class MockPolicy:
+        config = SimpleNamespace(n_action_steps=1, device="cpu", use_amp=False)
+
+        def select_action(self, batch: dict[str, torch.Tensor]) -> torch.Tensor:
+            return torch.zeros(1, 1)
+
+    with pytest.raises(ValueError, match="predict_action_chunk"):
+        AsyncActionChunkInference(MockPolicy(), torch.device("cpu"), use_amp=False, refill_threshold=2)
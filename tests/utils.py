@@ -23,11 +23,14 @@ import pytest
 import torch
 
 from lerobot import available_cameras, available_motors, available_robots
+from lerobot.common.policies.factory import get_policy_class, make_policy_config
+from lerobot.common.policies.pretrained import PreTrainedPolicy
 from lerobot.common.robot_devices.cameras.utils import Camera
 from lerobot.common.robot_devices.cameras.utils import make_camera as make_camera_device
 from lerobot.common.robot_devices.motors.utils import MotorsBus
 from lerobot.common.robot_devices.motors.utils import make_motors_bus as make_motors_bus_device
 from lerobot.common.utils.import_utils import is_package_available
+from lerobot.configs.types import FeatureType, PolicyFeature
 
 DEVICE = os.environ.get("LEROBOT_TEST_DEVICE", "cuda") if torch.cuda.is_available() else "cpu"
 
@@ -329,3 +332,64 @@ def make_motors_bus(motor_type: str, **kwargs) -> MotorsBus:
 
     else:
         raise ValueError(f"The motor type '{motor_type}' is not valid.")
+
+
+# Arguments of small policies observing a state and a camera, which are quick to build and run on cpu
+TINY_POLICY_KWARGS = {
+    "act": {
+        "pretrained_backbone_weights": None,
+        "dim_model": 64,
+        "n_heads": 2,
+        "dim_feedforward": 128,
+        "n_encoder_layers": 1,
+        "n_vae_encoder_layers": 1,
+        "chunk_size": 5,
+        "n_action_steps": 5,
+    },
+    "diffusion": {
+        "pretrained_backbone_weights": None,
+        "down_dims": (64, 128),
+        "sampler": "DDIM",
+        "num_inference_steps": 2,
+        "n_action_steps": 4,
+    },
+    "tdmpc": {},
+    "vqbet": {},
+}
+
+
+def make_stats(shape: tuple[int, ...]) -> dict[str, torch.Tensor]:
+    return {
+        "mean": torch.rand(shape),
+        "std": torch.rand(shape) + 0.5,
+        "min": -torch.rand(shape) - 0.5,
+        "max": torch.rand(shape) + 0.5,
+    }
+
+
+def make_tiny_policy(policy_name: str, **kwargs) -> PreTrainedPolicy:
+    """Builds a small policy in eval mode (see `TINY_POLICY_KWARGS`), with random normalization stats, taking
+    a state of 6 dimensions and a camera of 84x84 pixels to predict actions of 6 dimensions. `kwargs` override
+    the arguments of its config."""
+    config = make_policy_config(policy_name, device="cpu", **{**TINY_POLICY_KWARGS[policy_name], **kwargs})
+    config.input_features = {
+        "observation.state": PolicyFeature(type=FeatureType.STATE, shape=(6,)),
+        "observation.images.laptop": PolicyFeature(type=FeatureType.VISUAL, shape=(3, 84, 84)),
+    }
+    config.output_features = {"action": PolicyFeature(type=FeatureType.ACTION, shape=(6,))}
+    stats = {
+        "observation.state": make_stats((6,)),
+        "observation.images.laptop": make_stats((3, 1, 1)),
+        "action": make_stats((6,)),
+    }
+    policy = get_policy_class(policy_name)(config, dataset_stats=stats)
+    policy.eval()
+    return policy
+
+
+def make_tiny_observation() -> dict[str, torch.Tensor]:
+    """Returns a batch of one random observation of the policies built by `make_tiny_policy`."""
+    return {
+        "observation.state": torch.randn(1, 6),
+        "observation.images.laptop": torch.rand(1, 3, 84, 84),
+    }
@@ -0,0 +1,58 @@
+# Copyright 2024 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import time
+
+import pytest
+import torch
+
+from lerobot.common.utils.benchmark import TimeBenchmark, make_profiler
+
+
+def test_time_benchmark_total():
+    benchmark = TimeBenchmark()
+    assert benchmark.result is None
+    assert benchmark.total == 0.0
+    for _ in range(3):
+        with benchmark:
+            time.sleep(0.01)
+
+    assert benchmark.count == 3
+    assert benchmark.result >= 0.01
+    assert benchmark.total >= 0.03
+
+    benchmark.reset()
+    assert benchmark.count == 0
+    assert benchmark.total == 0.0
+
+
+@pytest.mark.skipif(not torch.cuda.is_available(), reason="requires cuda")
+def test_time_benchmark_cuda():
+    benchmark = TimeBenchmark(device="cuda")
+    x = torch.randn(1024, 1024, device="cuda")
+    for _ in range(2):
+        with benchmark:
+            x = x @ x
+    assert benchmark.count == 2
+    assert 0 < benchmark.result <= benchmark.total
+
+
+def test_make_profiler(tmp_path):
+    profiler = make_profiler(tmp_path, wait_steps=1, warmup_steps=1, active_steps=1)
+    profiler.start()
+    x = torch.randn(8, 8)
+    for _ in range(3):
+        x = x @ x.T
+        profiler.step()
+    profiler.stop()
+    assert len(list(tmp_path.glob("*.pt.trace.json"))) == 1
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+# Copyright 2024 The HuggingFace Inc. team. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import socket
+
+import pytest
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+from lerobot.common.utils.distributed_utils import (
+    all_reduce_metrics,
+    cleanup_distributed,
+    get_rank,
+    get_world_size,
+    init_distributed,
+    is_main_process,
+)
+from lerobot.common.utils.logging_utils import AverageMeter, MetricsTracker
+
+
+def test_not_distributed(monkeypatch):
+    monkeypatch.delenv("WORLD_SIZE", raising=False)
+    assert not init_distributed(torch.device("cpu"))
+    assert get_world_size() == 1
+    assert get_rank() == 0
+    assert is_main_process()
+
+    tracker = MetricsTracker(8, 100, 10, {"loss": AverageMeter("loss")})
+    tracker.loss = 2.0
+    all_reduce_metrics(tracker, torch.device("cpu"))
+    assert tracker.loss.avg == 2.0
+
+
+def _all_reduce_metrics_worker(rank: int, world_size: int, port: int):
+    os.environ.update(
+        WORLD_SIZE=str(world_size),
+        RANK=str(rank),
+        LOCAL_RANK=str(rank),
+        MASTER_ADDR="127.0.0.1",
+        MASTER_PORT=str(port),
+    )
+    assert init_distributed(torch.device("cpu"))
+    try:
+        assert dist.get_backend() == "gloo"
+        tracker = MetricsTracker(8, 100, 10, {"loss": AverageMeter("loss")})
+        # rank 0 logs two updates, rank 1 a single one
+        for _ in range(world_size - rank):
+            tracker.loss = float(rank + 1)
+        all_reduce_metrics(tracker, torch.device("cpu"))
+        assert tracker.loss.count == 3
+        assert tracker.loss.avg == pytest.approx((1.0 + 1.0 + 2.0) / 3)
+    finally:
+        cleanup_distributed()
+
+
+def _get_free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_all_reduce_metrics_gloo():
+    mp.spawn(_all_reduce_metrics_worker, args=(2, _get_free_port()), nprocs=2, join=True)
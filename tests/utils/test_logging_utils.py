@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import pytest
+import torch
 
 from lerobot.common.utils.logging_utils import AverageMeter, MetricsTracker
 
@@ -40,6 +41,20 @@ def test_average_meter_update():
     assert meter.avg == 5
 
 
+def test_average_meter_update_tensor():
+    meter = AverageMeter("loss")
+    meter.update(torch.tensor(1.0), n=2)
+    meter.update(torch.tensor(4.0))
+    # accumulated as a tensor until synchronized
+    assert meter.is_pending()
+    assert isinstance(meter.sum, torch.Tensor)
+    meter.sync()
+    assert not meter.is_pending()
+    assert meter.val == 4.0
+    assert meter.sum == 6.0
+    assert meter.avg == 2.0
+
+
 def test_average_meter_reset():
     meter = AverageMeter("loss")
     meter.update(3, 4)
@@ -79,6 +94,14 @@ def test_metrics_tracker_step(mock_metrics):
     assert tracker.epochs == tracker.samples / 1000
 
 
+def test_metrics_tracker_step_num_samples(mock_metrics):
+    tracker = MetricsTracker(batch_size=32, num_frames=1000, num_episodes=50, metrics=mock_metrics)
+    tracker.step(num_samples=20)
+    assert tracker.steps == 1
+    assert tracker.samples == 20
+    assert tracker.epochs == 20 / 1000
+
+
 def test_metrics_tracker_getattr(mock_metrics):
     tracker = MetricsTracker(batch_size=32, num_frames=1000, num_episodes=50, metrics=mock_metrics)
     assert tracker.loss == mock_metrics["loss"]
@@ -118,3 +141,13 @@ def test_metrics_tracker_reset_averages(mock_metrics):
     tracker.reset_averages()
     assert tracker.loss.avg == 0.0
     assert tracker.accuracy.avg == 0.0
+
+
+def test_metrics_tracker_to_dict_syncs_tensors(mock_metrics):
+    tracker = MetricsTracker(batch_size=32, num_frames=1000, num_episodes=50, metrics=mock_metrics)
+    tracker.loss = torch.tensor(0.5, dtype=torch.bfloat16)
+    tracker.accuracy = 0.9
+    metrics_dict = tracker.to_dict()
+    assert metrics_dict["loss"] == 0.5
+    assert isinstance(metrics_dict["loss"], float)
+    assert metrics_dict["accuracy"] == 0.9
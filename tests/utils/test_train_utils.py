@@ -14,26 +14,44 @@
 from pathlib import Path
 from unittest.mock import Mock, patch
 
+import pytest
+import torch
+from huggingface_hub.constants import SAFETENSORS_INDEX_FILE, SAFETENSORS_SINGLE_FILE
+from safetensors.torch import load_file
+
 from lerobot.common.constants import (
     CHECKPOINTS_DIR,
+    EMA_STATE,
     LAST_CHECKPOINT_LINK,
+    MASTER_WEIGHTS,
     OPTIMIZER_PARAM_GROUPS,
     OPTIMIZER_STATE,
+    PRETRAINED_MODEL_DIR,
     RNG_STATE,
     SCHEDULER_STATE,
     TRAINING_STATE_DIR,
     TRAINING_STEP,
+    TRAINING_WEIGHTS,
+    WEIGHT_BLOBS_DIR,
 )
+from lerobot.common.datasets.utils import load_json
+from lerobot.common.optim.ema import ExponentialMovingAverage
+from lerobot.common.optim.optimizers import AdamConfig, MasterWeights
 from lerobot.common.utils.train_utils import (
+    AsyncCheckpointWriter,
+    FrozenDigestCache,
     get_step_checkpoint_dir,
     get_step_identifier,
     load_training_state,
     load_training_step,
+    prune_checkpoints,
     save_checkpoint,
+    save_deduplicated_weights,
     save_training_state,
     save_training_step,
     update_last_checkpoint,
 )
+from lerobot.configs.default import CheckpointRetentionConfig
 
 
 def test_get_step_identifier():
@@ -79,6 +97,31 @@ def test_save_checkpoint(mock_save_training_state, tmp_path, optimizer):
     mock_save_training_state.assert_called_once()
 
 
+def test_save_checkpoint_export_ema(tmp_path, optimizer):
+    model = torch.nn.Linear(2, 2)
+    ema = ExponentialMovingAverage(model, decay=0.5, warmup=False)
+    with torch.no_grad():
+        model.weight.add_(1)
+    ema.step()
+    policy = Mock()
+    policy.state_dict = model.state_dict
+    cfg = Mock()
+    save_checkpoint(tmp_path, 10, cfg, policy, optimizer, ema=ema, export_ema=True)
+
+    model_state = load_file(tmp_path / PRETRAINED_MODEL_DIR / SAFETENSORS_SINGLE_FILE)
+    torch.testing.assert_close(model_state["weight"], ema.ema_params[0])
+    assert (tmp_path / TRAINING_STATE_DIR / EMA_STATE).is_file()
+    assert (tmp_path / TRAINING_STATE_DIR / TRAINING_WEIGHTS).is_file()
+
+    # Resuming loads the training weights in the policy
+    expected_weight = model.weight.detach().clone()
+    with torch.no_grad():
+        model.weight.zero_()
+    load_training_state(tmp_path, optimizer, None, ema=ema, policy=model)
+    torch.testing.assert_close(model.weight.detach(), expected_weight)
+    assert ema.num_steps == 1
+
+
 def test_save_training_state(tmp_path, optimizer, scheduler):
     save_training_state(tmp_path, 10, optimizer, scheduler)
     assert (tmp_path / TRAINING_STATE_DIR).is_dir()
@@ -95,3 +138,199 @@ def test_save_load_training_state(tmp_path, optimizer, scheduler):
     assert loaded_step == 10
     assert loaded_optimizer is optimizer
     assert loaded_scheduler is scheduler
+
+
+def test_save_load_master_weights(tmp_path):
+    param = torch.nn.Parameter(torch.randn(10))
+    optimizer = AdamConfig(lr=1e-3).build([param])
+    master_weights = MasterWeights(optimizer)
+    master_weights.cast_params(torch.bfloat16)
+    assert param.dtype == torch.bfloat16
+    param.float().sum().backward()
+    master_weights.copy_grads_to_master()
+    optimizer.step()
+    master_weights.copy_master_to_params()
+    expected_master_param = master_weights.master_params[0].detach().clone()
+
+    save_training_state(tmp_path, 10, optimizer, master_weights=master_weights)
+    assert (tmp_path / TRAINING_STATE_DIR / MASTER_WEIGHTS).is_file()
+
+    # Resuming restores the float32 master weights, rather than rebuilding them from the bfloat16 weights
+    with torch.no_grad():
+        master_weights.master_params[0].zero_()
+        param.zero_()
+    load_training_state(tmp_path, optimizer, None, master_weights=master_weights)
+    master_param = master_weights.master_params[0].detach()
+    torch.testing.assert_close(master_param, expected_master_param, rtol=0, atol=0)
+    torch.testing.assert_close(param.detach(), expected_master_param.to(torch.bfloat16), rtol=0, atol=0)
+
+
+@pytest.mark.parametrize("async_writer", [False, True])
+def test_save_checkpoint_master_weights(tmp_path, async_writer):
+    model = torch.nn.Linear(2, 2)
+    optimizer = AdamConfig(lr=1e-3).build(list(model.parameters()))
+    master_weights = MasterWeights(optimizer)
+    master_weights.cast_params(torch.bfloat16)
+    model(torch.randn(4, 2, dtype=torch.bfloat16)).float().sum().backward()
+    master_weights.copy_grads_to_master()
+    optimizer.step()
+    master_weights.copy_master_to_params()
+    policy = Mock()
+    policy.state_dict = model.state_dict
+    cfg = Mock()
+    checkpoint_dir = tmp_path / CHECKPOINTS_DIR / "000010"
+    if async_writer:
+        writer = AsyncCheckpointWriter(max_in_flight=1)
+        writer.save(checkpoint_dir, 10, cfg, policy, optimizer, master_weights=master_weights)
+        writer.stop()
+    else:
+        save_checkpoint(checkpoint_dir, 10, cfg, policy, optimizer, master_weights=master_weights)
+
+    # The float32 master weights are exported, rather than their bfloat16 copies
+    model_state = load_file(checkpoint_dir / PRETRAINED_MODEL_DIR / SAFETENSORS_SINGLE_FILE)
+    for key, master_param in zip(["weight", "bias"], master_weights.master_params, strict=True):
+        assert model_state[key].dtype == torch.float32
+        assert torch.equal(model_state[key], master_param.detach())
+
+
+def test_async_checkpoint_writer(tmp_path, optimizer, scheduler):
+    policy = Mock()
+    weight = torch.randn(2, 2)
+    policy.state_dict.return_value = {"weight": weight}
+    cfg = Mock()
+    checkpoint_dir = tmp_path / CHECKPOINTS_DIR / "000010"
+
+    writer = AsyncCheckpointWriter(max_in_flight=1)
+    writer.save(checkpoint_dir, 10, cfg, policy, optimizer, scheduler)
+    # The snapshot is not affected by updates made after `save` returns
+    expected_weight = weight.clone()
+    weight.add_(1)
+    writer.stop()
+
+    model_state = load_file(checkpoint_dir / PRETRAINED_MODEL_DIR / SAFETENSORS_SINGLE_FILE)
+    torch.testing.assert_close(model_state["weight"], expected_weight)
+    policy.config._save_pretrained.assert_called_once()
+    cfg.save_pretrained.assert_called_once()
+    assert (tmp_path / CHECKPOINTS_DIR / LAST_CHECKPOINT_LINK).resolve() == checkpoint_dir
+    assert not any(path.name.endswith(".tmp") for path in (tmp_path / CHECKPOINTS_DIR).iterdir())
+
+    loaded_step, _, _ = load_training_state(checkpoint_dir, optimizer, scheduler)
+    assert loaded_step == 10
+
+
+def test_async_checkpoint_writer_error(tmp_path, optimizer):
+    policy = Mock()
+    policy.state_dict.return_value = {"weight": torch.randn(2, 2)}
+    cfg = Mock()
+    cfg.save_pretrained.side_effect = OSError("disk full")
+
+    writer = AsyncCheckpointWriter()
+    writer.save(tmp_path / "000010", 10, cfg, policy, optimizer)
+    with pytest.raises(RuntimeError, match="checkpoint"):
+        writer.wait()
+    writer.stop()
+    assert not (tmp_path / "000010").exists()
+    assert not (tmp_path / LAST_CHECKPOINT_LINK).exists()
+
+
+def make_checkpoints(checkpoints_dir: Path, steps: list[int]) -> None:
+    for step in steps:
+        (checkpoints_dir / get_step_identifier(step, 100)).mkdir(parents=True)
+    update_last_checkpoint(checkpoints_dir / get_step_identifier(steps[-1], 100))
+
+
+@pytest.mark.parametrize(
+    "retention, metrics, expected_steps",
+    [
+        (CheckpointRetentionConfig(), None, [10, 20, 30, 40, 50]),
+        (CheckpointRetentionConfig(keep_last=2), None, [40, 50]),
+        (CheckpointRetentionConfig(keep_last=1, keep_every=20), None, [20, 40, 50]),
+        (
+            CheckpointRetentionConfig(keep_last=1, keep_best_metric="pc_success"),
+            {10: 20.0, 30: 80.0, 50: 60.0},
+            [30, 50],
+        ),
+        (
+            CheckpointRetentionConfig(keep_last=1, keep_best_metric="loss", lower_is_better=True),
+            {10: 0.1, 30: 0.5, 50: 0.3},
+            [10, 50],
+        ),
+    ],
+)
+def test_prune_checkpoints(tmp_path, retention, metrics, expected_steps):
+    make_checkpoints(tmp_path, [10, 20, 30, 40, 50])
+    pruned = prune_checkpoints(tmp_path, retention, metrics)
+
+    remaining_steps = sorted(int(p.name) for p in tmp_path.iterdir() if p.name.isdigit())
+    assert remaining_steps == expected_steps
+    assert sorted(int(p.name) for p in pruned) == sorted({10, 20, 30, 40, 50} - set(expected_steps))
+    assert (tmp_path / LAST_CHECKPOINT_LINK).resolve().name == get_step_identifier(50, 100)
+
+
+def test_checkpoint_retention_invalid_keep_last():
+    with pytest.raises(ValueError):
+        CheckpointRetentionConfig(keep_last=0)
+
+
+def test_save_deduplicated_weights(tmp_path):
+    blobs_dir = tmp_path / WEIGHT_BLOBS_DIR
+    frozen_keys = {"backbone.weight"}
+    state_1 = {"backbone.weight": torch.randn(4, 4), "head.weight": torch.randn(2, 4)}
+    state_2 = {"backbone.weight": state_1["backbone.weight"], "head.weight": torch.randn(2, 4)}
+    save_deduplicated_weights(state_1, frozen_keys, tmp_path / "000010", blobs_dir)
+    save_deduplicated_weights(state_2, frozen_keys, tmp_path / "000020", blobs_dir)
+
+    index_1 = load_json(tmp_path / "000010" / SAFETENSORS_INDEX_FILE)["weight_map"]
+    index_2 = load_json(tmp_path / "000020" / SAFETENSORS_INDEX_FILE)["weight_map"]
+    # The frozen shard is shared, the trainable one is not
+    assert index_1["backbone.weight"] == index_2["backbone.weight"]
+    assert index_1["head.weight"] != index_2["head.weight"]
+    frozen_shard = tmp_path / "000020" / index_2["backbone.weight"]
+    assert frozen_shard.stat().st_nlink == 3
+    assert len(list(blobs_dir.iterdir())) == 3
+
+    for checkpoint_dir, state, index in [("000010", state_1, index_1), ("000020", state_2, index_2)]:
+        loaded = {}
+        for shard_file in set(index.values()):
+            loaded.update(load_file(tmp_path / checkpoint_dir / shard_file))
+        assert loaded.keys() == state.keys()
+        for key in state:
+            torch.testing.assert_close(loaded[key], state[key])
+
+    # Blobs only linked by a pruned checkpoint are deleted
+    update_last_checkpoint(tmp_path / "000020")
+    prune_checkpoints(tmp_path, CheckpointRetentionConfig(keep_last=1))
+    assert not (tmp_path / "000010").exists()
+    assert frozen_shard.stat().st_nlink == 2
+    assert len(list(blobs_dir.iterdir())) == 2
+
+
+def test_frozen_digest_cache(tmp_path):
+    model = torch.nn.Linear(4, 2)
+    model.weight.requires_grad_(False)
+    cache = FrozenDigestCache()
+    with patch("lerobot.common.utils.train_utils._hash_tensor", return_value="digest") as hash_tensor:
+        digests = cache.get_digests(model.state_dict(), cache.get_fingerprints(model))
+        assert digests == {"weight": "digest"}
+        assert hash_tensor.call_count == 1
+
+        # Reused while the frozen weight is unchanged
+        with torch.no_grad():
+            model.bias.add_(1.0)
+        assert cache.get_digests(model.state_dict(), cache.get_fingerprints(model)) == digests
+        assert hash_tensor.call_count == 1
+
+        with torch.no_grad():
+            model.weight.mul_(2.0)
+        cache.get_digests(model.state_dict(), cache.get_fingerprints(model))
+        assert hash_tensor.call_count == 2
+
+    # Cached digests name the shards as if they were computed
+    state = {key: val.detach().clone() for key, val in model.state_dict().items()}
+    digests = FrozenDigestCache().get_digests(state, FrozenDigestCache.get_fingerprints(model))
+    blobs_dir = tmp_path / WEIGHT_BLOBS_DIR
+    save_deduplicated_weights(state, {"weight"}, tmp_path / "000010", blobs_dir, digests)
+    save_deduplicated_weights(state, {"weight"}, tmp_path / "000020", blobs_dir)
+    index_1 = load_json(tmp_path / "000010" / SAFETENSORS_INDEX_FILE)
+    index_2 = load_json(tmp_path / "000020" / SAFETENSORS_INDEX_FILE)
+    assert index_1 == index_2